@@ -0,0 +1,253 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Admittance matrices with a fixed sparsity structure.
+
+Ybus, Yf and Yt are assembled with an entry for every branch, active or not (the inactive ones are explicit zeros),
+and the position of every branch primitive in the data arrays is stored. Hence a change of taps or of branch states
+is applied by adding the primitive increments to a few nonzeros in place, instead of assembling the matrices again.
+The structure (indptr, indices) never changes, so the Newton-Raphson solver context keeps its symbolic analysis.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+
+
+def get_branch_buses(C_branch_bus):
+    """
+    Get the bus index of every branch from a branch-bus connectivity matrix
+    :param C_branch_bus: branch-bus connectivity matrix (nbr, nbus)
+    :return: array of bus indices (nbr)
+    """
+    rows, cols = sp.csr_matrix(C_branch_bus).nonzero()
+    buses = np.zeros(C_branch_bus.shape[0], dtype=int)
+    buses[rows] = cols
+    return buses
+
+
+def build_csc_structure(rows, cols, shape):
+    """
+    Build the CSC structure of a sparse matrix from the coordinates of its entries (repeated coordinates share entry)
+    :param rows: row indices of the entries
+    :param cols: column indices of the entries
+    :param shape: shape of the matrix
+    :return: indptr, indices, position of every coordinate in the data array
+    """
+    keys = cols.astype(np.int64) * shape[0] + rows
+    unique_keys, pos = np.unique(keys, return_inverse=True)
+
+    indices = (unique_keys % shape[0]).astype(np.int32)
+    counts = np.bincount(unique_keys // shape[0], minlength=shape[1])
+    indptr = np.r_[0, np.cumsum(counts)].astype(np.int32)
+
+    return indptr, indices, pos
+
+
+def transformer_primitives(Ys, Ysh, tap, tap_f, tap_t):
+    """
+    Compute the branch primitives of the transformers
+    :param Ys: series admittance
+    :param Ysh: shunt admittance
+    :param tap: complex tap (module and angle)
+    :param tap_f: virtual tap at the from side
+    :param tap_t: virtual tap at the to side
+    :return: Yff, Yft, Ytf, Ytt
+    """
+    Ys2 = Ys + Ysh / 2.0
+    Yff = Ys2 / (tap_f * tap_f * tap * np.conj(tap))
+    Yft = - Ys / (tap_f * tap_t * np.conj(tap))
+    Ytf = - Ys / (tap_t * tap_f * tap)
+    Ytt = Ys2 / (tap_t * tap_t)
+    return Yff, Yft, Ytf, Ytt
+
+
+class AdmittanceStructure:
+
+    def __init__(self, C_branch_bus_f, C_branch_bus_t):
+        """
+        Fixed sparsity structure of Ybus, Yf and Yt, with the position of the branch primitives in the data arrays
+        :param C_branch_bus_f: branch-from bus connectivity matrix (nbr, nbus)
+        :param C_branch_bus_t: branch-to bus connectivity matrix (nbr, nbus)
+        """
+        self.nbr, self.nbus = C_branch_bus_f.shape
+
+        self.F = get_branch_buses(C_branch_bus_f)
+        self.T = get_branch_buses(C_branch_bus_t)
+
+        br = np.arange(self.nbr)
+        bus = np.arange(self.nbus)
+        m = self.nbr
+
+        # Yf = diag(Yff) Cf + diag(Yft) Ct
+        self.yf_indptr, self.yf_indices, pos = build_csc_structure(np.r_[br, br], np.r_[self.F, self.T],
+                                                                   (self.nbr, self.nbus))
+        self.yf_ff = pos[:m]
+        self.yf_ft = pos[m:]
+
+        # Yt = diag(Ytf) Cf + diag(Ytt) Ct
+        self.yt_indptr, self.yt_indices, pos = build_csc_structure(np.r_[br, br], np.r_[self.F, self.T],
+                                                                   (self.nbr, self.nbus))
+        self.yt_tf = pos[:m]
+        self.yt_tt = pos[m:]
+
+        # Ybus = Cf' Yf + Ct' Yt + diag(Yshunt), the diagonal is always present
+        rows = np.r_[self.F, self.F, self.T, self.T, bus]
+        cols = np.r_[self.F, self.T, self.F, self.T, bus]
+        self.ybus_indptr, self.ybus_indices, pos = build_csc_structure(rows, cols, (self.nbus, self.nbus))
+        self.ybus_ff = pos[:m]
+        self.ybus_ft = pos[m:2 * m]
+        self.ybus_tf = pos[2 * m:3 * m]
+        self.ybus_tt = pos[3 * m:4 * m]
+        self.ybus_diag = pos[4 * m:]
+
+        # primitives and states currently applied
+        self.Yff = np.zeros(self.nbr, dtype=complex)
+        self.Yft = np.zeros(self.nbr, dtype=complex)
+        self.Ytf = np.zeros(self.nbr, dtype=complex)
+        self.Ytt = np.zeros(self.nbr, dtype=complex)
+        self.active = np.zeros(self.nbr, dtype=int)
+
+        self.Ybus = None
+        self.Yf = None
+        self.Yt = None
+
+    def assemble(self, Yff, Yft, Ytf, Ytt, active, Yshunt_bus):
+        """
+        Assemble the admittance matrices
+        :param Yff: from-from primitives (nbr)
+        :param Yft: from-to primitives (nbr)
+        :param Ytf: to-from primitives (nbr)
+        :param Ytt: to-to primitives (nbr)
+        :param active: branch states (nbr)
+        :param Yshunt_bus: shunt admittance of the devices at every bus (nbus)
+        :return: Ybus, Yf, Yt
+        """
+        # copies, since the stored primitives are modified by the updates
+        self.Yff = np.array(Yff, dtype=complex)
+        self.Yft = np.array(Yft, dtype=complex)
+        self.Ytf = np.array(Ytf, dtype=complex)
+        self.Ytt = np.array(Ytt, dtype=complex)
+        self.active = np.array(active, dtype=int)
+
+        yf_data = np.zeros(len(self.yf_indices), dtype=complex)
+        yt_data = np.zeros(len(self.yt_indices), dtype=complex)
+        ybus_data = np.zeros(len(self.ybus_indices), dtype=complex)
+        np.add.at(ybus_data, self.ybus_diag, Yshunt_bus)
+
+        self.Yf = sp.csc_matrix((yf_data, self.yf_indices, self.yf_indptr), shape=(self.nbr, self.nbus))
+        self.Yt = sp.csc_matrix((yt_data, self.yt_indices, self.yt_indptr), shape=(self.nbr, self.nbus))
+        self.Ybus = sp.csc_matrix((ybus_data, self.ybus_indices, self.ybus_indptr), shape=(self.nbus, self.nbus))
+
+        br_idx = np.arange(self.nbr)
+        self.add_increments(br_idx, self.Yff * self.active, self.Yft * self.active,
+                            self.Ytf * self.active, self.Ytt * self.active)
+
+        return self.Ybus, self.Yf, self.Yt
+
+    def add_increments(self, br_idx, dYff, dYft, dYtf, dYtt):
+        """
+        Add the primitive increments of some branches to the admittance matrices in place
+        :param br_idx: branch indices
+        :param dYff: from-from increments
+        :param dYft: from-to increments
+        :param dYtf: to-from increments
+        :param dYtt: to-to increments
+        """
+        np.add.at(self.Yf.data, self.yf_ff[br_idx], dYff)
+        np.add.at(self.Yf.data, self.yf_ft[br_idx], dYft)
+
+        np.add.at(self.Yt.data, self.yt_tf[br_idx], dYtf)
+        np.add.at(self.Yt.data, self.yt_tt[br_idx], dYtt)
+
+        np.add.at(self.Ybus.data, self.ybus_ff[br_idx], dYff)
+        np.add.at(self.Ybus.data, self.ybus_ft[br_idx], dYft)
+        np.add.at(self.Ybus.data, self.ybus_tf[br_idx], dYtf)
+        np.add.at(self.Ybus.data, self.ybus_tt[br_idx], dYtt)
+
+    def get_increments(self, br_idx, Yff=None, Yft=None, Ytf=None, Ytt=None, active=None):
+        """
+        Compute the primitive increments of some branches given their new primitives and / or states
+        :param br_idx: branch indices
+        :param Yff: new from-from primitives (None to keep the current ones)
+        :param Yft: new from-to primitives (None to keep the current ones)
+        :param Ytf: new to-from primitives (None to keep the current ones)
+        :param Ytt: new to-to primitives (None to keep the current ones)
+        :param active: new branch states (None to keep the current ones)
+        :return: dYff, dYft, dYtf, dYtt, new primitives [Yff, Yft, Ytf, Ytt], new states
+        """
+        old_active = self.active[br_idx]
+        new_active = old_active if active is None else np.array(active, dtype=int) * np.ones(len(br_idx), dtype=int)
+
+        increments = list()
+        new_values = list()
+        for old, new in zip((self.Yff, self.Yft, self.Ytf, self.Ytt), (Yff, Yft, Ytf, Ytt)):
+            old_val = old[br_idx]
+            new_val = old_val if new is None else np.array(new, dtype=complex) * np.ones(len(br_idx))
+            increments.append(new_val * new_active - old_val * old_active)
+            new_values.append(new_val)
+
+        return increments[0], increments[1], increments[2], increments[3], new_values, new_active
+
+    def update(self, br_idx, Yff=None, Yft=None, Ytf=None, Ytt=None, active=None):
+        """
+        Update the primitives and / or states of some branches, patching Ybus, Yf and Yt in place
+        :param br_idx: branch indices
+        :param Yff: new from-from primitives (None to keep the current ones)
+        :param Yft: new from-to primitives (None to keep the current ones)
+        :param Ytf: new to-from primitives (None to keep the current ones)
+        :param Ytt: new to-to primitives (None to keep the current ones)
+        :param active: new branch states (None to keep the current ones)
+        :return: indices of the branches that actually changed
+        """
+        br_idx = np.atleast_1d(np.array(br_idx, dtype=int))
+
+        dYff, dYft, dYtf, dYtt, new_values, new_active = self.get_increments(br_idx, Yff, Yft, Ytf, Ytt, active)
+
+        # the primitives of the inactive branches are stored as well, for when they are switched on
+        for store, val in zip((self.Yff, self.Yft, self.Ytf, self.Ytt), new_values):
+            store[br_idx] = val
+        self.active[br_idx] = new_active
+
+        changed = (dYff != 0) | (dYft != 0) | (dYtf != 0) | (dYtt != 0)
+
+        if changed.any():
+            self.add_increments(br_idx[changed], dYff[changed], dYft[changed], dYtf[changed], dYtt[changed])
+
+        return br_idx[changed]
+
+    def get_delta_ybus(self, br_idx, Yff=None, Yft=None, Ytf=None, Ytt=None, active=None):
+        """
+        Low rank increment of Ybus produced by changing some branches, without applying it.
+        The increment only involves the buses of the changed branches, so its rank is at most 2 x len(br_idx).
+        :param br_idx: branch indices
+        :param Yff: new from-from primitives (None to keep the current ones)
+        :param Yft: new from-to primitives (None to keep the current ones)
+        :param Ytf: new to-from primitives (None to keep the current ones)
+        :param Ytt: new to-to primitives (None to keep the current ones)
+        :param active: new branch states (None to keep the current ones)
+        :return: CSC sparse matrix (nbus, nbus)
+        """
+        br_idx = np.atleast_1d(np.array(br_idx, dtype=int))
+
+        dYff, dYft, dYtf, dYtt, _, _ = self.get_increments(br_idx, Yff, Yft, Ytf, Ytt, active)
+
+        f = self.F[br_idx]
+        t = self.T[br_idx]
+        rows = np.r_[f, f, t, t]
+        cols = np.r_[f, t, f, t]
+        data = np.r_[dYff, dYft, dYtf, dYtt]
+
+        return sp.csc_matrix((data, (rows, cols)), shape=(self.nbus, self.nbus))
@@ -13,7 +13,6 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
-from typing import List, Dict
 import numpy as np
 from GridCal.Engine.basic_structures import BusMode, Logger
 
@@ -64,38 +63,50 @@ def compile_types(Sbus, types, logger=Logger()):
     return ref, pq, pv, pqpv
 
 
-def find_different_states(branch_active_prof) -> Dict[int, List[int]]:
+def pack_states(*profiles):
     """
-    Find the different branch states in time that may lead to different islands
-    :param branch_active_prof:
-    :return:
+    Pack the rows of boolean-like state profiles into bytes, so that every time step state is a short row of bytes
+    :param profiles: state profiles (ntime, n), all with the same number of rows
+    :return: array of packed states (ntime, nbytes) of type uint8
     """
-    ntime = branch_active_prof.shape[0]
+    return np.hstack([np.packbits(np.asarray(prof) != 0, axis=1) for prof in profiles])
 
-    # initialize
-    states = dict()  # type: Dict[int, List[int]]
-    k = 1
-    for t in range(ntime):
 
-        # search this state in the already existing states
-        keys = list(states.keys())
-        nn = len(keys)
-        found = False
-        i = 0
-        while i < nn and not found:
-            t2 = keys[i]
+def group_states(*profiles):
+    """
+    Group the time steps that have the same state
+    :param profiles: state profiles (ntime, n) considered together, i.e. branch_active, bus_active
+    :return: first time index of every different state (nstates), state index of every time step (ntime).
+             The states are numbered in order of appearance.
+    """
+    packed = pack_states(*profiles)
+    ntime = packed.shape[0]
+
+    if ntime == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
 
-            # compare state at t2 with the state at t
-            if np.array_equal(branch_active_prof[t, :], branch_active_prof[t2, :]):
-                states[t2].append(t)
-                found = True
+    if packed.shape[1] == 0:
+        # there is nothing to compare: all the time steps share the same state
+        return np.zeros(1, dtype=int), np.zeros(ntime, dtype=int)
 
-            i += 1
+    _, first, inverse = np.unique(packed, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
 
-        if not found:
-            # new state found (append itself)
-            states[t] = [t]
+    # renumber the states by their first appearance
+    order = np.argsort(first)
+    rank = np.empty(len(order), dtype=int)
+    rank[order] = np.arange(len(order))
 
-        k += 1
+    return first[order], rank[inverse]
 
-    return states
\ No newline at end of file
+
+def states_to_time_groups(first, inverse):
+    """
+    Convert the state indices of the time steps into the time steps of each state
+    :param first: first time index of every different state (nstates)
+    :param inverse: state index of every time step (ntime)
+    :return: list of sorted arrays of time indices, one per state
+    """
+    order = np.argsort(inverse, kind='stable')
+    counts = np.bincount(inverse, minlength=len(first))
+    return np.split(order, np.cumsum(counts)[:-1])
@@ -0,0 +1,159 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Memory-mapped arrays to share the numerical circuits and the results among processes.
+
+The arrays are stored in temporary files that every process maps in memory, hence only small descriptors
+(path, shape, dtype) travel through the process pipes. This works with both the fork and spawn start methods.
+"""
+
+import os
+import copy
+import shutil
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+
+
+class SharedArrayStore:
+
+    def __init__(self, folder=None):
+        """
+        Store of memory-mapped arrays
+        :param folder: folder where to create the array files (a temporary folder by default)
+        """
+        self.folder = tempfile.mkdtemp(prefix='GridCal_') if folder is None else folder
+
+        self.counter = 0
+
+    def create(self, shape, dtype):
+        """
+        Create a shared array
+        :param shape: array shape
+        :param dtype: array data type
+        :return: memory-mapped array, descriptor
+        """
+        fname = os.path.join(self.folder, 'array_' + str(self.counter) + '.dat')
+        self.counter += 1
+        descriptor = (fname, tuple(shape), np.dtype(dtype).str)
+        arr = np.memmap(fname, dtype=descriptor[2], mode='w+', shape=descriptor[1])
+        return arr, descriptor
+
+    def publish(self, array):
+        """
+        Copy an array into the store
+        :param array: numpy array
+        :return: descriptor
+        """
+        arr, descriptor = self.create(array.shape, array.dtype)
+        arr[...] = array
+        arr.flush()
+        return descriptor
+
+    def cleanup(self):
+        """
+        Delete the array files
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+def attach_array(descriptor, mode='c'):
+    """
+    Map a shared array
+    :param descriptor: descriptor provided by SharedArrayStore
+    :param mode: 'c' copy on write (the modifications are private), 'r+' to write into the shared array
+    :return: memory-mapped array
+    """
+    fname, shape, dtype = descriptor
+    return np.memmap(fname, dtype=dtype, mode=mode, shape=shape)
+
+
+def can_be_shared(array):
+    """
+    Check if a numpy array can be memory-mapped
+    :param array: numpy array
+    :return: True / False
+    """
+    return array.size > 0 and not array.dtype.hasobject
+
+
+def publish_object(obj, store: SharedArrayStore):
+    """
+    Publish the numeric arrays and sparse matrices of an object (i.e. a TimeCircuit island)
+    :param obj: object to publish
+    :param store: SharedArrayStore
+    :return: skeleton (shallow copy of the object without the published arrays), dictionary of descriptors
+    """
+    skeleton = copy.copy(obj)
+    descriptors = dict()
+
+    # the admittance structure patches the object's own matrices, that are published below and rebound on attach
+    structure = getattr(obj, 'admittance_structure', None)
+    if structure is not None:
+        structure = copy.copy(structure)
+        structure.Ybus = None
+        structure.Yf = None
+        structure.Yt = None
+        skeleton.admittance_structure = structure
+
+    for name, value in obj.__dict__.items():
+
+        if isinstance(value, np.ndarray) and can_be_shared(value):
+            descriptors[name] = ('dense', store.publish(value))
+            setattr(skeleton, name, None)
+
+        elif sp.issparse(value):
+            fmt = value.format if value.format in ['csc', 'csr'] else 'csr'
+            mat = value.asformat(fmt)
+            descr = [store.publish(x) if x.size > 0 else x for x in (mat.data, mat.indices, mat.indptr)]
+            descriptors[name] = ('sparse', (fmt, mat.shape, descr))
+            setattr(skeleton, name, None)
+
+    return skeleton, descriptors
+
+
+def attach_object(skeleton, descriptors):
+    """
+    Rebuild an object published with publish_object
+    :param skeleton: skeleton returned by publish_object
+    :param descriptors: dictionary of descriptors returned by publish_object
+    :return: the object with the arrays memory-mapped (copy on write)
+    """
+    obj = copy.copy(skeleton)
+
+    for name, (kind, descriptor) in descriptors.items():
+
+        if kind == 'dense':
+            setattr(obj, name, attach_array(descriptor))
+
+        elif kind == 'sparse':
+            fmt, shape, descr = descriptor
+            data, indices, indptr = [x if isinstance(x, np.ndarray) else attach_array(x) for x in descr]
+            cls = sp.csc_matrix if fmt == 'csc' else sp.csr_matrix
+            setattr(obj, name, cls((data, indices, indptr), shape=shape))
+
+    # patch the attached matrices (the ones used by the solvers) when the taps or the branch states change
+    structure = getattr(obj, 'admittance_structure', None)
+    if structure is not None:
+        structure = copy.copy(structure)
+        for name in ['Yff', 'Yft', 'Ytf', 'Ytt', 'active']:
+            setattr(structure, name, getattr(structure, name).copy())
+        structure.Ybus = obj.Ybus
+        structure.Yf = obj.Yf
+        structure.Yt = obj.Yt
+        obj.admittance_structure = structure
+
+    return obj
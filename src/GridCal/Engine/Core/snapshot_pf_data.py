@@ -25,6 +25,7 @@ from GridCal.Engine.basic_structures import BranchImpedanceMode
 from GridCal.Engine.basic_structures import BusMode
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian
 from GridCal.Engine.Core.common_functions import compile_types
+from GridCal.Engine.Core.admittance_matrices import AdmittanceStructure, transformer_primitives
 from GridCal.Engine.Simulations.OPF.opf_results import OptimalPowerFlowResults
 from GridCal.Engine.Simulations.sparse_solve import get_sparse_type
 
@@ -81,6 +82,8 @@ class SnapshotCircuit:
         self.F = np.zeros(self.nbr, dtype=int)  # indices of the "from" buses
         self.T = np.zeros(self.nbr, dtype=int)  # indices of the "to" buses
         self.branch_rates = np.zeros(self.nbr, dtype=float)
+        self.branch_mttf = np.zeros(self.nbr, dtype=float)
+        self.branch_mttr = np.zeros(self.nbr, dtype=float)
         self.C_branch_bus_f = sp.lil_matrix((self.nbr, nbus), dtype=int)  # connectivity branch with their "from" bus
         self.C_branch_bus_t = sp.lil_matrix((self.nbr, nbus), dtype=int)  # connectivity branch with their "to" bus
 
@@ -168,6 +171,8 @@ class SnapshotCircuit:
         self.static_generator_names = np.empty(nstagen, dtype=object)
         self.static_generator_active = np.zeros(nstagen, dtype=bool)
         self.static_generator_s = np.zeros(nstagen, dtype=complex)
+        self.static_generator_mttf = np.zeros(nstagen, dtype=float)
+        self.static_generator_mttr = np.zeros(nstagen, dtype=float)
 
         self.C_bus_static_generator = sp.lil_matrix((nbus, nstagen), dtype=int)
 
@@ -181,6 +186,8 @@ class SnapshotCircuit:
         self.battery_v = np.zeros(nbatt)
         self.battery_qmin = np.zeros(nbatt)
         self.battery_qmax = np.zeros(nbatt)
+        self.battery_mttf = np.zeros(nbatt)
+        self.battery_mttr = np.zeros(nbatt)
 
         self.C_bus_batt = sp.lil_matrix((nbus, nbatt), dtype=int)
 
@@ -194,6 +201,9 @@ class SnapshotCircuit:
         self.generator_v = np.zeros(ngen)
         self.generator_qmin = np.zeros(ngen)
         self.generator_qmax = np.zeros(ngen)
+        self.generator_pmax = np.zeros(ngen)
+        self.generator_mttf = np.zeros(ngen)
+        self.generator_mttr = np.zeros(ngen)
 
         self.C_bus_gen = sp.lil_matrix((nbus, ngen), dtype=int)
 
@@ -218,6 +228,7 @@ class SnapshotCircuit:
         self.Ybus = None
         self.Yf = None
         self.Yt = None
+        self.admittance_structure = None
 
         # Admittance for HELM / AC linear
         self.Yseries = None
@@ -343,16 +354,59 @@ class SnapshotCircuit:
 
     def re_calc_admittance_matrices(self, tap_module):
         """
+        Update Ybus, Yf and Yt (and the linear matrices) with new transformer tap modules.
+        Only the transformers whose tap changed are patched in place, so the matrices keep their structure.
+        :param tap_module: array of transformer tap modules (ntr)
+        """
+        if self.admittance_structure is None:
+            self.compute_admittance_matrices(newton_raphson=True, tap_module=tap_module)
+        else:
+            self.update_taps(tap_module=tap_module)
 
-        :param tap_module:
-        :return:
+    def update_taps(self, tap_module=None, tap_angle=None):
+        """
+        Update the transformers primitives in Ybus, Yf and Yt in place
+        :param tap_module: array of transformer tap modules (ntr), None to use the transformers' tap module
+        :param tap_angle: array of transformer tap angles (ntr), None to use the transformers' tap angle
+        :return: indices of the branches that changed
+        """
+        if tap_module is None:
+            tap_module = self.tr_tap_mod
+
+        if tap_angle is None:
+            tap_angle = self.tr_tap_ang
+
+        Ys_tr = 1.0 / (self.tr_R + 1.0j * self.tr_X)
+        Ysh_tr = 1.0j * self.tr_B
+        tap = tap_module * np.exp(1.0j * tap_angle)
+
+        Yff, Yft, Ytf, Ytt = transformer_primitives(Ys_tr, Ysh_tr, tap, self.tr_tap_f, self.tr_tap_t)
+
+        br_idx = np.arange(self.nline, self.nline + self.ntr)
+        changed = self.admittance_structure.update(br_idx, Yff=Yff, Yft=Yft, Ytf=Ytf, Ytt=Ytt)
+
+        if len(changed):
+            self.Bpqpv = self.Ybus.imag[np.ix_(self.pqpv, self.pqpv)]
+            self.Bref = self.Ybus.imag[np.ix_(self.pqpv, self.vd)]
+
+        return changed
+
+    def update_branch_active(self, br_idx, active):
         """
-        self.compute_admittance_matrices(newton_raphson=False,
-                                         linear_dc=False,
-                                         linear_ac=False,
-                                         fast_decoupled=False,
-                                         helm=False,
-                                         tap_module=tap_module)
+        Switch branches on or off, updating Ybus, Yf and Yt in place.
+        The islands are not recomputed, so the changes must not split the circuit.
+        :param br_idx: indices of the branches
+        :param active: new states of the branches (0 / 1)
+        :return: indices of the branches that changed
+        """
+        changed = self.admittance_structure.update(br_idx, active=active)
+
+        if len(changed):
+            self.branch_active[changed] = self.admittance_structure.active[changed]
+            self.Bpqpv = self.Ybus.imag[np.ix_(self.pqpv, self.pqpv)]
+            self.Bref = self.Ybus.imag[np.ix_(self.pqpv, self.vd)]
+
+        return changed
 
     def compute_admittance_matrices(self, newton_raphson=False, linear_dc=False, linear_ac=False, fast_decoupled=False,
                                     helm=False, tap_module=None):
@@ -461,7 +515,6 @@ class SnapshotCircuit:
 
         Ys_tr = 1.0 / (self.tr_R + 1.0j * self.tr_X)
         Ysh_tr = 1.0j * self.tr_B
-        Ys_tr2 = Ys_tr + Ysh_tr / 2.0
 
         if tap_module is None:
             tap = self.tr_tap_mod * np.exp(1.0j * self.tr_tap_ang)
@@ -470,10 +523,8 @@ class SnapshotCircuit:
 
         # branch primitives in vector form for Ybus
         if newton_raphson:
-            Ytt[a:b] = Ys_tr2 / (self.tr_tap_t * self.tr_tap_t)
-            Yff[a:b] = Ys_tr2 / (self.tr_tap_f * self.tr_tap_f * tap * np.conj(tap))
-            Yft[a:b] = - Ys_tr / (self.tr_tap_f * self.tr_tap_t * np.conj(tap))
-            Ytf[a:b] = - Ys_tr / (self.tr_tap_t * self.tr_tap_f * tap)
+            Yff[a:b], Yft[a:b], Ytf[a:b], Ytt[a:b] = transformer_primitives(Ys_tr, Ysh_tr, tap,
+                                                                            self.tr_tap_f, self.tr_tap_t)
 
         # branch primitives in vector form, for Yseries
         if linear_ac or helm:
@@ -551,9 +602,11 @@ class SnapshotCircuit:
 
         # form the admittance matrices ---------------------------------------------------------------------------------
         if newton_raphson:
-            self.Yf = sp.diags(Yff) * Cf + sp.diags(Yft) * Ct
-            self.Yt = sp.diags(Ytf) * Cf + sp.diags(Ytt) * Ct
-            self.Ybus = sp.csc_matrix(Cf.T * self.Yf + Ct.T * self.Yt) + sp.diags(self.Yshunt_from_devices)
+            # fixed structure, so that the tap and state changes are applied in place
+            self.admittance_structure = AdmittanceStructure(self.C_branch_bus_f, self.C_branch_bus_t)
+            self.Ybus, self.Yf, self.Yt = self.admittance_structure.assemble(Yff, Yft, Ytf, Ytt,
+                                                                             active=self.branch_active,
+                                                                             Yshunt_bus=self.Yshunt_from_devices)
 
             self.Bpqpv = self.Ybus.imag[np.ix_(self.pqpv, self.pqpv)]
             self.Bref = self.Ybus.imag[np.ix_(self.pqpv, self.vd)]
@@ -836,6 +889,8 @@ def get_pf_island(circuit: SnapshotCircuit, bus_idx) -> "SnapshotCircuit":
     nc.F = circuit.F[br_idx]
     nc.T = circuit.T[br_idx]
     nc.branch_rates = circuit.branch_rates[br_idx]
+    nc.branch_mttf = circuit.branch_mttf[br_idx]
+    nc.branch_mttr = circuit.branch_mttr[br_idx]
     nc.C_branch_bus_f = circuit.C_branch_bus_f[np.ix_(br_idx, bus_idx)]
     nc.C_branch_bus_t = circuit.C_branch_bus_t[np.ix_(br_idx, bus_idx)]
 
@@ -922,6 +977,8 @@ def get_pf_island(circuit: SnapshotCircuit, bus_idx) -> "SnapshotCircuit":
     nc.static_generator_names = circuit.static_generator_names[stagen_idx]
     nc.static_generator_active = circuit.static_generator_active[stagen_idx]
     nc.static_generator_s = circuit.static_generator_s[stagen_idx]
+    nc.static_generator_mttf = circuit.static_generator_mttf[stagen_idx]
+    nc.static_generator_mttr = circuit.static_generator_mttr[stagen_idx]
 
     nc.C_bus_static_generator = circuit.C_bus_static_generator[np.ix_(bus_idx, stagen_idx)]
 
@@ -934,6 +991,8 @@ def get_pf_island(circuit: SnapshotCircuit, bus_idx) -> "SnapshotCircuit":
     nc.battery_v = circuit.battery_v[batt_idx]
     nc.battery_qmin = circuit.battery_qmin[batt_idx]
     nc.battery_qmax = circuit.battery_qmax[batt_idx]
+    nc.battery_mttf = circuit.battery_mttf[batt_idx]
+    nc.battery_mttr = circuit.battery_mttr[batt_idx]
 
     nc.C_bus_batt = circuit.C_bus_batt[np.ix_(bus_idx, batt_idx)]
 
@@ -946,6 +1005,9 @@ def get_pf_island(circuit: SnapshotCircuit, bus_idx) -> "SnapshotCircuit":
     nc.generator_v = circuit.generator_v[gen_idx]
     nc.generator_qmin = circuit.generator_qmin[gen_idx]
     nc.generator_qmax = circuit.generator_qmax[gen_idx]
+    nc.generator_pmax = circuit.generator_pmax[gen_idx]
+    nc.generator_mttf = circuit.generator_mttf[gen_idx]
+    nc.generator_mttr = circuit.generator_mttr[gen_idx]
 
     nc.C_bus_gen = circuit.C_bus_gen[np.ix_(bus_idx, gen_idx)]
 
@@ -1086,6 +1148,8 @@ def compile_snapshot_circuit(circuit: MultiCircuit, apply_temperature=False,
             nc.static_generator_names[i_stagen] = elm.name
             nc.static_generator_active[i_stagen] = elm.active
             nc.static_generator_s[i_stagen] = complex(elm.P, elm.Q)
+            nc.static_generator_mttf[i_stagen] = elm.mttf
+            nc.static_generator_mttr[i_stagen] = elm.mttr
 
             nc.C_bus_static_generator[i, i_stagen] = 1
             i_stagen += 1
@@ -1099,6 +1163,9 @@ def compile_snapshot_circuit(circuit: MultiCircuit, apply_temperature=False,
             nc.generator_active[i_gen] = elm.active
             nc.generator_controllable[i_gen] = elm.is_controlled
             nc.generator_installed_p[i_gen] = elm.Snom
+            nc.generator_pmax[i_gen] = elm.Pmax
+            nc.generator_mttf[i_gen] = elm.mttf
+            nc.generator_mttr[i_gen] = elm.mttr
 
             if opf_results is None:
                 nc.generator_p[i_gen] = elm.P
@@ -1123,6 +1190,8 @@ def compile_snapshot_circuit(circuit: MultiCircuit, apply_temperature=False,
             nc.battery_active[i_batt] = elm.active
             nc.battery_controllable[i_batt] = elm.is_controlled
             nc.battery_installed_p[i_batt] = elm.Snom
+            nc.battery_mttf[i_batt] = elm.mttf
+            nc.battery_mttr[i_batt] = elm.mttr
 
             if opf_results is None:
                 nc.battery_p[i_batt] = elm.P
@@ -1152,6 +1221,8 @@ def compile_snapshot_circuit(circuit: MultiCircuit, apply_temperature=False,
         nc.branch_names[i] = elm.name
         nc.branch_active[i] = elm.active
         nc.branch_rates[i] = elm.rate
+        nc.branch_mttf[i] = elm.mttf
+        nc.branch_mttr[i] = elm.mttr
         f = bus_dictionary[elm.bus_from]
         t = bus_dictionary[elm.bus_to]
         nc.C_branch_bus_f[i, f] = 1
@@ -1184,6 +1255,8 @@ def compile_snapshot_circuit(circuit: MultiCircuit, apply_temperature=False,
         nc.branch_names[ii] = elm.name
         nc.branch_active[ii] = elm.active
         nc.branch_rates[ii] = elm.rate
+        nc.branch_mttf[ii] = elm.mttf
+        nc.branch_mttr[ii] = elm.mttr
         nc.C_branch_bus_f[ii, f] = 1
         nc.C_branch_bus_t[ii, t] = 1
         nc.F[ii] = f
@@ -1226,6 +1299,8 @@ def compile_snapshot_circuit(circuit: MultiCircuit, apply_temperature=False,
         nc.branch_names[ii] = elm.name
         nc.branch_active[ii] = elm.active
         nc.branch_rates[ii] = elm.rate
+        nc.branch_mttf[ii] = elm.mttf
+        nc.branch_mttr[ii] = elm.mttr
         nc.C_branch_bus_f[ii, f] = 1
         nc.C_branch_bus_t[ii, t] = 1
         nc.F[ii] = f
@@ -1254,6 +1329,8 @@ def compile_snapshot_circuit(circuit: MultiCircuit, apply_temperature=False,
         nc.branch_names[ii] = elm.name
         nc.branch_active[ii] = elm.active
         nc.branch_rates[ii] = elm.rate
+        nc.branch_mttf[ii] = elm.mttf
+        nc.branch_mttr[ii] = elm.mttr
         nc.C_branch_bus_f[ii, f] = 1
         nc.C_branch_bus_t[ii, t] = 1
         nc.F[ii] = f
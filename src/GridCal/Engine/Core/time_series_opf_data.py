@@ -24,7 +24,7 @@ from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.basic_structures import BranchImpedanceMode
 from GridCal.Engine.basic_structures import BusMode
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian
-from GridCal.Engine.Core.common_functions import compile_types, find_different_states
+from GridCal.Engine.Core.common_functions import compile_types
 
 
 class OpfTimeCircuit:
@@ -299,7 +299,8 @@ class OpfTimeCircuit:
         :return: Ybus, Yseries, Yshunt
         """
 
-        t = self.original_time_idx[0]
+        # the islands have the same branch states in all their time steps, and their arrays use local time indices
+        t = 0
 
         # form the connectivity matrices with the states applied -------------------------------------------------------
         br_states_diag = sp.diags(self.branch_active[t, :])
@@ -728,79 +729,40 @@ def split_opf_time_circuit_into_islands(numeric_circuit: OpfTimeCircuit,
     circuit_islands = list()  # type: List[OpfTimeCircuit]
 
     all_buses = np.arange(numeric_circuit.nbus)
-    all_time = np.arange(numeric_circuit.ntime)
 
-    # find the probable time slices
-    states = find_different_states(branch_active_prof=numeric_circuit.branch_active)
+    # find the islands of every different topological state (the topology is processed once per state)
+    _, states = tp.find_islands_by_state(C_branch_bus_f=numeric_circuit.C_branch_bus_f,
+                                         C_branch_bus_t=numeric_circuit.C_branch_bus_t,
+                                         branch_active_prof=numeric_circuit.branch_active,
+                                         bus_active_prof=numeric_circuit.bus_active)
 
-    if len(states) == 1:
-        # compute the adjacency matrix
-        A = tp.get_adjacency_matrix(C_branch_bus_f=numeric_circuit.C_branch_bus_f,
-                                    C_branch_bus_t=numeric_circuit.C_branch_bus_t,
-                                    branch_active=numeric_circuit.branch_active[0, :],
-                                    bus_active=numeric_circuit.bus_active[0, :])
+    if len(states) == 1 and len(states[0][1]) == 1:
+        # only one state and only one island -> just copy the data ----------------------------------------------------
 
-        # find the matching islands
-        idx_islands = tp.find_islands(A)
+        numeric_circuit.consolidate()  # compute the internal magnitudes
+        return [numeric_circuit]
 
-        if len(idx_islands) == 1:  # only one state and only one island -> just copy the data --------------------------
+    for t_array, idx_islands in states:
 
-            numeric_circuit.consolidate()  # compute the internal magnitudes
-            return [numeric_circuit]
+        if len(idx_islands) == 1:  # one island -> slice only by time -----------------------------------------------
 
-        else:  # one state, many islands -> split by bus index, keep the time ------------------------------------------
+            island = get_opf_time_island(numeric_circuit, all_buses, t_array)  # convert the circuit to an island
+            island.consolidate()  # compute the internal magnitudes
 
-            for bus_idx in idx_islands:
-
-                if ignore_single_node_islands:
-
-                    if len(bus_idx) > 1:
-                        island = get_opf_time_island(numeric_circuit, bus_idx, all_time)
-                        island.consolidate()  # compute the internal magnitudes
-                        circuit_islands.append(island)
-
-                else:
-                    island = get_opf_time_island(numeric_circuit, bus_idx, all_time)
-                    island.consolidate()  # compute the internal magnitudes
-                    circuit_islands.append(island)
+            circuit_islands.append(island)
 
-    else:  # -----------------------------------------------------------------------------------------------------------
+        else:  # many islands -> slice by both time and bus index ---------------------------------------------------
 
-        for t, t_array in states.items():
-
-            # compute the adjacency matrix
-            A = tp.get_adjacency_matrix(C_branch_bus_f=numeric_circuit.C_branch_bus_f,
-                                        C_branch_bus_t=numeric_circuit.C_branch_bus_t,
-                                        branch_active=numeric_circuit.branch_active[t_array, :],
-                                        bus_active=numeric_circuit.bus_active[t_array, :])
-
-            # find the matching islands
-            idx_islands = tp.find_islands(A)
+            for bus_idx in idx_islands:
 
-            if len(idx_islands) == 1:  # many time states, one island -> slice only by time ----------------------------
+                if ignore_single_node_islands and len(bus_idx) <= 1:
+                    continue
 
-                island = get_opf_time_island(numeric_circuit, all_buses, t_array)  # convert the circuit to an island
+                island = get_opf_time_island(numeric_circuit, bus_idx, t_array)
                 island.consolidate()  # compute the internal magnitudes
-
                 circuit_islands.append(island)
 
-            else:  # any time states, many islands -> slice by both time and bus index ---------------------------------
-
-                for bus_idx in idx_islands:
-
-                    if ignore_single_node_islands:
-
-                        if len(bus_idx) > 1:
-                            island = get_opf_time_island(numeric_circuit, bus_idx, t_array)
-                            island.consolidate()  # compute the internal magnitudes
-                            circuit_islands.append(island)
-
-                    else:
-                        island = get_opf_time_island(numeric_circuit, bus_idx, t_array)
-                        island.consolidate()  # compute the internal magnitudes
-                        circuit_islands.append(island)
-
-        return circuit_islands
+    return circuit_islands
 
 
 def compile_opf_time_circuit(circuit: MultiCircuit, apply_temperature=False,
@@ -25,7 +25,8 @@ from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit
 from GridCal.Engine.basic_structures import BranchImpedanceMode
 from GridCal.Engine.basic_structures import BusMode
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian
-from GridCal.Engine.Core.common_functions import compile_types, find_different_states
+from GridCal.Engine.Core.common_functions import compile_types
+from GridCal.Engine.Core.admittance_matrices import AdmittanceStructure, transformer_primitives
 from GridCal.Engine.Simulations.sparse_solve import get_sparse_type
 from GridCal.Engine.Simulations.OPF.opf_ts_results import OptimalPowerFlowTimeSeriesResults
 
@@ -219,6 +220,7 @@ class TimeCircuit:
         self.Ybus = None
         self.Yf = None
         self.Yt = None
+        self.admittance_structure = None
         self.Yseries = None
         self.Yshunt = None
         self.B1 = None
@@ -461,16 +463,59 @@ class TimeCircuit:
 
     def re_calc_admittance_matrices(self, tap_module):
         """
+        Update Ybus, Yf and Yt (and the linear matrices) with new transformer tap modules.
+        Only the transformers whose tap changed are patched in place, so the matrices keep their structure.
+        :param tap_module: array of transformer tap modules (ntr)
+        """
+        if self.admittance_structure is None:
+            self.compute_admittance_matrices(newton_raphson=True, tap_module=tap_module)
+        else:
+            self.update_taps(tap_module=tap_module)
 
-        :param tap_module:
-        :return:
+    def update_taps(self, tap_module=None, tap_angle=None):
+        """
+        Update the transformers primitives in Ybus, Yf and Yt in place
+        :param tap_module: array of transformer tap modules (ntr), None to use the transformers' tap module
+        :param tap_angle: array of transformer tap angles (ntr), None to use the transformers' tap angle
+        :return: indices of the branches that changed
+        """
+        if tap_module is None:
+            tap_module = self.tr_tap_mod
+
+        if tap_angle is None:
+            tap_angle = self.tr_tap_ang
+
+        Ys_tr = 1.0 / (self.tr_R + 1.0j * self.tr_X)
+        Ysh_tr = 1.0j * self.tr_B
+        tap = tap_module * np.exp(1.0j * tap_angle)
+
+        Yff, Yft, Ytf, Ytt = transformer_primitives(Ys_tr, Ysh_tr, tap, self.tr_tap_f, self.tr_tap_t)
+
+        br_idx = np.arange(self.nline, self.nline + self.ntr)
+        changed = self.admittance_structure.update(br_idx, Yff=Yff, Yft=Yft, Ytf=Ytf, Ytt=Ytt)
+
+        if len(changed):
+            self.Bpqpv = self.Ybus.imag[np.ix_(self.pqpv, self.pqpv)]
+            self.Bref = self.Ybus.imag[np.ix_(self.pqpv, self.vd)]
+
+        return changed
+
+    def update_branch_active(self, br_idx, active):
+        """
+        Switch branches on or off, updating Ybus, Yf and Yt in place.
+        The islands are not recomputed, so the changes must not split the circuit.
+        :param br_idx: indices of the branches
+        :param active: new states of the branches (0 / 1)
+        :return: indices of the branches that changed
         """
-        self.compute_admittance_matrices(newton_raphson=False,
-                                         linear_dc=False,
-                                         linear_ac=False,
-                                         fast_decoupled=False,
-                                         helm=False,
-                                         tap_module=tap_module)
+        changed = self.admittance_structure.update(br_idx, active=active)
+
+        if len(changed):
+            self.branch_active[:, changed] = self.admittance_structure.active[changed]
+            self.Bpqpv = self.Ybus.imag[np.ix_(self.pqpv, self.pqpv)]
+            self.Bref = self.Ybus.imag[np.ix_(self.pqpv, self.vd)]
+
+        return changed
 
     def compute_admittance_matrices(self, newton_raphson=False, linear_dc=False, linear_ac=False, fast_decoupled=False,
                                     helm=False, tap_module=None):
@@ -479,7 +524,8 @@ class TimeCircuit:
         :return: Ybus, Yseries, Yshunt
         """
 
-        t = self.original_time_idx[0]
+        # the islands have the same branch states in all their time steps, and their arrays use local time indices
+        t = 0
 
         # form the connectivity matrices with the states applied -------------------------------------------------------
         br_states_diag = sp.diags(self.branch_active[t, :])
@@ -571,7 +617,6 @@ class TimeCircuit:
 
         Ys_tr = 1.0 / (self.tr_R + 1.0j * self.tr_X)
         Ysh_tr = 1.0j * self.tr_B
-        Ys_tr2 = Ys_tr + Ysh_tr / 2.0
 
         if tap_module is None:
             tap = self.tr_tap_mod * np.exp(1.0j * self.tr_tap_ang)
@@ -580,10 +625,8 @@ class TimeCircuit:
 
         # branch primitives in vector form for Ybus
         if newton_raphson:
-            Ytt[a:b] = Ys_tr2 / (self.tr_tap_t * self.tr_tap_t)
-            Yff[a:b] = Ys_tr2 / (self.tr_tap_f * self.tr_tap_f * tap * np.conj(tap))
-            Yft[a:b] = - Ys_tr / (self.tr_tap_f * self.tr_tap_t * np.conj(tap))
-            Ytf[a:b] = - Ys_tr / (self.tr_tap_t * self.tr_tap_f * tap)
+            Yff[a:b], Yft[a:b], Ytf[a:b], Ytt[a:b] = transformer_primitives(Ys_tr, Ysh_tr, tap,
+                                                                            self.tr_tap_f, self.tr_tap_t)
 
         # branch primitives in vector form, for Yseries
         if linear_ac or helm:
@@ -629,9 +672,11 @@ class TimeCircuit:
 
         # form the admittance matrices ---------------------------------------------------------------------------------
         if newton_raphson:
-            self.Yf = sp.diags(Yff) * Cf + sp.diags(Yft) * Ct
-            self.Yt = sp.diags(Ytf) * Cf + sp.diags(Ytt) * Ct
-            self.Ybus = sp.csc_matrix(Cf.T * self.Yf + Ct.T * self.Yt) + sp.diags(self.Yshunt_from_devices[:, 0])
+            # fixed structure, so that the tap and state changes are applied in place
+            self.admittance_structure = AdmittanceStructure(self.C_branch_bus_f, self.C_branch_bus_t)
+            self.Ybus, self.Yf, self.Yt = self.admittance_structure.assemble(Yff, Yft, Ytf, Ytt,
+                                                                             active=self.branch_active[t, :],
+                                                                             Yshunt_bus=self.Yshunt_from_devices[:, 0])
 
             self.Bpqpv = self.Ybus.imag[np.ix_(self.pqpv, self.pqpv)]
             self.Bref = self.Ybus.imag[np.ix_(self.pqpv, self.vd)]
@@ -1003,81 +1048,52 @@ def split_time_circuit_into_islands(numeric_circuit: TimeCircuit, ignore_single_
     circuit_islands = list()  # type: List[TimeCircuit]
 
     all_buses = np.arange(numeric_circuit.nbus)
-    all_time = np.arange(numeric_circuit.ntime)
-
-    # find the probable time slices
-    states = find_different_states(branch_active_prof=numeric_circuit.branch_active)
-
-    if len(states) == 1:
-        # compute the adjacency matrix
-        A = tp.get_adjacency_matrix(C_branch_bus_f=numeric_circuit.C_branch_bus_f,
-                                    C_branch_bus_t=numeric_circuit.C_branch_bus_t,
-                                    branch_active=numeric_circuit.branch_active[0, :],
-                                    bus_active=numeric_circuit.bus_active[0, :])
-
-        # find the matching islands
-        idx_islands = tp.find_islands(A)
-
-        if len(idx_islands) == 1:  # only one state and only one island -> just copy the data --------------------------
-
-            numeric_circuit.consolidate()  # compute the internal magnitudes
-            return [numeric_circuit]
 
-        else:  # one state, many islands -> split by bus index, keep the time ------------------------------------------
+    # find the islands of every different topological state (the topology is processed once per state)
+    _, states = tp.find_islands_by_state(C_branch_bus_f=numeric_circuit.C_branch_bus_f,
+                                         C_branch_bus_t=numeric_circuit.C_branch_bus_t,
+                                         branch_active_prof=numeric_circuit.branch_active,
+                                         bus_active_prof=numeric_circuit.bus_active)
 
-            for bus_idx in idx_islands:
-
-                if ignore_single_node_islands:
+    if len(states) == 1 and len(states[0][1]) == 1:
+        # only one state and only one island -> just copy the data ----------------------------------------------------
 
-                    if len(bus_idx) > 1:
-                        island = get_time_island(numeric_circuit, bus_idx, all_time)
-                        island.consolidate()  # compute the internal magnitudes
-                        circuit_islands.append(island)
+        numeric_circuit.consolidate()  # compute the internal magnitudes
+        return [numeric_circuit]
 
-                else:
-                    island = get_time_island(numeric_circuit, bus_idx, all_time)
-                    island.consolidate()  # compute the internal magnitudes
-                    circuit_islands.append(island)
+    for t_array, idx_islands in states:
 
-            return circuit_islands
+        if len(idx_islands) == 1:  # one island -> slice only by time -----------------------------------------------
 
-    else:  # -----------------------------------------------------------------------------------------------------------
+            island = get_time_island(numeric_circuit, all_buses, t_array)  # convert the circuit to an island
+            island.consolidate()  # compute the internal magnitudes
 
-        for t, t_array in states.items():
+            circuit_islands.append(island)
 
-            # compute the adjacency matrix
-            A = tp.get_adjacency_matrix(C_branch_bus_f=numeric_circuit.C_branch_bus_f,
-                                        C_branch_bus_t=numeric_circuit.C_branch_bus_t,
-                                        branch_active=numeric_circuit.branch_active[t_array, :],
-                                        bus_active=numeric_circuit.bus_active[t_array, :])
+        else:  # many islands -> slice by both time and bus index ---------------------------------------------------
 
-            # find the matching islands
-            idx_islands = tp.find_islands(A)
+            for bus_idx in idx_islands:
 
-            if len(idx_islands) == 1:  # many time states, one island -> slice only by time ----------------------------
+                if ignore_single_node_islands and len(bus_idx) <= 1:
+                    continue
 
-                island = get_time_island(numeric_circuit, all_buses, t_array)  # convert the circuit to an island
+                island = get_time_island(numeric_circuit, bus_idx, t_array)
                 island.consolidate()  # compute the internal magnitudes
-
                 circuit_islands.append(island)
 
-            else:  # any time states, many islands -> slice by both time and bus index ---------------------------------
-
-                for bus_idx in idx_islands:
+    return circuit_islands
 
-                    if ignore_single_node_islands:
 
-                        if len(bus_idx) > 1:
-                            island = get_time_island(numeric_circuit, bus_idx, t_array)
-                            island.consolidate()  # compute the internal magnitudes
-                            circuit_islands.append(island)
-
-                    else:
-                        island = get_time_island(numeric_circuit, bus_idx, t_array)
-                        island.consolidate()  # compute the internal magnitudes
-                        circuit_islands.append(island)
-
-        return circuit_islands
+def get_time_island_steps(time_island: TimeCircuit, time_indices):
+    """
+    Get the time steps of a time island that have been requested
+    :param time_island: TimeCircuit island
+    :param time_indices: sorted array of requested (original) time indices
+    :return: array of the island local time indices, array of positions of those steps in time_indices
+    """
+    local_idx = np.where(np.isin(time_island.original_time_idx, time_indices))[0]
+    positions = np.searchsorted(time_indices, time_island.original_time_idx[local_idx])
+    return local_idx, positions
 
 
 def compile_time_circuit(circuit: MultiCircuit, apply_temperature=False,
@@ -33,109 +33,138 @@ import numpy as np
 import numba as nb
 from scipy.sparse import csc_matrix, diags
 
+from GridCal.Engine.Core.common_functions import group_states, states_to_time_groups
 
-def find_islands(adj: csc_matrix):
+
+@nb.njit(cache=True)
+def find_islands_numba(node_number, indptr, indices):
     """
-    Method to get the islands of a graph
-    This is the non-recursive version
-    :return: list of islands, where each element is a list of the node indices of the island
+    Label the connected components of a graph given its CSC (or CSR) adjacency structure.
+    The depth first search uses an array-based stack, so that every push and pop is O(1)
+    :param node_number: number of nodes
+    :param indptr: index pointers of the adjacency matrix
+    :param indices: indices of the adjacency matrix
+    :return: island label of every node (node_number), number of islands
     """
+    labels = np.full(node_number, -1, dtype=np.int64)
 
-    node_number = adj.shape[0]
-
-    # Mark all the vertices as not visited
-    visited = np.zeros(node_number, dtype=bool)
+    # every node is pushed at most once per adjacency entry plus its own seed
+    stack = np.empty(len(indices) + node_number, dtype=np.int64)
 
-    # storage structure for the islands (list of lists)
-    islands = list()  # type: List[List[int]]
-
-    # set the island index
     island_idx = 0
 
-    # go though all the vertices...
     for node in range(node_number):
 
-        # if the node has not been visited...
-        if not visited[node]:
-
-            # add new island, because the recursive process has already visited all the island connected to v
-            # if island_idx >= len(islands):
-            islands.append(list())
-
-            # ------------------------------------------------------------------------------------------------------
-            # DFS: store in the island all the reachable vertices from current vertex "node"
-            #
-            # declare a stack with the initial node to visit (node)
-            stack = list()  # type: List[int]
-            stack.append(node)
+        if labels[node] < 0:
 
-            while len(stack) > 0:
+            # DFS: label all the reachable vertices from the current vertex "node"
+            top = 0
+            stack[top] = node
+            top += 1
 
-                # pick the first element of the stack
-                v = stack.pop(0)
+            while top > 0:
 
-                # if v has not been visited...
-                if not visited[v]:
+                # pick the last element of the stack
+                top -= 1
+                v = stack[top]
 
-                    # mark as visited
-                    visited[v] = True
+                if labels[v] < 0:
 
-                    # add element to the island
-                    islands[island_idx].append(v)
+                    labels[v] = island_idx
 
                     # Add the neighbours of v to the stack
-                    start = adj.indptr[v]
-                    end = adj.indptr[v + 1]
-                    for i in range(start, end):
-                        k = adj.indices[i]  # get the column index in the CSC scheme
-                        if not visited[k]:
-                            stack.append(k)
-            # ------------------------------------------------------------------------------------------------------
-
-            # increase the islands index, because all the other connected vertices have been visited
+                    for i in range(indptr[v], indptr[v + 1]):
+                        k = indices[i]
+                        if labels[k] < 0:
+                            stack[top] = k
+                            top += 1
+
             island_idx += 1
 
-    # sort each of the islands to maintain raccord
-    for island in islands:
-        island.sort()  # the sorting is done in-place
+    return labels, island_idx
+
+
+def get_island_labels(adj):
+    """
+    Label the islands of a graph
+    :param adj: adjacency matrix (CSC or CSR, it must be structurally symmetric)
+    :return: island label of every node, number of islands
+    """
+    if not isinstance(adj, csc_matrix):
+        adj = csc_matrix(adj)
 
-    return islands
+    return find_islands_numba(adj.shape[0],
+                              adj.indptr.astype(np.int64),
+                              adj.indices.astype(np.int64))
 
 
-def get_elements_of_the_island(C_element_bus, island):
+def labels_to_islands(labels, n_islands):
     """
-    Get the branch indices of the island
-    :param C_branch_bus: CSC elements-buses connectivity matrix with the dimensions: elements x buses
-    :param island: array of bus indices of the island
-    :return: array of indices of the elements that match that island
+    Convert the island labels into the list of sorted node indices of each island
+    :param labels: island label of every node
+    :param n_islands: number of islands
+    :return: list of islands, where each element is an array of the node indices of the island
     """
+    # the stable sort keeps the node indices of each island sorted
+    order = np.argsort(labels, kind='stable')
+    counts = np.bincount(labels, minlength=n_islands)
+    return np.split(order, np.cumsum(counts)[:-1])
 
-    if not isinstance(C_element_bus, csc_matrix):
-        C_element_bus = C_element_bus.tocsc()
 
-    # faster method
-    n_rows = C_element_bus.shape[0]
-    visited = np.zeros(n_rows, dtype=bool)
-    elm_idx = np.zeros(n_rows, dtype=int)
+def find_islands(adj: csc_matrix):
+    """
+    Method to get the islands of a graph
+    :return: list of islands, where each element is an array of the node indices of the island
+    """
+    labels, n_islands = get_island_labels(adj)
+    return labels_to_islands(labels, n_islands)
+
+
+@nb.njit(cache=True)
+def get_elements_of_the_island_numba(n_rows, indptr, indices, island):
+    """
+    Get the row indices of the CSC matrix that are connected to the columns of the island
+    :param n_rows: number of rows of the matrix
+    :param indptr: index pointers of the CSC matrix
+    :param indices: row indices of the CSC matrix
+    :param island: array of column indices of the island
+    :return: array of row indices
+    """
+    visited = np.zeros(n_rows, dtype=nb.boolean)
+    elm_idx = np.empty(n_rows, dtype=np.int64)
     n_visited = 0
 
     for k in range(len(island)):
 
         j = island[k]  # column index
 
-        for l in range(C_element_bus.indptr[j], C_element_bus.indptr[j + 1]):
+        for l in range(indptr[j], indptr[j + 1]):
 
-            i = C_element_bus.indices[l]  # row index
+            i = indices[l]  # row index
 
             if not visited[i]:
                 visited[i] = True
                 elm_idx[n_visited] = i
                 n_visited += 1
 
-    # resize vector
-    elm_idx = elm_idx[:n_visited]
+    return elm_idx[:n_visited]
+
+
+def get_elements_of_the_island(C_element_bus, island):
+    """
+    Get the branch indices of the island
+    :param C_branch_bus: CSC elements-buses connectivity matrix with the dimensions: elements x buses
+    :param island: array of bus indices of the island
+    :return: array of indices of the elements that match that island
+    """
+
+    if not isinstance(C_element_bus, csc_matrix):
+        C_element_bus = C_element_bus.tocsc()
 
-    return elm_idx
+    return get_elements_of_the_island_numba(C_element_bus.shape[0],
+                                            C_element_bus.indptr.astype(np.int64),
+                                            C_element_bus.indices.astype(np.int64),
+                                            np.array(island, dtype=np.int64))
 
 
 def get_adjacency_matrix(C_branch_bus_f, C_branch_bus_t, branch_active, bus_active):
@@ -161,6 +190,35 @@ def get_adjacency_matrix(C_branch_bus_f, C_branch_bus_t, branch_active, bus_acti
     return C_bus_bus
 
 
+def find_islands_by_state(C_branch_bus_f, C_branch_bus_t, branch_active_prof, bus_active_prof):
+    """
+    Find the islands of every different topological state in time.
+    The time steps are grouped by their branch and bus states, so the topology is processed once per state.
+    :param C_branch_bus_f: Branch-bus_from connectivity matrix
+    :param C_branch_bus_t: Branch-bus_to connectivity matrix
+    :param branch_active_prof: branch states profile (ntime, nbr)
+    :param bus_active_prof: bus states profile (ntime, nbus)
+    :return: state index of every time step (ntime),
+             list of (time indices of the state, list of islands) with one entry per different state
+    """
+    first, inverse = group_states(branch_active_prof, bus_active_prof)
+    time_groups = states_to_time_groups(first, inverse)
+
+    states = list()
+    for t, t_array in zip(first, time_groups):
+
+        # compute the adjacency matrix of the state
+        A = get_adjacency_matrix(C_branch_bus_f=C_branch_bus_f,
+                                 C_branch_bus_t=C_branch_bus_t,
+                                 branch_active=branch_active_prof[t, :],
+                                 bus_active=bus_active_prof[t, :])
+
+        # find the matching islands
+        states.append((t_array, find_islands(A)))
+
+    return inverse, states
+
+
 class Graph:
 
     def __init__(self, C_bus_bus, C_branch_bus, bus_states):
@@ -183,11 +241,18 @@ class Graph:
         """
         Method to get the islands of a graph
         This is the non-recursive version
-        :return: List of islands where each element is a list of the node indices of the island
+        :return: List of islands where each element is an array of the node indices of the island
         """
 
         return find_islands(self.adj)
 
+    def get_island_labels(self):
+        """
+        Label the islands of the graph
+        :return: island label of every node, number of islands
+        """
+        return get_island_labels(self.adj)
+
     def get_branches_of_the_island(self, island):
         """
         Get the branch indices of the island
@@ -309,11 +309,16 @@ class Bus(EditableDevice):
             show_fig = False
 
         if time_series_driver is not None:
-            v = np.abs(time_series_driver.results.voltage[:, my_index])
-            p = np.abs(time_series_driver.results.S[:, my_index])
             t = time_series_driver.results.time
-            pd.DataFrame(data=v, index=t, columns=['Voltage (p.u.)']).plot(ax=ax_voltage)
-            pd.DataFrame(data=p, index=t, columns=['Computed power (p.u.)']).plot(ax=ax_load)
+
+            # the time series may not keep all the arrays
+            if time_series_driver.results.voltage is not None:
+                v = np.abs(time_series_driver.results.voltage[:, my_index])
+                pd.DataFrame(data=v, index=t, columns=['Voltage (p.u.)']).plot(ax=ax_voltage)
+
+            if time_series_driver.results.S is not None:
+                p = np.abs(time_series_driver.results.S[:, my_index])
+                pd.DataFrame(data=p, index=t, columns=['Computed power (p.u.)']).plot(ax=ax_load)
 
             # plot the objects' active power profiles
 
@@ -14,6 +14,9 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import zipfile
+from xml.etree import ElementTree
+
 from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Devices import *
@@ -204,6 +207,17 @@ class SynchronousMachine(GeneralContainer):
         self.generating_unit = list()
 
 
+# containers of the CIM classes that hold references to other objects
+CIM_CONTAINERS = {'ACLineSegment': ACLineSegment,
+                  'PowerTransformer': PowerTransformer,
+                  'TransformerWinding': Winding,
+                  'PowerTransformerEnd': Winding,
+                  'ConformLoad': ConformLoad,
+                  'SynchronousMachine': SynchronousMachine}
+
+RDF_NS = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}'
+
+
 class CIMCircuit:
 
     def __init__(self):
@@ -269,203 +283,195 @@ class CIMCircuit:
         self.elm_dict = dict()
         self.elements_by_type = dict()
 
-    @staticmethod
-    def check_type(xml, class_types, starter='<cim:', ender='</cim:'):
+    def get_element(self, id, tpe):
         """
-        Checks if we are starting an object of the predefined types
-        :param xml: some text
-        :param class_types: list of CIM types
-        :param starter string to add prior to the class when opening an object
-        :param ender string to add prior to a class when closing an object
-        :return: start_recording, end_recording, the found type or None if no one was found
+        Create the container of a CIM object
+        :param id: object rdf:ID
+        :param tpe: type of the object (class)
+        :return: GeneralContainer or derived container
         """
+        if tpe in CIM_CONTAINERS:
+            return CIM_CONTAINERS[tpe](id, tpe)
+        else:
+            return GeneralContainer(id, tpe)
 
-        # for each type
-        for tpe in class_types:
-
-            # if the starter token is found: this is the beginning of an object
-            if starter + tpe + ' rdf:ID' in xml:
-                return True, False, tpe
+    def add_element(self, element):
+        """
+        Add an object to the circuit, merging it with the object with the same id if it was already added
+        (i.e. the same object described in the equipment, topology and steady state profiles)
+        :param element: GeneralContainer
+        """
+        existing = self.elm_dict.get(element.id, None)
 
-            # if the starter token is found: this is the beginning of an object (only in the topology definition)
-            elif starter + tpe + ' rdf:about' in xml:
-                return True, False, tpe
+        if existing is not None:
+            existing.merge(element)
+        else:
+            self.elm_dict[element.id] = element
+            self.elements.append(element)
 
-            # if the ender token is found: this is the end of an object
-            elif ender + tpe + '>' in xml:
-                return False, True, tpe
+            if element.tpe not in self.elements_by_type:
+                self.elements_by_type[element.tpe] = list()
 
-        # otherwise, this is neither the beginning nor the end of an object
-        return False, False, ""
+            self.elements_by_type[element.tpe].append(element)
 
     def find_references(self, recognised=set()):
         """
-        Replaces the references of the classes given
-        :return:
+        Replaces the references of the classes given, in a single pass over the properties
+        :param recognised: set of recognised types and properties (modified in place)
         """
 
         # for every element
         for element in self.elements:
 
             # for each property in the element
-            # for prop in element.properties.keys():
             for prop, ref_code in element.properties.items():
 
-                # if the value of the property is in the object ID references...
-                if ref_code in self.elm_dict.keys():
-
-                    # replace the reference by the corresponding object properties
-                    obj_idx = self.elm_dict[ref_code]
-                    ref_obj = self.elements[obj_idx]
-                    # element.properties[prop] = ref_obj
-
-                    # add the element type to the recognised types because it is in the referenced dictionary
-                    recognised.add(element.tpe)
-
-                    # A terminal points at an equipment with the property ConductingEquipment
-                    # A terminal points at a bus (topological node) with the property TopologicalNode
-                    if prop in ['ConductingEquipment', 'TopologicalNode', 'ConnectivityNode']:
-                        ref_obj.terminals.append(element)
-                        recognised.add(prop)
-
-                    if prop in ['BaseVoltage', 'VoltageLevel']:
-                        element.base_voltage.append(ref_obj)
-                        recognised.add(prop)
-
-                    if prop in ['EquipmentContainer']:
-                        element.containers.append(ref_obj)
-                        recognised.add(ref_obj.tpe)
-
-                    # the winding points at the transformer with the property PowerTransformer
-                    if ref_obj.tpe == 'PowerTransformer':
-                        if prop in ['PowerTransformer']:
-                            ref_obj.windings.append(element)
-                            recognised.add(prop)
-                        recognised.add(ref_obj.tpe)
-
-                    # The tap changer points at the winding with the property TransformerWinding
-                    if ref_obj.tpe in ['TransformerWinding', 'PowerTransformerEnd']:
-                        if prop in ['TransformerWinding', 'PowerTransformerEnd']:
-                            ref_obj.tap_changers.append(element)
-                            recognised.add(prop)
-                        recognised.add(ref_obj.tpe)
-
-                    # the synchronous generator references 3 types of objects
-                    if element.tpe == 'SynchronousMachine':
-                        if prop in ['BaseVoltage']:
-                            element.base_voltage.append(ref_obj)
-                            recognised.add(prop)
-                        if prop in ['RegulatingControl']:
-                            element.regulating_control.append(ref_obj)
-                            recognised.add(prop)
-                        if prop in ['GeneratingUnit']:
-                            element.generating_unit.append(ref_obj)
-                            recognised.add(prop)
-                        recognised.add(element.tpe)
-
-                    # a Conform load points at LoadResponseCharacteristic with the property LoadResponse
-                    if element.tpe == 'ConformLoad':
-                        if prop in ['LoadResponse']:
-                            element.load_response_characteristics.append(ref_obj)
-                            recognised.add(prop)
-                        recognised.add(element.tpe)
-
-                    if element.tpe == 'ACLineSegment':
-                        if prop in ['CurrentLimit']:
-                            element.current_limit.append(ref_obj)
+                # look up the referenced object by its id
+                ref_obj = self.elm_dict.get(ref_code, None)
 
-                else:
-                    pass
-                    # print('Not found ', prop, ref)
+                if ref_obj is None:
+                    continue
 
-    def parse_file(self, file_name, classes_=None):
-        """
-        Parse CIM file and add all the recognised objects
-        :param file_name:  file name or path
-        :return:
-        """
-        if classes_ is None:
-            classes = self.classes
-        else:
-            classes = classes_
-        recording = False
+                # add the element type to the recognised types because it is in the referenced dictionary
+                recognised.add(element.tpe)
 
-        disabled = False
+                # A terminal points at an equipment with the property ConductingEquipment
+                # A terminal points at a bus (topological node) with the property TopologicalNode
+                if prop in ('ConductingEquipment', 'TopologicalNode', 'ConnectivityNode'):
+                    ref_obj.terminals.append(element)
+                    recognised.add(prop)
 
-        # Read text file line by line
-        with open(file_name, 'r') as file_pointer:
+                elif prop in ('BaseVoltage', 'VoltageLevel'):
+                    element.base_voltage.append(ref_obj)
+                    recognised.add(prop)
 
-            for line in file_pointer:
+                elif prop == 'EquipmentContainer':
+                    element.containers.append(ref_obj)
+                    recognised.add(ref_obj.tpe)
 
-                if '<!--' in line:
-                    disabled = True
+                # the winding points at the transformer with the property PowerTransformer
+                elif prop == 'PowerTransformer' and ref_obj.tpe == 'PowerTransformer':
+                    ref_obj.windings.append(element)
+                    recognised.add(prop)
 
-                if not disabled:
+                # The tap changer points at the winding with the property TransformerWinding
+                elif prop in ('TransformerWinding', 'PowerTransformerEnd') and \
+                        ref_obj.tpe in ('TransformerWinding', 'PowerTransformerEnd'):
+                    ref_obj.tap_changers.append(element)
+                    recognised.add(prop)
 
-                    # determine if the line opens or closes and object
-                    # and of which type of the ones pre-specified
-                    start_rec, end_rec, tpe = self.check_type(line, classes)
+                # the synchronous generator references 3 types of objects
+                elif prop == 'RegulatingControl' and element.tpe == 'SynchronousMachine':
+                    element.regulating_control.append(ref_obj)
+                    recognised.add(prop)
 
-                    if tpe != "":
-                        # a recognisable object was found
+                elif prop == 'GeneratingUnit' and element.tpe == 'SynchronousMachine':
+                    element.generating_unit.append(ref_obj)
+                    recognised.add(prop)
 
-                        if start_rec:
+                # a Conform load points at LoadResponseCharacteristic with the property LoadResponse
+                elif prop == 'LoadResponse' and element.tpe == 'ConformLoad':
+                    element.load_response_characteristics.append(ref_obj)
+                    recognised.add(prop)
 
-                            id = index_find(line, '"', '">').replace('#', '')
+                elif prop == 'CurrentLimit' and element.tpe == 'ACLineSegment':
+                    element.current_limit.append(ref_obj)
 
-                            # start recording object
-                            if tpe == 'PowerTransformer':
-                                element = PowerTransformer(id, tpe)
+                if ref_obj.tpe in ('PowerTransformer', 'TransformerWinding', 'PowerTransformerEnd'):
+                    recognised.add(ref_obj.tpe)
 
-                            elif tpe == 'ACLineSegment':
-                                element = ACLineSegment(id, tpe)
+    def parse_stream(self, stream, classes):
+        """
+        Parse a CIM xml stream incrementally, keeping only the objects of the given classes
+        :param stream: binary file-like object
+        :param classes: set of CIM types to read
+        """
+        rdf_id = RDF_NS + 'ID'
+        rdf_about = RDF_NS + 'about'
+        rdf_resource = RDF_NS + 'resource'
 
-                            elif tpe == 'TransformerWinding':
-                                element = Winding(id, tpe)
+        depth = 0
+        element = None
+        root = None
 
-                            elif tpe == 'PowerTransformerEnd':
-                                element = Winding(id, tpe)
+        for event, elm in ElementTree.iterparse(stream, events=('start', 'end')):
 
-                            elif tpe == 'ConformLoad':
-                                element = ConformLoad(id, tpe)
+            if event == 'start':
+                depth += 1
 
-                            elif tpe == 'SynchronousMachine':
-                                element = SynchronousMachine(id, tpe)
+                if depth == 1:
+                    root = elm
 
-                            else:
-                                element = GeneralContainer(id, tpe)
+                elif depth == 2:
+                    # objects are the children of rdf:RDF
+                    tpe = elm.tag.rpartition('}')[2]
 
-                            recording = True
+                    if tpe in classes:
+                        id = elm.get(rdf_id, None)
+                        if id is None:
+                            id = elm.get(rdf_about, '')
+                        element = self.get_element(id.replace('#', ''), tpe)
 
-                        if end_rec:
-                            # stop recording object
-                            if recording:
+            else:
+                if depth == 3 and element is not None:
+                    # property of the object being recorded: <cim:Class.property>
+                    prop = elm.tag.rpartition('}')[2].partition('.')[2]
+                    val = elm.get(rdf_resource, None)
 
-                                if element.id in self.elm_dict.keys():
-                                    idx = self.elm_dict[element.id]
-                                    self.elements[idx].merge(element)
-                                    # print('Merging!')
-                                else:
-                                    self.elm_dict[element.id] = len(self.elements)
-                                    self.elements.append(element)
+                    if val is None:
+                        val = '' if elm.text is None else elm.text.strip()
 
-                                if tpe not in self.elements_by_type.keys():
-                                    self.elements_by_type[tpe] = list()
+                    elif len(val) > 0 and val[0] == '#':
+                        val = val[1:]
 
-                                self.elements_by_type[tpe].append(element)
+                    if prop != '':
+                        element.properties[prop] = val
 
-                                recording = False
+                elif depth == 2:
+                    if element is not None:
+                        self.add_element(element)
+                        element = None
 
-                    else:
-                        # process line
-                        if recording:
-                            element.parse_line(line)
-                else:
-                    # the line is a comment
-                    # print('#', line.replace('\n', ''))
+                    # drop the parsed xml so that the memory does not grow with the file size
+                    root.clear()
+
+                depth -= 1
+
+    def parse_file(self, file_name, classes_=None):
+        """
+        Parse CIM file and add all the recognised objects
+        The file may be an xml file or a zip file (i.e. a CGMES set) containing xml files or zip files
+        of the profiles (EQ, TP, SSH, ...); the objects of the different profiles are merged by their id.
+        :param file_name: file name or path
+        :param classes_: list of CIM types to read (None to read the default ones)
+        """
+        if classes_ is None:
+            classes = set(self.classes)
+        else:
+            classes = set(classes_)
+
+        if zipfile.is_zipfile(file_name):
+            self.parse_zip(zipfile.ZipFile(file_name), classes)
+        else:
+            with open(file_name, 'rb') as stream:
+                self.parse_stream(stream, classes)
 
-                    if '-->' in line:
-                        disabled = False
+    def parse_zip(self, zip_file: zipfile.ZipFile, classes):
+        """
+        Parse all the xml files of a zip file, streaming them without extracting them
+        :param zip_file: ZipFile
+        :param classes: set of CIM types to read
+        """
+        with zip_file:
+            for name in zip_file.namelist():
+
+                if name.lower().endswith('.xml'):
+                    with zip_file.open(name) as stream:
+                        self.parse_stream(stream, classes)
+
+                elif name.lower().endswith('.zip'):
+                    with zip_file.open(name) as stream:
+                        self.parse_zip(zipfile.ZipFile(stream), classes)
 
 
 class CIMExport:
@@ -1115,7 +1121,7 @@ class CIMImport:
     def load_cim_file(self, equipment_file, topology_file=None):
         """
         Load CIM file
-        :param equipment_file: Main CIM file
+        :param equipment_file: Main CIM file, zip file with the CGMES profiles or list of those
         :param topology_file: Secondary CIM file that may contain the terminals-connectivity node relations
         """
         # declare GridCal circuit
@@ -1125,8 +1131,12 @@ class CIMImport:
         # declare CIM circuit to process the file(s)
         cim = CIMCircuit()
 
-        # parse main file
-        cim.parse_file(equipment_file)
+        # parse main file(s)
+        if isinstance(equipment_file, (list, tuple)):
+            for file_name in equipment_file:
+                cim.parse_file(file_name)
+        else:
+            cim.parse_file(equipment_file)
 
         # if additionally there is a topology file, parse it as well
         if topology_file is not None:
@@ -15,9 +15,12 @@
 import os
 from io import StringIO
 import zipfile
+import numpy as np
+import pandas as pd
 from PySide2.QtCore import QThread, Signal
 
 from GridCal.Engine.IO.zip_interface import save_data_frames_to_zip
+from GridCal.Engine.IO.h5_interface import H5ResultsStore
 from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Devices import DeviceType
 
@@ -31,7 +34,7 @@ class ExportAllThread(QThread):
         """
         Constructor
         :param simulations_list: list of GridCal simulation drivers
-        :param file_name: name of the file where to save (.zip)
+        :param file_name: name of the file where to save (.zip for csv files, .h5 for binary)
         """
         QThread.__init__(self)
 
@@ -49,6 +52,78 @@ class ExportAllThread(QThread):
 
         self.__cancel__ = False
 
+    def save_zip(self):
+        """
+        Save the results as csv files in a zip file
+        """
+        with zipfile.ZipFile(self.file_name, 'w', zipfile.ZIP_DEFLATED) as myzip:
+
+            n = len(self.simulations_list)
+
+            for k, driver in enumerate(self.simulations_list):
+
+                self.progress_signal.emit((k + 1) / n * 100.0)
+
+                for available_result in driver.results.available_results:
+
+                    # ge the result type definition
+                    result_name, device_type = available_result.value
+
+                    self.progress_text.emit('flushing ' + driver.results.name + ' ' + result_name)
+
+                    # save the DataFrame to the buffer
+                    mdl = driver.results.mdl(result_type=available_result)
+
+                    if mdl is not None:
+                        with StringIO() as buffer:
+                            filename = driver.results.name + ' ' + result_name + '.csv'
+                            mdl.save_to_csv(buffer)
+                            myzip.writestr(filename, buffer.getvalue())
+                    else:
+                        self.logger.add_info('No results for ' + driver.results.name + ' - ' + result_name)
+
+    def save_binary(self):
+        """
+        Save the results in a HDF5 file, one group per results model with its data, index and columns.
+        The data is copied by blocks of rows, so the results stored in a file are not loaded at once.
+        """
+        with H5ResultsStore(self.file_name, mode='w') as store:
+
+            n = len(self.simulations_list)
+
+            for k, driver in enumerate(self.simulations_list):
+
+                self.progress_signal.emit((k + 1) / n * 100.0)
+
+                for available_result in driver.results.available_results:
+
+                    # ge the result type definition
+                    result_name, device_type = available_result.value
+
+                    self.progress_text.emit('flushing ' + driver.results.name + ' ' + result_name)
+
+                    mdl = driver.results.mdl(result_type=available_result)
+
+                    if mdl is None:
+                        self.logger.add_info('No results for ' + driver.results.name + ' - ' + result_name)
+                        continue
+
+                    if mdl.data_c.dtype.kind not in 'biufc':
+                        self.logger.add_info('Non numeric results are not exported in binary form: '
+                                             + driver.results.name + ' - ' + result_name)
+                        continue
+
+                    group = driver.results.name + '/' + result_name
+                    store.write_array(group + '/data', mdl.data_c)
+                    store.write_names(group + '/columns', mdl.cols_c)
+
+                    if mdl.index_c is not None:
+                        if isinstance(mdl.index_c, pd.DatetimeIndex) or \
+                                np.issubdtype(np.asarray(mdl.index_c).dtype, np.datetime64):
+                            store.write_time(group + '/index', mdl.index_c)
+                        else:
+                            store.write_names(group + '/index', mdl.index_c)
+
     def run(self):
         """
         run the file save procedure
@@ -67,33 +142,11 @@ class ExportAllThread(QThread):
                       DeviceType.BusDevice.GeneratorDevice: self.circuit.get_controlled_generator_names(),
                       DeviceType.BusDevice.BatteryDevice: self.circuit.get_battery_names()}
 
-        # open zip file for writing
         try:
-            with zipfile.ZipFile(self.file_name, 'w', zipfile.ZIP_DEFLATED) as myzip:
-
-                n = len(self.simulations_list)
-
-                for k, driver in enumerate(self.simulations_list):
-
-                    self.progress_signal.emit((k + 1) / n * 100.0)
-
-                    for available_result in driver.results.available_results:
-
-                        # ge the result type definition
-                        result_name, device_type = available_result.value
-
-                        self.progress_text.emit('flushing ' + driver.results.name + ' ' + result_name)
-
-                        # save the DataFrame to the buffer
-                        mdl = driver.results.mdl(result_type=available_result)
-
-                        if mdl is not None:
-                            with StringIO() as buffer:
-                                filename = driver.results.name + ' ' + result_name + '.csv'
-                                mdl.save_to_csv(buffer)
-                                myzip.writestr(filename, buffer.getvalue())
-                        else:
-                            self.logger.add_info('No results for ' + driver.results.name + ' - ' + result_name)
+            if self.file_name.endswith('.h5'):
+                self.save_binary()
+            else:
+                self.save_zip()
 
         except PermissionError:
             self.logger.add('Permission error.\nDo you have the file open?')
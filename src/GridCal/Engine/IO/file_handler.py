@@ -20,7 +20,7 @@ from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.IO.json_parser import save_json_file
 from GridCal.Engine.IO.cim_parser import CIMExport
 from GridCal.Engine.IO.excel_interface import save_excel, load_from_xls, interpret_excel_v3, interprete_excel_v2
-from GridCal.Engine.IO.pack_unpack import create_data_frames, data_frames_to_circuit
+from GridCal.Engine.IO.pack_unpack import create_data_frames, data_frames_to_circuit, release_memory_maps
 from GridCal.Engine.IO.matpower_parser import interpret_data_v1
 from GridCal.Engine.IO.dgs_parser import dgs_to_circuit
 from GridCal.Engine.IO.matpower_parser import parse_matpower_file
@@ -151,7 +151,7 @@ class FileOpen:
                 self.circuit = parser.circuit
                 self.logger += parser.logger
 
-            elif file_extension.lower() == '.xml':
+            elif file_extension.lower() in ['.xml', '.zip']:
                 parser = CIMImport()
                 self.circuit = parser.load_cim_file(self.file_name)
                 self.logger += parser.logger
@@ -225,7 +225,12 @@ class FileSave:
 
         logger = Logger()
 
-        dfs = create_data_frames(self.circuit)
+        # the profiles are stored in binary form
+        dfs = create_data_frames(self.circuit, profiles_as_arrays=True)
+
+        # the file is replaced once written, hence the profiles cannot stay memory mapped from it
+        if os.path.exists(self.file_name):
+            release_memory_maps(self.circuit, self.file_name)
 
         save_data_frames_to_zip(dfs,
                                 filename_zip=self.file_name,
@@ -19,8 +19,12 @@ from h5py._hl.group import Group
 import pandas as pd
 import numpy as np
 
+from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.IO.excel_interface import create_data_frames, interpret_excel_v3
+from GridCal.Engine.IO.pack_unpack import create_data_frames
+
+# approximate size in bytes of the chunks of the results datasets
+RESULTS_CHUNK_BYTES = 1024 * 1024
 
 
 def save_h5(circuit: MultiCircuit, file_path):
@@ -109,6 +113,288 @@ def recursively_load_dict_contents_from_group(h5file, path):
     return ans
 
 
+class H5Array:
+
+    def __init__(self, dataset: Dataset, func=None, block_rows=256):
+        """
+        2D array stored in a HDF5 dataset, that is read and written by slices
+        The reading of single values (i.e. from the GUI tables) is served from a cached block of rows.
+        :param dataset: h5py Dataset
+        :param func: function applied to the values when read (i.e. np.abs), None to read them as they are
+        :param block_rows: number of rows of the cached block
+        """
+        self.dataset = dataset
+
+        self.func = func
+
+        self.block_rows = block_rows
+
+        self._block = None
+
+        self._block_start = 0
+
+        self.shape = dataset.shape
+
+        self.ndim = len(self.shape)
+
+        # data type after applying the function
+        self.dtype = self.transform(dataset[0:0]).dtype
+
+    def transform(self, values):
+        """
+        Apply the function of this array to some values read from the dataset
+        :param values: numpy array
+        :return: numpy array
+        """
+        if self.func is None:
+            return values
+        else:
+            return self.func(values)
+
+    def apply(self, func):
+        """
+        Get a lazy array of the values of this array transformed by a function
+        :param func: function that transforms a numpy array
+        :return: H5Array
+        """
+        if self.func is None:
+            new_func = func
+        else:
+            old_func = self.func
+            new_func = lambda x: func(old_func(x))
+
+        return H5Array(self.dataset, func=new_func, block_rows=self.block_rows)
+
+    @property
+    def real(self):
+        return self.apply(np.real)
+
+    @property
+    def imag(self):
+        return self.apply(np.imag)
+
+    def __mul__(self, other):
+        return self.apply(lambda x: x * other)
+
+    def __rmul__(self, other):
+        return self.apply(lambda x: other * x)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None):
+        values = self.read_rows(0, self.shape[0])
+        if dtype is not None:
+            values = values.astype(dtype)
+        return values
+
+    def read_rows(self, a, b):
+        """
+        Read a range of rows, in blocks
+        :param a: first row
+        :param b: last row (not included)
+        :return: numpy array
+        """
+        values = np.empty((max(0, b - a),) + self.shape[1:], dtype=self.dtype)
+        step = max(1, self.block_rows)
+        for r in range(a, b, step):
+            r2 = min(b, r + step)
+            values[r - a:r2 - a] = self.transform(self.dataset[r:r2])
+        return values
+
+    def __getitem__(self, key):
+
+        if isinstance(key, tuple) and len(key) == 2 and isinstance(key[0], (int, np.integer)) \
+                and isinstance(key[1], (int, np.integer)):
+            # single value: serve it from the cached block of rows
+            i, j = int(key[0]), int(key[1])
+            if self._block is None or not (self._block_start <= i < self._block_start + len(self._block)):
+                self._block_start = (i // self.block_rows) * self.block_rows
+                self._block = self.transform(self.dataset[self._block_start:self._block_start + self.block_rows])
+            return self._block[i - self._block_start, j]
+
+        if isinstance(key, slice) and key.step in (None, 1):
+            a, b, _ = key.indices(self.shape[0])
+            return self.read_rows(a, b)
+
+        if key is Ellipsis:
+            return self.__array__()
+
+        # any other selection is passed to h5py (one fancy index at most, in increasing order)
+        return self.transform(self.dataset[key])
+
+    def __setitem__(self, key, value):
+
+        # any write invalidates the cached block
+        self._block = None
+
+        if self.func is not None:
+            raise Exception('Cannot write into a transformed array')
+
+        if key is Ellipsis or (isinstance(key, slice) and key == slice(None)):
+            # write all in blocks of rows
+            value = np.asarray(value)
+            for r in range(0, self.shape[0], self.block_rows):
+                r2 = min(self.shape[0], r + self.block_rows)
+                self.dataset[r:r2] = value if value.ndim < self.ndim else value[r:r2]
+
+        elif isinstance(key, tuple) and len(key) == 2 and isinstance(key[0], np.ndarray) and key[0].ndim == 2:
+            # np.ix_ selection: read-modify-write of the span of rows
+            rows = key[0].ravel()
+            cols = key[1].ravel()
+            if len(rows) == 0:
+                return
+            a, b = int(rows.min()), int(rows.max()) + 1
+            block = self.dataset[a:b]
+            block[np.ix_(rows - a, cols)] = value
+            self.dataset[a:b] = block
+
+        else:
+            self.dataset[key] = value
+
+
+def apply_lazily(array, func):
+    """
+    Apply a function to an array, deferring it if the array is stored in a file
+    :param array: numpy array or H5Array
+    :param func: function that transforms a numpy array
+    :return: numpy array or H5Array
+    """
+    if isinstance(array, H5Array):
+        return array.apply(func)
+    else:
+        return func(array)
+
+
+class H5ResultsStore:
+
+    def __init__(self, file_name, mode='a', block_rows=256):
+        """
+        Binary store of simulation results in a HDF5 file
+        The 2D arrays are chunked by blocks of rows (time steps) so that they can be written step by step
+        and read by slices without loading them.
+        :param file_name: name of the file
+        :param mode: h5py opening mode ('r', 'a', 'w')
+        :param block_rows: number of rows per chunk
+        """
+        self.file_name = file_name
+
+        self.block_rows = block_rows
+
+        self.h5 = h5py.File(file_name, mode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.h5
+
+    def close(self):
+        """
+        Close the file
+        """
+        if self.h5 is not None:
+            self.h5.close()
+            self.h5 = None
+
+    def flush(self):
+        """
+        Write the buffered data to the disk
+        """
+        self.h5.flush()
+
+    def get_chunks(self, shape, dtype):
+        """
+        Get the chunk shape of a dataset: blocks of rows, and as many columns as fit in the chunk size
+        :param shape: shape of the dataset
+        :param dtype: data type
+        :return: chunks tuple
+        """
+        rows = max(1, min(self.block_rows, shape[0]))
+        if len(shape) == 1:
+            return rows,
+        cols = int(RESULTS_CHUNK_BYTES / (np.dtype(dtype).itemsize * rows))
+        return rows, max(1, min(shape[1], cols))
+
+    def create(self, name, shape, dtype=float) -> H5Array:
+        """
+        Create an array in the store (initialized with zeros)
+        :param name: name of the array
+        :param shape: shape of the array
+        :param dtype: data type
+        :return: H5Array
+        """
+        if name in self.h5:
+            del self.h5[name]
+
+        if int(np.prod(shape)) == 0:
+            dataset = self.h5.create_dataset(name, shape=shape, dtype=dtype)
+        else:
+            dataset = self.h5.create_dataset(name, shape=shape, dtype=dtype, chunks=self.get_chunks(shape, dtype))
+
+        return H5Array(dataset, block_rows=self.block_rows)
+
+    def write_array(self, name, array) -> H5Array:
+        """
+        Write an array in the store, by blocks of rows
+        :param name: name of the array
+        :param array: numpy array, H5Array or any 2D array that can be sliced by rows
+        :return: H5Array
+        """
+        arr = self.create(name, array.shape, array.dtype)
+        for r in range(0, array.shape[0], self.block_rows):
+            arr.dataset[r:r + self.block_rows] = np.asarray(array[r:r + self.block_rows])
+        return arr
+
+    def get(self, name) -> H5Array:
+        """
+        Get a stored array without reading it
+        :param name: name of the array
+        :return: H5Array
+        """
+        return H5Array(self.h5[name], block_rows=self.block_rows)
+
+    def write_names(self, name, names):
+        """
+        Store a list of names
+        :param name: name of the list
+        :param names: list of strings
+        """
+        if name in self.h5:
+            del self.h5[name]
+        self.h5.create_dataset(name, data=np.array([str(x) for x in names], dtype=object),
+                               dtype=h5py.special_dtype(vlen=str))
+
+    def read_names(self, name):
+        """
+        Read a list of names
+        :param name: name of the list
+        :return: numpy array of strings
+        """
+        return np.array([x.decode() if isinstance(x, bytes) else x for x in self.h5[name][()]], dtype=object)
+
+    def write_time(self, name, time_array):
+        """
+        Store an array of dates (as nanoseconds)
+        :param name: name of the array
+        :param time_array: DatetimeIndex or array of datetime64
+        """
+        if name in self.h5:
+            del self.h5[name]
+        self.h5.create_dataset(name, data=pd.to_datetime(time_array).values.astype('datetime64[ns]').astype(np.int64))
+
+    def read_time(self, name):
+        """
+        Read an array of dates
+        :param name: name of the array
+        :return: DatetimeIndex
+        """
+        return pd.to_datetime(self.h5[name][()].astype('datetime64[ns]'))
+
+
 if __name__ == '__main__':
 
     from GridCal.Engine.IO.file_handler import *
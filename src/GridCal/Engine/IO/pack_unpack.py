@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 from typing import Dict
 
 from GridCal.Engine.basic_structures import Logger
@@ -63,10 +64,11 @@ def get_objects_dictionary():
     return object_types
 
 
-def create_data_frames(circuit: MultiCircuit):
+def create_data_frames(circuit: MultiCircuit, profiles_as_arrays=False):
     """
     Pack the circuit information into tables (DataFrames)
     :param circuit: MultiCircuit instance
+    :param profiles_as_arrays: store the profiles as arrays (n_objects, time) instead of DataFrames (time, n_objects)
     :return: dictionary of DataFrames
     """
     dfs = dict()
@@ -149,11 +151,11 @@ def create_data_frames(circuit: MultiCircuit):
                             arr = getattr(elm, profile_property)
 
                             if profile_property not in profiles.keys():
-                                # create the profile
-                                profiles[profile_property] = np.zeros((nt, len(lists_of_objects)), dtype=arr.dtype)
+                                # create the profile (one row per object, so that every profile is contiguous)
+                                profiles[profile_property] = np.zeros((len(lists_of_objects), nt), dtype=arr.dtype)
 
                             # copy the object profile to the array of profiles
-                            profiles[profile_property][:, k] = arr
+                            profiles[profile_property][k, :] = arr
 
             # convert the objects' list to an array
             dta = np.array(obj)
@@ -166,7 +168,10 @@ def create_data_frames(circuit: MultiCircuit):
 
         # create the profiles' DataFrames
         for prop, data in profiles.items():
-            dfs[object_type_name + '_' + prop] = pd.DataFrame(data=data, columns=object_names, index=T)
+            if profiles_as_arrays:
+                dfs[object_type_name + '_' + prop] = data
+            else:
+                dfs[object_type_name + '_' + prop] = pd.DataFrame(data=data.T, columns=object_names, index=T)
 
     # towers and wires -------------------------------------------------------------------------------------------------
     # because each tower contains a reference to a number of wires, these relations need to be stored as well
@@ -186,6 +191,77 @@ def create_data_frames(circuit: MultiCircuit):
     return dfs
 
 
+def release_memory_maps(circuit: MultiCircuit, file_name):
+    """
+    Replace the profiles memory mapped from a file by in-memory copies, so that the file can be replaced
+    (i.e. when saving over the .gridcal file that was opened, which is not possible on Windows while it is mapped)
+    :param circuit: MultiCircuit instance
+    :param file_name: name of the file
+    :return: number of profiles copied
+    """
+    file_name = os.path.abspath(file_name)
+    n = 0
+
+    object_types = get_objects_dictionary()
+
+    # the circuit has no list of Branch objects, the lines and transformers are in their own lists
+    del object_types['branch']
+
+    for object_type_name, object_sample in object_types.items():
+
+        for elm in circuit.get_elements_by_type(object_sample.device_type):
+
+            for profile_property in object_sample.properties_with_profile.values():
+
+                arr = getattr(elm, profile_property, None)
+
+                if isinstance(arr, np.memmap) and arr.filename is not None \
+                        and os.path.abspath(arr.filename) == file_name:
+                    setattr(elm, profile_property, np.array(arr))
+                    n += 1
+
+    return n
+
+
+def create_device_from_row(template_elm, df: pd.DataFrame, i, elements_dict, logger: Logger):
+    """
+    Create a device from one row of its table (without profiles)
+    :param template_elm: device of the type to create
+    :param df: DataFrame of the devices of this type
+    :param i: row index
+    :param elements_dict: dictionary of the referenced devices {DeviceType: {idtag: device}}
+    :param logger: Logger
+    :return: device
+    """
+    elm = type(template_elm)()
+
+    for prop, gc_prop in template_elm.editable_headers.items():
+
+        if prop in df.columns.values:
+
+            dtype = gc_prop.tpe
+            val = df[prop].values[i]
+
+            if dtype is None:
+                setattr(elm, prop, val)
+
+            elif dtype in [DeviceType.BusDevice,
+                           DeviceType.TransformerTypeDevice,
+                           DeviceType.SequenceLineDevice,
+                           DeviceType.TowerDevice]:
+
+                if dtype in elements_dict.keys() and val in elements_dict[dtype].keys():
+                    setattr(elm, prop, elements_dict[dtype][val])
+                else:
+                    logger.append(dtype.value + ' not found: ' + str(val))
+
+            else:
+                # regular types (int, str, float, etc...)
+                setattr(elm, prop, dtype(val))
+
+    return elm
+
+
 def data_frames_to_circuit(data: Dict):
     """
     Interpret data dictionary
@@ -333,13 +409,21 @@ def data_frames_to_circuit(data: Dict):
 
                             if profile_name in data.keys():
 
-                                # get the profile DataFrame
+                                # get the profile DataFrame (time, n_objects) or array (n_objects, time)
                                 dfp = data[profile_name]
 
-                                # for each object, set the profile
-                                for i in range(dfp.shape[1]):
-                                    profile = dfp.values[:, i]
-                                    setattr(devices[i], prop_prof, profile.astype(dtype))
+                                if isinstance(dfp, np.ndarray):
+                                    # binary profiles: the rows are views of the (memory mapped) array
+                                    for i in range(dfp.shape[0]):
+                                        profile = dfp[i, :]
+                                        if profile.dtype != dtype:
+                                            profile = profile.astype(dtype)
+                                        setattr(devices[i], prop_prof, profile)
+                                else:
+                                    # for each object, set the profile
+                                    for i in range(dfp.shape[1]):
+                                        profile = dfp.values[:, i]
+                                        setattr(devices[i], prop_prof, profile.astype(dtype))
 
                             else:
                                 circuit.logger.append(prop + ' profile was not found in the data')
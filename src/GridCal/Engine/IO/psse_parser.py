@@ -14,6 +14,7 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 import chardet
+import csv
 import re
 from typing import List, AnyStr, Dict
 
@@ -56,7 +57,7 @@ class PSSeGrid:
             data: array with the values
         """
 
-        self.IC, self.SBASE, self.REV, self.XFRRAT, self.NXFRAT, self.BASFRQ = data
+        self.IC, self.SBASE, self.REV, self.XFRRAT, self.NXFRAT, self.BASFRQ = data[:6]
 
         """
         Case Identification Data
@@ -92,6 +93,9 @@ class PSSeGrid:
         self.areas = list()
         self.zones = list()
 
+        # single line records parsed in bulk {section name: numpy record array}
+        self.tables = dict()
+
     def get_circuit(self, logger: Logger):
         """
         Return Newton circuit
@@ -108,46 +112,44 @@ class PSSeGrid:
         # ---------------------------------------------------------------------
         # Bus related
         # ---------------------------------------------------------------------
+        buses = get_buses_from_records(self.tables.get('bus', None), self.REV, area_dict, zones_dict)
         psse_bus_dict = dict()
         slack_buses = list()
 
-        for psse_bus in self.buses:
+        for psse_i, bus in buses:
 
             # relate each PSS bus index with a Newton bus object
-            psse_bus_dict[psse_bus.I] = psse_bus.bus
-
-            # replace area idx by area name if available
-            if abs(psse_bus.bus.area) in area_dict.keys():
-                psse_bus.bus.area = area_dict[abs(psse_bus.bus.area)]
+            psse_bus_dict[psse_i] = bus
 
-            if abs(psse_bus.bus.zone) in zones_dict.keys():
-                psse_bus.bus.zone = zones_dict[abs(psse_bus.bus.zone)]
-
-            if psse_bus.bus.type.value == 3:
-                slack_buses.append(psse_bus.I)
+            if bus.type == BusMode.Slack:
+                slack_buses.append(psse_i)
 
             # add the bus to the circuit
-            circuit.add_bus(psse_bus.bus)
+            circuit.add_bus(bus)
 
         for area in self.areas:
             if area.ISW not in slack_buses:
                 logger.add('The area slack bus ' + str(area.ISW) + ' is not a slack bus')
 
         # Go through loads
-        for psse_load in self.loads:
-            bus = psse_bus_dict[psse_load.I]
-            api_obj = psse_load.get_object(bus, logger)
-
-            circuit.add_load(bus, api_obj)
+        for psse_i, api_obj in get_loads_from_records(self.tables.get('load', None)):
+            circuit.add_load(psse_bus_dict[psse_i], api_obj)
 
         # Go through shunts
-        for psse_shunt in self.shunts + self.switched_shunts:
+        for psse_i, api_obj in get_shunts_from_records(self.tables.get('fixed shunt', None)):
+            circuit.add_shunt(psse_bus_dict[psse_i], api_obj)
+
+        for psse_shunt in self.switched_shunts:
             bus = psse_bus_dict[psse_shunt.I]
             api_obj = psse_shunt.get_object(bus, logger)
 
             circuit.add_shunt(bus, api_obj)
 
         # Go through generators
+        for psse_i, api_obj in get_generators_from_records(self.tables.get('generator', None)):
+            circuit.add_generator(psse_bus_dict[psse_i], api_obj)
+
+        # the induction machines are parsed as objects
         for psse_gen in self.generators:
             bus = psse_bus_dict[psse_gen.I]
             api_obj = psse_gen.get_object(logger)
@@ -159,9 +161,7 @@ class PSSeGrid:
         # ---------------------------------------------------------------------
         # Go through Branches
         already_there = set()
-        for psse_banch in self.lines:
-            # get the object
-            branch = psse_banch.get_object(psse_bus_dict, self.SBASE, logger)
+        for branch in get_lines_from_records(self.tables.get('branch', None), psse_bus_dict):
 
             if branch.idtag not in already_there:
 
@@ -2120,6 +2120,320 @@ def interpret_line(line, splitter=','):
     return parsed
 
 
+def strip_comment(line):
+    """
+    Remove the trailing comment of a RAW line (the text after a slash that is not quoted)
+    :param line: text line
+    :return: text line without comment
+    """
+    if '/' not in line:
+        return line
+
+    quoted = False
+    for i, c in enumerate(line):
+        if c == "'" or c == '"':
+            quoted = not quoted
+        elif c == '/' and not quoted:
+            return line[:i]
+    return line
+
+
+def detect_encoding(file_name, prefix_size=65536):
+    """
+    Guess the encoding of a text file from its first bytes
+    :param file_name: file name
+    :param prefix_size: number of bytes to examine
+    :return: encoding name
+    """
+    with open(file_name, 'rb') as f:
+        prefix = f.read(prefix_size)
+
+    encoding = chardet.detect(prefix)['encoding']
+
+    return encoding if encoding is not None else 'utf-8'
+
+
+# order of the sections in the RAW files (used when the end of a section does not tell its name)
+RAW_SECTIONS_ORDER = ['bus', 'load', 'fixed shunt', 'generator', 'branch', 'transformer', 'area', 'two-terminal dc',
+                      'vsc dc line', 'impedance correction', 'multi-terminal dc', 'multi-section line', 'zone',
+                      'inter-area transfer', 'owner', 'facts device', 'switched shunt', 'gne device',
+                      'induction machine']
+
+
+def read_raw_sections(file_name):
+    """
+    Read a RAW file line by line and split it into sections
+    :param file_name: file name
+    :return: header lines (3), dictionary of section lines by section name
+    """
+    header = list()
+    sections = dict()
+    current = list()
+    k = 0
+
+    with open(file_name, 'r', encoding=detect_encoding(file_name), errors='replace') as f:
+        for line in f:
+
+            if line.startswith('@'):
+                # comment line
+                continue
+
+            line = line.rstrip('\r\n')
+
+            if len(header) < 3:
+                header.append(line)
+                continue
+
+            stripped = line.strip()
+            value = strip_comment(stripped).strip()
+
+            if value == '0' or value.upper() == 'Q':
+
+                if value.upper() == 'Q':
+                    break
+
+                # end of section: get the name from the comment, or from the order
+                match = re.search('end of(.*)data', stripped.lower().split(',')[0])
+
+                if match is not None:
+                    name = match.group(1).strip()
+                elif k < len(RAW_SECTIONS_ORDER):
+                    name = RAW_SECTIONS_ORDER[k]
+                else:
+                    name = 'section ' + str(k)
+
+                sections[name] = current
+                current = list()
+                k += 1
+
+            else:
+                current.append(line)
+
+    return header, sections
+
+
+# fields of the single line records that are parsed in bulk: section -> version -> [(name, type, default), ...]
+_BUS_33 = [('I', int, 0), ('NAME', str, ''), ('BASKV', float, 0.0), ('IDE', int, 1), ('AREA', int, 1),
+           ('ZONE', int, 1), ('OWNER', int, 1), ('VM', float, 1.0), ('VA', float, 0.0), ('NVHI', float, 1.1),
+           ('NVLO', float, 0.9), ('EVHI', float, 1.1), ('EVLO', float, 0.9)]
+
+_BUS_30 = [('I', int, 0), ('NAME', str, ''), ('BASKV', float, 0.0), ('IDE', int, 1), ('GL', float, 0.0),
+           ('BL', float, 0.0), ('AREA', int, 1), ('ZONE', int, 1), ('VM', float, 1.0), ('VA', float, 0.0),
+           ('OWNER', int, 1)]
+
+_LOAD_33 = [('I', int, 0), ('ID', str, '1'), ('STATUS', int, 1), ('AREA', int, 1), ('ZONE', int, 1),
+            ('PL', float, 0.0), ('QL', float, 0.0), ('IP', float, 0.0), ('IQ', float, 0.0), ('YP', float, 0.0),
+            ('YQ', float, 0.0), ('OWNER', int, 1), ('SCALE', int, 1), ('INTRPT', int, 0)]
+
+_SHUNT_33 = [('I', int, 0), ('ID', str, '1'), ('STATUS', int, 1), ('GL', float, 0.0), ('BL', float, 0.0)]
+
+_OWNERS = [('O1', int, 1), ('F1', float, 1.0), ('O2', int, 0), ('F2', float, 1.0),
+           ('O3', int, 0), ('F3', float, 1.0), ('O4', int, 0), ('F4', float, 1.0)]
+
+_GEN_29 = [('I', int, 0), ('ID', str, '1'), ('PG', float, 0.0), ('QG', float, 0.0), ('QT', float, 9999.0),
+           ('QB', float, -9999.0), ('VS', float, 1.0), ('IREG', int, 0), ('MBASE', float, 100.0), ('ZR', float, 0.0),
+           ('ZX', float, 1.0), ('RT', float, 0.0), ('XT', float, 0.0), ('GTAP', float, 1.0), ('STAT', int, 1),
+           ('RMPCT', float, 100.0), ('PT', float, 9999.0), ('PB', float, -9999.0)] + _OWNERS
+
+_BRANCH_30 = [('I', int, 0), ('J', int, 0), ('CKT', str, '1'), ('R', float, 0.0), ('X', float, 0.0),
+              ('B', float, 0.0), ('RATEA', float, 0.0), ('RATEB', float, 0.0), ('RATEC', float, 0.0),
+              ('GI', float, 0.0), ('BI', float, 0.0), ('GJ', float, 0.0), ('BJ', float, 0.0), ('ST', int, 1),
+              ('LEN', float, 0.0)] + _OWNERS
+
+_BRANCH_33 = _BRANCH_30[:14] + [('MET', int, 1)] + _BRANCH_30[14:]
+
+RAW_RECORDS = {'bus': {33: _BUS_33, 32: _BUS_33[:9], 30: _BUS_30, 29: _BUS_30},
+               'load': {33: _LOAD_33, 32: _LOAD_33[:13], 30: _LOAD_33[:12], 29: _LOAD_33[:12]},
+               'fixed shunt': {33: _SHUNT_33, 32: _SHUNT_33},
+               'shunt': {33: _SHUNT_33, 32: _SHUNT_33},
+               'generator': {33: _GEN_29 + [('WMOD', int, 0), ('WPF', float, 1.0)],
+                             32: _GEN_29 + [('WMOD', int, 0), ('WPF', float, 1.0)],
+                             30: _GEN_29 + [('WMOD', int, 0), ('WPF', float, 1.0)],
+                             29: _GEN_29},
+               'branch': {33: _BRANCH_33, 32: _BRANCH_33, 30: _BRANCH_30, 29: _BRANCH_30}}
+
+# sections with more than one name
+RAW_RECORDS_ALIAS = {'shunt': 'fixed shunt'}
+
+
+def parse_records(lines, fields, logger: Logger):
+    """
+    Parse the lines of a section of single line records in bulk into a numpy record array
+    :param lines: list of text lines
+    :param fields: list of (name, type, default)
+    :param logger: Logger
+    :return: numpy record array
+    """
+    n = len(fields)
+    defaults = [str(default) for name, tpe, default in fields]
+
+    data_lines = list()
+    for line in lines:
+        if ',' in line:
+            data_lines.append(strip_comment(line))
+        elif line.strip() != '':
+            logger.append('Skipped:' + line)
+
+    # split all the lines at once, taking care of the quoted texts
+    rows = list()
+    for row in csv.reader(data_lines, quotechar="'", skipinitialspace=True):
+        if len(row) < n:
+            row += defaults[len(row):]
+        rows.append(row[:n])
+
+    dtype = [(name, np.int64 if tpe == int else (np.float64 if tpe == float else object)) for name, tpe, _ in fields]
+    rec = np.zeros(len(rows), dtype=dtype)
+
+    if len(rows) == 0:
+        return rec
+
+    # convert the data by columns
+    columns = list(zip(*rows))
+    for k, (name, tpe, default) in enumerate(fields):
+
+        col = np.char.strip(np.array(columns[k], dtype=str))
+        col = np.where(col == '', str(default), col)
+
+        if tpe == str:
+            rec[name] = np.char.strip(np.char.strip(col, '"')).astype(object)
+        elif tpe == int:
+            rec[name] = col.astype(np.float64).astype(np.int64)
+        else:
+            rec[name] = col.astype(np.float64)
+
+    return rec
+
+
+def get_buses_from_records(rec, version, area_dict, zones_dict):
+    """
+    Create the buses from the bus records
+    :param rec: record array of buses
+    :param version: RAW version
+    :param area_dict: area names by area number
+    :param zones_dict: zone names by zone number
+    :return: list of (PSSe bus number, Bus)
+    """
+    if rec is None:
+        return list()
+
+    bustype = {1: BusMode.PQ, 2: BusMode.PV, 3: BusMode.Slack, 4: BusMode.PQ}
+
+    n = len(rec)
+    if version == 33:
+        vmin = rec['EVLO'].tolist()
+        vmax = rec['EVHI'].tolist()
+    else:
+        vmin = [0.9] * n
+        vmax = [1.1] * n
+
+    buses = list()
+    for i, name, vnom, ide, area, zone, vl, vh in zip(rec['I'].tolist(), rec['NAME'], rec['BASKV'].tolist(),
+                                                      rec['IDE'].tolist(), rec['AREA'].tolist(),
+                                                      rec['ZONE'].tolist(), vmin, vmax):
+
+        # replace area idx by area name if available
+        bus = Bus(name=name.strip(), idtag=str(i), vnom=vnom, vmin=vl, vmax=vh, xpos=0, ypos=0, active=True,
+                  area=area_dict.get(abs(area), area), zone=zones_dict.get(abs(zone), zone))
+
+        bus.type = bustype.get(ide, BusMode.PQ)
+
+        if bus.type == BusMode.Slack:
+            bus.is_slack = True
+
+        if ide == 4:
+            bus.active = False
+
+        buses.append((i, bus))
+
+    if version in [29, 30]:
+        for k in np.where((rec['GL'] > 0) | (rec['BL'] > 0))[0]:
+            i, bus = buses[k]
+            bus.shunts.append(Shunt(name='Shunt_' + str(i), G=rec['GL'][k], B=rec['BL'][k], active=True))
+
+    return buses
+
+
+def get_loads_from_records(rec):
+    """
+    Create the loads from the load records
+    :param rec: record array of loads
+    :return: list of (PSSe bus number, Load)
+    """
+    if rec is None:
+        return list()
+
+    loads = list()
+    for i, idx, status, p, q in zip(rec['I'].tolist(), rec['ID'], rec['STATUS'].tolist(),
+                                    rec['PL'].tolist(), rec['QL'].tolist()):
+        name = str(i) + '_' + idx.strip()
+        loads.append((i, Load(name=name, idtag=name, active=bool(status), P=p, Q=q)))
+
+    return loads
+
+
+def get_shunts_from_records(rec):
+    """
+    Create the shunts from the fixed shunt records
+    :param rec: record array of fixed shunts
+    :return: list of (PSSe bus number, Shunt)
+    """
+    if rec is None:
+        return list()
+
+    shunts = list()
+    for i, idx, status, g, b in zip(rec['I'].tolist(), rec['ID'], rec['STATUS'].tolist(),
+                                    rec['GL'].tolist(), rec['BL'].tolist()):
+        name = str(i) + '_' + idx.strip()
+        shunts.append((i, Shunt(name=name, idtag=name, G=g, B=b, active=bool(status))))
+
+    return shunts
+
+
+def get_generators_from_records(rec):
+    """
+    Create the generators from the generator records
+    :param rec: record array of generators
+    :return: list of (PSSe bus number, Generator)
+    """
+    if rec is None:
+        return list()
+
+    generators = list()
+    for i, idx, pg, vs, qb, qt, mbase, pt, pb, stat in zip(rec['I'].tolist(), rec['ID'], rec['PG'].tolist(),
+                                                           rec['VS'].tolist(), rec['QB'].tolist(),
+                                                           rec['QT'].tolist(), rec['MBASE'].tolist(),
+                                                           rec['PT'].tolist(), rec['PB'].tolist(),
+                                                           rec['STAT'].tolist()):
+        name = str(i) + '_' + idx.strip()
+        generators.append((i, Generator(name=name, idtag=name, active_power=pg, voltage_module=vs, Qmin=qb,
+                                        Qmax=qt, Snom=mbase, p_max=pt, p_min=pb, active=bool(stat))))
+
+    return generators
+
+
+def get_lines_from_records(rec, psse_bus_dict):
+    """
+    Create the lines from the non-transformer branch records
+    :param rec: record array of branches
+    :param psse_bus_dict: Dictionary that relates PSSe bus indices with Newton Bus objects
+    :return: list of Line
+    """
+    if rec is None:
+        return list()
+
+    rate = np.max(np.c_[rec['RATEA'], rec['RATEB'], rec['RATEC']], axis=1)
+
+    lines = list()
+    for i, j, ckt, r, x, b, rt, st, length in zip(np.abs(rec['I']).tolist(), np.abs(rec['J']).tolist(), rec['CKT'],
+                                                  rec['R'].tolist(), rec['X'].tolist(), rec['B'].tolist(),
+                                                  rate.tolist(), rec['ST'].tolist(), rec['LEN'].tolist()):
+        name = str(i) + '_' + str(j) + '_' + ckt.strip()
+        lines.append(Line(bus_from=psse_bus_dict[i], bus_to=psse_bus_dict[j], idtag=name, name=name,
+                          r=r, x=x, b=b, rate=rt, active=bool(st), mttf=0, mttr=0, length=length))
+
+    return lines
+
+
 class PSSeParser:
 
     def __init__(self, file_name):
@@ -2144,49 +2458,6 @@ class PSSeParser:
         self.circuit.comments = 'Converted from the PSS/e .raw file ' \
                                 + os.path.basename(file_name) + '\n\n' + str(self.logger)
 
-    def read_and_split(self) -> (List[AnyStr], Dict[AnyStr, AnyStr]):
-        """
-        Read the text file and split it into sections
-        :return: list of sections, dictionary of sections by type
-        """
-
-        # make a guess of the file encoding
-        detection = chardet.detect(open(self.file_name, "rb").read())
-
-        # open the text file into a variable
-        txt = ''
-        with open(self.file_name, 'r', encoding=detection['encoding']) as my_file:
-            for line in my_file:
-                if line[0] != '@':
-                    txt += line
-
-        # split the text file into sections
-        sections = txt.split(' /')
-
-        sections_dict = dict()
-
-        str_a = 'End of'.lower()
-        str_b = 'data'.lower()
-
-        for i, sec in enumerate(sections):
-            data = sec.split('\n')
-            first = data.pop(0).lower()
-            if str_a in first:
-                if ',' in first:
-                    srch = first.split(',')[0]
-                else:
-                    srch = first
-                name = re.search(str_a + '(.*)' + str_b, srch).group(1).strip()
-                data2 = sections[i - 1].split('\n')[1:]
-
-                if name.lower() == 'bus':
-                    data2.pop(0)
-                    data2.pop(0)
-
-                sections_dict[name] = data2
-
-        return sections, sections_dict
-
     def parse_psse(self) -> (MultiCircuit, List[AnyStr]):
         """
         Parser implemented according to:
@@ -2199,10 +2470,10 @@ class PSSeParser:
 
         logger = Logger()
 
-        sections, sections_dict = self.read_and_split()
+        header, sections_dict = read_raw_sections(self.file_name)
 
         # header -> new grid
-        grid = PSSeGrid(interpret_line(sections[0]))
+        grid = PSSeGrid(interpret_line(strip_comment(header[0])))
 
         if grid.REV not in self.versions:
             logger.append('The PSSe version is not compatible. Compatible versions are:' + str(self.versions))
@@ -2210,7 +2481,21 @@ class PSSeParser:
         else:
             version = grid.REV
 
-        # declare contents:
+        # the single line records of the big tables are parsed in bulk into record arrays
+        for key, fields_by_version in RAW_RECORDS.items():
+
+            name = RAW_RECORDS_ALIAS.get(key, key)
+
+            if key in sections_dict.keys():
+                if version in fields_by_version.keys():
+                    grid.tables[name] = parse_records(sections_dict[key], fields_by_version[version], logger)
+                else:
+                    logger.append(key + ' not implemented for version ' + str(version))
+
+            elif name == key:
+                logger.append('"' + key + '" is not in the data')
+
+        # the rest of the records are parsed one by one
         # section_idx, objects_list, expected_data_length, ObjectT, lines per objects
 
         # SEQUENCE ORDER:
@@ -2237,14 +2522,8 @@ class PSSeParser:
         # 20: Q Record
 
         meta_data = dict()
-        meta_data['bus'] = [grid.buses, PSSeBus, 1]
-        meta_data['load'] = [grid.loads, PSSeLoad, 1]
-        meta_data['fixed shunt'] = [grid.shunts, PSSeShunt, 1]
-        meta_data['shunt'] = [grid.shunts, PSSeShunt, 1]
         meta_data['switched shunt'] = [grid.switched_shunts, PSSeSwitchedShunt, 1]
-        meta_data['generator'] = [grid.generators, PSSeGenerator, 1]
         meta_data['induction machine'] = [grid.generators, PSSeInductionMachine, 3]
-        meta_data['branch'] = [grid.lines, PSSeBranch, 1]
         meta_data['transformer'] = [grid.transformers, PSSeTransformer, 4]
         meta_data['two-terminal dc'] = [grid.hvdc_lines, PSSeTwoTerminalDCLine, 3]
         meta_data['vsc dc line'] = [grid.hvdc_lines, PSSeVscDCLine, 3]
@@ -2284,15 +2563,10 @@ class PSSeParser:
                         for k in range(lines_per_object2):
                             data.append(interpret_line(lines[l + k]))
 
-                        # pick the line that matches the object and split it by line returns \n
-                        # object_lines = line.split('\n')
-
                         # interpret each line of the object and store into data
                         # data is a vector of vectors with data definitions
                         # for the buses, branches, loads etc. data contains 1 vector,
                         # for the transformers data contains 4 vectors
-                        # data = [interpret_line(object_lines[k]) for k in range(lines_per_object)]
-
                         # pass the data to the according object to assign it to the matching variables
                         objects_list.append(ObjectT(data, version, logger))
 
@@ -2307,7 +2581,7 @@ class PSSeParser:
 
         # add logs for the non parsed objects
         for key in sections_dict.keys():
-            if key not in meta_data.keys():
+            if key not in meta_data.keys() and key not in RAW_RECORDS.keys():
                 logger.append(key + ' is not implemented in the parser.')
 
         return grid, logger
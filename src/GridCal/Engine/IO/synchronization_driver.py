@@ -14,7 +14,10 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import json
 import time
+import zipfile
+import pandas as pd
 from math import isclose
 from typing import List, Dict
 from PySide2.QtCore import QThread, Signal
@@ -23,6 +26,9 @@ from PySide2 import QtGui
 from GridCal.Engine.basic_structures import Logger, SyncIssueType
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.IO.pack_unpack import get_objects_dictionary, create_device_from_row
+from GridCal.Engine.IO.zip_interface import MANIFEST_NAME, get_row_fingerprints
+from GridCal.Engine.IO.generic_io_functions import parse_config_df
 from GridCal.Engine.Devices.editable_device import EditableDevice, DeviceType
 
 
@@ -236,6 +242,210 @@ def model_check(current_circuit: MultiCircuit, file_circuit: MultiCircuit):
     return issues, version_conflict
 
 
+# tables of the .gridcal files that are synchronized
+SYNC_TABLES = ['bus', 'load', 'static_generator', 'battery', 'generator', 'shunt', 'line', 'transformer2w', 'hvdc']
+
+
+def get_devices_index(circuit: MultiCircuit, key='idtag'):
+    """
+    Index of the devices of a circuit
+    :param circuit: MultiCircuit
+    :param key: property used as key (idtag or name)
+    :return: {DeviceType: {key: device}}
+    """
+    index = dict()
+    for template_elm in get_objects_dictionary().values():
+        if template_elm.device_type != DeviceType.BranchDevice:
+            index[template_elm.device_type] = {getattr(elm, key): elm
+                                               for elm in circuit.get_elements_by_type(template_elm.device_type)}
+    return index
+
+
+def issue_persists(issue: SyncIssue, index):
+    """
+    Check if an issue still applies to the current circuit
+    :param issue: SyncIssue
+    :param index: index of the devices of the current circuit by idtag {DeviceType: {idtag: device}}
+    :return: bool
+    """
+    if issue.issue_type == SyncIssueType.Conflict:
+        return issue.property_name in [prop for prop, v1, v2 in compare_devices(issue.my_elm, issue.their_elm)]
+
+    elif issue.issue_type == SyncIssueType.Added:
+        return issue.their_elm.idtag not in index[issue.device_type].keys()
+
+    elif issue.issue_type == SyncIssueType.Deleted:
+        return issue.my_elm.idtag in index[issue.device_type].keys()
+
+    else:
+        return True
+
+
+class ZipSyncState:
+
+    def __init__(self):
+        """
+        State of the incremental synchronization with a .gridcal file.
+        The file is only read when its modification time or size change, then only the tables whose
+        fingerprint (zip CRC and size) changed are parsed, and only their devices whose fingerprint changed are
+        compared. The local edits are therefore not compared against the rows of the file that did not change, unlike
+        model_check; instead, everything is compared again when the version of the local model changes (i.e. it was
+        saved), and the existing issues are dropped once they are solved locally.
+        """
+
+        # modification time and size of the file
+        self.file_stat = None
+
+        # {table name: (crc, size)}
+        self.table_fingerprints = dict()
+
+        # {table name: {idtag: row fingerprint}}
+        self.device_fingerprints = dict()
+
+        # {(table name, idtag): list of issues}
+        self.issues = dict()
+
+        self.model_version = 0
+
+        # version of the local model at the last synchronization
+        self.local_version = None
+
+    def file_changed(self, file_name):
+        """
+        Has the file changed since the last synchronization? (it only checks the file system)
+        :param file_name: name of the file
+        :return: bool
+        """
+        st = os.stat(file_name)
+        return (st.st_mtime_ns, st.st_size) != self.file_stat
+
+    def get_issues(self) -> List[SyncIssue]:
+        """
+        Get all the issues
+        :return: list of SyncIssue
+        """
+        issues = list()
+        for lst in self.issues.values():
+            issues += lst
+        return issues
+
+    def sync(self, circuit: MultiCircuit, file_name, logger: Logger):
+        """
+        Update the issues with the changes of the file
+        :param circuit: current circuit
+        :param file_name: .gridcal file name
+        :param logger: Logger
+        :return: list of the tables that changed
+        """
+        st = os.stat(file_name)
+        object_types = get_objects_dictionary()
+
+        if circuit.model_version != self.local_version:
+            # the local model was saved since the last synchronization: compare everything again
+            self.table_fingerprints = dict()
+            self.device_fingerprints = dict()
+            self.issues = dict()
+            self.local_version = circuit.model_version
+
+        with zipfile.ZipFile(file_name) as z:
+
+            tables = {os.path.splitext(info.filename)[0]: (info.CRC, info.file_size) for info in z.infolist()}
+            names = z.namelist()
+
+            if MANIFEST_NAME in names:
+                manifest = json.loads(z.read(MANIFEST_NAME))
+            else:
+                manifest = dict()
+
+            if 'config.csv' in names:
+                data = parse_config_df(pd.read_csv(z.open('config.csv'), index_col=0), dict())
+                self.model_version = int(data.get('ModelVersion', 0))
+
+            changed_tables = [name for name in SYNC_TABLES
+                              if tables.get(name, None) != self.table_fingerprints.get(name, None)]
+
+            for name in changed_tables:
+
+                template_elm = object_types[name]
+
+                if name + '.csv' in names:
+                    df = pd.read_csv(z.open(name + '.csv'))
+                else:
+                    df = pd.DataFrame(columns=['idtag'])
+
+                key = 'idtag' if 'idtag' in df.columns.values else 'name'
+                keys = df[key].values.astype(str)
+
+                # device fingerprints: stored in the file, or computed
+                if key == 'idtag' and name in manifest.get('devices', dict()):
+                    new_fp = manifest['devices'][name]
+                else:
+                    new_fp = dict(zip(keys, get_row_fingerprints(df)))
+
+                first_time = name not in self.device_fingerprints
+                old_fp = self.device_fingerprints.get(name, dict())
+                rows = {k: i for i, k in enumerate(keys)}
+
+                index = get_devices_index(circuit, key=key)
+                my_devices = index[template_elm.device_type]
+
+                # the devices added in the file can be referenced as well (i.e. the bus of a new load)
+                for lst in self.issues.values():
+                    for issue in lst:
+                        if issue.issue_type == SyncIssueType.Added:
+                            index[issue.device_type].setdefault(getattr(issue.their_elm, key), issue.their_elm)
+
+                # devices removed from the file
+                removed = [k for k in old_fp.keys() if k not in new_fp.keys()]
+                if first_time:
+                    removed += [k for k in my_devices.keys() if k not in new_fp.keys()]
+
+                for k in removed:
+                    self.issues.pop((name, k), None)
+                    if k in my_devices.keys():
+                        self.issues[(name, k)] = [SyncIssue(device_type=template_elm.device_type,
+                                                            issue_type=SyncIssueType.Deleted,
+                                                            property_name="",
+                                                            my_elm=my_devices[k],
+                                                            their_elm=None)]
+
+                # devices added or modified in the file
+                for k, fp in new_fp.items():
+
+                    if old_fp.get(k, None) == fp or k not in rows.keys():
+                        continue
+
+                    their_elm = create_device_from_row(template_elm, df, rows[k], index, logger)
+
+                    if k in my_devices.keys():
+                        my_elm = my_devices[k]
+                        self.issues[(name, k)] = [SyncIssue(device_type=my_elm.device_type,
+                                                            issue_type=SyncIssueType.Conflict,
+                                                            property_name=prop,
+                                                            my_elm=my_elm,
+                                                            their_elm=their_elm)
+                                                  for prop, val1, val2 in compare_devices(my_elm, their_elm)]
+                    else:
+                        self.issues[(name, k)] = [SyncIssue(device_type=their_elm.device_type,
+                                                            issue_type=SyncIssueType.Added,
+                                                            property_name="",
+                                                            my_elm=None,
+                                                            their_elm=their_elm)]
+
+                self.device_fingerprints[name] = new_fp
+                self.table_fingerprints[name] = tables.get(name, None)
+
+        # the issues of the devices that did not change in the file might have been solved on my side
+        index = get_devices_index(circuit)
+        for (name, k), lst in list(self.issues.items()):
+            if name not in changed_tables:
+                self.issues[(name, k)] = [issue for issue in lst if issue_persists(issue, index)]
+
+        self.file_stat = (st.st_mtime_ns, st.st_size)
+
+        return changed_tables
+
+
 def get_issues_tree_view_model(issues: List[SyncIssue]):
     """
     Get TreeView model of the issues
@@ -348,6 +558,55 @@ class FileSyncThread(QThread):
 
         self.__pause__ = False
 
+        self.sync_state = ZipSyncState()
+
+    def sync_zip(self):
+        """
+        Incremental synchronization with a .gridcal file: only the tables and devices that changed are compared
+        :return: did it sync?
+        """
+        if not self.sync_state.file_changed(self.file_name) and \
+                self.circuit.model_version == self.sync_state.local_version:
+            return False
+
+        try:
+            self.sync_state.sync(self.circuit, self.file_name, self.logger)
+        except (zipfile.BadZipFile, EOFError, KeyError, OSError, pd.errors.ParserError):
+            # the file is being written by another process, try again later
+            return False
+
+        self.issues = self.sync_state.get_issues()
+        self.version_conflict = (self.circuit.model_version + 1) <= self.sync_state.model_version
+        self.highest_version = max(self.circuit.model_version, self.sync_state.model_version)
+        return True
+
+    def sync_file(self, fopen: FileOpen):
+        """
+        Synchronization with the other file formats: the file is opened again if it changed
+        :param fopen: FileOpen instance
+        :return: did it sync?
+        """
+        if not self.sync_state.file_changed(self.file_name):
+            return False
+
+        st = os.stat(self.file_name)
+
+        # load the remote file
+        file_circuit = fopen.open(text_func=self.progress_text.emit,
+                                  progress_func=self.progress_signal.emit)
+
+        if file_circuit is not None:
+            # sync the models
+            self.issues, self.version_conflict = model_check(self.circuit, file_circuit)
+
+            self.highest_version = max(self.circuit.model_version, file_circuit.model_version)
+
+            self.sync_state.file_stat = (st.st_mtime_ns, st.st_size)
+            return True
+        else:
+            # the sync failed because the file was being used by another sync process
+            return False
+
     def run(self):
         """
         run the file save procedure
@@ -362,21 +621,14 @@ class FileSyncThread(QThread):
 
                 if os.path.exists(self.file_name):
 
-                    # load the remote file
-                    file_circuit = fopen.open(text_func=self.progress_text.emit,
-                                              progress_func=self.progress_signal.emit)
-
-                    if file_circuit is not None:
-                        # sync the models
-                        self.issues, self.version_conflict = model_check(self.circuit, file_circuit)
-
-                        self.highest_version = max(self.circuit.model_version, file_circuit.model_version)
+                    if zipfile.is_zipfile(self.file_name):
+                        synced = self.sync_zip()
+                    else:
+                        synced = self.sync_file(fopen)
 
+                    if synced:
                         # notify the external world that we did sync
                         self.sync_event.emit()
-                    else:
-                        # the sync failed because the file was being used by another sync process
-                        pass
 
                 else:
                     # the file disappeared!
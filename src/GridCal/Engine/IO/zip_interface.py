@@ -13,37 +13,130 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
+"""
+The .gridcal file is a zip file with:
+
+    - one csv file per device table (and config, time, tower_wires), read eagerly.
+    - one uncompressed .npy file per profile table with shape (n_objects, time), so that every profile is contiguous.
+    - manifest.json listing the binary entries, their shape and data type, and the fingerprint of every device
+      (a hash of its table row) by idtag, so that the changes can be located without comparing the devices.
+
+Since the .npy entries are stored without compression, they are memory mapped straight from the zip file when opening
+(copy on write), and their data is only read when it is used (i.e. by a time series study or by the profile editor).
+The files without manifest (only csv files) are still read.
+"""
+
 from io import StringIO
 import os
+import json
+import struct
 from random import randint, seed
+import numpy as np
 import pandas as pd
 import zipfile
-from typing import List, Dict
+from typing import List, Dict, Union
 
 from GridCal.Engine.IO.generic_io_functions import parse_config_df
 
 
-def save_data_frames_to_zip(dfs: Dict[str, pd.DataFrame], filename_zip="file.zip",
+MANIFEST_NAME = 'manifest.json'
+NATIVE_FORMAT_VERSION = 1
+
+
+def write_array_to_zip(myzip: zipfile.ZipFile, name, arr: np.ndarray):
+    """
+    Stream an array in the .npy format into an uncompressed zip entry
+    :param myzip: ZipFile open for writing
+    :param name: name of the entry
+    :param arr: numpy array
+    """
+    info = zipfile.ZipInfo(name)
+    info.compress_type = zipfile.ZIP_STORED
+    info.external_attr = 0o644 << 16
+
+    with myzip.open(info, 'w', force_zip64=True) as fp:
+        np.lib.format.write_array(fp, np.ascontiguousarray(arr), allow_pickle=arr.dtype.hasobject)
+
+
+def read_array_from_zip(file_name_zip, zip_file_pointer: zipfile.ZipFile, name, lazy=True):
+    """
+    Read an .npy entry of the zip file
+    :param file_name_zip: name of the zip file
+    :param zip_file_pointer: ZipFile open for reading
+    :param name: name of the entry
+    :param lazy: memory map the array if the entry is not compressed
+    :return: numpy array (np.memmap if lazy)
+    """
+    info = zip_file_pointer.getinfo(name)
+
+    if lazy and info.compress_type == zipfile.ZIP_STORED:
+
+        with open(file_name_zip, 'rb') as f:
+
+            # skip the local header of the entry
+            f.seek(info.header_offset)
+            header = f.read(30)
+            name_len, extra_len = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+
+            # read the .npy header
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            offset = f.tell()
+
+        if not dtype.hasobject:
+            if int(np.prod(shape)) == 0:
+                return np.zeros(shape, dtype=dtype)
+
+            return np.memmap(file_name_zip, dtype=dtype, mode='c', shape=shape, offset=offset,
+                             order='F' if fortran_order else 'C')
+
+    with zip_file_pointer.open(name) as fp:
+        return np.lib.format.read_array(fp, allow_pickle=True)
+
+
+def get_row_fingerprints(df: pd.DataFrame):
+    """
+    Get the fingerprint of every row of a table
+    :param df: DataFrame
+    :return: list of integers
+    """
+    return pd.util.hash_pandas_object(df, index=False).values.tolist()
+
+
+def save_data_frames_to_zip(dfs: Dict[str, Union[pd.DataFrame, np.ndarray]], filename_zip="file.zip",
                             text_func=None, progress_func=None):
     """
     Save a list of DataFrames to a zip file without saving to disk the csv files
-    :param dfs: dictionary of pandas dataFrames {name: DataFrame}
+    The arrays are saved as uncompressed .npy files listed in the manifest.
+    :param dfs: dictionary of pandas dataFrames or numpy arrays {name: DataFrame}
     :param filename_zip: file name where to save all
     :param text_func: pointer to function that prints the names
     :param progress_func: pointer to function that prints the progress 0~100
     """
 
     n = len(dfs)
+    manifest = {'format': 'GridCal', 'version': NATIVE_FORMAT_VERSION, 'arrays': dict(), 'devices': dict()}
+
+    # the file is written aside and then moved, so that a failure does not leave a broken file.
+    # The profiles memory mapped from the file being replaced must be released before (see release_memory_maps)
+    tmp_file_name = filename_zip + '.tmp'
 
     # open zip file for writing
-    with zipfile.ZipFile(filename_zip, 'w', zipfile.ZIP_DEFLATED) as myzip:
+    with zipfile.ZipFile(tmp_file_name, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as myzip:
 
         # for each DataFrame and name...
         i = 0
         for name, df in dfs.items():
 
-            # compose the csv file name
-            filename = name + ".csv"
+            if isinstance(df, np.ndarray):
+                filename = name + ".npy"
+            else:
+                # compose the csv file name
+                filename = name + ".csv"
 
             if text_func is not None:
                 text_func('Flushing ' + name + ' to ' + filename_zip + '...')
@@ -51,26 +144,41 @@ def save_data_frames_to_zip(dfs: Dict[str, pd.DataFrame], filename_zip="file.zip
             if progress_func is not None:
                 progress_func((i + 1) / n * 100)
 
-            # open a string buffer
-            with StringIO() as buffer:
+            if isinstance(df, np.ndarray):
 
-                # save the DataFrame to the buffer
-                df.to_csv(buffer, index=False)
+                write_array_to_zip(myzip, filename, df)
+                manifest['arrays'][name] = {'file': filename, 'shape': list(df.shape), 'dtype': df.dtype.str}
 
-                # save the buffer to the zip file
-                myzip.writestr(filename, buffer.getvalue())
+            else:
+                if 'idtag' in df.columns.values:
+                    manifest['devices'][name] = dict(zip(df['idtag'].values.astype(str),
+                                                         get_row_fingerprints(df)))
+
+                # open a string buffer
+                with StringIO() as buffer:
+
+                    # save the DataFrame to the buffer
+                    df.to_csv(buffer, index=False)
+
+                    # save the buffer to the zip file
+                    myzip.writestr(filename, buffer.getvalue())
 
             i += 1
 
+        myzip.writestr(MANIFEST_NAME, json.dumps(manifest))
+
+    os.replace(tmp_file_name, filename_zip)
+
     print('All DataFrames flushed to zip!')
 
 
-def open_data_frames_from_zip(file_name_zip, text_func=None, progress_func=None):
+def open_data_frames_from_zip(file_name_zip, text_func=None, progress_func=None, lazy_profiles=True):
     """
     Open the csv files from a zip file
     :param file_name_zip: name of the zip file
     :param text_func: pointer to function that prints the names
     :param progress_func: pointer to function that prints the progress 0~100
+    :param lazy_profiles: memory map the binary profiles instead of reading them
     :return: list of DataFrames
     """
 
@@ -82,6 +190,13 @@ def open_data_frames_from_zip(file_name_zip, text_func=None, progress_func=None)
 
     names = zip_file_pointer.namelist()
 
+    # binary entries
+    if MANIFEST_NAME in names:
+        manifest = json.loads(zip_file_pointer.read(MANIFEST_NAME))
+        arrays = {entry['file']: name for name, entry in manifest['arrays'].items()}
+    else:
+        arrays = dict()
+
     n = len(names)
     data = dict()
 
@@ -122,6 +237,13 @@ def open_data_frames_from_zip(file_name_zip, text_func=None, progress_func=None)
             # append the DataFrame to the list
             data[name] = df
 
+        elif file_name in arrays.keys():
+
+            data[arrays[file_name]] = read_array_from_zip(file_name_zip, zip_file_pointer, file_name,
+                                                          lazy=lazy_profiles)
+
+    zip_file_pointer.close()
+
     return data
 
 
@@ -3,11 +3,13 @@
 
 import numpy as np
 from numpy import angle, exp, r_, linalg, Inf, dot, zeros, conj
+import scipy.sparse as sp
 from scipy.sparse import hstack, vstack
-from scipy.sparse.linalg import spsolve
+from scipy.sparse.linalg import spsolve, splu
 from enum import Enum
 
-from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian, NRSolverContext
+from GridCal.Engine.Simulations.PowerFlow.high_speed_jacobian import dSbus_dV_numba_sparse, fill_J_data
 
 
 class VCStopAt(Enum):
@@ -753,10 +755,272 @@ def predictor(V, Ibus, lam, Ybus, Sxfr, pv, pq, step, z, Vprv, lamprv, parametri
     return V0, lam0, z
 
 
+class CpfSolverContext:
+    """
+    Solver context of the continuation power flow of an island.
+
+    The augmented Jacobian [[J, dF/dlam], [dP/dV, dP/dlam]] keeps the power flow Jacobian structure plus a full
+    border row and column, hence its sparsity pattern only depends on the Ybus structure and the pv and pq lists.
+    The pattern, the positions of every block in the data array and the fill-reducing column ordering are
+    computed once and shared by all the predictor and corrector steps (and by all the transfer directions);
+    every factorization only refreshes the numerical values.
+    """
+
+    def __init__(self):
+        """
+        CpfSolverContext constructor
+        """
+        self.nr = NRSolverContext()
+
+        self.nj = 0
+
+        # augmented Jacobian structure in CSR form and the positions of the blocks in the data array
+        self.Ap = None
+        self.Aj = None
+        self.Ax = None
+        self.pos_J = None
+        self.pos_col = None
+        self.pos_row = None
+
+        # column-permuted CSC structure used by the factorization
+        self.csc_indices = None
+        self.csc_indptr = None
+        self.csc_map = None
+        self.col_order = None
+
+        self.lu = None
+
+        # statistics
+        self.n_analysis = 0
+        self.n_factorizations = 0
+
+    def update(self, Ybus, pv, pq):
+        """
+        Refresh the structure only if needed
+        :param Ybus: Admittance matrix
+        :param pv: Array with the indices of the PV buses
+        :param pq: Array with the indices of the PQ buses
+        """
+        if not self.nr.is_valid(Ybus, pv, pq):
+            self.analyze(Ybus, pv, pq)
+        else:
+            self.nr.Ybus = Ybus
+
+    def analyze(self, Ybus, pv, pq):
+        """
+        Compute the augmented Jacobian structure
+        :param Ybus: Admittance matrix
+        :param pv: Array with the indices of the PV buses
+        :param pq: Array with the indices of the PQ buses
+        """
+        self.nr.analyze(Ybus, pv, pq)
+        Jp = self.nr.Jp
+        nj = len(Jp) - 1
+
+        # every row of J gets the lambda column at the end, and the parametrization row is full
+        counts = np.r_[np.diff(Jp) + 1, nj + 1]
+        self.Ap = np.r_[0, np.cumsum(counts)]
+        nnz = self.Ap[-1]
+
+        rows = np.repeat(np.arange(nj), np.diff(Jp))
+        self.pos_J = np.arange(len(self.nr.Jj)) + rows
+        self.pos_col = self.Ap[1:nj + 1] - 1
+        self.pos_row = np.arange(self.Ap[nj], nnz)
+
+        self.Aj = np.empty(nnz, dtype=int)
+        self.Aj[self.pos_J] = self.nr.Jj
+        self.Aj[self.pos_col] = nj
+        self.Aj[self.pos_row] = np.arange(nj + 1)
+        self.Ax = np.zeros(nnz)
+        self.nj = nj
+
+        # the ordering is computed with the first numerical factorization
+        self.col_order = None
+        self.lu = None
+
+        self.n_analysis += 1
+
+    def set_column_ordering(self, col_order):
+        """
+        Store the fill-reducing column ordering and the matching column-permuted CSC structure
+        :param col_order: column ordering
+        """
+        dim = self.nj + 1
+        nnz = len(self.Aj)
+        positions = sp.csr_matrix((np.arange(1, nnz + 1), self.Aj, self.Ap), shape=(dim, dim))
+        positions = positions.tocsc()[:, col_order].tocsc()
+        positions.sort_indices()
+        self.csc_indices = positions.indices
+        self.csc_indptr = positions.indptr
+        self.csc_map = positions.data - 1
+        self.col_order = col_order
+
+    def factorize(self, V, Ibus, dF_dlam, dP_dV, dP_dlam):
+        """
+        Compute the augmented Jacobian values and factorize it
+        :param V: Voltages array
+        :param Ibus: Array of nodal current injections
+        :param dF_dlam: derivative of the mismatch w.r.t. lambda (nj)
+        :param dP_dV: derivative of the parametrization function w.r.t. the voltages (nj)
+        :param dP_dlam: derivative of the parametrization function w.r.t. lambda
+        """
+        Ybus = self.nr.Ybus
+        Ibuf = -np.array(Ibus, dtype=complex)
+        dVm_x, dVa_x = dSbus_dV_numba_sparse(Ybus.data, Ybus.indptr, Ybus.indices, V, V / np.abs(V), Ibuf)
+        fill_J_data(dVm_x, dVa_x, self.nr.Jsrc, self.nr.Jkind, self.nr.Jx)
+
+        self.Ax[self.pos_J] = self.nr.Jx
+        self.Ax[self.pos_col] = dF_dlam
+        self.Ax[self.pos_row[:self.nj]] = dP_dV
+        self.Ax[self.pos_row[self.nj]] = dP_dlam
+
+        dim = self.nj + 1
+
+        if self.col_order is None:
+            # first factorization: compute the ordering
+            A = sp.csr_matrix((self.Ax, self.Aj, self.Ap), shape=(dim, dim)).tocsc()
+            lu = splu(A, permc_spec='COLAMD')
+            self.set_column_ordering(np.argsort(lu.perm_c))
+
+        Ac = sp.csc_matrix((self.Ax[self.csc_map], self.csc_indices, self.csc_indptr), shape=(dim, dim))
+        self.lu = splu(Ac, permc_spec='NATURAL')
+        self.n_factorizations += 1
+
+    def solve(self, rhs):
+        """
+        Solve A x = rhs with the stored factorization
+        :param rhs: right hand side
+        :return: solution
+        """
+        y = self.lu.solve(rhs)
+        x = np.empty_like(y)
+        x[self.col_order] = y
+        return x
+
+
+def predictor_cached(context: CpfSolverContext, V, Ibus, lam, Sxfr, pv, pq, step, z, Vprv, lamprv,
+                     parametrization: VCParametrization):
+    """
+    Same as predictor, using the structure and ordering stored in the solver context
+    :param context: CpfSolverContext instance (updated with the island structure)
+    :param V: complex bus voltage vector at current solution
+    :param Ibus:
+    :param lam: scalar lambda value at current solution
+    :param Sxfr: complex vector of scheduled transfers (difference between bus injections in base and target cases)
+    :param pv: vector of indices of PV buses
+    :param pq: vector of indices of PQ buses
+    :param step: continuation step length
+    :param z: normalized tangent prediction vector from previous step
+    :param Vprv: complex bus voltage vector at previous solution
+    :param lamprv: scalar lambda value at previous solution
+    :param parametrization: Value of cpf parametrization option.
+    :return: V0 : predicted complex bus voltage vector
+             LAM0 : predicted lambda continuation parameter
+             Z : the normalized tangent prediction vector
+    """
+    nb = len(V)
+    npv = len(pv)
+    npq = len(pq)
+    pvpq = r_[pv, pq]
+
+    dF_dlam = -r_[Sxfr[pvpq].real, Sxfr[pq].imag]
+    dP_dV, dP_dlam = cpf_p_jac(parametrization, z, V, lam, Vprv, lamprv, pv, pq, pvpq)
+    context.factorize(V, Ibus, dF_dlam, dP_dV, dP_dlam)
+
+    # compute normalized tangent predictor, increasing in the direction of lambda
+    s = np.zeros(npv + 2 * npq + 1)
+    s[npv + 2 * npq] = 1
+    z[r_[pvpq, nb + pq, 2 * nb]] = context.solve(s)
+    z /= linalg.norm(z)
+
+    # prediction for next step
+    Va0 = np.angle(V)
+    Vm0 = np.abs(V)
+    Va0[pvpq] += step * z[pvpq]
+    Vm0[pq] += step * z[nb + pq]
+    lam0 = lam + step * z[2 * nb]
+    V0 = Vm0 * exp(1j * Va0)
+
+    return V0, lam0, z
+
+
+def corrector_cached(context: CpfSolverContext, Ybus, Ibus, Sbus, V0, pv, pq, lam0, Sxfr, Vprv, lamprv, z, step,
+                     parametrization, tol, max_it):
+    """
+    Same as corrector, using the structure and ordering stored in the solver context
+    :param context: CpfSolverContext instance (updated with the island structure)
+    :param Ybus: Admittance matrix (CSC sparse)
+    :param Ibus: Bus current injections
+    :param Sbus: Bus power injections
+    :param V0:  Bus initial voltages
+    :param pv: list of pv nodes
+    :param pq: list of pq nodes
+    :param lam0: initial value of lambda (loading parameter)
+    :param Sxfr: [delP+j*delQ] transfer/loading vector for all buses
+    :param Vprv: final complex V corrector solution from previous continuation step
+    :param lamprv: final lambda corrector solution from previous continuation step
+    :param z: normalized predictor for all buses
+    :param step: continuation step size
+    :param parametrization:
+    :param tol:
+    :param max_it:
+    :return: V, CONVERGED, I, LAM, normF
+    """
+    npv = len(pv)
+    npq = len(pq)
+    pvpq = r_[pv, pq]
+    nj = npv + 2 * npq
+
+    V = V0
+    Va = angle(V)
+    Vm = np.abs(V)
+    lam = lam0
+
+    dF_dlam = -r_[Sxfr[pvpq].real, Sxfr[pq].imag]
+
+    # evaluate F(x0, lam0), including Sxfr transfer/loading, augmented with P(x0, lambda0)
+    mismatch = V * np.conj(Ybus * V) - Sbus - lam * Sxfr
+    P = cpf_p(parametrization, step, z, V, lam, Vprv, lamprv, pv, pq, pvpq)
+    F = r_[mismatch[pvpq].real, mismatch[pq].imag, P]
+    normF = linalg.norm(F, Inf)
+    converged = normF < tol
+
+    i = 0
+    while not converged and i < max_it:
+        i += 1
+
+        dP_dV, dP_dlam = cpf_p_jac(parametrization, z, V, lam, Vprv, lamprv, pv, pq, pvpq)
+        context.factorize(V, Ibus, dF_dlam, dP_dV, dP_dlam)
+        dx = -context.solve(F)
+
+        # update voltage
+        Va[pvpq] += dx[:npv + npq]
+        Vm[pq] += dx[npv + npq:nj]
+
+        # update Vm and Va again in case we wrapped around with a negative Vm
+        V = Vm * exp(1j * Va)
+        Vm = np.abs(V)
+        Va = angle(V)
+
+        # update lambda
+        lam += dx[nj]
+
+        # evaluate F(x, lam) and P(x, lambda)
+        mismatch = V * conj(Ybus * V) - Sbus - lam * Sxfr
+        P = cpf_p(parametrization, step, z, V, lam, Vprv, lamprv, pv, pq, pvpq)
+        F = r_[mismatch[pvpq].real, mismatch[pq].imag, P]
+
+        normF = linalg.norm(F, Inf)
+        converged = normF < tol
+
+    return V, converged, i, lam, normF
+
+
 def continuation_nr(Ybus, Ibus_base, Ibus_target, Sbus_base, Sbus_target, V, pv, pq, step,
                     approximation_order: VCParametrization,
                     adapt_step, step_min, step_max, error_tol=1e-3, tol=1e-6, max_it=20,
-                    stop_at=VCStopAt.Nose, verbose=False, call_back_fx=None):
+                    stop_at=VCStopAt.Nose, verbose=False, call_back_fx=None, context: CpfSolverContext = None,
+                    max_steps=1000):
     """
     Runs a full AC continuation power flow using a normalized tangent
     predictor and selected approximation_order scheme.
@@ -779,7 +1043,9 @@ def continuation_nr(Ybus, Ibus_base, Ibus_target, Sbus_base, Sbus_target, V, pv,
     :param stop_at:  Value of Lambda to stop at. It can be a number or {'NOSE', 'FULL'}
     :param verbose: Display additional intermediate information?
     :param call_back_fx: Function to call on every iteration passing the lambda parameter
-    :return: Voltage_series: List of all the voltage solutions from the base to the target
+    :param context: CpfSolverContext to reuse (i.e. among transfer directions), a new one is used if None
+    :param max_steps: maximum number of continuation steps
+    :return: Voltage_series: Array of all the voltage solutions from the base to the target (steps, buses)
              Lambda_series: Lambda values used in the continuation
 
 
@@ -815,53 +1081,58 @@ def continuation_nr(Ybus, Ibus_base, Ibus_target, Sbus_base, Sbus_target, V, pv,
     z = zeros(2 * nb + 1)
     z[2 * nb] = 1.0
 
+    # the augmented Jacobian structure is shared by the predictor and the corrector
+    if context is None:
+        context = CpfSolverContext()
+    context.update(Ybus, pv, pq)
+
     # result arrays
-    voltage_series = list()
-    lambda_series = list()
+    voltage_series = np.zeros((max_steps, nb), dtype=complex)
+    lambda_series = np.zeros(max_steps)
 
     # Simulation
-    while continuation:
-        cont_steps += 1
+    while continuation and cont_steps < max_steps:
 
         # prediction for next step
-        V0, lam0, z = predictor(V=V,
-                                Ibus=Ibus_base,
-                                lam=lam,
-                                Ybus=Ybus,
-                                Sxfr=Sxfr,
-                                pv=pv,
-                                pq=pq,
-                                step=step,
-                                z=z,
-                                Vprv=V_prev,
-                                lamprv=lam_prev,
-                                parametrization=approximation_order)
+        V0, lam0, z = predictor_cached(context=context,
+                                       V=V,
+                                       Ibus=Ibus_base,
+                                       lam=lam,
+                                       Sxfr=Sxfr,
+                                       pv=pv,
+                                       pq=pq,
+                                       step=step,
+                                       z=z,
+                                       Vprv=V_prev,
+                                       lamprv=lam_prev,
+                                       parametrization=approximation_order)
 
         # save previous voltage, lambda before updating
         V_prev = V.copy()
         lam_prev = lam
 
         # correction
-        V, success, i, lam, normF = corrector(Ybus=Ybus,
-                                              Ibus=Ibus_base,
-                                              Sbus=Sbus_base,
-                                              V0=V0,
-                                              pv=pv,
-                                              pq=pq,
-                                              lam0=lam0,
-                                              Sxfr=Sxfr,
-                                              Vprv=V_prev,
-                                              lamprv=lam_prev,
-                                              z=z,
-                                              step=step,
-                                              parametrization=approximation_order,
-                                              tol=tol,
-                                              max_it=max_it,
-                                              verbose=verbose)
+        V, success, i, lam, normF = corrector_cached(context=context,
+                                                     Ybus=Ybus,
+                                                     Ibus=Ibus_base,
+                                                     Sbus=Sbus_base,
+                                                     V0=V0,
+                                                     pv=pv,
+                                                     pq=pq,
+                                                     lam0=lam0,
+                                                     Sxfr=Sxfr,
+                                                     Vprv=V_prev,
+                                                     lamprv=lam_prev,
+                                                     z=z,
+                                                     step=step,
+                                                     parametrization=approximation_order,
+                                                     tol=tol,
+                                                     max_it=max_it)
 
         # store series values
-        voltage_series.append(V)
-        lambda_series.append(lam)
+        voltage_series[cont_steps, :] = V
+        lambda_series[cont_steps] = lam
+        cont_steps += 1
 
         if success:
 
@@ -928,7 +1199,7 @@ def continuation_nr(Ybus, Ibus_base, Ibus_target, Sbus_base, Sbus_target, V, pv,
             if verbose:
                 print('step ', cont_steps, ' : lambda = ', lam, ', corrector did not converge in ', i, ' iterations\n')
 
-    return voltage_series, lambda_series, normF, success
+    return voltage_series[:cont_steps].copy(), lambda_series[:cont_steps].copy(), normF, success
 
 
 if __name__ == '__main__':
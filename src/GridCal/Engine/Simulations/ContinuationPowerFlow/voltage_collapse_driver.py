@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
+import multiprocessing
 import pandas as pd
 import numpy as np
 import json
@@ -23,7 +24,8 @@ from PySide2.QtCore import QThread, Signal
 from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowResults
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import power_flow_post_process, PowerFlowOptions
 from GridCal.Engine.Simulations.result_types import ResultTypes
-from GridCal.Engine.Simulations.ContinuationPowerFlow.continuation_power_flow import continuation_nr, VCStopAt, VCParametrization
+from GridCal.Engine.Simulations.ContinuationPowerFlow.continuation_power_flow import continuation_nr, VCStopAt, \
+    VCParametrization, CpfSolverContext
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
 from GridCal.Engine.plot_config import LINEWIDTH
@@ -38,7 +40,8 @@ from GridCal.Gui.GuiFunctions import ResultsModel
 class VoltageCollapseOptions:
 
     def __init__(self, step=0.01, approximation_order=VCParametrization.Natural, adapt_step=True, step_min=0.0001,
-                 step_max=0.2, error_tol=1e-3, tol=1e-6, max_it=20, stop_at=VCStopAt.Nose, verbose=False):
+                 step_max=0.2, error_tol=1e-3, tol=1e-6, max_it=20, stop_at=VCStopAt.Nose, verbose=False,
+                 max_steps=1000):
         """
         Voltage collapse options
         @param step: Step length
@@ -51,6 +54,7 @@ class VoltageCollapseOptions:
         @param max_it: Maximum number of iterations
         @param stop_at: Value of lambda to stop at, it can be specified by a concept namely NOSE to sto at the edge or
         FULL tp draw the full curve
+        @param max_steps: Maximum number of continuation steps
         """
 
         self.step = step
@@ -73,6 +77,8 @@ class VoltageCollapseOptions:
 
         self.verbose = verbose
 
+        self.max_steps = max_steps
+
 
 class VoltageCollapseInput:
 
@@ -321,7 +327,8 @@ class VoltageCollapse(QThread):
                                                  max_it=self.options.max_it,
                                                  stop_at=self.options.stop_at,
                                                  verbose=False,
-                                                 call_back_fx=self.progress_callback)
+                                                 call_back_fx=self.progress_callback,
+                                                 max_steps=self.options.max_steps)
 
                 # nbus can be zero, because all the arrays are going to be overwritten
                 res = VoltageCollapseResults(nbus=numerical_island.nbus,
@@ -371,3 +378,336 @@ class VoltageCollapse(QThread):
         self.progress_text.emit('Cancelled!')
         self.done_signal.emit()
 
+
+
+########################################################################################################################
+# Multi-direction voltage collapse
+########################################################################################################################
+
+
+def get_transfer_target(Sbase, source_idx, sink_idx, power):
+    """
+    Get the target injections of a transfer between two groups of buses (i.e. two areas)
+    :param Sbase: array of base injections
+    :param source_idx: indices of the buses that increase their injection
+    :param sink_idx: indices of the buses that decrease their injection
+    :param power: power transferred (in the units of Sbase), shared equally among the buses of each group
+    :return: array of target injections
+    """
+    Starget = np.array(Sbase, dtype=complex)
+    Starget[source_idx] += power / len(source_idx)
+    Starget[sink_idx] -= power / len(sink_idx)
+    return Starget
+
+
+class CpfIsland:
+
+    def __init__(self, Ybus, Ibus, pv, pq, original_bus_idx):
+        """
+        Minimal island data needed by the continuation power flow (cheap to send to other processes)
+        :param Ybus: Admittance matrix
+        :param Ibus: Array of current injections
+        :param pv: Array of pv bus indices
+        :param pq: Array of pq bus indices
+        :param original_bus_idx: indices of the island buses in the complete circuit
+        """
+        self.Ybus = Ybus
+        self.Ibus = Ibus
+        self.pv = pv
+        self.pq = pq
+        self.original_bus_idx = original_bus_idx
+
+
+def run_cpf_direction(island: CpfIsland, context: CpfSolverContext, options: VoltageCollapseOptions,
+                      Sbase, Starget, V0, keep_curves=False):
+    """
+    Run the continuation power flow of an island in one transfer direction and reduce the curve
+    :param island: CpfIsland instance
+    :param context: CpfSolverContext of the island
+    :param options: VoltageCollapseOptions instance
+    :param Sbase: base injections of the island buses
+    :param Starget: target injections of the island buses
+    :param V0: base voltage of the island buses
+    :param keep_curves: return the voltage magnitudes of every step
+    :return: lambdas, minimum voltage module per step, voltage at the maximum lambda, voltage modules (or None),
+             error, converged
+    """
+    voltages, lambdas, normF, success = continuation_nr(Ybus=island.Ybus,
+                                                        Ibus_base=island.Ibus,
+                                                        Ibus_target=island.Ibus,
+                                                        Sbus_base=Sbase,
+                                                        Sbus_target=Starget,
+                                                        V=V0,
+                                                        pv=island.pv,
+                                                        pq=island.pq,
+                                                        step=options.step,
+                                                        approximation_order=options.approximation_order,
+                                                        adapt_step=options.adapt_step,
+                                                        step_min=options.step_min,
+                                                        step_max=options.step_max,
+                                                        error_tol=options.error_tol,
+                                                        tol=options.tol,
+                                                        max_it=options.max_it,
+                                                        stop_at=options.stop_at,
+                                                        verbose=False,
+                                                        context=context,
+                                                        max_steps=options.max_steps)
+    if len(lambdas) == 0:
+        return lambdas, lambdas, V0, None, normF, success
+
+    vm = np.abs(voltages)
+    v_nose = voltages[np.argmax(lambdas), :]
+    curves = vm.astype(np.float32) if keep_curves else None
+
+    return lambdas, vm.min(axis=1), v_nose, curves, normF, success
+
+
+# context of the worker processes
+__cpf_islands__ = None
+__cpf_contexts__ = dict()
+__cpf_options__ = None
+
+
+def init_cpf_worker(islands, options: VoltageCollapseOptions):
+    """
+    Initialize the context of a worker process
+    :param islands: list of CpfIsland
+    :param options: VoltageCollapseOptions instance
+    """
+    global __cpf_islands__, __cpf_contexts__, __cpf_options__
+    __cpf_islands__ = islands
+    __cpf_contexts__ = dict()
+    __cpf_options__ = options
+
+
+def cpf_worker(args):
+    """
+    Run a direction of an island in a worker process, the island solver context is reused among directions
+    :param args: tuple (island index, direction index, Sbase, Starget, V0, keep_curves)
+    :return: island index, direction index and the output of run_cpf_direction
+    """
+    i, d, Sbase, Starget, V0, keep_curves = args
+    if i not in __cpf_contexts__:
+        __cpf_contexts__[i] = CpfSolverContext()
+    res = run_cpf_direction(__cpf_islands__[i], __cpf_contexts__[i], __cpf_options__, Sbase, Starget, V0,
+                            keep_curves)
+    return (i, d) + res
+
+
+class VoltageCollapseMultiDirectionResults:
+
+    def __init__(self, n_dir, nbus, max_steps, bus_names, direction_names, keep_curves=False):
+        """
+        Results of the continuation power flow in many transfer directions.
+        The curves are stored in arrays padded with NaN after the last step of every direction.
+        For every direction, the curve of the island with the lowest maximum lambda is kept.
+        :param n_dir: number of directions
+        :param nbus: number of buses
+        :param max_steps: maximum number of continuation steps
+        :param bus_names: array of bus names
+        :param direction_names: array of direction names
+        :param keep_curves: store the voltage modules of every step
+        """
+        self.name = 'Voltage collapse (multi direction)'
+
+        self.bus_names = bus_names
+        self.direction_names = direction_names
+
+        self.lambdas = np.full((n_dir, max_steps), np.nan)
+        self.vmin = np.full((n_dir, max_steps), np.nan)
+        self.n_steps = np.zeros(n_dir, dtype=int)
+
+        self.max_lambda = np.full(n_dir, np.inf)
+        self.voltage_nose = np.zeros((n_dir, nbus), dtype=complex)
+        self.error = np.zeros(n_dir)
+        self.converged = np.ones(n_dir, dtype=bool)
+
+        self.vm_curves = np.full((n_dir, max_steps, nbus), np.nan, dtype=np.float32) if keep_curves else None
+
+    def apply_from_island(self, d, bus_idx, lambdas, vmin, v_nose, curves, error, converged):
+        """
+        Apply the results of an island in a direction
+        :param d: direction index
+        :param bus_idx: original indices of the island buses
+        :param lambdas: array of lambda values of every step
+        :param vmin: array of minimum voltage module of every step
+        :param v_nose: voltage at the maximum lambda
+        :param curves: voltage modules (steps, island buses) or None
+        :param error: error
+        :param converged: converged?
+        """
+        n = len(lambdas)
+        self.voltage_nose[d, bus_idx] = v_nose
+        self.error[d] = max(self.error[d], error)
+        self.converged[d] &= bool(converged)
+
+        if n == 0:
+            return
+
+        if curves is not None and self.vm_curves is not None:
+            self.vm_curves[d, :n, bus_idx] = curves.T
+
+        lam_max = lambdas.max()
+        if lam_max < self.max_lambda[d]:
+            # this island limits the transfer
+            self.max_lambda[d] = lam_max
+            self.lambdas[d, :] = np.nan
+            self.vmin[d, :] = np.nan
+            self.lambdas[d, :n] = lambdas
+            self.vmin[d, :n] = vmin
+            self.n_steps[d] = n
+
+    def get_critical_bus(self):
+        """
+        Get the index of the bus with the lowest voltage at the maximum loading of every direction
+        """
+        vm = np.abs(self.voltage_nose)
+        vm[vm == 0] = np.inf
+        return np.argmin(vm, axis=1)
+
+    def get_margins_df(self):
+        """
+        Get DataFrame with the loadability margin of every direction
+        """
+        critical = self.get_critical_bus()
+        vm = np.abs(self.voltage_nose)[np.arange(len(critical)), critical]
+        data = {'Max lambda': self.max_lambda,
+                'Critical bus': self.bus_names[critical],
+                'Critical voltage (p.u.)': vm,
+                'Steps': self.n_steps,
+                'Converged': self.converged}
+        return pd.DataFrame(data=data, index=self.direction_names)
+
+
+class VoltageCollapseMultiDirection(QThread):
+    progress_signal = Signal(float)
+    progress_text = Signal(str)
+    done_signal = Signal()
+    name = 'Voltage Stability (multi direction)'
+
+    def __init__(self, circuit: MultiCircuit, options: VoltageCollapseOptions, Vbase, Sbase, Stargets,
+                 pf_options: PowerFlowOptions, direction_names=None, use_multiprocessing=False, keep_curves=False):
+        """
+        Continuation power flow in many transfer directions (i.e. one per area pair).
+        The circuit is compiled once, the directions run in a process pool and every process reuses the
+        solver context (augmented Jacobian structure and ordering) of each island among its directions.
+        :param circuit: MultiCircuit instance
+        :param options: VoltageCollapseOptions instance
+        :param Vbase: array of base voltages (solved power flow)
+        :param Sbase: array of base injections (solved power flow)
+        :param Stargets: array of target injections (directions, buses)
+        :param pf_options: PowerFlowOptions instance
+        :param direction_names: names of the directions
+        :param use_multiprocessing: run the directions in parallel processes
+        :param keep_curves: store the voltage modules of every step and direction
+        """
+        QThread.__init__(self)
+
+        self.circuit = circuit
+
+        self.options = options
+
+        self.Vbase = Vbase
+
+        self.Sbase = Sbase
+
+        self.Stargets = np.atleast_2d(Stargets)
+
+        self.pf_options = pf_options
+
+        n_dir = self.Stargets.shape[0]
+        if direction_names is None:
+            direction_names = np.array(['Direction ' + str(d) for d in range(n_dir)], dtype=object)
+        self.direction_names = direction_names
+
+        self.use_multiprocessing = use_multiprocessing
+
+        self.keep_curves = keep_curves
+
+        self.results = None
+
+        self.__cancel__ = False
+
+    def get_islands(self):
+        """
+        Compile the circuit and get the islands with slack
+        :return: number of buses, bus names, list of CpfIsland
+        """
+        numerical_circuit = compile_snapshot_circuit(circuit=self.circuit,
+                                                     apply_temperature=self.pf_options.apply_temperature_correction,
+                                                     branch_tolerance_mode=self.pf_options.branch_impedance_tolerance_mode)
+
+        islands = list()
+        for island in split_into_islands(numeric_circuit=numerical_circuit,
+                                         ignore_single_node_islands=self.pf_options.ignore_single_node_islands):
+            if len(island.vd) > 0:
+                islands.append(CpfIsland(Ybus=island.Ybus, Ibus=island.Ibus, pv=island.pv, pq=island.pq,
+                                         original_bus_idx=island.original_bus_idx))
+
+        return numerical_circuit.nbus, numerical_circuit.bus_names, islands
+
+    def run(self):
+        """
+        Run the continuation power flow of all the directions
+        """
+        self.__cancel__ = False
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Compiling...')
+
+        nbus, bus_names, islands = self.get_islands()
+        n_dir = self.Stargets.shape[0]
+
+        self.results = VoltageCollapseMultiDirectionResults(n_dir=n_dir,
+                                                            nbus=nbus,
+                                                            max_steps=self.options.max_steps,
+                                                            bus_names=bus_names,
+                                                            direction_names=self.direction_names,
+                                                            keep_curves=self.keep_curves)
+
+        # the islands without transfer in a direction are skipped
+        tasks = list()
+        for i, island in enumerate(islands):
+            b = island.original_bus_idx
+            for d in range(n_dir):
+                if np.any(self.Stargets[d, b] != self.Sbase[b]):
+                    tasks.append((i, d, self.Sbase[b], self.Stargets[d, b], self.Vbase[b], self.keep_curves))
+
+        def apply(res):
+            i, d, lambdas, vmin, v_nose, curves, error, converged = res
+            self.results.apply_from_island(d, islands[i].original_bus_idx, lambdas, vmin, v_nose, curves,
+                                           error, converged)
+
+        self.progress_text.emit('Running ' + str(len(tasks)) + ' continuation power flows...')
+
+        if self.use_multiprocessing:
+            pool = multiprocessing.Pool(multiprocessing.cpu_count(), initializer=init_cpf_worker,
+                                        initargs=(islands, self.options))
+            for k, res in enumerate(pool.imap_unordered(cpf_worker, tasks)):
+                apply(res)
+                self.progress_signal.emit((k + 1) / len(tasks) * 100.0)
+                if self.__cancel__:
+                    break
+            if self.__cancel__:
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+        else:
+            init_cpf_worker(islands, self.options)
+            for k, task in enumerate(tasks):
+                if self.__cancel__:
+                    break
+                apply(cpf_worker(task))
+                self.progress_signal.emit((k + 1) / len(tasks) * 100.0)
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Done!')
+        self.done_signal.emit()
+
+    def cancel(self):
+        """
+        Cancel the simulation
+        """
+        self.__cancel__ = True
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Cancelled!')
@@ -0,0 +1,393 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Batched integrator of the 4th order synchronous machines.
+
+The states of all the machines are kept in one contiguous array x (4, ng) with the rows Eqp, Edp, omega and delta.
+Every step is an implicit trapezoidal step solved by fixed point iterations on the states and the network voltages,
+where the network is solved with the LU factorization of (Ybus + Yshunt), which is only computed again when an
+event changes the topology (bus faults and branch switching).
+"""
+
+import math
+import numba as nb
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+
+
+EQP = 0
+EDP = 1
+OMEGA = 2
+DELTA = 3
+
+
+@nb.njit("Tuple((f8[:], f8[:], f8[:], c16[:]))(f8[:, :], c16[:], f8[:], f8[:], f8[:], b1[:])")
+def sm4_currents(x, vt, Ra, Xdp, Xqp, speed_volt):
+    """
+    Compute the currents and the electrical power of the 4th order synchronous machines
+    :param x: states (4, ng)
+    :param vt: terminal voltages (ng)
+    :param Ra: armature resistance (ng)
+    :param Xdp: d-axis transient reactance (ng)
+    :param Xqp: q-axis transient reactance (ng)
+    :param speed_volt: include the speed-voltage term? (ng)
+    :return: Id, Iq, P, current injection in the network reference frame (ng)
+    """
+    ng = x.shape[1]
+    Id = np.empty(ng)
+    Iq = np.empty(ng)
+    P = np.empty(ng)
+    In = np.empty(ng, dtype=nb.complex128)
+
+    for i in range(ng):
+        Eqp = x[0, i]
+        Edp = x[1, i]
+        delta = x[3, i]
+
+        vm = abs(vt[i])
+        va = math.atan2(vt[i].imag, vt[i].real)
+
+        # terminal voltage in the dq reference frame
+        Vd = vm * math.sin(delta - va)
+        Vq = vm * math.cos(delta - va)
+
+        if speed_volt[i]:
+            w = x[2, i]
+        else:
+            w = 1.0
+
+        # Norton equivalent current in the dq frame
+        Id[i] = (Eqp - Ra[i] / (Xqp[i] * w) * (Vd - Edp) - Vq / w) / (Xdp[i] + Ra[i] * Ra[i] / (w * w * Xqp[i]))
+        Iq[i] = (Vd / w + Ra[i] * Id[i] / w - Edp) / Xqp[i]
+
+        P[i] = (Vd + Ra[i] * Id[i]) * Id[i] + (Vq + Ra[i] * Iq[i]) * Iq[i]
+
+        # (Iq - j Id) exp(j delta)
+        In[i] = complex(Iq[i], -Id[i]) * complex(math.cos(delta), math.sin(delta))
+
+    return Id, Iq, P, In
+
+
+@nb.njit("f8[:, :](f8[:, :], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:])")
+def sm4_derivatives(x, Id, Iq, P, Vfd, Pm, H, Xd, Xdp, Xq, Xqp, Td0p, Tq0p, omega_n):
+    """
+    Right hand side of the differential equations of the 4th order synchronous machines
+    :param x: states (4, ng)
+    :param Id: d-axis current (ng)
+    :param Iq: q-axis current (ng)
+    :param P: electrical power (ng)
+    :param Vfd: field voltage (ng)
+    :param Pm: mechanical power (ng)
+    :param H: inertia constant (ng)
+    :param Xd: d-axis reactance (ng)
+    :param Xdp: d-axis transient reactance (ng)
+    :param Xq: q-axis reactance (ng)
+    :param Xqp: q-axis transient reactance (ng)
+    :param Td0p: d-axis transient open loop time constant (ng)
+    :param Tq0p: q-axis transient open loop time constant (ng)
+    :param omega_n: nominal angular speed (ng)
+    :return: derivatives of the states (4, ng)
+    """
+    ng = x.shape[1]
+    dx = np.empty((4, ng))
+
+    for i in range(ng):
+        dx[0, i] = (Vfd[i] - (Xd[i] - Xdp[i]) * Id[i] - x[0, i]) / Td0p[i]
+        dx[1, i] = ((Xq[i] - Xqp[i]) * Iq[i] - x[1, i]) / Tq0p[i]
+        dx[2, i] = (Pm[i] / x[2, i] - P[i]) / (2.0 * H[i])
+        dx[3, i] = omega_n[i] * (x[2, i] - 1.0)
+
+    return dx
+
+
+class SynchronousMachineArrays:
+
+    def __init__(self, sm):
+        """
+        Contiguous parameters and states of a group of initialised 4th order synchronous machines
+        :param sm: SynchronousMachineOrder4 instance (already initialised)
+        """
+        self.bus_idx = np.array(sm.bus_idx, dtype=int)
+        self.ng = len(self.bus_idx)
+
+        def vec(val):
+            return np.ascontiguousarray(np.ones(self.ng) * val, dtype=float)
+
+        self.H = vec(sm.H)
+        self.Ra = vec(sm.Ra)
+        self.Xd = vec(sm.Xd)
+        self.Xdp = vec(sm.Xdp)
+        self.Xq = vec(sm.Xq)
+        self.Xqp = vec(sm.Xqp)
+        self.Td0p = vec(sm.Td0p)
+        self.Tq0p = vec(sm.Tq0p)
+        self.omega_n = vec(sm.omega_n)
+        self.Vfd = vec(sm.Vfd)
+        self.Pm = vec(sm.Pm)
+        self.speed_volt = np.ascontiguousarray(np.ones(self.ng, dtype=bool) * sm.speed_volt, dtype=bool)
+        self.Yg = np.ones(self.ng, dtype=complex) * sm.get_yg()
+
+        self.x = np.empty((4, self.ng))
+        self.x[EQP, :] = sm.Eqp
+        self.x[EDP, :] = sm.Edp
+        self.x[OMEGA, :] = sm.omega
+        self.x[DELTA, :] = sm.delta
+
+        self.P = np.zeros(self.ng)
+
+    def currents(self, x, V):
+        """
+        Current injections of the machines in the network (Norton equivalent)
+        :param x: states (4, ng)
+        :param V: bus voltages (nbus)
+        :return: Id, Iq, P, current injections (ng)
+        """
+        vt = np.ascontiguousarray(V[self.bus_idx], dtype=complex)
+        Id, Iq, P, In = sm4_currents(x, vt, self.Ra, self.Xdp, self.Xqp, self.speed_volt)
+        return Id, Iq, P, In + self.Yg * vt
+
+    def derivatives(self, x, Id, Iq, P):
+        """
+        Derivatives of the states
+        :param x: states (4, ng)
+        :param Id: d-axis currents (ng)
+        :param Iq: q-axis currents (ng)
+        :param P: electrical power (ng)
+        :return: dx (4, ng)
+        """
+        return sm4_derivatives(x, Id, Iq, P, self.Vfd, self.Pm, self.H, self.Xd, self.Xdp,
+                               self.Xq, self.Xqp, self.Td0p, self.Tq0p, self.omega_n)
+
+
+class NetworkSolver:
+
+    def __init__(self, Ybus, Yshunt, admittance_structure=None, fault_impedance=1e-6):
+        """
+        Network of the dynamic simulation, (Ybus + diag(Yshunt)) V = I, factorized once per topology
+        :param Ybus: admittance matrix of the branches (nbus, nbus)
+        :param Yshunt: shunt admittances of the loads and machines (nbus)
+        :param admittance_structure: AdmittanceStructure of Ybus, needed to switch branches
+        :param fault_impedance: default impedance of the bus short circuits (p.u.)
+        """
+        self.nbus = Ybus.shape[0]
+        self.Y0 = sp.csc_matrix(Ybus) + sp.diags(Yshunt, format='csc')
+        self.admittance_structure = admittance_structure
+        self.fault_impedance = fault_impedance
+
+        # bus faults {bus: fault admittance} and disconnected branches
+        self.faults = dict()
+        self.failed_branches = set()
+
+        self.factorizations = 0
+        self.lu = None
+        self.factorize()
+
+    def factorize(self):
+        """
+        Factorize the network matrix with the current faults and branch states
+        """
+        Y = self.Y0
+
+        if len(self.failed_branches):
+            if self.admittance_structure is None:
+                raise Exception('The admittance structure is needed to simulate branch events')
+            br_idx = np.array(sorted(self.failed_branches), dtype=int)
+            Y = Y + self.admittance_structure.get_delta_ybus(br_idx, active=0)
+
+        if len(self.faults):
+            idx = np.array(list(self.faults.keys()), dtype=int)
+            Y = Y + sp.csc_matrix((np.array(list(self.faults.values()), dtype=complex), (idx, idx)),
+                                  shape=(self.nbus, self.nbus))
+
+        self.lu = splu(sp.csc_matrix(Y))
+        self.factorizations += 1
+
+    def apply_event(self, event_type, obj, param):
+        """
+        Apply an event to the network, without factorizing
+        :param event_type: one of TransientStabilityEvents.events_available
+        :param obj: bus index or branch index
+        :param param: fault impedance for the bus short circuits (None for the default)
+        """
+        if event_type == 'Bus short circuit':
+            zf = self.fault_impedance if param is None else param
+            self.faults[int(obj)] = 1.0 / zf
+
+        elif event_type == 'Bus recovery':
+            self.faults.pop(int(obj), None)
+
+        elif event_type == 'Line failure':
+            if self.admittance_structure is None or self.admittance_structure.active[int(obj)]:
+                self.failed_branches.add(int(obj))
+
+        elif event_type == 'Line recovery':
+            self.failed_branches.discard(int(obj))
+
+        else:
+            raise Exception('Event not supported!')
+
+    def solve(self, I):
+        """
+        Solve the network voltages
+        :param I: current injections (nbus)
+        :return: V (nbus)
+        """
+        return self.lu.solve(I)
+
+
+def solve_network(machines: SynchronousMachineArrays, network: NetworkSolver, x, V, max_err, max_iter):
+    """
+    Solve the network voltages for fixed machine states (the machine currents depend on the voltages)
+    :param machines: SynchronousMachineArrays
+    :param network: NetworkSolver
+    :param x: machine states (4, ng)
+    :param V: initial voltages (nbus)
+    :param max_err: tolerance
+    :param max_iter: maximum number of iterations
+    :return: V, Id, Iq, P
+    """
+    I = np.zeros(network.nbus, dtype=complex)
+    for _ in range(max_iter):
+        Id, Iq, P, Ig = machines.currents(x, V)
+        I[:] = 0
+        np.add.at(I, machines.bus_idx, Ig)
+        V_new = network.solve(I)
+        err = np.max(np.abs(V_new - V))
+        V = V_new
+        if err < max_err:
+            break
+
+    Id, Iq, P, _ = machines.currents(x, V)
+    return V, Id, Iq, P
+
+
+def trapezoidal_step(machines: SynchronousMachineArrays, network: NetworkSolver, x, V, dx, h, max_err, max_iter):
+    """
+    Implicit trapezoidal step of the machines and the network:
+    x(t+h) = x(t) + h/2 (f(x(t), V(t)) + f(x(t+h), V(t+h)))
+    solved by fixed point iterations on the states and the voltages, starting from an explicit Euler prediction.
+    :param machines: SynchronousMachineArrays
+    :param network: NetworkSolver
+    :param x: states at t (4, ng)
+    :param V: voltages at t (nbus)
+    :param dx: derivatives at t (4, ng)
+    :param h: step (s)
+    :param max_err: tolerance
+    :param max_iter: maximum number of iterations
+    :return: states, voltages and derivatives at t+h, converged?
+    """
+    I = np.zeros(network.nbus, dtype=complex)
+    x_new = x + h * dx
+    V_new = V
+    converged = False
+
+    for _ in range(max_iter):
+        Id, Iq, P, Ig = machines.currents(x_new, V_new)
+        I[:] = 0
+        np.add.at(I, machines.bus_idx, Ig)
+        V_next = network.solve(I)
+
+        Id, Iq, P, _ = machines.currents(x_new, V_next)
+        dx_new = machines.derivatives(x_new, Id, Iq, P)
+        x_next = x + 0.5 * h * (dx + dx_new)
+
+        err = max(np.max(np.abs(x_next - x_new)), np.max(np.abs(V_next - V_new)))
+        x_new = x_next
+        V_new = V_next
+
+        if err < max_err:
+            converged = True
+            break
+
+    Id, Iq, P, _ = machines.currents(x_new, V_new)
+    machines.P = P
+    dx_new = machines.derivatives(x_new, Id, Iq, P)
+
+    return x_new, V_new, dx_new, converged
+
+
+def integrate(machines: SynchronousMachineArrays, network: NetworkSolver, V0, t_sim, h, events=None, decimation=1,
+              max_err=1e-4, max_iter=25, callback=None):
+    """
+    Integrate the machines and the network in time
+    :param machines: SynchronousMachineArrays
+    :param network: NetworkSolver
+    :param V0: initial voltages (nbus)
+    :param t_sim: simulation time (s)
+    :param h: step (s)
+    :param events: TransientStabilityEvents with bus indices and branch indices as objects
+    :param decimation: store one of every decimation steps
+    :param max_err: tolerance of the steps
+    :param max_iter: maximum number of iterations of the steps
+    :param callback: function(txt, progress) to report the progress
+    :return: time (nt), voltages (nt, nbus), omega (nt, ng), delta (nt, ng), number of non converged steps
+    """
+    decimation = max(1, int(decimation))
+    n_steps = int(round(t_sim / h))
+    nt = n_steps // decimation + 1
+
+    # preallocated results
+    time = np.zeros(nt)
+    voltage = np.zeros((nt, network.nbus), dtype=complex)
+    omega = np.zeros((nt, machines.ng))
+    delta = np.zeros((nt, machines.ng))
+
+    # events grouped by step
+    events_at = dict()
+    if events is not None:
+        for t_evt, evt_type, obj, param in zip(events.time, events.event_type, events.object, events.params):
+            k = int(round(t_evt / h))
+            events_at.setdefault(k, list()).append((evt_type, obj, param))
+
+    x = machines.x.copy()
+    V, Id, Iq, P = solve_network(machines, network, x, np.array(V0, dtype=complex), max_err, max_iter)
+    dx = machines.derivatives(x, Id, Iq, P)
+    not_converged = 0
+
+    time[0] = 0.0
+    voltage[0, :] = V
+    omega[0, :] = x[OMEGA, :]
+    delta[0, :] = x[DELTA, :]
+
+    for k in range(n_steps):
+
+        if k in events_at:
+            for evt_type, obj, param in events_at[k]:
+                network.apply_event(evt_type, obj, param)
+
+            # the topology changed: factorize once and jump the voltages (the states are continuous)
+            network.factorize()
+            V, Id, Iq, P = solve_network(machines, network, x, V, max_err, max_iter)
+            dx = machines.derivatives(x, Id, Iq, P)
+
+        x, V, dx, converged = trapezoidal_step(machines, network, x, V, dx, h, max_err, max_iter)
+        if not converged:
+            not_converged += 1
+
+        if (k + 1) % decimation == 0:
+            i = (k + 1) // decimation
+            time[i] = (k + 1) * h
+            voltage[i, :] = V
+            omega[i, :] = x[OMEGA, :]
+            delta[i, :] = x[DELTA, :]
+
+            if callback is not None:
+                callback('Running transient stability t:' + str(time[i]), (k + 1) / n_steps * 100)
+
+    machines.x = x
+
+    return time, voltage, omega, delta, not_converged
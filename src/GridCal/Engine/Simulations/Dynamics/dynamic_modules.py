@@ -22,6 +22,8 @@ from enum import Enum
 from warnings import warn
 from matplotlib import pyplot as plt
 
+from GridCal.Engine.Simulations.Dynamics.dynamic_integrator import SynchronousMachineArrays, NetworkSolver, integrate
+
 
 class DiffEqSolver(Enum):
     EULER = 1,
@@ -87,8 +89,12 @@ class TransientStabilityResults:
 
         self.omega = None
 
+        self.delta = None
+
         self.time = None
 
+        self.factorizations = 0
+
         self.available_results = ['Bus voltage']
 
     def plot(self, result_type, ax=None, indices=None, names=None, LINEWIDTH=2):
@@ -1167,26 +1173,30 @@ class DoubleCageAsynchronousMotor:
 
 
 def dynamic_simulation(n, Vbus, Sbus, Ybus, Sbase, fBase, t_sim, h, dynamic_devices=list(), bus_indices=list(),
-                       callback=None):
+                       callback=None, events=None, decimation=1, max_err=1e-3, max_iter=20,
+                       admittance_structure=None):
     """
     Dynamic transient simulation of a power system
     Args:
         n: number of nodes
-        Vbus:
-        Ybus:
-        Sbase:
+        Vbus: initial voltages (power flow solution)
+        Sbus: power injections (p.u.)
+        Ybus: admittance matrix
+        Sbase: base power (MVA)
         fBase: base frequency i.e. 50Hz
-        t_sim:
-        h:
+        t_sim: simulation time (s)
+        h: integration step (s)
         dynamic_devices: objects of each machine
-        bus_indices:
-
-    Returns:
-
+        bus_indices: bus index of each machine
+        callback: function(txt, progress) to report the progress
+        events: TransientStabilityEvents with bus indices and branch indices as objects
+        decimation: store one of every decimation steps
+        max_err: tolerance of the integration steps
+        max_iter: maximum number of iterations of the integration steps
+        admittance_structure: AdmittanceStructure of Ybus, needed for the line events
+
+    Returns: TransientStabilityResults
     """
-    max_err = 1e-3
-    max_iter = 20
-
     # compose dynamic controllers
     '''
     class DynamicModels(Enum):
@@ -1397,68 +1407,41 @@ def dynamic_simulation(n, Vbus, Sbus, Ybus, Sbase, fBase, t_sim, h, dynamic_devi
                                       bus_idx=dam_bus_idx,
                                       fn=fBase)
 
-    # modify Ybus to add the admittances
-
-    Y_shunt = np.zeros(n, dtype=complex)
-    load_idx = np.where(Sbus > 0)[0]
-    Y_shunt[load_idx] = Sbus[load_idx] / np.power(Vbus[load_idx], 2)  # add loads as admittances
-
-    Y_shunt[sm4.bus_idx] += sm4.get_yg()
-    Y_shunt[sm6.bus_idx] += sm6.get_yg()
-    Y_shunt[vsc.bus_idx] += vsc.get_yg()
-    Y_shunt[exg.bus_idx] += exg.get_yg()
-    Y_shunt[sam.bus_idx] += sam.get_yg()
-    Y_shunt[dam.bus_idx] += dam.get_yg()
-
-    ib = range(n)
-    Ydiag = sparse((Y_shunt, (ib, ib)))
-
-    # factorize the impedance matrix
-    Zbus = splu(Ybus + Ydiag)
-
-    # copy the initial voltage
-    V = Vbus.copy()
-    I = np.zeros(n, dtype=complex)
+    if len(sm6b_idx + vsc_idx + eg_idx + sam_idx + dam_idx):
+        warn('Only the 4th order synchronous machines are integrated, the rest of the dynamic models are ignored')
 
     # initialize machines
     sm4.initialise(vt0=Vbus[sm4_bus_idx], S0=Sbus[sm4_bus_idx])
-    sm6.initialise(vt0=Vbus[sm6b_bus_idx], S0=Sbus[sm6b_bus_idx])
-    vsc.initialise(vt0=Vbus[vsc_bus_idx], S0=Sbus[vsc_bus_idx])
-    exg.initialise(vt0=Vbus[eg_bus_idx], S0=Sbus[eg_bus_idx])
-    sam.initialise(vt0=Vbus[sam_bus_idx], S0=Sbus[sam_bus_idx])
-    dam.initialise(vt0=Vbus[dam_bus_idx], S0=Sbus[dam_bus_idx])
-
-    voltages = list()
-    omegas = list()
-
-    # iterate
-    t = 0.0
-    time = list()
-    while t < t_sim:
-
-        sm4.solve(h)
-
-        # compute machine currents
 
-        sm4.calc_currents(V, I)
-
-        # solve voltages
-        V = Zbus.solve(I)
-
-        voltages.append(V)
-        omegas.append(sm4.omega)
-        time.append(t)
-
-        t += h
-
-        if callback is not None:
-            progress = t / t_sim * 100
-            txt = 'Running transient stability t:' + str(t)
-            callback(txt, progress)
+    # the injections of the buses without machines are modelled as constant admittances
+    Y_shunt = np.zeros(n, dtype=complex)
+    load_idx = np.setdiff1d(np.arange(n), sm4_bus_idx)
+    Y_shunt[load_idx] = - np.conj(Sbus[load_idx]) / np.power(np.abs(Vbus[load_idx]), 2)
+
+    machines = SynchronousMachineArrays(sm4)
+    np.add.at(Y_shunt, machines.bus_idx, machines.Yg)
+
+    # the network is factorized once, and again only when an event changes the topology
+    network = NetworkSolver(Ybus, Y_shunt, admittance_structure=admittance_structure)
+
+    time, voltage, omega, delta, not_converged = integrate(machines=machines,
+                                                           network=network,
+                                                           V0=Vbus,
+                                                           t_sim=t_sim,
+                                                           h=h,
+                                                           events=events,
+                                                           decimation=decimation,
+                                                           max_err=max_err,
+                                                           max_iter=max_iter,
+                                                           callback=callback)
+    if not_converged:
+        warn(str(not_converged) + ' integration steps did not converge')
 
     res = TransientStabilityResults()
-    res.voltage = np.array(voltages)
-    res.omegas = np.array(omegas)
-    res.time = np.array(time)
+    res.voltage = voltage
+    res.omega = omega
+    res.delta = delta
+    res.time = time
+    res.factorizations = network.factorizations
 
     return res
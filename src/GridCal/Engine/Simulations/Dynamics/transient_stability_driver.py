@@ -17,8 +17,10 @@
 from PySide2.QtCore import QThread, Signal
 
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Core.admittance_matrices import get_branch_buses
 from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowResults
-from GridCal.Engine.Simulations.Dynamics.dynamic_modules import dynamic_simulation
+from GridCal.Engine.Simulations.Dynamics.dynamic_modules import dynamic_simulation, TransientStabilityEvents
 
 ########################################################################################################################
 # Transient stability
@@ -27,7 +29,8 @@ from GridCal.Engine.Simulations.Dynamics.dynamic_modules import dynamic_simulati
 
 class TransientStabilityOptions:
 
-    def __init__(self, h=0.001, t_sim=15, max_err=0.0001, max_iter=25):
+    def __init__(self, h=0.001, t_sim=15, max_err=0.0001, max_iter=25, decimation=1,
+                 events: TransientStabilityEvents = None):
 
         # step length (s)
         self.h = h
@@ -41,6 +44,12 @@ class TransientStabilityOptions:
         # Maximum number of network iterations
         self.max_iter = max_iter
 
+        # store the results of one of every decimation steps
+        self.decimation = decimation
+
+        # events (bus and branch objects of the grid)
+        self.events = events
+
 
 class TransientStability(QThread):
     progress_signal = Signal(float)
@@ -78,6 +87,33 @@ class TransientStability(QThread):
         self.progress_signal.emit(progress)
         self.progress_text.emit(txt)
 
+    def get_island_events(self, island):
+        """
+        Translate the events of the grid objects into events of the island indices
+        :param island: SnapshotCircuit of the island
+        :return: TransientStabilityEvents with bus indices and branch indices as objects
+        """
+        if self.options.events is None:
+            return None
+
+        bus_dict = {bus: i for i, bus in enumerate(self.grid.buses)}
+        branch_dict = {branch: i for i, branch in enumerate(self.grid.get_branches())}
+        island_bus = {b: i for i, b in enumerate(island.original_bus_idx)}
+        island_branch = {b: i for i, b in enumerate(island.original_branch_idx)}
+
+        events = TransientStabilityEvents()
+        for t, evt_type, obj, param in zip(self.options.events.time, self.options.events.event_type,
+                                           self.options.events.object, self.options.events.params):
+            if evt_type in ['Bus short circuit', 'Bus recovery']:
+                idx = island_bus.get(bus_dict.get(obj, None), None)
+            else:
+                idx = island_branch.get(branch_dict.get(obj, None), None)
+
+            if idx is not None:
+                events.add(t, evt_type, idx, param)
+
+        return events
+
     def run(self):
         """
         Run transient stability
@@ -85,26 +121,33 @@ class TransientStability(QThread):
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Running transient stability...')
 
-        # print('Compiling...', end='')
-        numerical_circuit = self.grid.compile_snapshot()
-        calculation_inputs = numerical_circuit.compute()
+        numerical_circuit = compile_snapshot_circuit(self.grid)
+        islands = split_into_islands(numeric_circuit=numerical_circuit)
+        generators = self.grid.get_generators()
+        res = None
 
-        for calculation_input in calculation_inputs:
+        for island in islands:
 
-            dynamic_devices = calculation_input.get_generators()
-            bus_indices = [calculation_input.buses_dict[elm.bus] for elm in dynamic_devices]
+            dynamic_devices = [generators[i] for i in island.original_gen_idx]
+            bus_indices = get_branch_buses(island.C_bus_gen.T)
+            events = self.get_island_events(island)
 
-            res = dynamic_simulation(n=len(calculation_input.buses),
-                                     Vbus=self.pf_res.voltage[calculation_input.original_bus_idx],
-                                     Sbus=self.pf_res.Sbus[calculation_input.original_bus_idx],
-                                     Ybus=calculation_input.Ybus,
-                                     Sbase=calculation_input.Sbase,
-                                     fBase=calculation_input.fBase,
+            res = dynamic_simulation(n=island.nbus,
+                                     Vbus=self.pf_res.voltage[island.original_bus_idx],
+                                     Sbus=self.pf_res.Sbus[island.original_bus_idx],
+                                     Ybus=island.Ybus,
+                                     Sbase=island.Sbase,
+                                     fBase=self.grid.fBase,
                                      t_sim=self.options.t_sim,
                                      h=self.options.h,
                                      dynamic_devices=dynamic_devices,
                                      bus_indices=bus_indices,
-                                     callback=self.status)
+                                     callback=self.status,
+                                     events=events,
+                                     decimation=self.options.decimation,
+                                     max_err=self.options.max_err,
+                                     max_iter=self.options.max_iter,
+                                     admittance_structure=island.admittance_structure)
 
         self.results = res
 
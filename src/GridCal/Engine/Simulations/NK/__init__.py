@@ -1,2 +1,3 @@
 from GridCal.Engine.Simulations.NK.n_minus_k_driver import *
-from GridCal.Engine.Simulations.NK.n_minus_k_results import *
\ No newline at end of file
+from GridCal.Engine.Simulations.NK.n_minus_k_results import *
+from GridCal.Engine.Simulations.NK.contingency_screening import *
@@ -0,0 +1,230 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Linear (DC) N-k contingency screening.
+
+The outage of a set of branches c is emulated by transferring the power x between the ends of the failed branches,
+such that the transfer equals the post-contingency flow through them: (I - H[c, c]) x = F[c], where H are the transfer
+factors derived from the PTDF. The post-contingency flows are then F + H[:, c] x, which is a rank-k update of the
+base case solution that needs neither recompiling the circuit nor factorizing the susceptance matrix again.
+A singular (I - H[c, c]) means that the contingency splits an island.
+
+The columns of H are requested by blocks of branches through a function (i.e. CircuitLinearFactors.transfer_factors),
+so that the memory used is proportional to the number of branches times the block size, and never to nbr x nbr.
+"""
+
+import numpy as np
+from itertools import combinations
+
+
+def post_contingency_flows(flows, get_factors, failed):
+    """
+    Compute the post-contingency flows of an arbitrary set of failed branches
+    :param flows: base flows (nbr)
+    :param get_factors: function that returns the transfer factors columns of some branches H[:, idx] (nbr, len(idx))
+    :param failed: indices of the failed branches
+    :return: post-contingency flows (nbr), the contingency splits an island?
+    """
+    failed = np.array(failed, dtype=int)
+    Hc = get_factors(failed)
+    M = np.eye(len(failed)) - Hc[failed, :]
+
+    try:
+        x = np.linalg.solve(M, flows[failed])
+    except np.linalg.LinAlgError:
+        return flows.copy(), True
+
+    post = flows + np.dot(Hc, x)
+    post[failed] = 0.0
+    return post, False
+
+
+def get_loading(post, rates):
+    """
+    Get the most loaded branch of every contingency
+    :param post: post-contingency flows (nbr, contingencies)
+    :param rates: branch rates (nbr)
+    :return: max loading (contingencies), most loaded branch (contingencies)
+    """
+    loading = np.abs(post) / (rates[:, np.newaxis] + 1e-9)
+    worst = loading.argmax(axis=0)
+    return loading[worst, np.arange(post.shape[1])], worst
+
+
+def screen_n1(flows, Hc, rates, candidates, tol=1e-10):
+    """
+    Screen the single contingencies of a block of candidates at once
+    :param flows: base flows (nbr)
+    :param Hc: transfer factors columns of the candidates (nbr, nc)
+    :param rates: branch rates (nbr)
+    :param candidates: indices of the branches that can fail (nc)
+    :param tol: tolerance to detect the contingencies that split an island
+    :return: max loading (nc), most loaded branch (nc), splits an island? (nc)
+    """
+    rng = np.arange(len(candidates))
+    den = 1.0 - Hc[candidates, rng]
+    islanding = np.abs(den) < tol
+    den[islanding] = 1.0
+
+    x = flows[candidates] / den
+    post = flows[:, np.newaxis] + Hc * x[np.newaxis, :]
+    post[candidates, rng] = 0.0
+    post[:, islanding] = flows[:, np.newaxis]
+
+    max_loading, worst = get_loading(post, rates)
+
+    return max_loading, worst, islanding
+
+
+def screen_n2(flows, Hj, Hc, rates, j, candidates, tol=1e-10):
+    """
+    Screen all the double contingencies of the branch j with a block of candidate branches at once,
+    by solving the 2x2 systems (I - H[c, c]) x = F[c] in closed form
+    :param flows: base flows (nbr)
+    :param Hj: transfer factors column of the branch j (nbr)
+    :param Hc: transfer factors columns of the candidates (nbr, nc)
+    :param rates: branch rates (nbr)
+    :param j: index of the first failed branch
+    :param candidates: indices of the second failed branches (nc)
+    :param tol: tolerance to detect the contingencies that split an island
+    :return: max loading (nc), most loaded branch (nc), splits an island? (nc)
+    """
+    rng = np.arange(len(candidates))
+    a = 1.0 - Hj[j]
+    d = 1.0 - Hc[candidates, rng]
+    b = Hc[j, :]
+    c = Hj[candidates]
+
+    det = a * d - b * c
+    islanding = np.abs(det) < tol
+    det[islanding] = 1.0
+
+    xj = (d * flows[j] + b * flows[candidates]) / det
+    xk = (c * flows[j] + a * flows[candidates]) / det
+    xj[islanding] = 0.0
+    xk[islanding] = 0.0
+
+    post = flows[:, np.newaxis] + Hj[:, np.newaxis] * xj[np.newaxis, :] + Hc * xk[np.newaxis, :]
+    post[j, :] = 0.0
+    post[candidates, rng] = 0.0
+
+    max_loading, worst = get_loading(post, rates)
+
+    return max_loading, worst, islanding
+
+
+def screen_contingencies(flows, get_factors, rates, candidates, k=1, block_size=256, tol=1e-10,
+                         cancel_func=None, prog_func=None):
+    """
+    Screen all the contingencies of up to k failed branches
+    :param flows: base flows (nbr)
+    :param get_factors: function that returns the transfer factors columns of some branches H[:, idx] (nbr, len(idx))
+    :param rates: branch rates (nbr)
+    :param candidates: indices of the branches that can fail
+    :param k: maximum number of simultaneous failures
+    :param block_size: number of transfer factors columns computed at once
+    :param tol: tolerance to detect the contingencies that split an island
+    :param cancel_func: function that returns True if the screening must stop
+    :param prog_func: progress function to display progress [0~100]
+    :return: contingencies (number of contingencies, k) with the failed branches (padded with -1),
+             max loading, most loaded branch, splits an island?
+    """
+    candidates = np.array(candidates, dtype=int)
+    nc = len(candidates)
+    blocks = [candidates[a:a + block_size] for a in range(0, nc, block_size)]
+
+    contingencies = list()
+    max_loading = list()
+    worst_branch = list()
+    islanding = list()
+
+    def append(failed, ld, wr, isl):
+        cont = np.full((len(failed), k), -1, dtype=int)
+        cont[:, :failed.shape[1]] = failed
+        contingencies.append(cont)
+        max_loading.append(ld)
+        worst_branch.append(wr)
+        islanding.append(isl)
+
+    for level in range(1, k + 1):
+
+        if level == 1:
+            for block in blocks:
+                ld, wr, isl = screen_n1(flows, get_factors(block), rates, block, tol=tol)
+                append(block[:, np.newaxis], ld, wr, isl)
+
+                if cancel_func is not None and cancel_func():
+                    break
+
+        elif level == 2:
+            # pairs of blocks (J, K) with K >= J, the factors of each block are computed once per pair
+            n_pairs = len(blocks) * (len(blocks) + 1) // 2
+            p = 0
+            for bj, block_j in enumerate(blocks):
+                H_j = get_factors(block_j)
+
+                for bk in range(bj, len(blocks)):
+                    block_k = blocks[bk]
+                    H_k = H_j if bk == bj else get_factors(block_k)
+
+                    for i, j in enumerate(block_j):
+                        sel = np.arange(i + 1, len(block_k)) if bk == bj else np.arange(len(block_k))
+                        if len(sel) == 0:
+                            continue
+
+                        others = block_k[sel]
+                        ld, wr, isl = screen_n2(flows, H_j[:, i], H_k[:, sel], rates, j, others, tol=tol)
+                        append(np.c_[np.full(len(others), j), others], ld, wr, isl)
+
+                    p += 1
+                    if prog_func is not None:
+                        prog_func(p / n_pairs * 100.0)
+
+                    if cancel_func is not None and cancel_func():
+                        break
+
+                if cancel_func is not None and cancel_func():
+                    break
+
+        else:
+            # higher order contingencies are solved one by one
+            failed_lst = list()
+            ld = list()
+            wr = list()
+            isl = list()
+            for failed in combinations(candidates, level):
+                post, splits = post_contingency_flows(flows, get_factors, failed)
+                loading = np.abs(post) / (rates + 1e-9)
+                failed_lst.append(failed)
+                ld.append(loading.max())
+                wr.append(loading.argmax())
+                isl.append(splits)
+
+                if cancel_func is not None and cancel_func():
+                    break
+
+            if len(failed_lst):
+                append(np.array(failed_lst, dtype=int), np.array(ld, dtype=float), np.array(wr, dtype=int),
+                       np.array(isl, dtype=bool))
+
+        if cancel_func is not None and cancel_func():
+            break
+
+    if len(contingencies) == 0:
+        return np.zeros((0, k), dtype=int), np.zeros(0), np.zeros(0, dtype=int), np.zeros(0, dtype=bool)
+
+    return np.concatenate(contingencies), np.concatenate(max_loading), np.concatenate(worst_branch), \
+        np.concatenate(islanding)
@@ -23,7 +23,11 @@ from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Core.time_series_pf_data import compile_time_circuit, split_time_circuit_into_islands, TimeCircuit
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions, SolverType, single_island_pf
-from GridCal.Engine.Simulations.NK.n_minus_k_results import NMinusKResults
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Simulations.PTDF.linear_analysis import CircuitLinearFactors
+from GridCal.Engine.Simulations.PTDF.ptdf_analysis import power_flow_worker
+from GridCal.Engine.Simulations.NK.contingency_screening import screen_contingencies
+from GridCal.Engine.Simulations.NK.n_minus_k_results import NMinusKResults, NMinusKScreeningResults
 
 
 def enumerate_states_n_k(m, k=1):
@@ -133,10 +137,24 @@ def re_index_time(nc: TimeCircuit, t_idx):
 
 class NMinusKOptions:
 
-    def __init__(self, use_multi_threading):
-
+    def __init__(self, use_multi_threading, screening=False, k=1, screening_threshold=0.9):
+        """
+        N-k options
+        :param use_multi_threading: use multi-threading?
+        :param screening: screen the contingencies with the linear factors and only run the AC power flow
+                          of the contingencies flagged near the limits?
+        :param k: maximum number of simultaneous failures (screening only)
+        :param screening_threshold: linear post-contingency loading above which the contingency is verified with
+                                    the AC power flow (screening only)
+        """
         self.use_multi_threading = use_multi_threading
 
+        self.screening = screening
+
+        self.k = k
+
+        self.screening_threshold = screening_threshold
+
 
 class NMinusK(QThread):
     progress_signal = Signal(float)
@@ -323,6 +341,92 @@ class NMinusK(QThread):
 
         return n_k_results
 
+    def n_minus_k_screening(self, k=1, threshold=0.9):
+        """
+        Run the N-k contingency screening with the linear factors of the base case. The contingencies with
+        a post-contingency loading above the threshold, or that split an island, are verified with the AC power flow
+        :param k: maximum number of simultaneous failures
+        :param threshold: linear post-contingency loading above which the contingency is verified
+        :return: NMinusKScreeningResults instance
+        """
+        self.progress_text.emit("Compiling assets...")
+        self.progress_signal.emit(0)
+
+        numerical_circuit = compile_snapshot_circuit(circuit=self.grid,
+                                                     apply_temperature=self.pf_options.apply_temperature_correction,
+                                                     branch_tolerance_mode=self.pf_options.branch_impedance_tolerance_mode)
+
+        islands = split_into_islands(numeric_circuit=numerical_circuit,
+                                     ignore_single_node_islands=self.pf_options.ignore_single_node_islands)
+
+        nbr = numerical_circuit.nbr
+        self.branch_names = numerical_circuit.branch_names
+
+        # base case linear flows, the transfer factors are computed by blocks of branches while screening
+        self.progress_text.emit("Computing the linear factors...")
+        factors = CircuitLinearFactors(nbr=nbr, islands=islands, logger=self.logger)
+        flows = factors.get_flows() * numerical_circuit.Sbase
+
+        # screen all the contingencies of the active branches
+        self.progress_text.emit("Screening contingencies...")
+        candidates = np.where(numerical_circuit.branch_active)[0]
+        contingencies, max_loading, worst_branch, islanding = screen_contingencies(flows=flows,
+                                                                                   get_factors=factors.transfer_factors,
+                                                                                   rates=numerical_circuit.branch_rates,
+                                                                                   candidates=candidates,
+                                                                                   k=k,
+                                                                                   cancel_func=lambda: self.__cancel__,
+                                                                                   prog_func=self.progress_signal.emit)
+
+        flagged = (max_loading >= threshold) | islanding
+
+        results = NMinusKScreeningResults(branch_names=numerical_circuit.branch_names,
+                                          contingencies=contingencies,
+                                          max_loading=max_loading,
+                                          worst_branch=worst_branch,
+                                          islanding=islanding,
+                                          flagged=flagged,
+                                          base_flows=flows)
+
+        # verify the flagged contingencies with the AC power flow
+        self.progress_text.emit("Verifying the flagged contingencies...")
+        flagged_idx = np.where(flagged)[0]
+        dP = np.zeros(numerical_circuit.nbus)
+        for a, i in enumerate(flagged_idx):
+
+            failed = contingencies[i][contingencies[i] >= 0]
+            numerical_circuit.branch_active[failed] = 0
+
+            calculation_inputs = split_into_islands(numeric_circuit=numerical_circuit,
+                                                    ignore_single_node_islands=self.pf_options.ignore_single_node_islands)
+
+            returns = dict()
+            power_flow_worker(variation=0,
+                              nbus=numerical_circuit.nbus,
+                              nbr=numerical_circuit.nbr,
+                              n_tr=numerical_circuit.ntr,
+                              bus_names=numerical_circuit.bus_names,
+                              branch_names=numerical_circuit.branch_names,
+                              transformer_names=numerical_circuit.tr_names,
+                              bus_types=numerical_circuit.bus_types,
+                              calculation_inputs=calculation_inputs,
+                              options=self.pf_options,
+                              dP=dP,
+                              return_dict=returns)
+
+            pf_results, log = returns[0]
+            self.logger += log
+            results.set_ac_results(i, pf_results)
+
+            numerical_circuit.branch_active[failed] = 1
+
+            self.progress_signal.emit((a + 1) / len(flagged_idx) * 100.0)
+
+            if self.__cancel__:
+                break
+
+        return results
+
     def n_minus_k_mt(self, k=1, indices=None, vmin=200, states_number_limit=None):
         """
         Run N-K simulation in series
@@ -461,14 +565,17 @@ class NMinusK(QThread):
         :return:
         """
         start = time.time()
-        if self.options.use_multi_threading:
+        if self.options.screening:
+            self.results = self.n_minus_k_screening(k=self.options.k, threshold=self.options.screening_threshold)
+
+        elif self.options.use_multi_threading:
             self.results = self.n_minus_k_mt(k=1, indices=None, vmin=0, states_number_limit=None)
 
         else:
             self.results = self.n_minus_k(k=1, indices=None, vmin=0, states_number_limit=None)
 
         self.progress_text.emit('Computing OTDF...')
-        if self.results is not None:
+        if self.results is not None and not self.options.screening:
             self.results.branch_names = np.array([b.name for b in self.grid.lines])
             self.results.otdf = self.get_otdf(failure_flow_limit=1.0/100.0)
 
@@ -398,3 +398,85 @@ class NMinusKResults(PowerFlowResults):
 
         else:
             return None
+
+
+class NMinusKScreeningResults:
+
+    def __init__(self, branch_names, contingencies, max_loading, worst_branch, islanding, flagged, base_flows):
+        """
+        Linear contingency screening results
+        :param branch_names: names of the branches
+        :param contingencies: failed branches of each contingency (contingencies, k), padded with -1
+        :param max_loading: maximum post-contingency loading of each contingency (linear estimation)
+        :param worst_branch: most loaded branch of each contingency
+        :param islanding: does each contingency split an island?
+        :param flagged: was each contingency flagged for the AC power flow verification?
+        :param base_flows: base case flows (MW)
+        """
+        self.name = 'N-1'
+
+        self.branch_names = np.array(branch_names)
+
+        self.contingencies = contingencies
+
+        self.max_loading = max_loading
+
+        self.worst_branch = worst_branch
+
+        self.islanding = islanding
+
+        self.flagged = flagged
+
+        self.base_flows = base_flows
+
+        # AC power flow results of the flagged contingencies {contingency index: PowerFlowResults}
+        self.ac_results = dict()
+
+        # maximum post-contingency loading of each contingency, replaced by the AC value if verified
+        self.ac_max_loading = max_loading.copy()
+
+        # the OTDF matrix (nbr, nbr) is not stored by the screening
+        self.available_results = [ResultTypes.BranchLoading]
+
+    def set_ac_results(self, i, results: PowerFlowResults):
+        """
+        Store the AC power flow results of a flagged contingency
+        :param i: contingency index
+        :param results: PowerFlowResults instance
+        """
+        self.ac_results[i] = results
+        self.ac_max_loading[i] = np.abs(results.loading).max()
+
+    def get_contingency_names(self):
+        """
+        Get the names of the contingencies
+        :return: list of strings
+        """
+        return [' + '.join(self.branch_names[c[c >= 0]]) for c in self.contingencies]
+
+    def get_data_frame(self):
+        """
+        Get Pandas DataFrame with the screening summary
+        :return: pandas DataFrame
+        """
+        data = {'Linear max loading': self.max_loading,
+                'Most loaded branch': self.branch_names[self.worst_branch],
+                'Islanding': self.islanding,
+                'AC verified': self.flagged,
+                'Max loading': self.ac_max_loading}
+        return pd.DataFrame(data=data, index=self.get_contingency_names())
+
+    def mdl(self, result_type: ResultTypes, indices=None, names=None) -> "ResultsModel":
+        """
+        Get ResultsModel instance
+        :param result_type: ResultTypes
+        :param indices: indices of the elements (unused)
+        :param names: names of the elements (unused)
+        :return: ResultsModel instance
+        """
+        if result_type == ResultTypes.BranchLoading:
+            return ResultsModel(data=self.ac_max_loading.reshape(-1, 1) * 100, index=self.get_contingency_names(),
+                                columns=['Max loading'], title='Contingency loading', ylabel='(%)', units='(%)')
+
+        else:
+            raise Exception('Result type not understood:' + str(result_type))
@@ -1,5 +1,6 @@
 
 
+from GridCal.Engine.Simulations.OPF.lp_matrix import *
 from GridCal.Engine.Simulations.OPF.dc_opf import *
 from GridCal.Engine.Simulations.OPF.dc_opf_ts import *
 from GridCal.Engine.Simulations.OPF.ac_opf import *
@@ -14,97 +14,37 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 """
-This file implements a DC-OPF for time series
+This file implements a linearized AC-OPF for time series
 That means that solves the OPF problem for a complete time series at once
 """
 
+import numpy as np
+
 from GridCal.Engine.basic_structures import MIPSolvers
 from GridCal.Engine.Core.time_series_opf_data import OpfTimeCircuit, split_opf_time_circuit_into_islands
-from GridCal.Engine.Simulations.OPF.opf_templates import OpfTimeSeries
-from GridCal.ThirdParty.pulp import *
-
-
-def add_objective_function(Pg, Pb, LSlack, FSlack1, FSlack2,
-                           cost_g, cost_b, cost_l, cost_br):
-    """
-    Add the objective function to the problem
-    :param problem: LpProblem instance
-    :param Pg: generator LpVars (ng, nt)
-    :param Pb: batteries LpVars (nb, nt)
-    :param LSlack: Load slack LpVars (nl, nt)
-    :param FSlack1: Branch overload slack1 (m, nt)
-    :param FSlack2: Branch overload slack2 (m, nt)
-    :param cost_g: Cost of the generators (ng, nt)
-    :param cost_b: Cost of the batteries (nb, nt)
-    :param cost_l: Cost of the loss of load (nl, nt)
-    :param cost_br: Cost of the overload (m, nt)
-    :return: Nothing, just assign the objective function
-    """
-
-    f_obj = lpSum(cost_g * Pg)
-
-    f_obj += lpSum(cost_b * Pb)
-
-    f_obj += lpSum(cost_l * LSlack)
-
-    f_obj += lpSum(cost_br * (FSlack1 + FSlack2))
-
-    return f_obj
-
-
-def set_fix_generation(problem, Pg, P_profile, enabled_for_dispatch):
-    """
-    Set the generatin fixed at the non dispatchabel generators
-    :param problem: LP problem instance
-    :param Pg: Array of generation variables
-    :param P_profile: Array of fixed generation values
-    :param enabled_for_dispatch: array of "enables" for dispatching generators
-    :return: Nothing
-    """
-
-    idx = np.where(enabled_for_dispatch == False)[0]
+from GridCal.Engine.Simulations.OPF.opf_templates import OpfMatrixTimeSeries
+from GridCal.Engine.Simulations.OPF.lp_matrix import LpMatrixModel
+from GridCal.Engine.Simulations.OPF.dc_opf_ts import add_objective_function, set_fix_generation, \
+    get_injection_terms, get_island_time_steps, get_branch_bus_matrix, add_branch_loading_restriction, \
+    add_battery_discharge_restriction
 
-    lpAddRestrictions2(problem=problem,
-                       lhs=Pg[idx, :],
-                       rhs=P_profile[idx, :],
-                       # Fmax + FSlack2
-                       name='fixed_generation',
-                       op='=')
 
-
-def get_power_injections(C_bus_gen, Pg, C_bus_bat, Pb, C_bus_load, PlSlack, QlSlack, Pl, Ql):
-    """
-    Create the power injections per bus
-    :param C_bus_gen: Bus-Generators sparse connectivity matrix (n, ng)
-    :param Pg: generator LpVars (ng, nt)
-    :param C_bus_bat: Bus-Batteries sparse connectivity matrix (n, nb)
-    :param Pb: Batteries LpVars (nb, nt)
-    :param C_bus_load: Bus-Load sparse connectivity matrix (n, nl)
-    :param PlSlack: Load (real) slack LpVars (nl, nt)
-    :param QlSlack: Load (imag) slack LpVars (nl, nt)
-    :param Pl: Load values (nl, nt)
-    :return: Power injection at the buses (n, nt)
-    """
-
-    P = lpDot(C_bus_gen, Pg)
-
-    P += lpDot(C_bus_bat, Pb)
-
-    P -= lpDot(C_bus_load, Pl - PlSlack)
-
-    Q = - lpDot(C_bus_load, Ql - QlSlack)
-
-    return P, Q
-
-
-def add_ac_nodal_power_balance(numerical_circuit: OpfTimeCircuit, problem: LpProblem, dvm, dva, P, Q, start_, end_):
+def add_ac_nodal_power_balance(numerical_circuit: OpfTimeCircuit, model: LpMatrixModel, dvm, dva,
+                               Pg, Pb, LSlack, Pl, Ql, start_, end_):
     """
     Add the nodal power balance
     :param numerical_circuit: NumericalCircuit instance
-    :param problem: LpProblem instance
-    :param dva: Voltage angles LpVars (n, nt)
-    :param P: Power injection at the buses LpVars (n, nt)
-    :return: Nothing, the restrictions are added to the problem
+    :param model: LpMatrixModel instance
+    :param dvm: Voltage modules increments variables (n, nt)
+    :param dva: Voltage angles increments variables (n, nt)
+    :param Pg: generator variables (ng, nt)
+    :param Pb: Batteries variables (nb, nt)
+    :param LSlack: Load slack variables (nl, nt), used for both the real and the reactive power
+    :param Pl: Load real power values (nl, nt)
+    :param Ql: Load reactive power values (nl, nt)
+    :param start_: start index of the formulation interval
+    :param end_: end index of the formulation interval
+    :return: arrays of real and reactive nodal restriction indices (n, nt), -1 where there is no restriction
     """
 
     # do the topological computation
@@ -114,150 +54,64 @@ def add_ac_nodal_power_balance(numerical_circuit: OpfTimeCircuit, problem: LpPro
     if end_ == -1:
         end_ = len(numerical_circuit.time_array)
 
-    nodal_restrictions_P = np.empty((numerical_circuit.nbus, end_ - start_), dtype=object)
-    nodal_restrictions_Q = np.empty((numerical_circuit.nbus, end_ - start_), dtype=object)
+    nodal_restrictions_P = np.full((numerical_circuit.nbus, end_ - start_), -1, dtype=int)
+    nodal_restrictions_Q = np.full((numerical_circuit.nbus, end_ - start_), -1, dtype=int)
 
     # For every island, run the time series
     for i, calc_inpt in enumerate(calc_inputs):
 
-        # find the original indices
-        bus_original_idx = np.array(calc_inpt.original_bus_idx)
+        _, t_idx = get_island_time_steps(calc_inpt, start_, end_)
 
-        # re-pack the variables for the island and time interval
-        P_island = P[bus_original_idx, :]  # the sizes already reflect the correct time span
-        Q_island = Q[bus_original_idx, :]  # the sizes already reflect the correct time span
-        dva_island = dva[bus_original_idx, :]  # the sizes already reflect the correct time span
-        dvm_island = dvm[bus_original_idx, :]  # the sizes already reflect the correct time span
+        if len(t_idx) == 0:
+            continue
+
+        # find the original indices
+        bus_original_idx = np.array(calc_inpt.original_bus_idx, dtype=int)
+        dva_island = dva[np.ix_(bus_original_idx, t_idx)]
+        dvm_island = dvm[np.ix_(bus_original_idx, t_idx)]
         B_island = calc_inpt.Ybus.imag
         G_island = calc_inpt.Ybus.real
         Bs_island = calc_inpt.Yseries.imag
         Gs_island = calc_inpt.Yseries.real
 
-        pqpv = calc_inpt.pqpv
-        pq = calc_inpt.pq
-        pv = calc_inpt.pv
-        vd = calc_inpt.vd
-        vdpv = np.r_[vd, pv]
-        vdpv.sort()
-
-        # Add nodal real power balance for the non slack nodes
-        idx = bus_original_idx[pqpv]
-        nodal_restrictions_P[idx] = lpAddRestrictions2(problem=problem,
-                                                       lhs=-lpDot(Bs_island[np.ix_(pqpv, pqpv)], dva_island[pqpv, :])
-                                                           + lpDot(G_island[np.ix_(pqpv, pq)], dvm_island[pq, :]),
-                                                       rhs=P_island[pqpv, :],
-                                                       name='Nodal_real_power_balance_pqpv_is' + str(i),
-                                                       op='=')
-
-        # Add nodal reactive power balance for the non slack nodes
-        idx = bus_original_idx[pq]
-        nodal_restrictions_Q[idx] = lpAddRestrictions2(problem=problem,
-                                                       lhs=-lpDot(Gs_island[np.ix_(pq, pqpv)], dva_island[pqpv, :])
-                                                           - lpDot(B_island[np.ix_(pq, pq)], dvm_island[pq, :]),
-                                                       rhs=Q_island[pq, :],
-                                                       name='Nodal_imag_power_balance_pqpv_is' + str(i),
-                                                       op='=')
-
-        # Add nodal real power balance for the slack nodes
-        idx = bus_original_idx[vd]
-        nodal_restrictions_P[idx] = lpAddRestrictions2(problem=problem,
-                                                       lhs=-lpDot(Bs_island[vd, :], dva_island)
-                                                           + lpDot(G_island[vd, :], dvm_island),
-                                                       rhs=P_island[vd, :],
-                                                       name='Nodal_real_power_balance_vd_is' + str(i),
-                                                       op='=')
-
-        # delta of voltage angles equal to zero for the slack nodes (vd)
-        lpAddRestrictions2(problem=problem,
-                           lhs=dva_island[vd, :],
-                           rhs=np.zeros_like(dva_island[vd, :]),
-                           name='dVa_vd_zero_is' + str(i),
-                           op='=')
-
-        # delta of voltage module equal to zero for the slack and pv nodes (vdpv)
-        lpAddRestrictions2(problem=problem,
-                           lhs=dvm_island[vdpv, :],
-                           rhs=np.zeros_like(dva_island[vdpv, :]),
-                           name='dVm_vdpv_zero_is' + str(i),
-                           op='=')
-
-    return nodal_restrictions_P, nodal_restrictions_Q
-
-
-def add_branch_loading_restriction(problem: LpProblem,
-                                   theta_f, theta_t, Bseries,
-                                   Fmax, FSlack1, FSlack2):
-    """
-    Add the branch loading restrictions
-    :param problem: LpProblem instance
-    :param theta_f: voltage angles at the "from" side of the branches (m, nt)
-    :param theta_t: voltage angles at the "to" side of the branches (m, nt)
-    :param Bseries: Array of branch susceptances (m)
-    :param Fmax: Array of branch ratings (m, nt)
-    :param FSlack1: Array of branch loading slack variables in the from-to sense
-    :param FSlack2: Array of branch loading slack variables in the to-from sense
-    :return: Nothing
-    """
-
-    load_f = Bseries * (theta_f - theta_t)
-    load_t = Bseries * (theta_t - theta_f)
+        pq = np.array(calc_inpt.pq, dtype=int)
+        pv = np.array(calc_inpt.pv, dtype=int)
+        vd = np.array(calc_inpt.vd, dtype=int)
+        vdpv = np.sort(np.r_[vd, pv])
 
-    # from-to branch power restriction
-    lpAddRestrictions2(problem=problem,
-                       lhs=load_f,
-                       rhs=np.array([Fmax[:, i] + FSlack1[:, i] for i in range(FSlack1.shape[1])]).transpose(),  # Fmax + FSlack1
-                       name='from_to_branch_rate',
-                       op='<=')
+        # real power injections
+        terms, P_const = get_injection_terms(C_bus_gen=numerical_circuit.C_bus_gen, Pg=Pg,
+                                             C_bus_bat=numerical_circuit.C_bus_batt, Pb=Pb,
+                                             C_bus_load=numerical_circuit.C_bus_load, LSlack=LSlack, Pl=Pl,
+                                             bus_idx=bus_original_idx, t_idx=t_idx)
 
-    # to-from branch power restriction
-    lpAddRestrictions2(problem=problem,
-                       lhs=load_t,
-                       rhs=np.array([Fmax[:, i] + FSlack2[:, i] for i in range(FSlack2.shape[1])]).transpose(),  # Fmax + FSlack2
-                       name='to_from_branch_rate',
-                       op='<=')
+        # Add nodal real power balance: -Bs x dva + G x dvm = P
+        terms = [(-Bs_island, dva_island, None), (G_island, dvm_island, None)] + \
+                [(-M, idx, coef) for M, idx, coef in terms]
 
-    return load_f, load_t
+        nodal_restrictions_P[np.ix_(bus_original_idx, t_idx)] = model.add_constraints(
+            name='Nodal_real_power_balance_is' + str(i), terms=terms, sense='=', rhs=P_const)
 
+        # Add nodal reactive power balance for the pq nodes: -Gs x dva - B x dvm = Q = -Cl (Ql - LSlack)
+        if len(pq) > 0:
+            Cl = numerical_circuit.C_bus_load[bus_original_idx[pq], :]
+            terms = [(-Gs_island[pq, :], dva_island, None),
+                     (-B_island[pq, :], dvm_island, None),
+                     (-Cl, LSlack[:, t_idx], None)]
 
-def add_battery_discharge_restriction(problem: LpProblem, SoC0, Capacity, Efficiency, Pb, E, dt):
-    """
-    Add the batteries capacity restrictions
-    :param problem: LpProblem instance
-    :param SoC0: State of Charge at 0 (nb)
-    :param SoCmax: Maximum State of Charge (nb)
-    :param SoCmin: Minimum State of Charge (nb)
-    :param Capacity: Capacities of the batteries (nb) in MWh/MW base
-    :param Efficiency: Roundtrip efficiency
-    :param Pb: Batteries injection power LpVars (nb, nt)
-    :param E: Batteries Energy state LpVars (nb, nt)
-    :param dt: time increments in hours (nt-1)
-    :return: Nothing, the restrictions are added to the problem
-    """
-
-    # set the initial state of charge
-    lpAddRestrictions2(problem=problem,
-                       lhs=E[:, 0],
-                       rhs=SoC0 * Capacity,
-                       name='initial_soc',
-                       op='=')
-
-    # compute the inverse of he efficiency because pulp does not divide by floats
-    eff_inv = 1 / Efficiency
+            nodal_restrictions_Q[np.ix_(bus_original_idx[pq], t_idx)] = model.add_constraints(
+                name='Nodal_imag_power_balance_is' + str(i), terms=terms, sense='=', rhs=-(Cl * Ql[:, t_idx]))
 
-    # set the Energy values for t=1:nt
-    for i in range(len(dt) - 1):
+        # delta of voltage angles equal to zero for the slack nodes (vd)
+        model.set_bounds(dva_island[vd, :], lower=0.0, upper=0.0)
 
-        t = i + 1
+        # delta of voltage module equal to zero for the slack and pv nodes (vdpv)
+        model.set_bounds(dvm_island[vdpv, :], lower=0.0, upper=0.0)
 
-        # set the energy value Et = E(t-1) + dt * Pb / eff
-        lpAddRestrictions2(problem=problem,
-                           lhs=E[:, t],
-                           rhs=E[:, t-1] - dt[i] * Pb[:, t] * eff_inv,
-                           name='initial_soc_t' + str(t) + '_',
-                           op='=')
+    return nodal_restrictions_P, nodal_restrictions_Q
 
 
-class OpfAcTimeSeries(OpfTimeSeries):
+class OpfAcTimeSeries(OpfMatrixTimeSeries):
 
     def __init__(self, numerical_circuit: OpfTimeCircuit, start_idx, end_idx, solver: MIPSolvers = MIPSolvers.CBC,
                  batteries_energy_0=None):
@@ -270,11 +124,10 @@ class OpfAcTimeSeries(OpfTimeSeries):
         :param batteries_energy_0: initial state of the batteries, if None the default values are taken
         """
 
-        OpfTimeSeries.__init__(self, numerical_circuit=numerical_circuit, start_idx=start_idx, end_idx=end_idx,
-                               solver=solver)
+        OpfMatrixTimeSeries.__init__(self, numerical_circuit=numerical_circuit, start_idx=start_idx, end_idx=end_idx,
+                                     solver=solver)
 
         self.v0 = None
-        self.dva = None
         self.dvm = None
         self.Ql = None
 
@@ -284,7 +137,7 @@ class OpfAcTimeSeries(OpfTimeSeries):
         """
         Formulate the AC OPF time series in the non-sequential fashion (all to the solver at once)
         :param batteries_energy_0: initial energy state of the batteries (if none, the default is taken)
-        :return: PuLP Problem instance
+        :return: LpMatrixModel instance
         """
         numerical_circuit = self.numerical_circuit
 
@@ -336,74 +189,71 @@ class OpfAcTimeSeries(OpfTimeSeries):
         for t in range(1, nt):
             dt[t - 1] = (numerical_circuit.time_array[a + t] - numerical_circuit.time_array[a + t - 1]).seconds / 3600
 
-        # create LP variables
-        Pg = lpMakeVars(name='Pg', shape=(ng, nt), lower=Pg_min, upper=Pg_max)
-        Pb = lpMakeVars(name='Pb', shape=(nb, nt), lower=Pb_min, upper=Pb_max)
-        E = lpMakeVars(name='E', shape=(nb, nt), lower=Capacity * minSoC, upper=Capacity * maxSoC)
-        load_slack = lpMakeVars(name='LSlack', shape=(nl, nt), lower=0, upper=None)
-        dva = lpMakeVars(name='dva', shape=(n, nt), lower=-3.14, upper=3.14)
-        dvm = lpMakeVars(name='dvm', shape=(n, nt), lower=0, upper=2)
-        theta_f = dva[numerical_circuit.F, :]
-        theta_t = dva[numerical_circuit.T, :]
-        branch_rating_slack1 = lpMakeVars(name='FSlack1', shape=(m, nt), lower=0, upper=None)
-        branch_rating_slack2 = lpMakeVars(name='FSlack2', shape=(m, nt), lower=0, upper=None)
-
         # declare problem
-        problem = LpProblem(name='AC_OPF_Time_Series')
+        model = LpMatrixModel(name='AC_OPF_Time_Series')
+
+        # create LP variables
+        Pg = model.add_vars(name='Pg', shape=(ng, nt), lower=Pg_min[:, np.newaxis], upper=Pg_max[:, np.newaxis])
+        Pb = model.add_vars(name='Pb', shape=(nb, nt), lower=Pb_min[:, np.newaxis], upper=Pb_max[:, np.newaxis])
+        E = model.add_vars(name='E', shape=(nb, nt),
+                           lower=(Capacity * minSoC)[:, np.newaxis], upper=(Capacity * maxSoC)[:, np.newaxis])
+        load_slack = model.add_vars(name='LSlack', shape=(nl, nt), lower=0, upper=None)
+        dva = model.add_vars(name='dva', shape=(n, nt), lower=-3.14, upper=3.14)
+        dvm = model.add_vars(name='dvm', shape=(n, nt), lower=0, upper=2)
+        branch_rating_slack1 = model.add_vars(name='FSlack1', shape=(m, nt), lower=0, upper=None)
+        branch_rating_slack2 = model.add_vars(name='FSlack2', shape=(m, nt), lower=0, upper=None)
 
         # add the objective function
-        problem += add_objective_function(Pg, Pb, load_slack, branch_rating_slack1, branch_rating_slack2,
-                                          cost_g, cost_b, cost_l, cost_br)
+        add_objective_function(model, Pg, Pb, load_slack, branch_rating_slack1, branch_rating_slack2,
+                               cost_g, cost_b, cost_l, cost_br)
 
         # set the fixed generation values
-        set_fix_generation(problem=problem, Pg=Pg, P_profile=P_profile,
-                           enabled_for_dispatch=enabled_for_dispatch)
-
-        # compute the power injections per node
-        P, Q = get_power_injections(C_bus_gen=numerical_circuit.C_bus_gen, Pg=Pg,
-                                    C_bus_bat=numerical_circuit.C_bus_batt, Pb=Pb,
-                                    C_bus_load=numerical_circuit.C_bus_load,
-                                    PlSlack=load_slack, QlSlack=load_slack,
-                                    Pl=Pl, Ql=Ql)
+        set_fix_generation(model=model, Pg=Pg, P_profile=P_profile, enabled_for_dispatch=enabled_for_dispatch)
 
         # compute the nodal power balance restrictions
         nodal_restrictions_P, nodal_restrictions_Q = add_ac_nodal_power_balance(numerical_circuit=numerical_circuit,
-                                                                                problem=problem,
-                                                                                dvm=dvm, dva=dva, P=P, Q=Q,
-                                                                                start_=self.start_idx, end_=self.end_idx)
+                                                                                model=model,
+                                                                                dvm=dvm, dva=dva,
+                                                                                Pg=Pg, Pb=Pb, LSlack=load_slack,
+                                                                                Pl=Pl, Ql=Ql,
+                                                                                start_=self.start_idx,
+                                                                                end_=self.end_idx)
+
+        branch_bus = get_branch_bus_matrix(numerical_circuit)
 
-        load_f, load_t = add_branch_loading_restriction(problem, theta_f, theta_t, Bseries, branch_ratings,
-                                                        branch_rating_slack1, branch_rating_slack2)
+        add_branch_loading_restriction(model, branch_bus, dva, Bseries, branch_ratings,
+                                       branch_rating_slack1, branch_rating_slack2)
 
         # if there are batteries, add the batteries
         if nb > 0:
-            add_battery_discharge_restriction(problem, SoC0, Capacity, Efficiency, Pb, E, dt)
+            add_battery_discharge_restriction(model, SoC0, Capacity, Efficiency, Pb, E, dt)
 
-        # Assign variables to keep
-        # transpose them to be in the format of GridCal: time, device
+        # Assign variables to keep (device, time)
         self.v0 = np.abs(numerical_circuit.Vbus[a:b, :])
-        self.dva = dva.transpose()
-        self.dvm = dvm.transpose()
-        self.Pg = Pg.transpose()
-        self.Pb = Pb.transpose()
-        self.Pl = Pl.transpose()
-        self.E = E.transpose()
-        self.load_shedding = load_slack.transpose()
-        self.s_from = load_f.transpose()
-        self.s_to = load_t.transpose()
-        self.overloads = (branch_rating_slack1 + branch_rating_slack2).transpose()
+        self.theta = dva
+        self.dvm = dvm
+        self.Pg = Pg
+        self.Pb = Pb
+        self.Pl = Pl
+        self.Ql = Ql
+        self.E = E
+        self.load_shedding = load_slack
+        self.FSlack1 = branch_rating_slack1
+        self.FSlack2 = branch_rating_slack2
+        self.branch_bus = branch_bus
+        self.Bseries = Bseries
         self.rating = branch_ratings.T
         self.nodal_restrictions = nodal_restrictions_P
 
-        return problem
+        return model
 
     def get_voltage(self):
         """
         return the complex voltages (time, device)
         :return: 2D array
         """
-        angles = self.extract2D(self.dva)
-        modules = self.v0 + self.extract2D(self.dvm)
+        angles = self.extract(self.theta)
+        modules = self.v0 + self.extract(self.dvm)
         return modules * np.exp(-1j * angles)
 
 
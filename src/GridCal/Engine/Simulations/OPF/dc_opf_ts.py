@@ -17,44 +17,47 @@
 This file implements a DC-OPF for time series
 That means that solves the OPF problem for a complete time series at once
 """
-from GridCal.Engine.Simulations.OPF.opf_templates import OpfTimeSeries
+import numpy as np
+import scipy.sparse as sp
+
+from GridCal.Engine.Simulations.OPF.opf_templates import OpfMatrixTimeSeries
+from GridCal.Engine.Simulations.OPF.lp_matrix import LpMatrixModel
 from GridCal.Engine.basic_structures import MIPSolvers
 from GridCal.Engine.Core.time_series_opf_data import OpfTimeCircuit, split_opf_time_circuit_into_islands
 
-from GridCal.ThirdParty.pulp import *
-
 
-def get_objective_function(Pg, Pb, LSlack, FSlack1, FSlack2,
+def add_objective_function(model: LpMatrixModel, Pg, Pb, LSlack, FSlack1, FSlack2,
                            cost_g, cost_b, cost_l, cost_br):
     """
     Add the objective function to the problem
-    :param Pg: generator LpVars (ng, nt)
-    :param Pb: batteries LpVars (nb, nt)
-    :param LSlack: Load slack LpVars (nl, nt)
+    :param model: LpMatrixModel instance
+    :param Pg: generator variables (ng, nt)
+    :param Pb: batteries variables (nb, nt)
+    :param LSlack: Load slack variables (nl, nt)
     :param FSlack1: Branch overload slack1 (m, nt)
     :param FSlack2: Branch overload slack2 (m, nt)
     :param cost_g: Cost of the generators (ng, nt)
     :param cost_b: Cost of the batteries (nb, nt)
     :param cost_l: Cost of the loss of load (nl, nt)
     :param cost_br: Cost of the overload (m, nt)
-    :return: Nothing, just assign the objective function
+    :return: Nothing, the costs are added to the model
     """
 
-    f_obj = lpSum(cost_g * Pg)
+    model.add_cost(Pg, cost_g)
 
-    f_obj += lpSum(cost_b * Pb)
+    model.add_cost(Pb, cost_b)
 
-    f_obj += lpSum(cost_l * LSlack)
+    model.add_cost(LSlack, cost_l)
 
-    f_obj += lpSum(cost_br * (FSlack1 + FSlack2))
+    model.add_cost(FSlack1, cost_br)
 
-    return f_obj
+    model.add_cost(FSlack2, cost_br)
 
 
-def set_fix_generation(problem, Pg, P_profile, enabled_for_dispatch):
+def set_fix_generation(model: LpMatrixModel, Pg, P_profile, enabled_for_dispatch):
     """
     Set the generation fixed at the non dispatchable generators
-    :param problem: LP problem instance
+    :param model: LpMatrixModel instance
     :param Pg: Array of generation variables
     :param P_profile: Array of fixed generation values
     :param enabled_for_dispatch: array of "enables" for dispatching generators
@@ -63,44 +66,63 @@ def set_fix_generation(problem, Pg, P_profile, enabled_for_dispatch):
 
     idx = np.where(enabled_for_dispatch == False)[0]
 
-    lpAddRestrictions2(problem=problem,
-                       lhs=Pg[idx, :],
-                       rhs=P_profile[idx, :],
-                       # Fmax + FSlack2
-                       name='fixed_generation',
-                       op='=')
+    if len(idx) > 0:
+        model.add_constraints(name='fixed_generation',
+                              terms=[(None, Pg[idx, :], None)],
+                              sense='=',
+                              rhs=P_profile[idx, :])
 
 
-def get_power_injections(C_bus_gen, Pg, C_bus_bat, Pb, C_bus_load, LSlack, Pl):
+def get_injection_terms(C_bus_gen, Pg, C_bus_bat, Pb, C_bus_load, LSlack, Pl, bus_idx, t_idx):
     """
-    Create the power injections per bus
+    Get the terms of the power injections (P = Cg Pg + Cb Pb - Cl (Pl - LSlack)) of some buses and time steps
     :param C_bus_gen: Bus-Generators sparse connectivity matrix (n, ng)
-    :param Pg: generator LpVars (ng, nt)
+    :param Pg: generator variables (ng, nt)
     :param C_bus_bat: Bus-Batteries sparse connectivity matrix (n, nb)
-    :param Pb: Batteries LpVars (nb, nt)
+    :param Pb: Batteries variables (nb, nt)
     :param C_bus_load: Bus-Load sparse connectivity matrix (n, nl)
-    :param LSlack: Load slack LpVars (nl, nt)
+    :param LSlack: Load slack variables (nl, nt)
     :param Pl: Load values (nl, nt)
-    :return: Power injection at the buses (n, nt)
+    :param bus_idx: indices of the buses
+    :param t_idx: indices of the time steps
+    :return: list of variable terms, constant injection (len(bus_idx), len(t_idx))
     """
+    Cl = C_bus_load[bus_idx, :]
 
-    P = lpDot(C_bus_gen, Pg)
+    terms = [(C_bus_gen[bus_idx, :], Pg[:, t_idx], None),
+             (C_bus_bat[bus_idx, :], Pb[:, t_idx], None),
+             (Cl, LSlack[:, t_idx], None)]
 
-    P += lpDot(C_bus_bat, Pb)
+    return terms, - (Cl * Pl[:, t_idx])
 
-    P -= lpDot(C_bus_load, Pl - LSlack)
 
-    return P
+def get_island_time_steps(calc_inpt: OpfTimeCircuit, start_, end_):
+    """
+    Get the time steps of an island that fall within the formulation interval
+    :param calc_inpt: OpfTimeCircuit island
+    :param start_: start index of the interval
+    :param end_: end index of the interval
+    :return: local time indices of the island, time indices relative to the interval
+    """
+    t = np.array(calc_inpt.original_time_idx, dtype=int)
+    local_idx = np.where((t >= start_) & (t < end_))[0]
+    return local_idx, t[local_idx] - start_
 
 
-def add_dc_nodal_power_balance(numerical_circuit: OpfTimeCircuit, problem: LpProblem, theta, P, start_, end_):
+def add_dc_nodal_power_balance(numerical_circuit: OpfTimeCircuit, model: LpMatrixModel, theta,
+                               Pg, Pb, LSlack, Pl, start_, end_):
     """
     Add the nodal power balance
     :param numerical_circuit: NumericalCircuit instance
-    :param problem: LpProblem instance
-    :param theta: Voltage angles LpVars (n, nt)
-    :param P: Power injection at the buses LpVars (n, nt)
-    :return: Nothing, the restrictions are added to the problem
+    :param model: LpMatrixModel instance
+    :param theta: Voltage angles variables (n, nt)
+    :param Pg: generator variables (ng, nt)
+    :param Pb: Batteries variables (nb, nt)
+    :param LSlack: Load slack variables (nl, nt)
+    :param Pl: Load values (nl, nt)
+    :param start_: start index of the formulation interval
+    :param end_: end index of the formulation interval
+    :return: array of nodal restriction indices (n, nt), -1 where there is no restriction
     """
 
     # do the topological computation
@@ -110,122 +132,110 @@ def add_dc_nodal_power_balance(numerical_circuit: OpfTimeCircuit, problem: LpPro
     if end_ == -1:
         end_ = len(numerical_circuit.time_array)
 
-    nodal_restrictions = np.empty((numerical_circuit.nbus, end_ - start_), dtype=object)
+    nodal_restrictions = np.full((numerical_circuit.nbus, end_ - start_), -1, dtype=int)
 
     # For every island, run the time series
     for i, calc_inpt in enumerate(calc_inputs):
 
+        _, t_idx = get_island_time_steps(calc_inpt, start_, end_)
+
+        if len(t_idx) == 0:
+            continue
+
         # find the original indices
-        bus_original_idx = np.array(calc_inpt.original_bus_idx)
-
-        # re-pack the variables for the island and time interval
-        P_island = P[bus_original_idx, :]  # the sizes already reflect the correct time span
-        theta_island = theta[bus_original_idx, :]  # the sizes already reflect the correct time span
-        B_island = calc_inpt.Ybus.imag
-
-        pqpv = calc_inpt.pqpv
-        vd = calc_inpt.vd
-
-        # Add nodal power balance for the non slack nodes
-        idx = bus_original_idx[pqpv]
-        nodal_restrictions[idx] = lpAddRestrictions2(problem=problem,
-                                                     lhs=lpDot(B_island[np.ix_(pqpv, pqpv)], theta_island[pqpv, :]),
-                                                     rhs=P_island[pqpv, :],
-                                                     name='Nodal_power_balance_pqpv_is' + str(i),
-                                                     op='=')
-
-        # Add nodal power balance for the slack nodes
-        idx = bus_original_idx[vd]
-        nodal_restrictions[idx] = lpAddRestrictions2(problem=problem,
-                                                     lhs=lpDot(B_island[vd, :], theta_island),
-                                                     rhs=P_island[vd, :],
-                                                     name='Nodal_power_balance_vd_is' + str(i),
-                                                     op='=')
+        bus_original_idx = np.array(calc_inpt.original_bus_idx, dtype=int)
+        vd = np.array(calc_inpt.vd, dtype=int)
+
+        # B x theta = P, expressed as B x theta - P(variables) = P(constant)
+        terms, P_const = get_injection_terms(C_bus_gen=numerical_circuit.C_bus_gen, Pg=Pg,
+                                             C_bus_bat=numerical_circuit.C_bus_batt, Pb=Pb,
+                                             C_bus_load=numerical_circuit.C_bus_load, LSlack=LSlack, Pl=Pl,
+                                             bus_idx=bus_original_idx, t_idx=t_idx)
+
+        terms = [(calc_inpt.Ybus.imag, theta[np.ix_(bus_original_idx, t_idx)], None)] + \
+                [(-M, idx, coef) for M, idx, coef in terms]
+
+        nodal_restrictions[np.ix_(bus_original_idx, t_idx)] = model.add_constraints(
+            name='Nodal_power_balance_is' + str(i), terms=terms, sense='=', rhs=P_const)
 
         # slack angles equal to zero
-        lpAddRestrictions2(problem=problem,
-                           lhs=theta_island[vd, :],
-                           rhs=np.zeros_like(theta_island[vd, :]),
-                           name='Theta_vd_zero_is' + str(i),
-                           op='=')
+        model.set_bounds(theta[np.ix_(bus_original_idx[vd], t_idx)], lower=0.0, upper=0.0)
 
     return nodal_restrictions
 
 
-def add_branch_loading_restriction(problem: LpProblem,
-                                   theta_f, theta_t, Bseries,
-                                   Fmax, FSlack1, FSlack2):
+def get_branch_bus_matrix(numerical_circuit: OpfTimeCircuit):
+    """
+    Get the branch-bus incidence matrix Cf - Ct
+    :param numerical_circuit: OpfTimeCircuit instance
+    :return: CSC sparse matrix (m, n)
+    """
+    m = numerical_circuit.nbr
+    n = numerical_circuit.nbus
+    rows = np.r_[np.arange(m), np.arange(m)]
+    cols = np.r_[numerical_circuit.F, numerical_circuit.T]
+    data = np.r_[np.ones(m), -np.ones(m)]
+    return sp.csc_matrix((data, (rows, cols)), shape=(m, n))
+
+
+def add_branch_loading_restriction(model: LpMatrixModel, branch_bus, theta, Bseries, Fmax, FSlack1, FSlack2):
     """
     Add the branch loading restrictions
-    :param problem: LpProblem instance
-    :param theta_f: voltage angles at the "from" side of the branches (m, nt)
-    :param theta_t: voltage angles at the "to" side of the branches (m, nt)
-    :param Bseries: Array of branch susceptances (m)
+    :param model: LpMatrixModel instance
+    :param branch_bus: branch-bus incidence matrix Cf - Ct (m, n)
+    :param theta: voltage angles variables (n, nt)
+    :param Bseries: Array of branch susceptances (m, nt)
     :param Fmax: Array of branch ratings (m, nt)
     :param FSlack1: Array of branch loading slack variables in the from-to sense
     :param FSlack2: Array of branch loading slack variables in the to-from sense
     :return: Nothing
     """
 
-    load_f = Bseries * (theta_f - theta_t)
-    load_t = Bseries * (theta_t - theta_f)
+    # from-to branch power restriction: Bseries (theta_f - theta_t) <= Fmax + FSlack1
+    model.add_constraints(name='from_to_branch_rate',
+                          terms=[(branch_bus, theta, Bseries), (None, FSlack1, -1.0)],
+                          sense='<=',
+                          rhs=Fmax)
 
-    # from-to branch power restriction
-    lpAddRestrictions2(problem=problem,
-                       lhs=load_f,
-                       rhs=np.array([Fmax[:, i] + FSlack1[:, i] for i in range(FSlack1.shape[1])]).transpose(),  # Fmax + FSlack1
-                       name='from_to_branch_rate',
-                       op='<=')
+    # to-from branch power restriction: Bseries (theta_t - theta_f) <= Fmax + FSlack2
+    model.add_constraints(name='to_from_branch_rate',
+                          terms=[(branch_bus, theta, -Bseries), (None, FSlack2, -1.0)],
+                          sense='<=',
+                          rhs=Fmax)
 
-    # to-from branch power restriction
-    lpAddRestrictions2(problem=problem,
-                       lhs=load_t,
-                       rhs=np.array([Fmax[:, i] + FSlack2[:, i] for i in range(FSlack2.shape[1])]).transpose(),  # Fmax + FSlack2
-                       name='to_from_branch_rate',
-                       op='<=')
 
-    return load_f, load_t
-
-
-def add_battery_discharge_restriction(problem: LpProblem, SoC0, Capacity, Efficiency, Pb, E, dt):
+def add_battery_discharge_restriction(model: LpMatrixModel, SoC0, Capacity, Efficiency, Pb, E, dt):
     """
     Add the batteries capacity restrictions
-    :param problem: LpProblem instance
+    :param model: LpMatrixModel instance
     :param SoC0: State of Charge at 0 (nb)
-    :param SoCmax: Maximum State of Charge (nb)
-    :param SoCmin: Minimum State of Charge (nb)
     :param Capacity: Capacities of the batteries (nb) in MWh/MW base
     :param Efficiency: Roundtrip efficiency
-    :param Pb: Batteries injection power LpVars (nb, nt)
-    :param E: Batteries Energy state LpVars (nb, nt)
+    :param Pb: Batteries injection power variables (nb, nt)
+    :param E: Batteries Energy state variables (nb, nt)
     :param dt: time increments in hours (nt-1)
     :return: Nothing, the restrictions are added to the problem
     """
 
     # set the initial state of charge
-    lpAddRestrictions2(problem=problem,
-                       lhs=E[:, 0],
-                       rhs=SoC0 * Capacity,
-                       name='initial_soc',
-                       op='=')
-
-    # compute the inverse of he efficiency because pulp does not divide by floats
-    eff_inv = 1 / Efficiency
+    model.add_constraints(name='initial_soc',
+                          terms=[(None, E[:, :1], None)],
+                          sense='=',
+                          rhs=(SoC0 * Capacity)[:, np.newaxis])
 
-    # set the Energy values for t=1:nt
-    for i in range(len(dt) - 1):
+    if E.shape[1] > 1:
+        eff_inv = np.ones(E.shape[0]) / Efficiency
 
-        t = i + 1
+        # set the energy values for t=1:nt at once: Et - E(t-1) + dt * Pb / eff = 0
+        model.add_constraints(name='soc',
+                              terms=[(None, E[:, 1:], None),
+                                     (None, E[:, :-1], -1.0),
+                                     (None, Pb[:, 1:], eff_inv[:, np.newaxis] * dt[np.newaxis, :-1])],
+                              sense='=',
+                              rhs=0.0)
 
-        # set the energy value Et = E(t-1) + dt * Pb / eff
-        lpAddRestrictions2(problem=problem,
-                           lhs=E[:, t],
-                           rhs=E[:, t-1] - dt[i] * Pb[:, t] * eff_inv,
-                           name='initial_soc_t' + str(t) + '_',
-                           op='=')
 
-
-class OpfDcTimeSeries(OpfTimeSeries):
+class OpfDcTimeSeries(OpfMatrixTimeSeries):
 
     def __init__(self, numerical_circuit: OpfTimeCircuit, start_idx, end_idx, solver: MIPSolvers = MIPSolvers.CBC,
                  batteries_energy_0=None):
@@ -237,17 +247,17 @@ class OpfDcTimeSeries(OpfTimeSeries):
         :param solver: MIP solver to use
         :param batteries_energy_0: initial state of the batteries, if None the default values are taken
         """
-        OpfTimeSeries.__init__(self, numerical_circuit=numerical_circuit, start_idx=start_idx, end_idx=end_idx,
-                               solver=solver)
+        OpfMatrixTimeSeries.__init__(self, numerical_circuit=numerical_circuit, start_idx=start_idx, end_idx=end_idx,
+                                     solver=solver)
 
         # build the formulation
         self.problem = self.formulate(batteries_energy_0=batteries_energy_0)
 
     def formulate(self, batteries_energy_0=None):
         """
-        Formulate the AC OPF time series in the non-sequential fashion (all to the solver at once)
+        Formulate the DC OPF time series in the non-sequential fashion (all to the solver at once)
         :param batteries_energy_0: initial energy state of the batteries (if none, the default is taken)
-        :return: PuLP Problem instance
+        :return: LpMatrixModel instance
         """
 
         # general indices
@@ -296,63 +306,55 @@ class OpfDcTimeSeries(OpfTimeSeries):
         for t in range(1, nt):
             dt[t - 1] = (self.numerical_circuit.time_array[a + t] - self.numerical_circuit.time_array[a + t - 1]).seconds / 3600
 
-        # create LP variables
-        Pg = lpMakeVars(name='Pg', shape=(ng, nt), lower=Pg_min, upper=Pg_max)
-        Pb = lpMakeVars(name='Pb', shape=(nb, nt), lower=Pb_min, upper=Pb_max)
-        E = lpMakeVars(name='E', shape=(nb, nt), lower=Capacity * minSoC, upper=Capacity * maxSoC)
-        load_slack = lpMakeVars(name='LSlack', shape=(nl, nt), lower=0, upper=None)
-        theta = lpMakeVars(name='theta', shape=(n, nt), lower=-3.14, upper=3.14)
-        theta_f = theta[self.numerical_circuit.F, :]
-        theta_t = theta[self.numerical_circuit.T, :]
-        branch_rating_slack1 = lpMakeVars(name='FSlack1', shape=(m, nt), lower=0, upper=None)
-        branch_rating_slack2 = lpMakeVars(name='FSlack2', shape=(m, nt), lower=0, upper=None)
-
         # declare problem
-        problem = LpProblem(name='DC_OPF_Time_Series')
+        model = LpMatrixModel(name='DC_OPF_Time_Series')
+
+        # create LP variables
+        Pg = model.add_vars(name='Pg', shape=(ng, nt), lower=Pg_min[:, np.newaxis], upper=Pg_max[:, np.newaxis])
+        Pb = model.add_vars(name='Pb', shape=(nb, nt), lower=Pb_min[:, np.newaxis], upper=Pb_max[:, np.newaxis])
+        E = model.add_vars(name='E', shape=(nb, nt),
+                           lower=(Capacity * minSoC)[:, np.newaxis], upper=(Capacity * maxSoC)[:, np.newaxis])
+        load_slack = model.add_vars(name='LSlack', shape=(nl, nt), lower=0, upper=None)
+        theta = model.add_vars(name='theta', shape=(n, nt), lower=-3.14, upper=3.14)
+        branch_rating_slack1 = model.add_vars(name='FSlack1', shape=(m, nt), lower=0, upper=None)
+        branch_rating_slack2 = model.add_vars(name='FSlack2', shape=(m, nt), lower=0, upper=None)
 
         # add the objective function
-        problem += get_objective_function(Pg, Pb, load_slack, branch_rating_slack1, branch_rating_slack2,
-                                          cost_g, cost_b, cost_l, cost_br)
+        add_objective_function(model, Pg, Pb, load_slack, branch_rating_slack1, branch_rating_slack2,
+                               cost_g, cost_b, cost_l, cost_br)
 
         # set the fixed generation values
-        set_fix_generation(problem=problem, Pg=Pg, P_profile=P_profile,
-                           enabled_for_dispatch=enabled_for_dispatch)
-
-        # compute the power injections
-        P = get_power_injections(C_bus_gen=self.numerical_circuit.C_bus_gen,
-                                 Pg=Pg,
-                                 C_bus_bat=self.numerical_circuit.C_bus_batt,
-                                 Pb=Pb,
-                                 C_bus_load=self.numerical_circuit.C_bus_load,
-                                 LSlack=load_slack,
-                                 Pl=Pl)
+        set_fix_generation(model=model, Pg=Pg, P_profile=P_profile, enabled_for_dispatch=enabled_for_dispatch)
 
         # set the nodal restrictions
-        nodal_restrictions = add_dc_nodal_power_balance(self.numerical_circuit, problem, theta, P,
+        nodal_restrictions = add_dc_nodal_power_balance(self.numerical_circuit, model, theta,
+                                                        Pg=Pg, Pb=Pb, LSlack=load_slack, Pl=Pl,
                                                         start_=self.start_idx, end_=self.end_idx)
 
-        load_f, load_t = add_branch_loading_restriction(problem, theta_f, theta_t, Bseries, branch_ratings,
-                                                        branch_rating_slack1, branch_rating_slack2)
+        branch_bus = get_branch_bus_matrix(self.numerical_circuit)
+
+        add_branch_loading_restriction(model, branch_bus, theta, Bseries, branch_ratings,
+                                       branch_rating_slack1, branch_rating_slack2)
 
         # if there are batteries, add the batteries
         if nb > 0:
-            add_battery_discharge_restriction(problem, SoC0, Capacity, Efficiency, Pb, E, dt)
-
-        # Assign variables to keep
-        # transpose them to be in the format of GridCal: time, device
-        self.theta = theta.transpose()
-        self.Pg = Pg.transpose()
-        self.Pb = Pb.transpose()
-        self.Pl = Pl.transpose()
-        self.E = E.transpose()
-        self.load_shedding = load_slack.transpose()
-        self.s_from = load_f.transpose()
-        self.s_to = load_t.transpose()
-        self.overloads = (branch_rating_slack1 + branch_rating_slack2).transpose()
+            add_battery_discharge_restriction(model, SoC0, Capacity, Efficiency, Pb, E, dt)
+
+        # Assign variables to keep (device, time)
+        self.theta = theta
+        self.Pg = Pg
+        self.Pb = Pb
+        self.Pl = Pl
+        self.E = E
+        self.load_shedding = load_slack
+        self.FSlack1 = branch_rating_slack1
+        self.FSlack2 = branch_rating_slack2
+        self.branch_bus = branch_bus
+        self.Bseries = Bseries
         self.rating = branch_ratings.T
         self.nodal_restrictions = nodal_restrictions
 
-        return problem
+        return model
 
 
 if __name__ == '__main__':
@@ -0,0 +1,401 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Sparse matrix LP model.
+
+The problem min c x, s.t. A x (=, <=, >=) b, lb <= x <= ub is assembled directly in sparse matrix form: the variables
+are blocks of column indices (i.e. (devices, time)) and the constraints are blocks of rows built from sparse matrices
+applied to every time step at once, so no per-cell Python expression is ever created.
+The model is written to MPS in bulk and solved with CBC, or translated to PuLP to use any of its solvers.
+"""
+
+import os
+import subprocess
+from uuid import uuid4
+import numpy as np
+import scipy.sparse as sp
+
+from GridCal.Engine.basic_structures import MIPSolvers
+from GridCal.ThirdParty.pulp import *
+
+
+class LpMatrixModel:
+
+    def __init__(self, name='LP'):
+        """
+        Sparse matrix LP model (minimization)
+        :param name: name of the problem
+        """
+        self.name = name
+
+        # variables
+        self.nvar = 0
+        self.lower = list()
+        self.upper = list()
+        self.cost = list()
+        self.var_names = list()  # (name, first index, shape)
+
+        # constraints in coordinate form
+        self.nrow = 0
+        self.rows = list()
+        self.cols = list()
+        self.vals = list()
+        self.rhs = list()
+        self.senses = list()
+        self.row_names = list()  # (name, first index, shape)
+
+        # solution
+        self.status = LpStatusNotSolved
+        self.x = None
+        self.duals = None
+        self.objective = None
+
+    def add_vars(self, name, shape, lower=0.0, upper=None):
+        """
+        Declare a block of variables
+        :param name: name of the block
+        :param shape: shape of the block (i.e. (ng, nt))
+        :param lower: lower bound (scalar or array broadcastable to the shape), None for -infinity
+        :param upper: upper bound (scalar or array broadcastable to the shape), None for +infinity
+        :return: array of the variable indices with the given shape
+        """
+        size = int(np.prod(shape))
+        idx = np.arange(self.nvar, self.nvar + size).reshape(shape)
+
+        lb = -np.inf if lower is None else lower
+        ub = np.inf if upper is None else upper
+
+        self.lower.append(np.broadcast_to(np.asarray(lb, dtype=float), shape).ravel())
+        self.upper.append(np.broadcast_to(np.asarray(ub, dtype=float), shape).ravel())
+        self.cost.append(np.zeros(size))
+        self.var_names.append((name, self.nvar, shape))
+        self.nvar += size
+
+        return idx
+
+    def set_bounds(self, idx, lower=None, upper=None):
+        """
+        Modify the bounds of some already declared variables
+        :param idx: array of variable indices
+        :param lower: new lower bound (scalar or array broadcastable to idx), None to keep it
+        :param upper: new upper bound (scalar or array broadcastable to idx), None to keep it
+        """
+        self.consolidate_vars()
+        idx = np.asarray(idx)
+        if lower is not None:
+            self.lower[0][idx] = lower
+        if upper is not None:
+            self.upper[0][idx] = upper
+
+    def add_cost(self, idx, cost):
+        """
+        Add cost coefficients to the objective function
+        :param idx: array of variable indices
+        :param cost: cost array broadcastable to idx
+        """
+        self.consolidate_vars()
+        idx = np.asarray(idx)
+        np.add.at(self.cost[0], idx.ravel(), np.broadcast_to(cost, idx.shape).ravel())
+
+    def consolidate_vars(self):
+        """
+        Merge the variable blocks into single arrays
+        """
+        if len(self.lower) > 1:
+            self.lower = [np.concatenate(self.lower)]
+            self.upper = [np.concatenate(self.upper)]
+            self.cost = [np.concatenate(self.cost)]
+
+        # the broadcast arrays may be read only
+        for arr in [self.lower, self.upper, self.cost]:
+            if len(arr) == 1 and not arr[0].flags.writeable:
+                arr[0] = np.array(arr[0])
+
+    def add_constraints(self, name, terms, sense, rhs):
+        """
+        Add a block of constraints sum_k M_k x[idx_k] * coef_k (sense) rhs, where every term is applied to all the
+        columns (time steps) of its variable indices at once
+        :param name: name of the block
+        :param terms: list of (M, idx, coef) where
+                        M: sparse matrix (nr, nd) or None for the identity,
+                        idx: array of variable indices (nd, nt),
+                        coef: scaling of the rows of the term (scalar or array broadcastable to (nr, nt)) or None
+        :param sense: '=', '<=' or '>='
+        :param rhs: right hand side (scalar or array broadcastable to (nr, nt))
+        :return: array of the constraint indices (nr, nt)
+        """
+        shape = None
+
+        for M, idx, coef in terms:
+
+            idx = np.asarray(idx, dtype=int)
+            if idx.ndim == 1:
+                idx = idx[:, np.newaxis]
+            nd, nt = idx.shape
+
+            if M is None:
+                M = sp.identity(nd, format='coo')
+            else:
+                M = sp.coo_matrix(M)
+
+            nr = M.shape[0]
+            if shape is None:
+                shape = (nr, nt)
+            elif shape != (nr, nt):
+                raise Exception('The terms of ' + name + ' have inconsistent shapes: ' + str(shape) + ', ' +
+                                str((nr, nt)))
+
+            # replicate every entry of M for every column (time step)
+            t = np.tile(np.arange(nt), M.nnz)
+            r = np.repeat(M.row, nt)
+            val = np.repeat(M.data.astype(float), nt)
+
+            if coef is not None:
+                val = val * np.broadcast_to(coef, (nr, nt))[r, t]
+
+            self.rows.append(self.nrow + r * nt + t)
+            self.cols.append(idx[np.repeat(M.col, nt), t])
+            self.vals.append(val)
+
+        size = shape[0] * shape[1]
+        self.rhs.append(np.broadcast_to(np.asarray(rhs, dtype=float), shape).ravel())
+        self.senses.append(np.full(size, {'=': 'E', '<=': 'L', '>=': 'G'}[sense]))
+        self.row_names.append((name, self.nrow, shape))
+
+        idx = np.arange(self.nrow, self.nrow + size).reshape(shape)
+        self.nrow += size
+
+        return idx
+
+    def get_matrices(self):
+        """
+        Get the matrix form of the problem
+        :return: c, A (CSC), senses, b, lb, ub
+        """
+        self.consolidate_vars()
+
+        if self.nrow > 0:
+            A = sp.csc_matrix((np.concatenate(self.vals), (np.concatenate(self.rows), np.concatenate(self.cols))),
+                              shape=(self.nrow, self.nvar))
+            b = np.concatenate(self.rhs)
+            senses = np.concatenate(self.senses)
+        else:
+            A = sp.csc_matrix((0, self.nvar))
+            b = np.zeros(0)
+            senses = np.zeros(0, dtype='<U1')
+
+        if self.nvar > 0:
+            return self.cost[0], A, senses, b, self.lower[0], self.upper[0]
+        else:
+            return np.zeros(0), A, senses, b, np.zeros(0), np.zeros(0)
+
+    def write_mps(self, file_name):
+        """
+        Write the problem in free MPS format. The rows are called R<index> and the columns C<index>
+        :param file_name: name of the file
+        """
+        c, A, senses, b, lb, ub = self.get_matrices()
+
+        lines = ['NAME ' + self.name, 'ROWS', ' N  OBJ']
+        lines += [' %s  R%d' % (s, i) for i, s in enumerate(senses.tolist())]
+
+        # the columns must be listed contiguously, which is the CSC order with the objective first
+        lines.append('COLUMNS')
+        col_of_entry = np.repeat(np.arange(self.nvar), np.diff(A.indptr))
+        obj_cols = np.where(c != 0)[0]
+        entries_col = np.r_[obj_cols, col_of_entry]
+        entries_row = np.r_[np.full(len(obj_cols), -1), A.indices]
+        entries_val = np.r_[c[obj_cols], A.data]
+        order = np.argsort(entries_col, kind='stable')
+        lines += ['    C%d  %s  %.12g' % (j, 'OBJ' if i < 0 else 'R%d' % i, v)
+                  for j, i, v in zip(entries_col[order].tolist(), entries_row[order].tolist(),
+                                     entries_val[order].tolist())]
+
+        # columns that appear nowhere must be declared anyway
+        empty = np.setdiff1d(np.arange(self.nvar), entries_col)
+        lines += ['    C%d  OBJ  0' % j for j in empty.tolist()]
+
+        lines.append('RHS')
+        nz = np.where(b != 0)[0]
+        lines += ['    RHS  R%d  %.12g' % (i, v) for i, v in zip(nz.tolist(), b[nz].tolist())]
+
+        lines.append('BOUNDS')
+        fixed = lb == ub
+        free = np.isinf(lb) & np.isinf(ub)
+        for j in np.where(fixed)[0].tolist():
+            lines.append(' FX BND  C%d  %.12g' % (j, lb[j]))
+        for j in np.where(free)[0].tolist():
+            lines.append(' FR BND  C%d' % j)
+        rest = ~fixed & ~free
+        for j in np.where(rest & np.isinf(lb))[0].tolist():
+            lines.append(' MI BND  C%d' % j)
+        for j in np.where(rest & np.isfinite(lb))[0].tolist():
+            lines.append(' LO BND  C%d  %.12g' % (j, lb[j]))
+        for j in np.where(rest & np.isfinite(ub))[0].tolist():
+            lines.append(' UP BND  C%d  %.12g' % (j, ub[j]))
+
+        lines.append('ENDATA')
+
+        with open(file_name, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def solve_cbc(self, msg=False, keep_files=False):
+        """
+        Solve the problem with the CBC executable shipped with PuLP, passing the problem as a bulk MPS file
+        :param msg: show the solver output?
+        :param keep_files: keep the MPS and solution files?
+        :return: status string
+        """
+        solver = PULP_CBC_CMD(msg=msg)
+
+        uuid = uuid4().hex
+        mps_file = os.path.join(solver.tmpDir, uuid + '-gridcal.mps')
+        sol_file = os.path.join(solver.tmpDir, uuid + '-gridcal.sol')
+
+        self.write_mps(mps_file)
+
+        args = [solver.path, mps_file, 'initialSolve', 'printingOptions', 'all', 'solution', sol_file]
+        pipe = None if msg else open(os.devnull, 'w')
+        process = subprocess.Popen(args, stdout=pipe, stderr=pipe)
+        ret = process.wait()
+        if pipe is not None:
+            pipe.close()
+
+        if ret != 0 or not os.path.exists(sol_file):
+            raise PulpSolverError("Error while trying to execute " + solver.path)
+
+        self.read_cbc_solution(sol_file)
+
+        if not keep_files:
+            for f in [mps_file, sol_file]:
+                try:
+                    os.remove(f)
+                except OSError:
+                    pass
+
+        return LpStatus[self.status]
+
+    def read_cbc_solution(self, file_name):
+        """
+        Read a CBC solution file of a problem written with write_mps
+        :param file_name: name of the file
+        """
+        cbc_status = {'Optimal': LpStatusOptimal,
+                      'Infeasible': LpStatusInfeasible,
+                      'Integer': LpStatusInfeasible,
+                      'Unbounded': LpStatusUnbounded,
+                      'Stopped': LpStatusNotSolved}
+
+        self.x = np.zeros(self.nvar)
+        self.duals = np.zeros(self.nrow)
+
+        with open(file_name) as f:
+            header = f.readline().split()
+            self.status = cbc_status.get(header[0], LpStatusUndefined) if len(header) else LpStatusUndefined
+            data = [l.replace('**', '').split() for l in f if len(l) > 2]
+
+        names = [d[1] for d in data]
+        values = np.array([float(d[2]) for d in data])
+        marginals = np.array([float(d[3]) for d in data])
+        is_row = np.array([n[0] == 'R' for n in names], dtype=bool)
+        number = np.array([int(n[1:]) for n in names], dtype=int)
+
+        self.x[number[~is_row]] = values[~is_row]
+        self.duals[number[is_row]] = marginals[is_row]
+        self.objective = np.dot(self.cost[0], self.x) if self.nvar > 0 else 0.0
+
+    def to_pulp(self):
+        """
+        Translate the problem to PuLP (row by row, but without the intermediate expression arrays)
+        :return: LpProblem, list of variables, list of constraints
+        """
+        c, A, senses, b, lb, ub = self.get_matrices()
+
+        problem = LpProblem(name=self.name)
+
+        variables = [LpVariable('C' + str(j),
+                                lowBound=None if np.isinf(lb[j]) else lb[j],
+                                upBound=None if np.isinf(ub[j]) else ub[j]) for j in range(self.nvar)]
+
+        nz = np.where(c != 0)[0]
+        problem += LpAffineExpression([(variables[j], c[j]) for j in nz])
+
+        A = A.tocsr()
+        pulp_sense = {'E': LpConstraintEQ, 'L': LpConstraintLE, 'G': LpConstraintGE}
+        constraints = list()
+        for i in range(self.nrow):
+            a, z = A.indptr[i], A.indptr[i + 1]
+            e = LpAffineExpression([(variables[j], v) for j, v in zip(A.indices[a:z], A.data[a:z])])
+            cst = LpConstraint(e, sense=pulp_sense[senses[i]], rhs=b[i], name='R' + str(i))
+            problem.addConstraint(cst)
+            constraints.append(cst)
+
+        return problem, variables, constraints
+
+    def solve(self, solver: MIPSolvers = MIPSolvers.CBC, msg=False):
+        """
+        Solve the problem
+        :param solver: MIP solver to use
+        :param msg: show the solver output?
+        :return: status string
+        """
+        if solver == MIPSolvers.CBC:
+            return self.solve_cbc(msg=msg)
+
+        elif solver == MIPSolvers.SCIP:
+            params = SCIP_CMD(msg=msg)
+
+        elif solver == MIPSolvers.CPLEX:
+            params = CPLEX_CMD(msg=msg)
+
+        elif solver == MIPSolvers.GUROBI:
+            params = GUROBI_CMD(msg=msg)
+
+        elif solver == MIPSolvers.XPRESS:
+            params = XPRESS(msg=msg)
+
+        else:
+            raise Exception('Solver not supported! ' + str(solver))
+
+        problem, variables, constraints = self.to_pulp()
+        problem.solve(params)
+
+        self.status = problem.status
+        self.x = np.array([v.value() if v.value() is not None else 0.0 for v in variables])
+        self.duals = np.array([cst.pi if cst.pi is not None else 0.0 for cst in constraints])
+        self.objective = np.dot(self.cost[0], self.x) if self.nvar > 0 else 0.0
+
+        return LpStatus[self.status]
+
+    def get_values(self, idx):
+        """
+        Get the solution values of some variables
+        :param idx: array of variable indices
+        :return: array of values with the shape of idx
+        """
+        return self.x[np.asarray(idx, dtype=int)]
+
+    def get_duals(self, idx):
+        """
+        Get the dual values of some constraints
+        :param idx: array of constraint indices, negative indices mean no constraint and get 0
+        :return: array of duals with the shape of idx
+        """
+        idx = np.asarray(idx, dtype=int)
+        val = np.zeros(idx.shape)
+        mask = idx >= 0
+        val[mask] = self.duals[idx[mask]]
+        return val
@@ -16,6 +16,7 @@
 from GridCal.Engine.basic_structures import MIPSolvers
 from GridCal.Engine.Core.snapshot_opf_data import OpfSnapshotCircuit
 from GridCal.Engine.Core.time_series_opf_data import OpfTimeCircuit
+from GridCal.Engine.Simulations.OPF.lp_matrix import LpMatrixModel
 from GridCal.ThirdParty.pulp import *
 
 
@@ -326,3 +327,138 @@ class OpfTimeSeries:
             if self.nodal_restrictions[i, j].pi is not None:
                 val[i, j] = - self.nodal_restrictions[i, j].pi
         return val.transpose()
+
+
+class OpfMatrixTimeSeries:
+
+    def __init__(self, numerical_circuit: OpfTimeCircuit, start_idx, end_idx, solver: MIPSolvers = MIPSolvers.CBC):
+        """
+        Optimal power flow time series template class for the problems formulated as a sparse matrix LP model.
+        The variables and restrictions are arrays of indices (device, time) of the model.
+        :param numerical_circuit: OpfTimeCircuit instance
+        :param start_idx: start index of the time series
+        :param end_idx: end index of the time series
+        :param solver: MIP solver to use
+        """
+        self.numerical_circuit = numerical_circuit
+        self.start_idx = start_idx
+        self.end_idx = end_idx
+        self.solver = solver
+
+        self.theta = None
+        self.Pg = None
+        self.Pb = None
+        self.Pl = None  # values (nl, nt)
+        self.E = None
+        self.load_shedding = None
+        self.FSlack1 = None
+        self.FSlack2 = None
+        self.branch_bus = None  # branch-bus incidence matrix (m, n)
+        self.Bseries = None  # branch susceptances (m, nt)
+        self.rating = None  # branch ratings (nt, m)
+        self.nodal_restrictions = None
+
+        # the problem is formulated by the derived classes
+        self.problem = None
+
+    def formulate(self):
+        """
+        Formulate the OPF time series in the non-sequential fashion (all to the solver at once)
+        :return: LpMatrixModel instance
+        """
+        return LpMatrixModel(name='OPF_Time_Series')
+
+    def solve(self, msg=False):
+        """
+        Solve the problem
+        :param msg: show the solver output?
+        :return: status string
+        """
+        return self.problem.solve(solver=self.solver, msg=msg)
+
+    def extract(self, idx):
+        """
+        Extract the values of an array of variables in the GridCal format (time, device)
+        :param idx: array of variable indices (device, time)
+        :return: 2D numpy array
+        """
+        return self.problem.get_values(idx).transpose()
+
+    def get_voltage(self):
+        """
+        return the complex voltages (time, device)
+        :return: 2D array
+        """
+        angles = self.extract(self.theta)
+        return np.ones_like(angles) * np.exp(-1j * angles)
+
+    def get_overloads(self):
+        """
+        return the branch overloads (time, device)
+        :return: 2D array
+        """
+        return self.extract(self.FSlack1) + self.extract(self.FSlack2)
+
+    def get_flows(self):
+        """
+        return the branch "from" power in p.u. (time, device)
+        :return: 2D array
+        """
+        theta = self.problem.get_values(self.theta)
+        return (self.Bseries * (self.branch_bus * theta)).transpose()
+
+    def get_loading(self):
+        """
+        return the branch loading (time, device)
+        :return: 2D array
+        """
+        return np.abs(self.get_flows()) / self.rating
+
+    def get_branch_power(self):
+        """
+        return the branch power (time, device)
+        :return: 2D array
+        """
+        return np.abs(self.get_flows()) * self.numerical_circuit.Sbase
+
+    def get_battery_power(self):
+        """
+        return the battery dispatch (time, device)
+        :return: 2D array
+        """
+        return self.extract(self.Pb) * self.numerical_circuit.Sbase
+
+    def get_battery_energy(self):
+        """
+        return the battery energy (time, device)
+        :return: 2D array
+        """
+        return self.extract(self.E) * self.numerical_circuit.Sbase
+
+    def get_generator_power(self):
+        """
+        return the generator dispatch (time, device)
+        :return: 2D array
+        """
+        return self.extract(self.Pg) * self.numerical_circuit.Sbase
+
+    def get_load_shedding(self):
+        """
+        return the load shedding (time, device)
+        :return: 2D array
+        """
+        return self.extract(self.load_shedding) * self.numerical_circuit.Sbase
+
+    def get_load_power(self):
+        """
+        return the load power (time, device)
+        :return: 2D array
+        """
+        return self.Pl.transpose() * self.numerical_circuit.Sbase
+
+    def get_shadow_prices(self):
+        """
+        Extract the nodal prices from the duals of the nodal power balance restrictions
+        :return: 2D numpy array (time, bus)
+        """
+        return - self.problem.get_duals(self.nodal_restrictions).transpose()
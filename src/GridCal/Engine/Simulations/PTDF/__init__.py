@@ -17,3 +17,4 @@ from GridCal.Engine.Simulations.PTDF.ptdf_driver import *
 from GridCal.Engine.Simulations.PTDF.ptdf_analysis import *
 from GridCal.Engine.Simulations.PTDF.ptdf_results import *
 from GridCal.Engine.Simulations.PTDF.ptdf_ts_driver import *
+from GridCal.Engine.Simulations.PTDF.linear_analysis import *
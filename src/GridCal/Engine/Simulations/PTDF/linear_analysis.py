@@ -0,0 +1,311 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Analytic (DC) Power Transfer Distribution Factors and Line Outage Distribution Factors.
+
+The branch flows of the DC model are Pf = Bf x theta, with Bf = diag(b) x (Cf - Ct), and the nodal injections are
+P = Bbus x theta, with Bbus = (Cf - Ct)^T x Bf. Removing the slack buses, the PTDF is Bf x Bbus^-1, which is
+computed with a single sparse factorization of the reduced Bbus and multi right hand side solves.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+from typing import List
+
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit
+
+
+def get_branch_susceptances(circuit: SnapshotCircuit):
+    """
+    Series susceptance of the branches in the DC approximation (0 for the inactive branches).
+    The susceptance is taken from the from-to primitive of Yf, so that the taps are accounted for,
+    and the DC lines (that have no reactance) use their conductance instead.
+    :param circuit: SnapshotCircuit instance (with the admittance matrices computed)
+    :return: array of susceptances (nbr)
+    """
+    Ct = sp.diags(circuit.branch_active) * circuit.C_branch_bus_t
+
+    # Yft primitive of every branch
+    Yft = np.array(circuit.Yf.multiply(Ct).sum(axis=1)).ravel()
+
+    b = Yft.imag
+
+    # dc lines
+    a = circuit.nline + circuit.ntr + circuit.nvsc
+    b[a:a + circuit.ndcline] = -Yft[a:a + circuit.ndcline].real
+
+    return b
+
+
+def get_dc_matrices(circuit: SnapshotCircuit):
+    """
+    Compute the DC branch-bus and bus-bus susceptance matrices
+    :param circuit: SnapshotCircuit instance (with the admittance matrices computed)
+    :return: Bbus (nbus, nbus), Bf (nbr, nbus) both CSC sparse matrices
+    """
+    br_states_diag = sp.diags(circuit.branch_active)
+    A = br_states_diag * (circuit.C_branch_bus_f - circuit.C_branch_bus_t)
+
+    Bf = sp.csc_matrix(sp.diags(get_branch_susceptances(circuit)) * A)
+    Bbus = sp.csc_matrix(A.T * Bf)
+
+    return Bbus, Bf
+
+
+def get_slack_distribution(circuit: SnapshotCircuit):
+    """
+    Participation of every bus in the slack distribution, proportional to the installed power.
+    If there is no installed power, the slack is shared equally by all the buses.
+    :param circuit: SnapshotCircuit instance
+    :return: array of participation factors that add up to 1 (nbus)
+    """
+    w = np.array(circuit.bus_installed_power, dtype=float)
+    total = w.sum()
+
+    if total > 0:
+        return w / total
+    else:
+        return np.ones(circuit.nbus) / circuit.nbus
+
+
+class LinearFactorsContext:
+
+    def __init__(self, circuit: SnapshotCircuit):
+        """
+        Factorization of the reduced DC susceptance matrix of an island, shared by all the factor computations
+        :param circuit: SnapshotCircuit island with at least one slack bus
+        """
+        self.circuit = circuit
+
+        self.Bbus, self.Bf = get_dc_matrices(circuit)
+
+        # the slack buses are removed: their angle is fixed
+        self.noref = np.sort(np.r_[circuit.pq, circuit.pv]).astype(int)
+
+        self.Bf_noref = self.Bf[:, self.noref]
+
+        # branch-bus incidence of the active branches, without the slack buses
+        br_states_diag = sp.diags(circuit.branch_active)
+        self.A_noref = sp.csr_matrix(br_states_diag * (circuit.C_branch_bus_f - circuit.C_branch_bus_t))[:, self.noref]
+
+        if len(self.noref) > 0:
+            self.lu = splu(sp.csc_matrix(self.Bbus[np.ix_(self.noref, self.noref)]), permc_spec='COLAMD')
+        else:
+            self.lu = None
+
+    def ptdf_block(self, br_idx, distribute_slack=False):
+        """
+        Compute the PTDF rows of some branches
+        :param br_idx: indices of the branches in the island
+        :param distribute_slack: distribute the injections among all the buses instead of the slack bus?
+        :return: PTDF block (len(br_idx), nbus)
+        """
+        block = np.zeros((len(br_idx), self.circuit.nbus))
+
+        if self.lu is not None and len(br_idx) > 0:
+            # Bbus is symmetric, hence the rows of Bf x Bbus^-1 are the solutions of Bbus x = Bf^T
+            rhs = self.Bf_noref[br_idx, :].T.toarray()
+            block[:, self.noref] = self.lu.solve(rhs).T
+
+        if distribute_slack:
+            w = get_slack_distribution(self.circuit)
+            block -= np.dot(block, w)[:, np.newaxis]
+
+        return block
+
+    def get_flows(self, P):
+        """
+        Compute the DC branch flows of some injections
+        :param P: nodal injections (nbus)
+        :return: branch flows (nbr)
+        """
+        if self.lu is None:
+            return np.zeros(self.circuit.nbr)
+
+        return self.Bf_noref * self.lu.solve(P[self.noref])
+
+    def transfer_factors_block(self, br_idx):
+        """
+        Compute the transfer factors columns of some branches (see make_transfer_factors) without the whole PTDF
+        :param br_idx: indices of the branches in the island
+        :return: transfer factors block (nbr, len(br_idx))
+        """
+        if self.lu is None or len(br_idx) == 0:
+            return np.zeros((self.circuit.nbr, len(br_idx)))
+
+        # the column k is Bf x Bbus^-1 x A[k, :]^T
+        rhs = self.A_noref[br_idx, :].T.toarray()
+        return self.Bf_noref * self.lu.solve(rhs)
+
+
+def make_ptdf(circuit: SnapshotCircuit, distribute_slack=False):
+    """
+    Compute the dense PTDF matrix of an island
+    :param circuit: SnapshotCircuit island with at least one slack bus
+    :param distribute_slack: distribute the injections among all the buses instead of the slack bus?
+    :return: PTDF matrix (nbr, nbus)
+    """
+    context = LinearFactorsContext(circuit)
+    return context.ptdf_block(np.arange(circuit.nbr), distribute_slack=distribute_slack)
+
+
+def iter_ptdf_blocks(circuit: SnapshotCircuit, block_size=1000, distribute_slack=False):
+    """
+    Generate the PTDF of an island by blocks of branches, so that the whole matrix is never stored for large grids
+    :param circuit: SnapshotCircuit island with at least one slack bus
+    :param block_size: number of branches per block
+    :param distribute_slack: distribute the injections among all the buses instead of the slack bus?
+    :return: generator of (branch indices, PTDF block (len(branch indices), nbus))
+    """
+    context = LinearFactorsContext(circuit)
+
+    for a in range(0, circuit.nbr, block_size):
+        br_idx = np.arange(a, min(a + block_size, circuit.nbr))
+        yield br_idx, context.ptdf_block(br_idx, distribute_slack=distribute_slack)
+
+
+def make_transfer_factors(circuit: SnapshotCircuit, ptdf):
+    """
+    Compute the flow change in every branch per unit of power transferred between the ends of every branch
+    :param circuit: SnapshotCircuit island
+    :param ptdf: PTDF matrix (nbr, nbus)
+    :return: transfer factors matrix (nbr, nbr), the column k corresponds to the transfer between the ends of k
+    """
+    br_states_diag = sp.diags(circuit.branch_active)
+    A = br_states_diag * (circuit.C_branch_bus_f - circuit.C_branch_bus_t)
+
+    return (A * ptdf.T).T
+
+
+def make_lodf(circuit: SnapshotCircuit, ptdf, tol=1e-10):
+    """
+    Compute the LODF matrix of an island from its PTDF.
+    The column k contains the change of flow in every branch per unit of the pre-contingency flow of the branch k
+    when the branch k fails. The failure of a branch that splits the island cannot be represented, so its column
+    is set to zero.
+    :param circuit: SnapshotCircuit island
+    :param ptdf: PTDF matrix (nbr, nbus)
+    :param tol: tolerance to detect the branches that split the island
+    :return: LODF matrix (nbr, nbr)
+    """
+    H = make_transfer_factors(circuit, ptdf)
+
+    den = 1.0 - np.diag(H)
+    splits = np.abs(den) < tol
+    den[splits] = 1.0
+
+    lodf = H / den[np.newaxis, :]
+    lodf[:, splits] = 0.0
+    np.fill_diagonal(lodf, -1.0)
+
+    # the inactive branches cannot fail
+    lodf[:, circuit.branch_active == 0] = 0.0
+
+    return lodf
+
+
+class CircuitLinearFactors:
+
+    def __init__(self, nbr, islands: List[SnapshotCircuit], logger=Logger()):
+        """
+        Linear factors of a circuit split in islands, computed on demand by blocks of branches
+        so that no matrix of size (nbr, nbr) is ever stored
+        :param nbr: number of branches of the complete circuit
+        :param islands: list of SnapshotCircuit islands
+        :param logger: Logger instance
+        """
+        self.nbr = nbr
+
+        self.islands = list()
+
+        self.contexts = list()
+
+        # index of the context of every branch (-1 if the branch is not in an island with a slack bus)
+        self.branch_context = np.full(nbr, -1, dtype=int)
+
+        # index of every branch in its island
+        self.branch_local_idx = np.zeros(nbr, dtype=int)
+
+        for i, island in enumerate(islands):
+
+            if len(island.vd) == 0:
+                logger.append('There are no slack nodes in the island ' + str(i))
+                continue
+
+            br_idx = island.original_branch_idx
+            self.branch_context[br_idx] = len(self.contexts)
+            self.branch_local_idx[br_idx] = np.arange(len(br_idx))
+            self.islands.append(island)
+            self.contexts.append(LinearFactorsContext(island))
+
+    def get_flows(self):
+        """
+        Compute the DC branch flows of the islands injections
+        :return: branch flows in per unit (nbr)
+        """
+        flows = np.zeros(self.nbr)
+        for island, context in zip(self.islands, self.contexts):
+            flows[island.original_branch_idx] = context.get_flows(island.Sbus.real)
+        return flows
+
+    def transfer_factors(self, br_idx):
+        """
+        Compute the transfer factors columns of some branches of the circuit
+        :param br_idx: indices of the branches in the circuit
+        :return: transfer factors block (nbr, len(br_idx))
+        """
+        br_idx = np.array(br_idx, dtype=int)
+        block = np.zeros((self.nbr, len(br_idx)))
+
+        for c, (island, context) in enumerate(zip(self.islands, self.contexts)):
+            cols = np.where(self.branch_context[br_idx] == c)[0]
+            if len(cols):
+                block[np.ix_(island.original_branch_idx, cols)] = context.transfer_factors_block(
+                    self.branch_local_idx[br_idx[cols]])
+
+        return block
+
+
+def compute_linear_factors(nbus, nbr, islands: List[SnapshotCircuit], distribute_slack=False, lodf=True,
+                           logger=Logger()):
+    """
+    Compute the PTDF and LODF of a circuit split in islands
+    :param nbus: number of buses of the complete circuit
+    :param nbr: number of branches of the complete circuit
+    :param islands: list of SnapshotCircuit islands
+    :param distribute_slack: distribute the injections among all the buses of each island?
+    :param lodf: compute the LODF matrix as well?
+    :param logger: Logger instance
+    :return: PTDF (nbr, nbus), LODF (nbr, nbr) or None
+    """
+    PTDF = np.zeros((nbr, nbus))
+    LODF = np.zeros((nbr, nbr)) if lodf else None
+
+    for i, island in enumerate(islands):
+
+        if len(island.vd) == 0:
+            logger.append('There are no slack nodes in the island ' + str(i))
+            continue
+
+        ptdf = make_ptdf(island, distribute_slack=distribute_slack)
+        PTDF[np.ix_(island.original_branch_idx, island.original_bus_idx)] = ptdf
+
+        if lodf:
+            LODF[np.ix_(island.original_branch_idx, island.original_branch_idx)] = make_lodf(island, ptdf)
+
+    return PTDF, LODF
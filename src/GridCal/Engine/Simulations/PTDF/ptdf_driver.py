@@ -14,6 +14,7 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 import time
 import multiprocessing
+import numpy as np
 from PySide2.QtCore import QThread, Signal
 
 from GridCal.Engine.basic_structures import Logger
@@ -21,6 +22,7 @@ from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
 from GridCal.Engine.Simulations.PTDF.ptdf_analysis import get_ptdf_variations, power_flow_worker, PtdfGroupMode
 from GridCal.Engine.Simulations.PTDF.ptdf_results import PTDFResults
+from GridCal.Engine.Simulations.PTDF.linear_analysis import compute_linear_factors
 from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
 
 ########################################################################################################################
@@ -31,12 +33,14 @@ from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split
 class PTDFOptions:
 
     def __init__(self, group_mode: PtdfGroupMode = PtdfGroupMode.ByGenLoad,
-                 power_increment=100.0, use_multi_threading=False):
+                 power_increment=100.0, use_multi_threading=False, analytic=True, distribute_slack=False):
         """
         Power Transfer Distribution Factors's options
         :param group_mode: Grouping type
         :param power_increment: Amount of power to change in MVA
         :param use_multi_threading: use multi-threading?
+        :param analytic: compute the DC factors with linear algebra instead of running a power flow per variation?
+        :param distribute_slack: distribute the variations among all the buses instead of the slack (analytic only)
         """
         self.group_mode = group_mode
 
@@ -44,6 +48,10 @@ class PTDFOptions:
 
         self.use_multi_threading = use_multi_threading
 
+        self.analytic = analytic
+
+        self.distribute_slack = distribute_slack
+
 
 class PTDF(QThread):
     progress_signal = Signal(float)
@@ -82,6 +90,70 @@ class PTDF(QThread):
 
         self.logger = Logger()
 
+    def ptdf_analytic(self, circuit: MultiCircuit, options: PowerFlowOptions, group_mode: PtdfGroupMode,
+                      power_amount, distribute_slack=False, text_func=None, prog_func=None):
+        """
+        Power Transfer Distribution Factors analysis using the DC linear factors (no power flows are run)
+        :param circuit: MultiCircuit instance
+        :param options: power flow options
+        :param group_mode: group mode
+        :param power_amount: amount o power to vary in MW
+        :param distribute_slack: distribute the variations among all the buses instead of the slack?
+        :param text_func: text function to display progress
+        :param prog_func: progress function to display progress [0~100]
+        :return: PTDFResults instance
+        """
+
+        if text_func is not None:
+            text_func('Compiling...')
+
+        # compile to arrays
+        numerical_circuit = compile_snapshot_circuit(circuit=circuit,
+                                                     apply_temperature=options.apply_temperature_correction,
+                                                     branch_tolerance_mode=options.branch_impedance_tolerance_mode,
+                                                     opf_results=self.opf_results)
+
+        calculation_inputs = split_into_islands(numeric_circuit=numerical_circuit,
+                                                ignore_single_node_islands=options.ignore_single_node_islands)
+
+        # compute the variations
+        delta_of_power_variations = get_ptdf_variations(circuit=circuit,
+                                                        numerical_circuit=numerical_circuit,
+                                                        group_mode=group_mode,
+                                                        power_amount=power_amount)
+
+        # declare the PTDF results
+        results = PTDFResults(n_variations=len(delta_of_power_variations) - 1,
+                              n_br=numerical_circuit.nbr,
+                              n_bus=numerical_circuit.nbus,
+                              br_names=numerical_circuit.branch_names,
+                              bus_names=numerical_circuit.bus_names)
+
+        if text_func is not None:
+            text_func('Computing the linear factors...')
+
+        results.ptdf, results.lodf = compute_linear_factors(nbus=numerical_circuit.nbus,
+                                                            nbr=numerical_circuit.nbr,
+                                                            islands=calculation_inputs,
+                                                            distribute_slack=distribute_slack,
+                                                            logger=results.logger)
+
+        # the variations are subtracted from the injections (same convention as the power flow based PTDF)
+        variations = delta_of_power_variations[1:]
+        results.variations = variations
+        dP = np.array([variation.dP for variation in variations]).reshape(len(variations), numerical_circuit.nbus)
+        original_power = np.array([variation.original_power for variation in variations]) + 1e-20
+
+        results.flows_sensitivity_matrix = - np.dot(dP, results.ptdf.T) * circuit.Sbase / original_power[:, np.newaxis]
+
+        # the DC model does not change the voltage modules
+        results.voltage_sensitivity_matrix = np.zeros((len(variations), numerical_circuit.nbus))
+
+        if prog_func is not None:
+            prog_func(100.0)
+
+        return results
+
     def ptdf(self, circuit: MultiCircuit, options: PowerFlowOptions, group_mode: PtdfGroupMode, power_amount,
              text_func=None, prog_func=None):
         """
@@ -273,7 +345,16 @@ class PTDF(QThread):
         Run thread
         """
         start = time.time()
-        if self.options.use_multi_threading:
+        if self.options.analytic:
+
+            self.results = self.ptdf_analytic(circuit=self.grid, options=self.pf_options,
+                                              group_mode=self.options.group_mode,
+                                              power_amount=self.options.power_increment,
+                                              distribute_slack=self.options.distribute_slack,
+                                              text_func=self.progress_text.emit,
+                                              prog_func=self.progress_signal.emit)
+
+        elif self.options.use_multi_threading:
 
             self.results = self.ptdf_multi_treading(circuit=self.grid, options=self.pf_options,
                                                     group_mode=self.options.group_mode,
@@ -78,6 +78,10 @@ class PTDFResults:
         self.flows_sensitivity_matrix = None
         self.voltage_sensitivity_matrix = None
 
+        # analytic (DC) factors
+        self.ptdf = None  # (n_br, n_bus)
+        self.lodf = None  # (n_br, n_br)
+
         self.available_results = [ResultTypes.PTDFBranchesSensitivity,
                                   ResultTypes.PTDFBusVoltageSensitivity]
 
@@ -125,6 +129,10 @@ class PTDFResults:
         Consolidate results in matrix
         :return:
         """
+        if self.default_pf_results is None:
+            # the sensitivities were computed analytically, there are no power flow results to consolidate
+            return
+
         self.flows_sensitivity_matrix = np.zeros((self.n_variations, self.n_br))
         for i in range(self.n_variations):
             self.flows_sensitivity_matrix[i, :] = self.get_branch_sensitivity_at(i)
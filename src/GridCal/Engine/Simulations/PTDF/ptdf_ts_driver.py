@@ -28,6 +28,9 @@ from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOpt
 from GridCal.Engine.Simulations.PTDF.ptdf_driver import PTDF, PTDFOptions, PtdfGroupMode
 from GridCal.Gui.GuiFunctions import ResultsModel
 from GridCal.Engine.Core.time_series_opf_data import compile_opf_time_circuit
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Simulations.PTDF.linear_analysis import compute_linear_factors
+from GridCal.Engine.Core.common_functions import group_states, states_to_time_groups
 
 
 class PtdfTimeSeriesResults:
@@ -169,11 +172,14 @@ class PtdfTimeSeries(QThread):
     done_signal = Signal()
     name = 'PTDF Time Series'
 
-    def __init__(self, grid: MultiCircuit, pf_options: PowerFlowOptions, start_=0, end_=None, power_delta=10):
+    def __init__(self, grid: MultiCircuit, pf_options: PowerFlowOptions, start_=0, end_=None, power_delta=10,
+                 analytic=True, distribute_slack=False):
         """
         TimeSeries constructor
         @param grid: MultiCircuit instance
         @param pf_options: PowerFlowOptions instance
+        @param analytic: use the analytic DC PTDF instead of the power flow perturbation based one
+        @param distribute_slack: distribute the injections imbalance among all the buses (analytic only)
         """
         QThread.__init__(self)
 
@@ -192,6 +198,10 @@ class PtdfTimeSeries(QThread):
 
         self.power_delta = power_delta
 
+        self.analytic = analytic
+
+        self.distribute_slack = distribute_slack
+
         self.elapsed = 0
 
         self.logger = Logger()
@@ -204,6 +214,83 @@ class PtdfTimeSeries(QThread):
         """
         return [l.strftime('%d-%m-%Y %H:%M') for l in pd.to_datetime(self.grid.time_profile)]
 
+    def run_analytic_mode(self, time_indices) -> PtdfTimeSeriesResults:
+        """
+        Run the PTDF time series with the analytic DC PTDF: the flows of every time step are a matrix product
+        :param time_indices: array of time indices to simulate
+        :return: PtdfTimeSeriesResults instance
+        """
+
+        nc = compile_opf_time_circuit(circuit=self.grid,
+                                      apply_temperature=self.pf_options.apply_temperature_correction,
+                                      branch_tolerance_mode=self.pf_options.branch_impedance_tolerance_mode)
+
+        results = PtdfTimeSeriesResults(n=nc.nbus,
+                                        m=nc.nbr,
+                                        time_array=self.grid.time_profile[time_indices],
+                                        bus_names=nc.bus_names,
+                                        branch_names=nc.branch_names)
+
+        # if there are valid profiles...
+        if self.grid.time_profile is not None:
+
+            # the PTDF is computed from the snapshot impedances, once for every topological state of the profiles
+            numerical_circuit = compile_snapshot_circuit(circuit=self.grid,
+                                                         apply_temperature=self.pf_options.apply_temperature_correction,
+                                                         branch_tolerance_mode=self.pf_options.branch_impedance_tolerance_mode)
+
+            branch_active_prof = nc.branch_active[time_indices, :]
+            bus_active_prof = nc.bus_active[time_indices, :]
+            first, inverse = group_states(branch_active_prof, bus_active_prof)
+            time_groups = states_to_time_groups(first, inverse)
+
+            if len(first) > 1:
+                self.logger.append('The profiles have ' + str(len(first)) +
+                                   ' different topological states, one PTDF is computed per state')
+
+            # compose the power injections (MW)
+            Pbus = nc.get_power_injections().real[:, time_indices] * nc.Sbase
+            results.S = Pbus.T
+
+            for i, (t, t_array) in enumerate(zip(first, time_groups)):
+
+                self.progress_text.emit('Computing the PTDF of the state ' + str(i + 1) + '/' + str(len(first)) + '...')
+
+                # apply the topological state of the group
+                numerical_circuit.branch_active = branch_active_prof[t, :].copy()
+                numerical_circuit.bus_active = bus_active_prof[t, :].copy()
+
+                islands = split_into_islands(numeric_circuit=numerical_circuit,
+                                             ignore_single_node_islands=self.pf_options.ignore_single_node_islands)
+
+                ptdf, _ = compute_linear_factors(nbus=numerical_circuit.nbus,
+                                                 nbr=numerical_circuit.nbr,
+                                                 islands=islands,
+                                                 distribute_slack=self.distribute_slack,
+                                                 lodf=False,
+                                                 logger=self.logger)
+
+                # the flows of all the time steps of the state at once
+                results.Sbranch[t_array, :] = np.dot(ptdf, Pbus[:, t_array]).T
+
+                self.progress_signal.emit((i + 1) / len(first) * 100.0)
+
+                if self.__cancel__:
+                    break
+
+            results.loading = results.Sbranch / (nc.branch_rates[time_indices, :] + 1e-9)
+
+            # the DC model does not change the voltage modules
+            results.voltage = np.ones((len(time_indices), nc.nbus))
+
+            self.progress_signal.emit(100.0)
+
+        else:
+            print('There are no profiles')
+            self.progress_text.emit('There are no profiles')
+
+        return results
+
     def run_nodal_mode(self, time_indices) -> PtdfTimeSeriesResults:
         """
         Run multi thread time series
@@ -226,7 +313,8 @@ class PtdfTimeSeries(QThread):
 
             options_ = PTDFOptions(group_mode=PtdfGroupMode.ByNode,
                                    power_increment=self.power_delta,
-                                   use_multi_threading=False)
+                                   use_multi_threading=False,
+                                   analytic=False)
 
             # run a node based PTDF
             self.ptdf_driver = PTDF(grid=self.grid,
@@ -278,7 +366,10 @@ class PtdfTimeSeries(QThread):
             self.end_ = len(self.grid.time_profile)
         time_indices = np.arange(self.start_, self.end_)
 
-        self.results = self.run_nodal_mode(time_indices)
+        if self.analytic:
+            self.results = self.run_analytic_mode(time_indices)
+        else:
+            self.results = self.run_nodal_mode(time_indices)
 
         self.elapsed = time.time() - a
 
@@ -0,0 +1,363 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Batched (multi right hand side) Newton-Raphson power flow.
+
+All the time steps of a time island share the admittance matrix and the bus types, hence the mismatch is
+evaluated for the whole (nbus, nt) block at once, and the nt Jacobians are assembled as a single block-diagonal
+matrix that reuses the structure and column ordering of one NRSolverContext, so that every Newton iteration
+costs one factorization call regardless of the number of time steps.
+"""
+
+import time
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+
+from GridCal.Engine.basic_structures import Logger, SolverType, ReactivePowerControlMode, TapsControlMode
+from GridCal.Engine.basic_structures import TimeSeriesInitialization
+from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import NRSolverContext
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import single_island_pf, time_series_initial_voltage
+
+
+def dSbus_dV_batch(Yx, Yp, Yj, V):
+    """
+    Vectorized version of dSbus_dV_numba_sparse for many voltage vectors at once.
+    The rows/columns convention is the same as in the numba function so that the Jacobian matches.
+    :param Yx: Ybus data
+    :param Yp: Ybus index pointer
+    :param Yj: Ybus indices
+    :param V: matrix of voltages (nbus, nt)
+    :return: dS_dVm data (nnz, nt), dS_dVa data (nnz, nt)
+    """
+    n = V.shape[0]
+    rows = np.repeat(np.arange(n), np.diff(Yp))
+    is_diag = rows == Yj
+
+    Ibus = sp.csr_matrix((Yx, Yj, Yp), shape=(n, n)) * V
+    Vnorm = V / np.abs(V)
+
+    YV = Yx[:, np.newaxis] * V[Yj, :]
+
+    dS_dVm = V[rows, :] * np.conj(Yx[:, np.newaxis] * Vnorm[Yj, :])
+    dS_dVm[is_diag, :] += np.conj(Ibus[rows[is_diag], :]) * Vnorm[rows[is_diag], :]
+
+    YV[is_diag, :] -= Ibus[rows[is_diag], :]
+    dS_dVa = np.conj(-YV) * (1j * V[rows, :])
+
+    return dS_dVm, dS_dVa
+
+
+def block_diagonal_jacobian(context: NRSolverContext, dS_dVm, dS_dVa):
+    """
+    Compose the block-diagonal Jacobian of many time steps in the column-permuted CSC form of the context
+    :param context: NRSolverContext with the structure and column ordering computed
+    :param dS_dVm: dS_dVm data (nnz, nt)
+    :param dS_dVa: dS_dVa data (nnz, nt)
+    :return: CSC sparse matrix (nt * dimJ, nt * dimJ)
+    """
+    nt = dS_dVm.shape[1]
+    nnz = len(context.Jsrc)
+    dimJ = len(context.Jp) - 1
+
+    # Jacobian values of every time step
+    Jx = np.empty((nnz, nt))
+    for kind, data, part in ((0, dS_dVa, 'real'), (1, dS_dVm, 'real'), (2, dS_dVa, 'imag'), (3, dS_dVm, 'imag')):
+        idx = np.where(context.Jkind == kind)[0]
+        values = data[context.Jsrc[idx], :]
+        Jx[idx, :] = values.real if part == 'real' else values.imag
+
+    # tile the permuted structure
+    offsets = np.arange(nt)
+    data = Jx[context.csc_map, :].T.ravel()
+    indices = (context.csc_indices[np.newaxis, :] + dimJ * offsets[:, np.newaxis]).ravel()
+    indptr = np.r_[(context.csc_indptr[np.newaxis, :-1] + nnz * offsets[:, np.newaxis]).ravel(), nnz * nt]
+
+    return sp.csc_matrix((data, indices, indptr), shape=(nt * dimJ, nt * dimJ))
+
+
+def batched_newton_raphson(context: NRSolverContext, Ybus, Sbus, V0, Ibus, pv, pq, tol, max_it=15):
+    """
+    Solve many power flows of the same island at once with the Newton-Raphson method.
+    The time steps that converge are removed from the active set.
+    :param context: NRSolverContext to provide the Jacobian structure
+    :param Ybus: Admittance matrix
+    :param Sbus: matrix of nodal power injections (nbus, nt)
+    :param V0: matrix of nodal voltages (initial solution) (nbus, nt)
+    :param Ibus: matrix of nodal current injections (nbus, nt)
+    :param pv: Array with the indices of the PV buses
+    :param pq: Array with the indices of the PQ buses
+    :param tol: Tolerance
+    :param max_it: Maximum number of iterations
+    :return: Voltage solution (nbus, nt), converged (nt), error (nt), calculated power injections (nbus, nt),
+             iterations (nt), elapsed
+    """
+    start = time.time()
+
+    nbus, nt = Sbus.shape
+    npv = len(pv)
+    npq = len(pq)
+
+    V = V0.astype(complex)
+    Scalc = V * np.conj(Ybus * V - Ibus)
+    norm_f = np.zeros(nt)
+    iterations = np.zeros(nt, dtype=int)
+
+    if (npq + npv) == 0:
+        return V, np.ones(nt, dtype=bool), norm_f, Sbus.copy(), iterations, time.time() - start
+
+    context.update(Ybus, pv, pq)
+    pvpq = context.pvpq
+    j2 = npv + npq
+    dimJ = j2 + npq
+
+    if context.col_order is None:
+        # compute the column ordering with the first time step
+        context.factorize(Ybus, V[:, 0])
+
+    # evaluate F(x0)
+    dS = Scalc - Sbus
+    f = np.r_[dS[pvpq, :].real, dS[pq, :].imag]
+    norm_f = 0.5 * (f * f).sum(axis=0)
+
+    active = np.where(norm_f >= tol)[0]
+
+    it = 0
+    while len(active) and it < max_it:
+        it += 1
+        na = len(active)
+        Va = V[:, active]
+
+        # factorize the block diagonal Jacobian of the active time steps
+        dS_dVm, dS_dVa = dSbus_dV_batch(Ybus.data, Ybus.indptr, Ybus.indices, Va)
+        J = block_diagonal_jacobian(context, dS_dVm, dS_dVa)
+        lu = splu(J, permc_spec='NATURAL')
+
+        # solve all the active time steps at once
+        y = lu.solve(f[:, active].T.ravel()).reshape(na, dimJ)
+        dx = np.empty_like(y)
+        dx[:, context.col_order] = y
+
+        # update the voltages
+        Vm = np.abs(Va)
+        Vang = np.angle(Va)
+        Vang[pvpq, :] -= dx[:, :j2].T
+        Vm[pq, :] -= dx[:, j2:].T
+        Va = Vm * np.exp(1.0j * Vang)
+        V[:, active] = Va
+
+        # compute the mismatch of the active time steps
+        Scalc_a = Va * np.conj(Ybus * Va - Ibus[:, active])
+        Scalc[:, active] = Scalc_a
+        dS = Scalc_a - Sbus[:, active]
+        f[:, active] = np.r_[dS[pvpq, :].real, dS[pq, :].imag]
+        norm_f[active] = 0.5 * (f[:, active] * f[:, active]).sum(axis=0)
+        iterations[active] += 1
+
+        # drop the converged and diverged time steps
+        keep = (norm_f[active] >= tol) & np.isfinite(norm_f[active])
+        active = active[keep]
+
+    converged = norm_f < tol
+
+    return V, converged, norm_f, Scalc, iterations, time.time() - start
+
+
+def batched_power_flow_post_process(circuit, Sbus, V, branch_rates):
+    """
+    Vectorized version of power_flow_post_process for many time steps
+    :param circuit: island circuit (SnapshotCircuit or TimeCircuit)
+    :param Sbus: matrix of computed power injections (nbus, nt)
+    :param V: matrix of voltages (nbus, nt)
+    :param branch_rates: matrix of branch rates (nt, nbr)
+    :return: Sbranch, Ibranch, Vbranch, loading, losses, flow_direction, Sbus; all of them (nt, n)
+    """
+    vd = circuit.vd
+    pv = circuit.pv
+
+    Sbus = Sbus.copy()
+
+    # power at the slack nodes
+    Sbus[vd, :] = V[vd, :] * np.conj(circuit.Ybus[vd, :] * V)
+
+    # Reactive power at the pv nodes, keeping the original P injection
+    Q = (V[pv, :] * np.conj(circuit.Ybus[pv, :] * V)).imag
+    Sbus[pv, :] = Sbus[pv, :].real + 1j * Q
+
+    # Branches current, loading, etc
+    Vf = circuit.C_branch_bus_f * V
+    Vt = circuit.C_branch_bus_t * V
+    If = circuit.Yf * V
+    It = circuit.Yt * V
+    Sf = Vf * np.conj(If)
+    St = Vt * np.conj(It)
+
+    losses = (Sf + St) * circuit.Sbase
+    flow_direction = Sf.real / np.abs(Sf + 1e-20)
+    Vbranch = Vf - Vt
+    Ibranch = If
+    Sbranch = Sf * circuit.Sbase
+    loading = Sbranch / (branch_rates.T + 1e-9)
+
+    return Sbranch.T, Ibranch.T, Vbranch.T, loading.T, losses.T, flow_direction.T, Sbus.T
+
+
+def can_run_batched(options: PowerFlowOptions):
+    """
+    Check if the power flow options allow to run the batched Newton-Raphson
+    :param options: PowerFlowOptions instance
+    :return: True / False
+    """
+    return (options.solver_type == SolverType.NR
+            and options.control_Q == ReactivePowerControlMode.NoControl
+            and options.control_taps == TapsControlMode.NoControl
+            and not options.distributed_slack
+            and not options.dispatch_storage)
+
+
+def batched_pf(circuit, V0, Sbus, Ibus, branch_rates, options: PowerFlowOptions, logger: Logger,
+               nr_context: NRSolverContext = None):
+    """
+    Run the power flow of many injection scenarios of an island at once.
+    The scenarios that do not converge with the batched Newton-Raphson are solved one by one with single_island_pf.
+    :param circuit: island circuit (SnapshotCircuit or TimeCircuit)
+    :param V0: matrix of initial voltages (nbus, nt)
+    :param Sbus: matrix of power injections (nbus, nt)
+    :param Ibus: matrix of current injections (nbus, nt)
+    :param branch_rates: matrix of branch rates (nt, nbr)
+    :param options: PowerFlowOptions instance
+    :param logger: Logger instance
+    :param nr_context: NRSolverContext to reuse (optional)
+    :return: V, Sbus, Sbranch, Ibranch, Vbranch, loading, losses, flow_direction (all of them (nt, n)),
+             error, converged, iterations (all of them (nt))
+    """
+    if nr_context is None:
+        nr_context = NRSolverContext()
+
+    V, converged, error, Scalc, iterations, elapsed = batched_newton_raphson(context=nr_context,
+                                                                            Ybus=circuit.Ybus,
+                                                                            Sbus=Sbus,
+                                                                            V0=V0,
+                                                                            Ibus=Ibus,
+                                                                            pv=circuit.pv,
+                                                                            pq=circuit.pq,
+                                                                            tol=options.tolerance,
+                                                                            max_it=options.max_iter)
+
+    # compute the branch magnitudes of all the scenarios at once
+    Sbranch, Ibranch, Vbranch, loading, losses, \
+        flow_direction, Sbus_calc = batched_power_flow_post_process(circuit=circuit,
+                                                                    Sbus=Scalc,
+                                                                    V=V,
+                                                                    branch_rates=branch_rates)
+    V = V.T
+
+    # solve the failed scenarios one by one with the regular (and more robust) procedure
+    for k in np.where(~converged)[0]:
+        res = single_island_pf(circuit=circuit,
+                               Vbus=V0[:, k],
+                               Sbus=Sbus[:, k],
+                               Ibus=Ibus[:, k],
+                               branch_rates=branch_rates[k, :],
+                               options=options,
+                               logger=logger,
+                               nr_context=nr_context)
+        V[k, :] = res.voltage
+        Sbus_calc[k, :] = res.Sbus
+        Sbranch[k, :] = res.Sbranch
+        Ibranch[k, :] = res.Ibranch
+        Vbranch[k, :] = res.Vbranch
+        loading[k, :] = res.loading
+        losses[k, :] = res.losses
+        flow_direction[k, :] = res.flow_direction
+        error[k] = res.error()
+        converged[k] = res.converged()
+        iterations[k] += res.iterations()
+
+    return V, Sbus_calc, Sbranch, Ibranch, Vbranch, loading, losses, flow_direction, error, converged, iterations
+
+
+def batched_island_pf(circuit, t_loc, options: PowerFlowOptions, logger: Logger, nr_context: NRSolverContext = None):
+    """
+    Run the power flow of many time steps of a time island at once.
+    The time steps that do not converge with the batched Newton-Raphson are solved one by one with single_island_pf.
+    The time steps are solved together, so the initializations that use the previous solutions fall back to the
+    profile voltage; the linear predictor is computed for every time step.
+    :param circuit: TimeCircuit island
+    :param t_loc: array of time indices of the island to simulate
+    :param options: PowerFlowOptions instance
+    :param logger: Logger instance
+    :param nr_context: NRSolverContext to reuse (optional)
+    :return: V, Sbus, Sbranch, Ibranch, Vbranch, loading, losses, flow_direction (all of them (nt, n)),
+             error, converged, iterations (all of them (nt))
+    """
+    V0 = circuit.Vbus[t_loc, :].T
+    Sbus = circuit.Sbus[:, t_loc]
+    Ibus = circuit.Ibus[:, t_loc]
+
+    if options.ts_initialization == TimeSeriesInitialization.LinearPredictor:
+        V0 = V0.copy()
+        for k in range(len(t_loc)):
+            V0[:, k] = time_series_initial_voltage(circuit=circuit,
+                                                   Vbus=V0[:, k],
+                                                   Sbus=Sbus[:, k],
+                                                   Ibus=Ibus[:, k],
+                                                   previous_solutions=list(),
+                                                   initialization=options.ts_initialization)
+
+    return batched_pf(circuit=circuit,
+                      V0=V0,
+                      Sbus=Sbus,
+                      Ibus=Ibus,
+                      branch_rates=circuit.branch_rates[t_loc, :],
+                      options=options,
+                      logger=logger,
+                      nr_context=nr_context)
+
+
+def write_time_series_block(results, rows, bus_idx, br_idx, V, Sbus, Sbranch, Ibranch, Vbranch, loading, losses,
+                            flow_direction, error, converged, iterations):
+    """
+    Write the results of many time steps of an island into time series results arrays.
+    Any object with the TimeSeriesResults arrays as attributes is valid (i.e. shared memory arrays)
+    :param results: TimeSeriesResults-like object
+    :param rows: time rows of the results to write
+    :param bus_idx: original bus indices of the island
+    :param br_idx: original branch indices of the island
+    :param V: voltages (nt, nbus)
+    :param Sbus: power injections (nt, nbus)
+    :param Sbranch: branch power (nt, nbr)
+    :param Ibranch: branch current (nt, nbr)
+    :param Vbranch: branch voltage increment (nt, nbr)
+    :param loading: branch loading (nt, nbr)
+    :param losses: branch losses (nt, nbr)
+    :param flow_direction: branch flow direction (nt, nbr)
+    :param error: power flow error (nt)
+    :param converged: converged? (nt)
+    :param iterations: number of iterations (nt)
+    """
+    ix_bus = np.ix_(rows, bus_idx)
+    ix_br = np.ix_(rows, br_idx)
+    values = {'voltage': V, 'S': Sbus, 'Sbranch': Sbranch, 'Ibranch': Ibranch, 'Vbranch': Vbranch,
+              'loading': loading, 'losses': losses, 'flow_direction': flow_direction}
+    for name, value in values.items():
+        array = getattr(results, name)
+        if array is not None:  # the arrays that are not kept are None
+            array[ix_bus if name in ['voltage', 'S'] else ix_br] = value
+    results.error[rows] = np.maximum(results.error[rows], error)
+    results.converged[rows] = results.converged[rows] & converged
+    results.iterations[rows] = np.maximum(results.iterations[rows], iterations)
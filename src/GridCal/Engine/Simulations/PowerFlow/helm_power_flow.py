@@ -73,10 +73,11 @@ def epsilon(Sn, n, E):
     return estim, E
 
 
-@nb.njit("(c16[:])(i8, c16[:, :], f8)")
 def pade4all(order, coeff_mat, s=1.0):
     """
     Computes the "order" Padè approximant of the coefficients at the approximation point s
+    The linear systems of all the buses are stacked and solved at once. If the system of some bus is singular,
+    the summation of its coefficients is returned instead for that bus.
 
     Arguments:
         coeff_mat: coefficient matrix (order, buses)
@@ -88,49 +89,48 @@ def pade4all(order, coeff_mat, s=1.0):
     """
     nbus = coeff_mat.shape[1]
 
-    complex_type = nb.complex128
-
-    voltages = np.zeros(nbus, dtype=complex_type)
-
     nn = int(order / 2)
     L = nn
     M = nn
 
-    for d in range(nbus):
-
-        # formation of the linear system right hand side
-        rhs = coeff_mat[L + 1:L + M + 1, d]
-
-        # formation of the coefficients matrix
-        C = np.zeros((L, M), dtype=complex_type)
-        for i in range(L):
-            k = i + 1
-            C[i, :] = coeff_mat[L - M + k:L + k, d]
-
-        # Obtaining of the b coefficients for orders greater than 0
-        b = np.zeros(rhs.shape[0] + 1, dtype=complex_type)
-        x = np.linalg.solve(C, -rhs)  # bn to b1
-        b[0] = 1
-        b[1:] = x[::-1]
-
-        # Obtaining of the coefficients 'a'
-        a = np.zeros(L + 1, dtype=complex_type)
-        a[0] = coeff_mat[0, d]
-        for i in range(L):
-            val = complex_type(0)
-            k = i + 1
-            for j in range(k + 1):
-                val += coeff_mat[k - j, d] * b[j]
-            a[i + 1] = val
-
-        # evaluation of the function for the value 's'
-        p = complex_type(0)
-        q = complex_type(0)
-        for i in range(L + 1):
-            p += a[i] * s ** i
-            q += b[i] * s ** i
-
-        voltages[d] = p / q
+    if L == 0:
+        return coeff_mat[0, :].copy()
+
+    # formation of the linear systems right hand side (buses, M)
+    rhs = coeff_mat[L + 1:L + M + 1, :].T
+
+    # formation of the coefficients matrices (buses, L, M): C[d, i, j] = coeff_mat[L - M + i + j + 1, d]
+    idx = (L - M + 1) + np.arange(L)[:, np.newaxis] + np.arange(M)[np.newaxis, :]
+    C = np.transpose(coeff_mat[idx, :], (2, 0, 1))
+
+    # Obtaining of the b coefficients for orders greater than 0 (bn to b1)
+    try:
+        x = np.linalg.solve(C, -rhs[:, :, np.newaxis])[:, :, 0]
+    except np.linalg.LinAlgError:
+        # solve bus by bus to isolate the singular systems
+        x = np.empty((nbus, M), dtype=complex)
+        for d in range(nbus):
+            try:
+                x[d, :] = np.linalg.solve(C[d, :, :], -rhs[d, :])
+            except np.linalg.LinAlgError:
+                x[d, :] = np.nan
+
+    b = np.ones((M + 1, nbus), dtype=complex)
+    b[1:, :] = x[:, ::-1].T
+
+    # Obtaining of the coefficients 'a': a[i] = sum_j coeff_mat[i - j] * b[j]
+    a = np.zeros((L + 1, nbus), dtype=complex)
+    for j in range(L + 1):
+        a[j:, :] += coeff_mat[:L + 1 - j, :] * b[j, :]
+
+    # evaluation of the function for the value 's'
+    s_powers = np.power(complex(s), np.arange(L + 1))
+    voltages = s_powers.dot(a) / s_powers.dot(b)
+
+    # fall back to the summation where the approximant could not be computed
+    failed = ~np.isfinite(voltages)
+    if failed.any():
+        voltages[failed] = coeff_mat[:, failed].sum(axis=0)
 
     return voltages
 
@@ -177,58 +177,210 @@ def sigma_function(coeff_matU, coeff_matX, order, V_slack):
     return sigmes
 
 
-@nb.njit("(c16[:])(c16[:, :], c16[:, :], i8, i8[:])")
-def conv1(A, B, c, indices):
+@nb.njit("void(i8, c16[:, :], c16[:, :], c16[:, :], c16[:], c16[:], i8[:], f8[:])")
+def helm_rhs(c, U, X, Q, Sx, Ysh, pv_, rhs):
     """
-    Performs the convolution of A* and B
-    :param A: Coefficients matrix 1 (orders, buses)
-    :param B: Coefficients matrix 2 (orders, buses)
+    Compose the right hand side of the HELM linear system for the depth c >= 2
+    (this replaces the per-depth calls to the convolutions of X and Q, and U and U*)
     :param c: order of the coefficients
-    :param indices: bus indices array
-    :return: Array with the convolution for the buses given by "indices"
+    :param U: voltage coefficients matrix (orders, buses)
+    :param X: inverse conjugated voltage coefficients matrix (orders, buses)
+    :param Q: reactive power coefficients matrix (orders, buses)
+    :param Sx: specified power factor of X: P - jQ for the PQ buses and P for the PV buses
+    :param Ysh: shunt admittances of the buses
+    :param pv_: internal indices of the PV buses
+    :param rhs: right hand side array (2 * buses + pv) that is filled in place
     """
-    suma = np.zeros(len(indices), dtype=nb.complex128)
-    for k in range(1, c + 1):
-        for i, d in enumerate(indices):
-            suma[i] += np.conj(A[k, d]) * B[c - k, d]
-    return suma
+    npqpv = U.shape[1]
+    npv = len(pv_)
+
+    for d in range(npqpv):
+        valor = Sx[d] * X[c - 1, d] - U[c - 1, d] * Ysh[d]
+        rhs[d] = valor.real
+        rhs[npqpv + d] = valor.imag
+
+    for i in range(npv):
+        d = pv_[i]
+
+        # convolution of X and Q
+        conv_xq = complex(0.0)
+        for k in range(1, c):
+            conv_xq += X[k, d] * Q[c - 1 - k, d]
 
+        # convolution of U and U*
+        conv_uu = 0.0
+        for k in range(1, c):
+            conv_uu += (U[k, d] * np.conj(U[c - k, d])).real
 
-@nb.njit("(c16[:])(c16[:, :], c16[:, :], i8, i8[:])")
-def conv2(A, B, c, indices):
+        # -1j * conv_xq
+        rhs[d] += conv_xq.imag
+        rhs[npqpv + d] -= conv_xq.real
+        rhs[2 * npqpv + i] = -conv_uu
+
+
+@nb.njit("void(i8, f8[:], c16[:, :], c16[:, :], c16[:, :], i8[:])")
+def helm_update(c, LHS, U, X, Q, pv_):
     """
-    Performs the convolution of A and B
-    :param A: Coefficients matrix 1 (orders, buses)
-    :param B: Coefficients matrix 2 (orders, buses)
+    Store the solution of the HELM linear system for the depth c >= 1
+    and compute the inverse conjugated voltage coefficients of that depth
     :param c: order of the coefficients
-    :param indices: bus indices array
-    :return: Array with the convolution for the buses given by "indices"
+    :param LHS: solution of the linear system (2 * buses + pv)
+    :param U: voltage coefficients matrix (orders, buses)
+    :param X: inverse conjugated voltage coefficients matrix (orders, buses)
+    :param Q: reactive power coefficients matrix (orders, buses)
+    :param pv_: internal indices of the PV buses
     """
-    suma = np.zeros(len(indices), dtype=nb.complex128)
-    for k in range(1, c):
-        for i, d in enumerate(indices):
-            suma[i] += A[k, d] * B[c - 1 - k, d]
-    return suma
+    npqpv = U.shape[1]
 
+    # update voltage coefficients
+    for d in range(npqpv):
+        U[c, d] = LHS[d] + 1j * LHS[npqpv + d]
 
-@nb.njit("(c16[:])(c16[:, :], c16[:, :], i8, i8[:])")
-def conv3(A, B, c, indices):
-    """
-    Performs the convolution of A and B*
-    :param A: Coefficients matrix 1 (orders, buses)
-    :param B: Coefficients matrix 2 (orders, buses)
-    :param c: order of the coefficients
-    :param indices: bus indices array
-    :return: Array with the convolution for the buses given by "indices"
+    # update reactive power
+    for i in range(len(pv_)):
+        Q[c - 1, pv_[i]] = LHS[2 * npqpv + i]
+
+    # update voltage inverse coefficients: convolution of U* and X
+    for d in range(npqpv):
+        suma = complex(0.0)
+        for k in range(1, c + 1):
+            suma += np.conj(U[k, d]) * X[c - k, d]
+        X[c, d] = -suma / np.conj(U[0, d])
+
+
+class HelmSolverContext:
     """
-    suma = np.zeros(len(indices), dtype=nb.complex128)
-    for k in range(1, c):
-        for i, d in enumerate(indices):
-            suma[i] += A[k, d] * np.conj(B[c - k, d])
-    return suma
+    HELM solver context to be reused among many power flows of the same island and topology state
+    (i.e. the time steps of a time series).
 
+    The system matrix of the coefficients recursion only depends on the series admittances and on the bus types,
+    hence it is factorized once together with the zero order coefficients. Every call only composes the right
+    hand sides and solves with the stored factorization.
+    """
 
-def helm_coefficients_josep(Yseries, V0, S0, Ysh0, pq, pv, sl, pqpv, tolerance=1e-6, max_coeff=30, verbose=False):
+    def __init__(self):
+        """
+        HelmSolverContext constructor
+        """
+        # structure keys
+        self.Yseries_data = None
+        self.Yseries_indices = None
+        self.Yseries_indptr = None
+        self.pq = None
+        self.pv = None
+        self.sl = None
+
+        # internal indices (0 based in the reduced scheme)
+        self.pq_ = None
+        self.pv_ = None
+        self.pqpv_ = None
+
+        # reduced system
+        self.Yslack = None
+        self.Yslack_sum = None
+        self.U0 = None
+        self.X0 = None
+
+        # factorization of the system matrix
+        self.MAT_LU = None
+
+        # statistics
+        self.n_analysis = 0
+
+    def is_valid(self, Yseries, pq, pv, sl):
+        """
+        Check if the stored factorization can be used with the given inputs
+        :param Yseries: Admittance matrix of the series elements
+        :param pq: list of pq nodes
+        :param pv: list of pv nodes
+        :param sl: list of slack nodes
+        :return: True / False
+        """
+        if self.MAT_LU is None:
+            return False
+
+        if not (np.array_equal(self.pq, pq) and np.array_equal(self.pv, pv) and np.array_equal(self.sl, sl)):
+            return False
+
+        # the values are compared as well, since the tap changes modify the matrices in place
+        return (np.array_equal(self.Yseries_indptr, Yseries.indptr) and
+                np.array_equal(self.Yseries_indices, Yseries.indices) and
+                np.array_equal(self.Yseries_data, Yseries.data))
+
+    def analyze(self, Yseries, pq, pv, sl, pqpv):
+        """
+        Compute the zero order coefficients and factorize the system matrix
+        :param Yseries: Admittance matrix of the series elements
+        :param pq: list of pq nodes
+        :param pv: list of pv nodes
+        :param sl: list of slack nodes
+        :param pqpv: sorted list of pq and pv nodes
+        """
+        self.Yseries_data = Yseries.data.copy()
+        self.Yseries_indices = Yseries.indices.copy()
+        self.Yseries_indptr = Yseries.indptr.copy()
+        self.pq = np.array(pq).copy()
+        self.pv = np.array(pv).copy()
+        self.sl = np.array(sl).copy()
+
+        n = Yseries.shape[0]
+        npqpv = len(pqpv)
+        npv = len(pv)
+
+        # indices 0 based in the internal scheme
+        is_slack = np.zeros(n, dtype=np.int64)
+        is_slack[sl] = 1
+        nsl_counted = np.cumsum(is_slack)
+
+        self.pq_ = (pq - nsl_counted[pq]).astype(np.int64)
+        self.pv_ = (pv - nsl_counted[pv]).astype(np.int64)
+        self.pqpv_ = np.sort(np.r_[self.pq_, self.pv_])
+
+        # build the reduced system
+        Yred = Yseries[np.ix_(pqpv, pqpv)]  # admittance matrix without slack buses
+        self.Yslack = -Yseries[np.ix_(pqpv, sl)]  # yes, it is the negative of this
+        self.Yslack_sum = self.Yslack.sum(axis=1).A1
+        G = np.real(Yred)  # real parts of Yij
+        B = np.imag(Yred)  # imaginary parts of Yij
+
+        # .......................CALCULATION OF TERMS [0] --------------------------------------------------------------
+        self.U0 = spsolve(Yred, self.Yslack_sum)
+        self.X0 = 1 / np.conj(self.U0)
+
+        # Form the system matrix (MAT)
+        pv_ = self.pv_
+        Upv = self.U0[pv_]
+        Xpv = self.X0[pv_]
+        VRE = coo_matrix((2 * Upv.real, (np.arange(npv), pv_)), shape=(npv, npqpv)).tocsc()
+        VIM = coo_matrix((2 * Upv.imag, (np.arange(npv), pv_)), shape=(npv, npqpv)).tocsc()
+        XIM = coo_matrix((-Xpv.imag, (pv_, np.arange(npv))), shape=(npqpv, npv)).tocsc()
+        XRE = coo_matrix((Xpv.real, (pv_, np.arange(npv))), shape=(npqpv, npv)).tocsc()
+        EMPTY = csc_matrix((npv, npv))
+
+        MAT = vs((hs((G,  -B,   XIM)),
+                  hs((B,   G,   XRE)),
+                  hs((VRE, VIM, EMPTY))), format='csc')
+
+        # factorize (only once)
+        self.MAT_LU = factorized(MAT.tocsc())
+
+        self.n_analysis += 1
+
+    def update(self, Yseries, pq, pv, sl, pqpv):
+        """
+        Analyze and factorize the system only if the stored one is not valid for the given inputs
+        :param Yseries: Admittance matrix of the series elements
+        :param pq: list of pq nodes
+        :param pv: list of pv nodes
+        :param sl: list of slack nodes
+        :param pqpv: sorted list of pq and pv nodes
+        """
+        if not self.is_valid(Yseries, pq, pv, sl):
+            self.analyze(Yseries, pq, pv, sl, pqpv)
+
+
+def helm_coefficients_josep(Yseries, V0, S0, Ysh0, pq, pv, sl, pqpv, tolerance=1e-6, max_coeff=30, verbose=False,
+                            context: HelmSolverContext = None):
     """
     Holomorphic Embedding LoadFlow Method as formulated by Josep Fanals Batllori in 2020
     THis function just returns the coefficients for further usage in other routines
@@ -243,12 +395,12 @@ def helm_coefficients_josep(Yseries, V0, S0, Ysh0, pq, pv, sl, pqpv, tolerance=1
     :param tolerance: target error (or tolerance)
     :param max_coeff: maximum number of coefficients
     :param verbose: print intermediate information
+    :param context: HelmSolverContext to reuse the factorization among calls (optional)
     :return: U, X, Q, iterations
     """
 
     npqpv = len(pqpv)
     npv = len(pv)
-    nsl = len(sl)
     n = Yseries.shape[0]
 
     # --------------------------- PREPARING IMPLEMENTATION -------------------------------------------------------------
@@ -266,47 +418,38 @@ def helm_coefficients_josep(Yseries, V0, S0, Ysh0, pq, pv, sl, pqpv, tolerance=1
                           columns=['Ysh', 'P0', 'Q0', 'V0'])
         print(df)
 
-    # build the reduced system
-    Yred = Yseries[np.ix_(pqpv, pqpv)]  # admittance matrix without slack buses
-    Yslack = -Yseries[np.ix_(pqpv, sl)]  # yes, it is the negative of this
-    G = np.real(Yred)  # real parts of Yij
-    B = np.imag(Yred)  # imaginary parts of Yij
+    # get the factorized system (only computed if the structure or the series admittances change)
+    if context is None:
+        context = HelmSolverContext()
+    context.update(Yseries, pq, pv, sl, pqpv)
+
+    pq_ = context.pq_
+    pv_ = context.pv_
+    pqpv_ = context.pqpv_
+    Yslack = context.Yslack
+    MAT_LU = context.MAT_LU
+
     vec_P = S0.real[pqpv]
     vec_Q = S0.imag[pqpv]
     Vslack = V0[sl]
-    Ysh = Ysh0[pqpv]
+    Ysh = Ysh0[pqpv].astype(complex)
     Vm0 = np.abs(V0[pqpv])
     vec_W = Vm0 * Vm0
 
-    # indices 0 based in the internal scheme
-    nsl_counted = np.zeros(n, dtype=int)
-    compt = 0
-    for i in range(n):
-        if i in sl:
-            compt += 1
-        nsl_counted[i] = compt
-
-    pq_ = pq - nsl_counted[pq]
-    pv_ = pv - nsl_counted[pv]
-    pqpv_ = np.sort(np.r_[pq_, pv_])
+    # specified power factor of X: the reactive power of the PV buses is an unknown
+    Sx = vec_P - 1j * vec_Q
+    Sx[pv_] = vec_P[pv_]
 
     # .......................CALCULATION OF TERMS [0] ------------------------------------------------------------------
-
-    if nsl > 1:
-        U[0, :] = spsolve(Yred, Yslack.sum(axis=1))
-    else:
-        U[0, :] = spsolve(Yred, Yslack)
-
-    X[0, :] = 1 / np.conj(U[0, :])
+    U[0, :] = context.U0
+    X[0, :] = context.X0
 
     # .......................CALCULATION OF TERMS [1] ------------------------------------------------------------------
-    valor = np.zeros(npqpv, dtype=complex)
 
     # get the current injections that appear due to the slack buses reduction
     I_inj_slack = Yslack[pqpv_, :] * Vslack
 
-    valor[pq_] = I_inj_slack[pq_] - Yslack[pq_].sum(axis=1).A1 + (vec_P[pq_] - vec_Q[pq_] * 1j) * X[0, pq_] - U[0, pq_] * Ysh[pq_]
-    valor[pv_] = I_inj_slack[pv_] - Yslack[pv_].sum(axis=1).A1 + (vec_P[pv_]) * X[0, pv_] - U[0, pv_] * Ysh[pv_]
+    valor = I_inj_slack - context.Yslack_sum + Sx * X[0, :] - U[0, :] * Ysh
 
     # compose the right-hand side vector
     RHS = np.r_[valor.real,
@@ -314,56 +457,21 @@ def helm_coefficients_josep(Yseries, V0, S0, Ysh0, pq, pv, sl, pqpv, tolerance=1
                 vec_W[pv_] - (U[0, pv_] * U[0, pv_]).real  # vec_W[pv_] - 1.0
                 ]
 
-    # Form the system matrix (MAT)
-    Upv = U[0, pv_]
-    Xpv = X[0, pv_]
-    VRE = coo_matrix((2 * Upv.real, (np.arange(npv), pv_)), shape=(npv, npqpv)).tocsc()
-    VIM = coo_matrix((2 * Upv.imag, (np.arange(npv), pv_)), shape=(npv, npqpv)).tocsc()
-    XIM = coo_matrix((-Xpv.imag, (pv_, np.arange(npv))), shape=(npqpv, npv)).tocsc()
-    XRE = coo_matrix((Xpv.real, (pv_, np.arange(npv))), shape=(npqpv, npv)).tocsc()
-    EMPTY = csc_matrix((npv, npv))
-
-    MAT = vs((hs((G,  -B,   XIM)),
-              hs((B,   G,   XRE)),
-              hs((VRE, VIM, EMPTY))), format='csc')
-
-    if verbose:
-        print('MAT')
-        print(MAT.toarray())
-
-    # factorize (only once)
-    MAT_LU = factorized(MAT.tocsc())
-
     # solve
     LHS = MAT_LU(RHS)
 
     # update coefficients
-    U[1, :] = LHS[:npqpv] + 1j * LHS[npqpv:2 * npqpv]
-    Q[0, pv_] = LHS[2 * npqpv:]
-    X[1, :] = -X[0, :] * np.conj(U[1, :]) / np.conj(U[0, :])
+    helm_update(1, LHS, U, X, Q, pv_)
 
     # .......................CALCULATION OF TERMS [>=2] ----------------------------------------------------------------
     iter_ = 1
-    range_pqpv = np.arange(npqpv, dtype=np.int64)
     for c in range(2, max_coeff):  # c defines the current depth
 
-        valor[pq_] = (vec_P[pq_] - vec_Q[pq_] * 1j) * X[c - 1, pq_] - U[c - 1, pq_] * Ysh[pq_]
-        valor[pv_] = -1j * conv2(X, Q, c, pv_) - U[c - 1, pv_] * Ysh[pv_] + X[c - 1, pv_] * vec_P[pv_]
-
-        RHS = np.r_[valor.real,
-                    valor.imag,
-                    -conv3(U, U, c, pv_).real]
+        helm_rhs(c, U, X, Q, Sx, Ysh, pv_, RHS)
 
         LHS = MAT_LU(RHS)
 
-        # update voltage coefficients
-        U[c, :] = LHS[:npqpv] + 1j * LHS[npqpv:2 * npqpv]
-
-        # update reactive power
-        Q[c - 1, pv_] = LHS[2 * npqpv:]
-
-        # update voltage inverse coefficients
-        X[c, range_pqpv] = -conv1(U, X, c, range_pqpv) / np.conj(U[0, range_pqpv])
+        helm_update(c, LHS, U, X, Q, pv_)
 
         iter_ += 1
 
@@ -371,7 +479,7 @@ def helm_coefficients_josep(Yseries, V0, S0, Ysh0, pq, pv, sl, pqpv, tolerance=1
 
 
 def helm_josep(Ybus, Yseries, V0, S0, Ysh0, pq, pv, sl, pqpv, tolerance=1e-6, max_coeff=30, use_pade=True,
-               verbose=False):
+               verbose=False, context: HelmSolverContext = None):
     """
     Holomorphic Embedding LoadFlow Method as formulated by Josep Fanals Batllori in 2020
     :param Ybus: Complete admittance matrix
@@ -387,6 +495,7 @@ def helm_josep(Ybus, Yseries, V0, S0, Ysh0, pq, pv, sl, pqpv, tolerance=1e-6, ma
     :param max_coeff: maximum number of coefficients
     :param use_pade: Use the Padè approximation? otherwise a simple summation is done
     :param verbose: print intermediate information
+    :param context: HelmSolverContext to reuse the factorization among calls (optional)
     :return: V, converged, norm_f, Scalc, iter_, elapsed
     """
 
@@ -398,7 +507,8 @@ def helm_josep(Ybus, Yseries, V0, S0, Ysh0, pq, pv, sl, pqpv, tolerance=1e-6, ma
 
     # compute the series of coefficients
     U, X, Q, iter_ = helm_coefficients_josep(Yseries, V0, S0, Ysh0, pq, pv, sl, pqpv,
-                                             tolerance=tolerance, max_coeff=max_coeff, verbose=verbose)
+                                             tolerance=tolerance, max_coeff=max_coeff, verbose=verbose,
+                                             context=context)
 
     # --------------------------- RESULTS COMPOSITION ------------------------------------------------------------------
     if verbose:
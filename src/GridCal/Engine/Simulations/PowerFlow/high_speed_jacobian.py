@@ -350,3 +350,91 @@ def get_fastest_jacobian_function(pvpq, pq):
         return create_J2
     else:
         return create_J
+
+
+@jit(nopython=True, cache=False)
+def create_J_structure(Yp, Yj, pvpq_lookup, pvpq, pq, Jj, Jp, Jsrc, Jkind):  # pragma: no cover
+    """
+    Compute the sparse structure of the Jacobian once, in the same order as create_J does.
+
+    Instead of the Jacobian values, the position in the dS/dV data arrays (Jsrc) and the kind of entry (Jkind)
+    are stored for every non zero, so that the numerical values can be refreshed later with fill_J_data:
+
+        Jkind = 0 -> dS_dVa.real (J11)
+        Jkind = 1 -> dS_dVm.real (J12)
+        Jkind = 2 -> dS_dVa.imag (J21)
+        Jkind = 3 -> dS_dVm.imag (J22)
+
+    :param Yp: Ybus index pointer
+    :param Yj: Ybus indices
+    :param pvpq_lookup: lookup pvpq -> index pvpq
+    :param pvpq: array of pv and pq bus indices
+    :param pq: array of pq bus indices
+    :param Jj: (output) Jacobian indices
+    :param Jp: (output) Jacobian index pointer
+    :param Jsrc: (output) position of each Jacobian entry in the dS/dV data arrays
+    :param Jkind: (output) kind of each Jacobian entry
+    :return: number of non zeros
+    """
+    lpvpq = len(pvpq)
+    lpq = len(pq)
+    lpv = lpvpq - lpq
+
+    nnz = 0
+
+    # J11 and J12
+    for r in range(lpvpq):
+        for c in range(Yp[pvpq[r]], Yp[pvpq[r] + 1]):
+            cc = pvpq_lookup[Yj[c]]
+            if pvpq[cc] == Yj[c]:
+                Jsrc[nnz] = c
+                Jkind[nnz] = 0
+                Jj[nnz] = cc
+                nnz += 1
+                if cc >= lpv:
+                    Jsrc[nnz] = c
+                    Jkind[nnz] = 1
+                    Jj[nnz] = cc + lpq
+                    nnz += 1
+        Jp[r + 1] = nnz
+
+    # J21 and J22
+    for r in range(lpq):
+        for c in range(Yp[pq[r]], Yp[pq[r] + 1]):
+            cc = pvpq_lookup[Yj[c]]
+            if pvpq[cc] == Yj[c]:
+                Jsrc[nnz] = c
+                Jkind[nnz] = 2
+                Jj[nnz] = cc
+                nnz += 1
+                if cc >= lpv:
+                    Jsrc[nnz] = c
+                    Jkind[nnz] = 3
+                    Jj[nnz] = cc + lpq
+                    nnz += 1
+        Jp[r + lpvpq + 1] = nnz
+
+    return nnz
+
+
+@jit(nopython=True, cache=False)
+def fill_J_data(dVm_x, dVa_x, Jsrc, Jkind, Jx):  # pragma: no cover
+    """
+    Refresh the Jacobian values using the structure computed by create_J_structure
+    :param dVm_x: dS/dVm data
+    :param dVa_x: dS/dVa data
+    :param Jsrc: position of each Jacobian entry in the dS/dV data arrays
+    :param Jkind: kind of each Jacobian entry
+    :param Jx: (output) Jacobian data
+    """
+    for k in range(len(Jx)):
+        c = Jsrc[k]
+        kind = Jkind[k]
+        if kind == 0:
+            Jx[k] = dVa_x[c].real
+        elif kind == 1:
+            Jx[k] = dVm_x[c].real
+        elif kind == 2:
+            Jx[k] = dVa_x[c].imag
+        else:
+            Jx[k] = dVm_x[c].imag
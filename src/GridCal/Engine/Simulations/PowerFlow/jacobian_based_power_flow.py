@@ -20,12 +20,14 @@
 import time
 import scipy
 import scipy.sparse as sp
+from scipy.sparse.linalg import splu
 import numpy as np
 
 from GridCal.Engine.Sparse.csc import pack_4_by_4
 from GridCal.Engine.Simulations.sparse_solve import get_sparse_type, get_linear_solver
 from GridCal.Engine.Simulations.PowerFlow.numba_functions import calc_power_csr_numba, diag
 from GridCal.Engine.Simulations.PowerFlow.high_speed_jacobian import _create_J_with_numba, get_fastest_jacobian_function
+from GridCal.Engine.Simulations.PowerFlow.high_speed_jacobian import dSbus_dV_numba_sparse, create_J_structure, fill_J_data
 
 linear_solver = get_linear_solver()
 sparse = get_sparse_type()
@@ -402,6 +404,347 @@ def NR_LS(Ybus, Sbus, V0, Ibus, pv, pq, tol, max_it=15, acceleration_parameter=0
     return V, converged, norm_f, Scalc, iter_, elapsed
 
 
+class NRSolverContext:
+    """
+    Newton-Raphson solver context to be reused among many power flows of the same island and topology state
+    (i.e. the time steps of a time series).
+
+    The Jacobian sparsity pattern only depends on the Ybus structure and on the pv and pq bus lists, hence it is
+    computed once together with the pvpq lookup and the fill-reducing column ordering of the factorization.
+    Every refactorization only refreshes the numerical values and skips the ordering step.
+
+    In dishonest (chord) mode, the last LU factorization is reused until the convergence stalls, and it is also
+    kept among consecutive calls, since the Jacobian barely changes from one time step to the next one.
+    The factorization is discarded when the admittance values change (i.e. the taps or the branch states are
+    patched in place), since the old Jacobian may not lead to convergence anymore.
+    """
+
+    def __init__(self, dishonest=False, stall_ratio=0.5):
+        """
+        NRSolverContext constructor
+        :param dishonest: reuse the last LU factorization until the convergence stalls?
+        :param stall_ratio: ratio between consecutive errors above which the Jacobian is refactorized (dishonest)
+        """
+        self.dishonest = dishonest
+
+        self.stall_ratio = stall_ratio
+
+        # structure keys
+        self.Ybus = None
+        self.Yp = None
+        self.Yj = None
+        self.pv = None
+        self.pq = None
+
+        # index maps
+        self.pvpq = None
+        self.pvpq_lookup = None
+        self.npv = 0
+        self.npq = 0
+
+        # Jacobian structure in CSR form, and the mapping to the dS/dV data
+        self.Jj = None
+        self.Jp = None
+        self.Jsrc = None
+        self.Jkind = None
+        self.Jx = None
+
+        # column-permuted CSC structure used by the factorization
+        self.csc_indices = None
+        self.csc_indptr = None
+        self.csc_map = None
+        self.col_order = None
+
+        # numerical factorization and the admittance values it was computed with
+        self.lu = None
+        self.Yx = None
+
+        # statistics
+        self.n_analysis = 0
+        self.n_factorizations = 0
+
+    def is_valid(self, Ybus, pv, pq):
+        """
+        Check if the stored structure can be used with the given inputs
+        :param Ybus: Admittance matrix
+        :param pv: Array with the indices of the PV buses
+        :param pq: Array with the indices of the PQ buses
+        :return: True / False
+        """
+        if self.Jp is None:
+            return False
+
+        if not (np.array_equal(self.pv, pv) and np.array_equal(self.pq, pq)):
+            return False
+
+        if Ybus is self.Ybus:
+            return True
+
+        # a different matrix object (i.e. after a tap change) may keep the same structure
+        return np.array_equal(self.Yp, Ybus.indptr) and np.array_equal(self.Yj, Ybus.indices)
+
+    def analyze(self, Ybus, pv, pq):
+        """
+        Compute the Jacobian structure, the index maps and the column ordering
+        :param Ybus: Admittance matrix
+        :param pv: Array with the indices of the PV buses
+        :param pq: Array with the indices of the PQ buses
+        """
+        Ybus.sort_indices()
+
+        self.Ybus = Ybus
+        self.Yp = Ybus.indptr.copy()
+        self.Yj = Ybus.indices.copy()
+        self.pv = np.array(pv, dtype=int)
+        self.pq = np.array(pq, dtype=int)
+
+        self.pvpq = np.r_[self.pv, self.pq]
+        self.npv = len(self.pv)
+        self.npq = len(self.pq)
+
+        self.pvpq_lookup = np.zeros(np.max(Ybus.indices) + 1, dtype=int)
+        self.pvpq_lookup[self.pvpq] = np.arange(len(self.pvpq))
+
+        # compute the Jacobian structure
+        nnz_max = len(Ybus.data) * 4
+        dimJ = self.npv + 2 * self.npq
+        Jj = np.empty(nnz_max, dtype=np.int32)
+        Jp = np.zeros(dimJ + 1, dtype=np.int32)
+        Jsrc = np.empty(nnz_max, dtype=np.int64)
+        Jkind = np.empty(nnz_max, dtype=np.int8)
+        nnz = create_J_structure(Ybus.indptr, Ybus.indices, self.pvpq_lookup, self.pvpq, self.pq,
+                                 Jj, Jp, Jsrc, Jkind)
+        self.Jj = Jj[:nnz]
+        self.Jp = Jp
+        self.Jsrc = Jsrc[:nnz]
+        self.Jkind = Jkind[:nnz]
+        self.Jx = np.empty(nnz, dtype=float)
+
+        # the ordering is computed with the first numerical factorization
+        self.csc_indices = None
+        self.csc_indptr = None
+        self.csc_map = None
+        self.col_order = None
+        self.lu = None
+
+        self.n_analysis += 1
+
+    def update(self, Ybus, pv, pq):
+        """
+        Refresh the structure only if needed
+        :param Ybus: Admittance matrix
+        :param pv: Array with the indices of the PV buses
+        :param pq: Array with the indices of the PQ buses
+        """
+        if not self.is_valid(Ybus, pv, pq):
+            self.analyze(Ybus, pv, pq)
+        else:
+            self.Ybus = Ybus
+
+            # the values may have been patched in place, so the stored factorization may be outdated
+            if self.lu is not None and not np.array_equal(self.Yx, Ybus.data):
+                self.lu = None
+
+    def set_column_ordering(self, col_order):
+        """
+        Store the fill-reducing column ordering and the matching column-permuted CSC structure
+        :param col_order: column ordering
+        """
+        dimJ = len(self.Jp) - 1
+        nnz = len(self.Jj)
+        positions = sp.csr_matrix((np.arange(1, nnz + 1), self.Jj, self.Jp), shape=(dimJ, dimJ))
+        positions = positions.tocsc()[:, col_order].tocsc()
+        positions.sort_indices()
+        self.csc_indices = positions.indices
+        self.csc_indptr = positions.indptr
+        self.csc_map = positions.data - 1
+        self.col_order = col_order
+
+    def factorize(self, Ybus, V):
+        """
+        Compute the Jacobian values at V and factorize it
+        :param Ybus: Admittance matrix
+        :param V: Voltages array
+        """
+        Ibus = np.zeros(len(V), dtype=complex)
+        dVm_x, dVa_x = dSbus_dV_numba_sparse(Ybus.data, Ybus.indptr, Ybus.indices, V, V / np.abs(V), Ibus)
+        fill_J_data(dVm_x, dVa_x, self.Jsrc, self.Jkind, self.Jx)
+
+        dimJ = len(self.Jp) - 1
+
+        if self.col_order is None:
+            # first factorization: compute the ordering
+            J = sp.csr_matrix((self.Jx, self.Jj, self.Jp), shape=(dimJ, dimJ)).tocsc()
+            lu = splu(J, permc_spec='COLAMD')
+            self.set_column_ordering(np.argsort(lu.perm_c))
+
+        Jc = sp.csc_matrix((self.Jx[self.csc_map], self.csc_indices, self.csc_indptr), shape=(dimJ, dimJ))
+        self.lu = splu(Jc, permc_spec='NATURAL')
+        self.Yx = Ybus.data.copy()
+        self.n_factorizations += 1
+
+    def solve(self, f):
+        """
+        Solve J x = f with the stored factorization
+        :param f: right hand side
+        :return: solution
+        """
+        y = self.lu.solve(f)
+        x = np.empty_like(y)
+        x[self.col_order] = y
+        return x
+
+
+def NR_LS_cached(context: NRSolverContext, Ybus, Sbus, V0, Ibus, pv, pq, tol, max_it=15,
+                 acceleration_parameter=0.05, error_registry=None):
+    """
+    Solves the power flow using a full Newton's method with backtrack correction, reusing the Jacobian structure
+    and the factorization ordering stored in the solver context. In dishonest mode, the Jacobian is only
+    refactorized when the convergence stalls.
+    :param context: NRSolverContext instance
+    :param Ybus: Admittance matrix
+    :param Sbus: Array of nodal power injections
+    :param V0: Array of nodal voltages (initial solution)
+    :param Ibus: Array of nodal current injections
+    :param pv: Array with the indices of the PV buses
+    :param pq: Array with the indices of the PQ buses
+    :param tol: Tolerance
+    :param max_it: Maximum number of iterations
+    :param acceleration_parameter: parameter used to correct the "bad" iterations, should be be between 1e-3 ~ 0.5
+    :param error_registry: list to store the error for plotting
+    :return: Voltage solution, converged?, error, calculated power injections
+    """
+    start = time.time()
+
+    # initialize
+    converged = 0
+    iter_ = 0
+    V = V0
+    Va = np.angle(V)
+    Vm = np.abs(V)
+    dVa = np.zeros_like(Va)
+    dVm = np.zeros_like(Vm)
+
+    npv = len(pv)
+    npq = len(pq)
+
+    if (npq + npv) > 0:
+
+        # reuse the structure if possible
+        context.update(Ybus, pv, pq)
+        pvpq = context.pvpq
+
+        # j1:j2 - V angle of pv and pq buses
+        j1 = 0
+        j2 = npv + npq
+        # j2:j3 - V mag of pq buses
+        j3 = j2 + npq
+
+        # evaluate F(x0)
+        Scalc = V * np.conj(Ybus * V - Ibus)
+        dS = Scalc - Sbus  # compute the mismatch
+        f = np.r_[dS[pvpq].real, dS[pq].imag]
+
+        # check tolerance
+        norm_f = 0.5 * f.dot(f)
+
+        if error_registry is not None:
+            error_registry.append(norm_f)
+
+        if norm_f < tol:
+            converged = 1
+
+        refresh = context.lu is None or not context.dishonest
+
+        # do Newton iterations
+        while not converged and iter_ < max_it:
+            # update iteration counter
+            iter_ += 1
+
+            # evaluate and factorize the Jacobian only if needed
+            if refresh:
+                context.factorize(Ybus, V)
+
+            # compute update step
+            dx = context.solve(f)
+
+            # reassign the solution vector
+            dVa[pvpq] = dx[j1:j2]
+            dVm[pq] = dx[j2:j3]
+
+            # update voltage the Newton way (mu=1)
+            mu_ = 1.0
+            Vm -= mu_ * dVm
+            Va -= mu_ * dVa
+            Vnew = Vm * np.exp(1.0j * Va)
+
+            # compute the mismatch function f(x_new)
+            Scalc = Vnew * np.conj(Ybus * Vnew - Ibus)
+            dS = Scalc - Sbus  # complex power mismatch
+            f_new = np.r_[dS[pvpq].real, dS[pq].imag]  # concatenate to form the mismatch function
+            norm_f_new = 0.5 * f_new.dot(f_new)
+
+            if error_registry is not None:
+                error_registry.append(norm_f_new)
+
+            cond = norm_f_new > norm_f  # condition to back track (no improvement at all)
+
+            l_iter = 0
+            while not cond and l_iter < 10 and mu_ > 0.01:
+                # line search back
+                # update voltage with a closer value to the last value in the Jacobian direction
+                mu_ *= acceleration_parameter
+                Vm -= mu_ * dVm
+                Va -= mu_ * dVa
+                Vnew = Vm * np.exp(1.0j * Va)
+
+                # compute the mismatch function f(x_new)
+                Scalc = Vnew * np.conj(Ybus * Vnew - Ibus)
+                dS = Scalc - Sbus  # complex power mismatch
+                f_new = np.r_[dS[pvpq].real, dS[pq].imag]  # concatenate to form the mismatch function
+
+                norm_f_new = 0.5 * f_new.dot(f_new)
+
+                cond = norm_f_new > norm_f
+
+                if error_registry is not None:
+                    error_registry.append(norm_f_new)
+
+                l_iter += 1
+
+            # in dishonest mode, refactorize only if the error did not decrease enough
+            if context.dishonest:
+                refresh = norm_f_new > context.stall_ratio * norm_f
+
+            # update calculation variables
+            V = Vnew
+            f = f_new
+
+            # check for convergence
+            if l_iter == 0:
+                # no correction loop executed, hence compute the error fresh
+                norm_f = 0.5 * f_new.dot(f_new)
+            else:
+                # pick the latest computer error in the correction loop
+                norm_f = norm_f_new
+
+            if error_registry is not None:
+                error_registry.append(norm_f)
+
+            if norm_f < tol:
+                converged = 1
+
+    else:
+        norm_f = 0
+        converged = True
+        Scalc = Sbus
+
+    end = time.time()
+    elapsed = end - start
+
+    return V, converged, norm_f, Scalc, iter_, elapsed
+
+
 def NRD_LS(Ybus, Sbus, V0, Ibus, pv, pq, tol, max_it=15, acceleration_parameter=0.05, error_registry=None):
     """
     Solves the power flow using a full Newton's method with backtrack correction.
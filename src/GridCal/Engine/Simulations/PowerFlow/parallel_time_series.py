@@ -0,0 +1,119 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Process pool worker of the time series power flow.
+This module must not import any GUI library since it is imported by the spawned processes.
+"""
+
+import numpy as np
+
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Core.shared_arrays import attach_array, attach_object
+from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import single_island_pf, time_series_initial_voltage
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import NRSolverContext
+from GridCal.Engine.Simulations.PowerFlow.helm_power_flow import HelmSolverContext
+from GridCal.Engine.Simulations.PowerFlow.batched_power_flow import can_run_batched, batched_island_pf, \
+    write_time_series_block
+
+# arrays of TimeSeriesResults that are written by the workers
+TIME_SERIES_RESULTS_ARRAYS = ['voltage', 'S', 'Sbranch', 'Ibranch', 'Vbranch', 'loading', 'losses',
+                              'flow_direction', 'error', 'converged', 'iterations']
+
+# arrays that are shared by all the islands at the same rows, hence they are stored per island (n_islands, nt)
+TIME_SERIES_ISLAND_ARRAYS = ['error', 'converged', 'iterations']
+
+
+class SharedTimeSeriesResults:
+
+    def __init__(self, descriptors, island_index):
+        """
+        Shared version of the TimeSeriesResults arrays
+        :param descriptors: dictionary of array name -> SharedArrayStore descriptor
+        :param island_index: index of the island that writes the results
+        """
+        for name, descriptor in descriptors.items():
+            arr = attach_array(descriptor, mode='r+')
+            setattr(self, name, arr[island_index] if name in TIME_SERIES_ISLAND_ARRAYS else arr)
+
+    def flush(self):
+        """
+        Write the changes to the shared arrays
+        """
+        for name in TIME_SERIES_RESULTS_ARRAYS:
+            getattr(self, name).flush()
+
+
+def time_series_island_worker(island_index, skeleton, descriptors, results_descriptors, t_loc, rows,
+                              options: PowerFlowOptions):
+    """
+    Run the power flow of a chunk of time steps of a time island and write the results in place
+    :param island_index: index of the island
+    :param skeleton: TimeCircuit island skeleton (see publish_object)
+    :param descriptors: descriptors of the island arrays (see publish_object)
+    :param results_descriptors: descriptors of the shared results arrays
+    :param t_loc: array of time indices of the island to simulate
+    :param rows: array of results rows corresponding to t_loc
+    :param options: PowerFlowOptions instance
+    :return: Logger, number of time steps simulated
+    """
+    logger = Logger()
+    circuit = attach_object(skeleton, descriptors)
+    results = SharedTimeSeriesResults(results_descriptors, island_index)
+    bus_idx = circuit.original_bus_idx
+    br_idx = circuit.original_branch_idx
+    nr_context = NRSolverContext(dishonest=options.dishonest_newton)
+
+    if options.batched_time_series and can_run_batched(options):
+        values = batched_island_pf(circuit=circuit, t_loc=t_loc, options=options,
+                                   logger=logger, nr_context=nr_context)
+        write_time_series_block(results, rows, bus_idx, br_idx, *values)
+
+    else:
+        helm_context = HelmSolverContext()
+        previous_solutions = list()
+        for it, row in zip(t_loc, rows):
+            V0 = time_series_initial_voltage(circuit=circuit,
+                                             Vbus=circuit.Vbus[it, :],
+                                             Sbus=circuit.Sbus[:, it],
+                                             Ibus=circuit.Ibus[:, it],
+                                             previous_solutions=previous_solutions,
+                                             initialization=options.ts_initialization)
+
+            res = single_island_pf(circuit=circuit,
+                                   Vbus=V0,
+                                   Sbus=circuit.Sbus[:, it],
+                                   Ibus=circuit.Ibus[:, it],
+                                   branch_rates=circuit.branch_rates[it, :],
+                                   options=options,
+                                   logger=logger,
+                                   nr_context=nr_context,
+                                   helm_context=helm_context)
+
+            write_time_series_block(results, [row], bus_idx, br_idx,
+                                    res.voltage, res.Sbus, res.Sbranch, res.Ibranch, res.Vbranch,
+                                    res.loading, res.losses, res.flow_direction,
+                                    np.array([res.error()]), np.array([res.converged()]),
+                                    np.array([res.iterations()]))
+
+            if res.converged():
+                previous_solutions = previous_solutions[-2:] + [res.voltage]
+            else:
+                previous_solutions = list()
+
+    results.flush()
+
+    return logger, len(t_loc)
@@ -14,6 +14,7 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 from GridCal.Engine.basic_structures import BranchImpedanceMode, ReactivePowerControlMode, SolverType, TapsControlMode
+from GridCal.Engine.basic_structures import TimeSeriesInitialization
 
 
 class PowerFlowOptions:
@@ -70,6 +71,16 @@ class PowerFlowOptions:
 
         **correction_parameter** (float, 1e-4): parameter used to correct the "bad" iterations,
                                                 should be be between 1e-4 ~ 0.5
+
+        **dishonest_newton** (bool, False): In the time series, reuse the Newton-Raphson Jacobian factorization
+                                            until the convergence stalls (chord / dishonest Newton)
+
+        **batched_time_series** (bool, False): In the time series, solve all the time steps of each island at once
+                                               with the batched Newton-Raphson (only without outer loop controls)
+
+        **ts_initialization** (TimeSeriesInitialization, TimeSeriesInitialization.Profile): Initial voltage guess
+                                                                                           of every time step of the
+                                                                                           time series
     """
 
     def __init__(self,
@@ -90,7 +101,10 @@ class PowerFlowOptions:
                  q_steepness_factor=30,
                  distributed_slack=False,
                  ignore_single_node_islands=False,
-                 correction_parameter=1e-4):
+                 correction_parameter=1e-4,
+                 dishonest_newton=False,
+                 batched_time_series=False,
+                 ts_initialization=TimeSeriesInitialization.Profile):
 
         self.solver_type = solver_type
 
@@ -128,5 +142,11 @@ class PowerFlowOptions:
 
         self.acceleration_parameter = correction_parameter
 
+        self.dishonest_newton = dishonest_newton
+
+        self.batched_time_series = batched_time_series
+
+        self.ts_initialization = ts_initialization
+
     def __str__(self):
         return "PowerFlowOptions"
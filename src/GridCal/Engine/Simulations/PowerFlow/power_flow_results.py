@@ -151,6 +151,16 @@ class PowerFlowResults:
             val = max(val, conv.error())
         return val
 
+    def iterations(self):
+        """
+        Total number of iterations of the numerical methods in all modes
+        :return: number of iterations
+        """
+        val = 0
+        for conv in self.convergence_reports:
+            val += int(np.sum(conv.iterations_))
+        return val
+
     def copy(self):
         """
         Return a copy of this
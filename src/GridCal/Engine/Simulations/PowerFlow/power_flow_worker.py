@@ -17,11 +17,13 @@ import pandas as pd
 import numpy as np
 import scipy.sparse as sp
 from GridCal.Engine.basic_structures import BusMode, ReactivePowerControlMode, SolverType, TapsControlMode, Logger
+from GridCal.Engine.basic_structures import TimeSeriesInitialization
 from GridCal.Engine.Simulations.PowerFlow.linearized_power_flow import dcpf, lacpf
-from GridCal.Engine.Simulations.PowerFlow.helm_power_flow import helm_josep
+from GridCal.Engine.Simulations.PowerFlow.helm_power_flow import helm_josep, HelmSolverContext
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import IwamotoNR
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import levenberg_marquardt_pf
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import NR_LS, NR_I_LS, NRD_LS
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import NR_LS_cached, NRSolverContext
 from GridCal.Engine.Simulations.PowerFlow.fast_decoupled_power_flow import FDPF
 from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowResults
 from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
@@ -66,7 +68,7 @@ class ConvergenceReport:
 
 
 def solve(solver_type, V0, Sbus, Ibus, Ybus, Yseries, Ysh_helm, B1, B2, Bpqpv, Bref, pq, pv, ref, pqpv, tolerance, max_iter,
-          acceleration_parameter=1e-5):
+          acceleration_parameter=1e-5, nr_context: NRSolverContext = None, helm_context: HelmSolverContext = None):
     """
     Run a power flow simulation using the selected method (no outer loop controls).
 
@@ -104,6 +106,10 @@ def solve(solver_type, V0, Sbus, Ibus, Ybus, Yseries, Ysh_helm, B1, B2, Bpqpv, B
 
         **max_iter**: maximum iterations
 
+        **nr_context**: NRSolverContext to reuse among calls with the Newton-Raphson method (optional)
+
+        **helm_context**: HelmSolverContext to reuse among calls with the HELM method (optional)
+
     Returns:
 
         V0 (Voltage solution), converged (converged?), normF (error in power),
@@ -123,7 +129,8 @@ def solve(solver_type, V0, Sbus, Ibus, Ybus, Yseries, Ysh_helm, B1, B2, Bpqpv, B
                                                         tolerance=tolerance,
                                                         max_coeff=max_iter,
                                                         use_pade=True,
-                                                        verbose=False)
+                                                        verbose=False,
+                                                        context=helm_context)
 
     # type DC
     elif solver_type == SolverType.DC:
@@ -173,6 +180,19 @@ def solve(solver_type, V0, Sbus, Ibus, Ybus, Yseries, Ysh_helm, B1, B2, Bpqpv, B
                                                   tol=tolerance,
                                                   max_it=max_iter)
 
+    # Newton-Raphson (full) reusing the Jacobian structure and factorization
+    elif solver_type == SolverType.NR and nr_context is not None:
+        V, converged, normF, Scalc, it, el = NR_LS_cached(context=nr_context,
+                                                          Ybus=Ybus,
+                                                          Sbus=Sbus,
+                                                          V0=V0,
+                                                          Ibus=Ibus,
+                                                          pv=pv,
+                                                          pq=pq,
+                                                          tol=tolerance,
+                                                          max_it=max_iter,
+                                                          acceleration_parameter=acceleration_parameter)
+
     # Newton-Raphson (full)
     elif solver_type == SolverType.NR:
         # Solve NR with the linear AC solution
@@ -230,7 +250,9 @@ def solve(solver_type, V0, Sbus, Ibus, Ybus, Yseries, Ysh_helm, B1, B2, Bpqpv, B
 
 
 def outer_loop_power_flow(circuit: SnapshotCircuit, options: PowerFlowOptions, solver_type: SolverType,
-                          voltage_solution, Sbus, Ibus, branch_rates, logger) -> "PowerFlowResults":
+                          voltage_solution, Sbus, Ibus, branch_rates, logger,
+                          nr_context: NRSolverContext = None,
+                          helm_context: HelmSolverContext = None) -> "PowerFlowResults":
     """
     Run a power flow simulation for a single circuit using the selected outer loop
     controls. This method shouldn't be called directly.
@@ -253,6 +275,10 @@ def outer_loop_power_flow(circuit: SnapshotCircuit, options: PowerFlowOptions, s
 
         **t**: (optional) time step
 
+        **nr_context**: (optional) NRSolverContext to reuse the Newton-Raphson Jacobian structure
+
+        **helm_context**: (optional) HelmSolverContext to reuse the HELM system factorization
+
     Return:
 
         PowerFlowResults instance
@@ -265,7 +291,12 @@ def outer_loop_power_flow(circuit: SnapshotCircuit, options: PowerFlowOptions, s
     # copy the tap positions
     tap_positions = circuit.tr_tap_position.copy()
 
-    tap_module = circuit.tr_tap_mod
+    # copy the tap modules, since the tap control modifies them
+    tap_module = circuit.tr_tap_mod.copy()
+
+    # the tap control patches the admittance matrices in place, so a previous run may have left other taps in them
+    if options.control_taps != TapsControlMode.NoControl and circuit.ntr > 0:
+        circuit.update_taps(tap_module=tap_module)
 
     # control flags
     any_q_control_issue = True
@@ -324,7 +355,9 @@ def outer_loop_power_flow(circuit: SnapshotCircuit, options: PowerFlowOptions, s
                                                                       pqpv=pqpv,
                                                                       tolerance=options.tolerance,
                                                                       max_iter=options.max_iter,
-                                                                      acceleration_parameter=options.acceleration_parameter)
+                                                                      acceleration_parameter=options.acceleration_parameter,
+                                                                      nr_context=nr_context,
+                                                                      helm_context=helm_context)
             if options.distributed_slack:
                 # Distribute the slack power
                 slack_power = Scalc[vd].real.sum()
@@ -351,7 +384,9 @@ def outer_loop_power_flow(circuit: SnapshotCircuit, options: PowerFlowOptions, s
                                                                                 pqpv=pqpv,
                                                                                 tolerance=options.tolerance,
                                                                                 max_iter=options.max_iter,
-                                                                                acceleration_parameter=options.acceleration_parameter)
+                                                                                acceleration_parameter=options.acceleration_parameter,
+                                                                                nr_context=nr_context,
+                                                                                helm_context=helm_context)
                     # increase the metrics with the second run numbers
                     it += it2
                     el += el2
@@ -442,7 +477,8 @@ def outer_loop_power_flow(circuit: SnapshotCircuit, options: PowerFlowOptions, s
                                                            verbose=options.verbose)
 
                 if not stable:
-                    # recompute the admittance matrices based on the tap changes
+                    # patch the admittance matrices with the tap changes: Ybus is modified in place and keeps its
+                    # structure, hence the Newton-Raphson context keeps the Jacobian analysis
                     circuit.re_calc_admittance_matrices(tap_module)
                 any_tap_control_issue = not stable
 
@@ -1109,7 +1145,9 @@ def control_taps_direct(voltage, T, bus_to_regulated_idx, tap_position, tap_modu
 
 
 def single_island_pf(circuit: SnapshotCircuit, Vbus, Sbus, Ibus, branch_rates,
-                     options: PowerFlowOptions, logger: Logger) -> "PowerFlowResults":
+                     options: PowerFlowOptions, logger: Logger,
+                     nr_context: NRSolverContext = None,
+                     helm_context: HelmSolverContext = None) -> "PowerFlowResults":
     """
     Run a power flow for a circuit. In most cases, the **run** method should be used instead.
     :param circuit: SnapshotCircuit instance
@@ -1119,6 +1157,8 @@ def single_island_pf(circuit: SnapshotCircuit, Vbus, Sbus, Ibus, branch_rates,
     :param branch_rates: array of branch rates
     :param options: PowerFlowOptions instance
     :param logger: Logger instance
+    :param nr_context: NRSolverContext to reuse among consecutive calls for the same island (optional)
+    :param helm_context: HelmSolverContext to reuse among consecutive calls for the same island (optional)
     :return: PowerFlowResults instance
     """
 
@@ -1157,7 +1197,9 @@ def single_island_pf(circuit: SnapshotCircuit, Vbus, Sbus, Ibus, branch_rates,
                                         Sbus=Sbus,
                                         Ibus=Ibus,
                                         branch_rates=branch_rates,
-                                        logger=logger)
+                                        logger=logger,
+                                        nr_context=nr_context,
+                                        helm_context=helm_context)
 
         # did it worked?
         worked = np.all(results.converged())
@@ -1171,6 +1213,63 @@ def single_island_pf(circuit: SnapshotCircuit, Vbus, Sbus, Ibus, branch_rates,
     return results
 
 
+def time_series_initial_voltage(circuit: SnapshotCircuit, Vbus, Sbus, Ibus, previous_solutions,
+                                initialization: TimeSeriesInitialization):
+    """
+    Initial voltage guess of a time step of the time series.
+    The predicted voltage is only used if its power mismatch is lower than the one of the profile voltage and
+    the previous solution, since the extrapolations may overshoot when the injections change abruptly.
+    :param circuit: island circuit (SnapshotCircuit or TimeCircuit)
+    :param Vbus: voltage of the profile at the time step (set points)
+    :param Sbus: Power injection at each bus at the time step
+    :param Ibus: Current injection at each bus at the time step
+    :param previous_solutions: list of the last converged voltage solutions (the most recent last)
+    :param initialization: TimeSeriesInitialization mode
+    :return: initial voltage
+    """
+    n_prev = len(previous_solutions)
+
+    if initialization == TimeSeriesInitialization.Profile:
+        return Vbus
+
+    elif initialization == TimeSeriesInitialization.LinearPredictor:
+        V0 = lacpf(Y=circuit.Ybus, Ys=circuit.Yseries, S=Sbus, I=Ibus, Vset=Vbus, pq=circuit.pq, pv=circuit.pv)[0]
+
+    elif n_prev == 0:
+        return Vbus
+
+    else:
+        # extrapolate the module and the angle with as many previous solutions as the order allows
+        order = {TimeSeriesInitialization.PreviousSolution: 1,
+                 TimeSeriesInitialization.LinearExtrapolation: 2,
+                 TimeSeriesInitialization.QuadraticExtrapolation: 3}[initialization]
+        k = min(order, n_prev)
+        coefficients = {1: [1.0], 2: [-1.0, 2.0], 3: [1.0, -3.0, 3.0]}[k]
+        history = np.array(previous_solutions[-k:])
+        Vm = np.dot(coefficients, np.abs(history))
+        Va = np.dot(coefficients, np.unwrap(np.angle(history), axis=0))
+        V0 = Vm * np.exp(1.0j * Va)
+
+    # pick the candidate with the lowest power mismatch
+    pvpq = np.r_[circuit.pv, circuit.pq]
+    candidates = [Vbus, V0] if n_prev == 0 else [Vbus, previous_solutions[-1], V0]
+    best_V = Vbus
+    best_norm = np.inf
+    for V in candidates:
+        # the slack voltages and the PV voltage modules are not variables
+        V = V.copy()
+        V[circuit.vd] = Vbus[circuit.vd]
+        V[circuit.pv] = np.abs(Vbus[circuit.pv]) * np.exp(1.0j * np.angle(V[circuit.pv]))
+
+        dS = V * np.conj(circuit.Ybus * V - Ibus) - Sbus
+        norm_f = max(np.max(np.abs(dS[pvpq].real), initial=0), np.max(np.abs(dS[circuit.pq].imag), initial=0))
+        if norm_f < best_norm:
+            best_V = V
+            best_norm = norm_f
+
+    return best_V
+
+
 def multi_island_pf(multi_circuit: MultiCircuit, options: PowerFlowOptions, opf_results=None,
                     logger=Logger()) -> "PowerFlowResults":
     """
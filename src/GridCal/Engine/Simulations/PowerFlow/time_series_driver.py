@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import json
 import pandas as pd
 import numpy as np
@@ -21,21 +22,60 @@ import multiprocessing
 from sklearn.cluster import KMeans
 from PySide2.QtCore import QThread, QThreadPool, Signal
 
-from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.basic_structures import Logger, TimeSeriesInitialization
 from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowResults
 from GridCal.Engine.Simulations.result_types import ResultTypes
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import single_island_pf, power_flow_worker_args
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import time_series_initial_voltage
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import NRSolverContext
+from GridCal.Engine.Simulations.PowerFlow.helm_power_flow import HelmSolverContext
+from GridCal.Engine.Simulations.PowerFlow.batched_power_flow import can_run_batched, batched_island_pf, \
+    write_time_series_block
+from GridCal.Engine.Simulations.PowerFlow.parallel_time_series import time_series_island_worker, \
+    TIME_SERIES_RESULTS_ARRAYS, TIME_SERIES_ISLAND_ARRAYS
 from GridCal.Engine.Core.time_series_pf_data import compile_time_circuit, split_time_circuit_into_islands, BranchImpedanceMode
+from GridCal.Engine.Core.time_series_pf_data import get_time_island_steps
+from GridCal.Engine.Core.shared_arrays import SharedArrayStore, publish_object
 from GridCal.Engine.Simulations.Stochastic.latin_hypercube_sampling import lhs
+from GridCal.Engine.IO.h5_interface import H5ResultsStore, H5Array, apply_lazily
 from GridCal.Gui.GuiFunctions import ResultsModel
 
 
+# (nt, n) and (nt, m) arrays of the time series results that may be kept in a results store
+TIME_SERIES_STORED_ARRAYS = ['voltage', 'S', 'Sbranch', 'Ibranch', 'Vbranch', 'loading', 'losses', 'flow_direction']
+
+# names lists of the time series results
+TIME_SERIES_NAMES = ['bus_names', 'branch_names', 'transformer_names', 'hvdc_names']
+
+# per element statistics of the time series results, computed as the steps are set
+TIME_SERIES_AGGREGATES = ['voltage_max', 'voltage_min', 'Sbranch_max', 'loading_max', 'overload_count']
+
+# array required by each of the time series result types
+TIME_SERIES_RESULT_ARRAYS = {ResultTypes.BusVoltageModule: 'voltage',
+                             ResultTypes.BusVoltageAngle: 'voltage',
+                             ResultTypes.BusActivePower: 'S',
+                             ResultTypes.BusReactivePower: 'S',
+                             ResultTypes.BranchActivePower: 'Sbranch',
+                             ResultTypes.BranchReactivePower: 'Sbranch',
+                             ResultTypes.BranchActiveCurrent: 'Ibranch',
+                             ResultTypes.BranchReactiveCurrent: 'Ibranch',
+                             ResultTypes.BranchLoading: 'loading',
+                             ResultTypes.BranchActiveLosses: 'losses',
+                             ResultTypes.BranchReactiveLosses: 'losses',
+                             ResultTypes.BranchVoltage: 'Vbranch',
+                             ResultTypes.BranchAngles: 'Vbranch',
+                             ResultTypes.BranchPower: 'Sbranch',
+                             ResultTypes.BranchCurrent: 'Ibranch',
+                             ResultTypes.BranchLosses: 'losses',
+                             ResultTypes.BatteryPower: 'losses'}
+
+
 class TimeSeriesResults(PowerFlowResults):
 
     def __init__(self, n, m, n_tr, n_hvdc, bus_names, branch_names, transformer_names, hvdc_names,
-                 time_array, bus_types):
+                 time_array, bus_types, store: H5ResultsStore = None, keep=None):
         """
         TimeSeriesResults constructor
         :param n: number of buses
@@ -48,6 +88,10 @@ class TimeSeriesResults(PowerFlowResults):
         :param hvdc_names:
         :param time_array:
         :param bus_types:
+        :param store: H5ResultsStore where the big arrays are written (or read from if the store is read-only),
+                      None to keep them in memory
+        :param keep: list of the arrays of TIME_SERIES_STORED_ARRAYS to keep (None to keep all of them),
+                     the ones not kept are None and only their statistics are computed
         """
         PowerFlowResults.__init__(self,
                                   n=n,
@@ -67,21 +111,25 @@ class TimeSeriesResults(PowerFlowResults):
 
         self.time = time_array
 
+        self.store = store
+
+        self.keep = list(TIME_SERIES_STORED_ARRAYS) if keep is None else list(keep)
+
         self.bus_types = np.zeros(n, dtype=int)
 
-        self.voltage = np.zeros((self.nt, n), dtype=complex)
+        self.voltage = self.allocate('voltage', (self.nt, n), complex)
 
-        self.S = np.zeros((self.nt, n), dtype=complex)
+        self.S = self.allocate('S', (self.nt, n), complex)
 
-        self.Sbranch = np.zeros((self.nt, m), dtype=complex)
+        self.Sbranch = self.allocate('Sbranch', (self.nt, m), complex)
 
-        self.Ibranch = np.zeros((self.nt, m), dtype=complex)
+        self.Ibranch = self.allocate('Ibranch', (self.nt, m), complex)
 
-        self.Vbranch = np.zeros((self.nt, m), dtype=complex)
+        self.Vbranch = self.allocate('Vbranch', (self.nt, m), complex)
 
-        self.loading = np.zeros((self.nt, m), dtype=complex)
+        self.loading = self.allocate('loading', (self.nt, m), complex)
 
-        self.losses = np.zeros((self.nt, m), dtype=complex)
+        self.losses = self.allocate('losses', (self.nt, m), complex)
 
         self.hvdc_losses = np.zeros((self.nt, self.n_hvdc))
 
@@ -89,12 +137,14 @@ class TimeSeriesResults(PowerFlowResults):
 
         self.hvdc_loading = np.zeros((self.nt, self.n_hvdc))
 
-        self.flow_direction = np.zeros((self.nt, m), dtype=float)
+        self.flow_direction = self.allocate('flow_direction', (self.nt, m), float)
 
         self.error = np.zeros(self.nt)
 
         self.converged = np.ones(self.nt, dtype=bool)  # guilty assumption
 
+        self.iterations = np.zeros(self.nt, dtype=int)
+
         self.overloads = [None] * self.nt
 
         self.overvoltage = [None] * self.nt
@@ -109,6 +159,17 @@ class TimeSeriesResults(PowerFlowResults):
 
         self.buses_useful_for_storage = [None] * self.nt
 
+        # statistics along the time steps
+        self.voltage_max = np.zeros(n)
+
+        self.voltage_min = np.full(n, np.inf)
+
+        self.Sbranch_max = np.zeros(m)
+
+        self.loading_max = np.zeros(m)
+
+        self.overload_count = np.zeros(m, dtype=int)
+
         # results available
         self.available_results = [ResultTypes.BusVoltageModule,
                                   ResultTypes.BusVoltageAngle,
@@ -125,32 +186,79 @@ class TimeSeriesResults(PowerFlowResults):
                                   ResultTypes.BranchAngles,
                                   ResultTypes.SimulationError]
 
-    def set_at(self, t, results: PowerFlowResults):
+        self.available_results = [tpe for tpe in self.available_results
+                                  if TIME_SERIES_RESULT_ARRAYS.get(tpe, None) in self.keep + [None]]
+
+        self.available_results += [ResultTypes.BusVoltageMax,
+                                   ResultTypes.BusVoltageMin,
+                                   ResultTypes.BranchLoadingMax,
+                                   ResultTypes.BranchOverloadCount]
+
+    def get_array_specs(self):
         """
-        Set the results at the step t
-        @param t: time index
-        @param results: PowerFlowResults instance
+        Get the shape and data type of the arrays of TIME_SERIES_STORED_ARRAYS
+        :return: dictionary name -> (shape, dtype)
         """
+        specs = {name: ((self.nt, self.m), complex) for name in TIME_SERIES_STORED_ARRAYS}
+        specs['voltage'] = ((self.nt, self.n), complex)
+        specs['S'] = ((self.nt, self.n), complex)
+        specs['flow_direction'] = ((self.nt, self.m), float)
+        return specs
 
-        self.voltage[t, :] = results.voltage
+    def allocate(self, name, shape, dtype):
+        """
+        Allocate a results array, in memory or in the results store
+        :param name: name of the array
+        :param shape: shape of the array
+        :param dtype: data type
+        :return: numpy array, H5Array or None if the array is not kept
+        """
+        if name not in self.keep:
+            return None
 
-        self.S[t, :] = results.Sbus
+        elif self.store is None:
+            return np.zeros(shape, dtype=dtype)
 
-        self.Sbranch[t, :] = results.Sbranch
+        elif self.store.h5.mode == 'r':
+            return self.store.get(name)
 
-        self.Ibranch[t, :] = results.Ibranch
+        else:
+            return self.store.create(name, shape, dtype)
 
-        self.Vbranch[t, :] = results.Vbranch
+    def set_at(self, t, results: PowerFlowResults, b_idx=None, br_idx=None):
+        """
+        Set the results at the step t
+        @param t: time index
+        @param results: PowerFlowResults instance
+        @param b_idx: original bus indices of the results (None if the results are of the whole grid)
+        @param br_idx: original branch indices of the results (None if the results are of the whole grid)
+        """
+        if b_idx is None:
+            b_idx = slice(None)
+
+        if br_idx is None:
+            br_idx = slice(None)
 
-        self.loading[t, :] = results.loading
+        values = {'voltage': results.voltage,
+                  'S': results.Sbus,
+                  'Sbranch': results.Sbranch,
+                  'Ibranch': results.Ibranch,
+                  'Vbranch': results.Vbranch,
+                  'loading': results.loading,
+                  'losses': results.losses,
+                  'flow_direction': results.flow_direction}
 
-        self.losses[t, :] = results.losses
+        for name in self.keep:
+            getattr(self, name)[t, b_idx if name in ['voltage', 'S'] else br_idx] = values[name]
 
-        self.flow_direction[t, :] = results.flow_direction
+        self.update_aggregates(results.voltage, results.Sbranch, results.loading, b_idx, br_idx)
 
-        self.error[t] = results.error()
+        # the islands share the step
+        self.error[t] = max(self.error[t], results.error())
 
-        self.converged[t] = results.converged()
+        self.converged[t] = self.converged[t] and results.converged()
+
+        self.iterations[t] = max(self.iterations[t], results.iterations())
 
         # self.overloads[t] = results.overloads
         #
@@ -166,6 +274,33 @@ class TimeSeriesResults(PowerFlowResults):
         #
         # self.buses_useful_for_storage[t] = results.buses_useful_for_storage
 
+    def update_aggregates(self, V, Sbranch, loading, b_idx=None, br_idx=None):
+        """
+        Update the statistics with the results of one or many time steps
+        :param V: bus voltages (n) or (nt, n)
+        :param Sbranch: branch powers (m) or (nt, m)
+        :param loading: branch loadings (m) or (nt, m)
+        :param b_idx: original bus indices of the results (None if the results are of the whole grid)
+        :param br_idx: original branch indices of the results (None if the results are of the whole grid)
+        """
+        if b_idx is None:
+            b_idx = slice(None)
+
+        if br_idx is None:
+            br_idx = slice(None)
+
+        vm = np.atleast_2d(np.abs(V))
+        if vm.shape[0] > 0 and vm.shape[1] > 0:
+            self.voltage_max[b_idx] = np.maximum(self.voltage_max[b_idx], vm.max(axis=0))
+            self.voltage_min[b_idx] = np.minimum(self.voltage_min[b_idx], vm.min(axis=0))
+
+        lm = np.atleast_2d(np.abs(loading))
+        if lm.shape[0] > 0 and lm.shape[1] > 0:
+            sm = np.atleast_2d(np.abs(Sbranch))
+            self.Sbranch_max[br_idx] = np.maximum(self.Sbranch_max[br_idx], sm.max(axis=0))
+            self.loading_max[br_idx] = np.maximum(self.loading_max[br_idx], lm.max(axis=0))
+            self.overload_count[br_idx] += (lm > 1.0).sum(axis=0)
+
     @staticmethod
     def merge_if(df, arr, ind, cols):
         """
@@ -195,76 +330,100 @@ class TimeSeriesResults(PowerFlowResults):
         :return:
         """
 
-        # bus results
-        if self.voltage.shape == results.voltage.shape:
-            self.voltage = results.voltage
-            self.S = results.S
-        else:
-            self.voltage[np.ix_(t_index, b_idx)] = results.voltage
-            self.S[np.ix_(t_index, b_idx)] = results.S
-
-        # branch results
-        if self.Sbranch.shape == results.Sbranch.shape:
-            self.Sbranch = results.Sbranch
+        ix_bus = np.ix_(t_index, b_idx)
+        ix_br = np.ix_(t_index, br_idx)
 
-            self.Ibranch = results.Ibranch
+        whole_grid = (self.nt, self.n, self.m) == (results.nt, results.n, results.m)
 
-            self.Vbranch = results.Vbranch
-
-            self.loading = results.loading
+        for name in self.keep:
+            value = getattr(results, name)
+            if whole_grid and self.store is None:
+                # the island is the whole grid: take its arrays
+                setattr(self, name, value)
+            else:
+                getattr(self, name)[ix_bus if name in ['voltage', 'S'] else ix_br] = value
 
-            self.losses = results.losses
+        self.update_aggregates(results.voltage, results.Sbranch, results.loading, b_idx, br_idx)
 
-            self.flow_direction = results.flow_direction
+        if whole_grid:
 
             if (results.error > self.error).any():
                 self.error += results.error
 
             self.converged = self.converged * results.converged
 
-        else:
-            self.Sbranch[np.ix_(t_index, br_idx)] = results.Sbranch
-
-            self.Ibranch[np.ix_(t_index, br_idx)] = results.Ibranch
-
-            self.Vbranch[np.ix_(t_index, br_idx)] = results.Vbranch
-
-            self.loading[np.ix_(t_index, br_idx)] = results.loading
+            self.iterations = np.maximum(self.iterations, results.iterations)
 
-            self.losses[np.ix_(t_index, br_idx)] = results.losses
-
-            self.flow_direction[np.ix_(t_index, br_idx)] = results.flow_direction
+        else:
 
             if (results.error > self.error[t_index]).any():
                 self.error[t_index] += results.error
 
             self.converged[t_index] = self.converged[t_index] * results.converged
 
+            self.iterations[t_index] = np.maximum(self.iterations[t_index], results.iterations)
+
     def get_results_dict(self):
         """
         Returns a dictionary with the results sorted in a dictionary
+        The arrays that are not kept are not included, and the stored ones are read by blocks
         :return: dictionary of 2D numpy arrays (probably of complex numbers)
         """
-        data = {'Vm': np.abs(self.voltage).tolist(),
-                'Va': np.angle(self.voltage).tolist(),
-                'P': self.S.real.tolist(),
-                'Q': self.S.imag.tolist(),
-                'Sbr_real': self.Sbranch.real.tolist(),
-                'Sbr_imag': self.Sbranch.imag.tolist(),
-                'Ibr_real': self.Ibranch.real.tolist(),
-                'Ibr_imag': self.Ibranch.imag.tolist(),
-                'loading': np.abs(self.loading).tolist(),
-                'losses': np.abs(self.losses).tolist()}
+        entries = {'Vm': ('voltage', np.abs),
+                   'Va': ('voltage', np.angle),
+                   'P': ('S', np.real),
+                   'Q': ('S', np.imag),
+                   'Sbr_real': ('Sbranch', np.real),
+                   'Sbr_imag': ('Sbranch', np.imag),
+                   'Ibr_real': ('Ibranch', np.real),
+                   'Ibr_imag': ('Ibranch', np.imag),
+                   'loading': ('loading', np.abs),
+                   'losses': ('losses', np.abs)}
+
+        data = dict()
+        for key, (name, func) in entries.items():
+            array = getattr(self, name)
+            if array is not None:
+                data[key] = np.asarray(apply_lazily(array, func)[:]).tolist()
         return data
 
+    def write_to_store(self, store: H5ResultsStore):
+        """
+        Write the results into a results store, by blocks of time steps
+        :param store: H5ResultsStore
+        """
+        for name in self.keep + TIME_SERIES_AGGREGATES + ['error', 'converged', 'iterations', 'bus_types']:
+            array = getattr(self, name)
+
+            if isinstance(array, H5Array):
+                # the arrays that are already in the store are not copied
+                if array.dataset.file != store.h5:
+                    store.write_array(name, array)
+            else:
+                store.write_array(name, np.asarray(array))
+
+        for name in TIME_SERIES_NAMES:
+            store.write_names(name, getattr(self, name))
+
+        store.write_time('time', self.time)
+        store.flush()
+
     def save(self, fname):
         """
-        Export as json
+        Export in binary form (HDF5)
         """
+        if self.store is not None and os.path.abspath(self.store.file_name) == os.path.abspath(fname):
+            self.write_to_store(self.store)
+        else:
+            with H5ResultsStore(fname, mode='w') as store:
+                self.write_to_store(store)
 
-        with open(fname, "wb") as output_file:
-            json_str = json.dumps(self.get_results_dict())
-            output_file.write(json_str)
+    def close(self):
+        """
+        Close the results file, if any (the arrays stored in it are no longer readable)
+        """
+        if self.store is not None:
+            self.store.close()
 
     def analyze(self):
         """
@@ -292,16 +451,20 @@ class TimeSeriesResults(PowerFlowResults):
         :param names:
         :return:
         """
+        array_name = TIME_SERIES_RESULT_ARRAYS.get(result_type, None)
+        if array_name is not None and getattr(self, array_name) is None:
+            # the array was not kept
+            return None
 
         if result_type == ResultTypes.BusVoltageModule:
             labels = self.bus_names
-            data = np.abs(self.voltage)
+            data = apply_lazily(self.voltage, np.abs)
             y_label = '(p.u.)'
             title = 'Bus voltage '
 
         elif result_type == ResultTypes.BusVoltageAngle:
             labels = self.bus_names
-            data = np.angle(self.voltage, deg=True)
+            data = apply_lazily(self.voltage, lambda x: np.angle(x, deg=True))
             y_label = '(Deg)'
             title = 'Bus voltage '
 
@@ -355,7 +518,7 @@ class TimeSeriesResults(PowerFlowResults):
 
         elif result_type == ResultTypes.BranchLoading:
             labels = self.branch_names
-            data = np.abs(self.loading) * 100
+            data = apply_lazily(self.loading, lambda x: np.abs(x) * 100)
             y_label = '(%)'
             title = 'Branch loading '
 
@@ -379,19 +542,19 @@ class TimeSeriesResults(PowerFlowResults):
 
         elif result_type == ResultTypes.BranchVoltage:
             labels = self.branch_names
-            data = np.abs(self.Vbranch)
+            data = apply_lazily(self.Vbranch, np.abs)
             y_label = '(p.u.)'
             title = result_type.value[0]
 
         elif result_type == ResultTypes.BranchAngles:
             labels = self.branch_names
-            data = np.angle(self.Vbranch, deg=True)
+            data = apply_lazily(self.Vbranch, lambda x: np.angle(x, deg=True))
             y_label = '(deg)'
             title = result_type.value[0]
 
         elif result_type == ResultTypes.BatteryPower:
             labels = self.branch_names
-            data = np.zeros_like(self.losses)
+            data = np.zeros(self.losses.shape, dtype=complex)
             y_label = '$\Delta$ (MVA)'
             title = 'Battery power'
 
@@ -401,6 +564,22 @@ class TimeSeriesResults(PowerFlowResults):
             labels = ['Error']
             title = 'Error'
 
+        elif result_type in [ResultTypes.BusVoltageMax, ResultTypes.BusVoltageMin,
+                             ResultTypes.BranchLoadingMax, ResultTypes.BranchOverloadCount]:
+            # statistics: one value per element
+            if result_type == ResultTypes.BusVoltageMax:
+                index, data, y_label = self.bus_names, self.voltage_max, '(p.u.)'
+            elif result_type == ResultTypes.BusVoltageMin:
+                index, data, y_label = self.bus_names, self.voltage_min, '(p.u.)'
+            elif result_type == ResultTypes.BranchLoadingMax:
+                index, data, y_label = self.branch_names, self.loading_max * 100, '(%)'
+            else:
+                index, data, y_label = self.branch_names, self.overload_count, '(steps)'
+            title = result_type.value[0]
+
+            return ResultsModel(data=data.reshape(-1, 1), index=index, columns=[title], title=title,
+                                ylabel=y_label, units=y_label)
+
         else:
             raise Exception('Result type not understood:' + str(result_type))
 
@@ -414,6 +593,35 @@ class TimeSeriesResults(PowerFlowResults):
         return mdl
 
 
+def open_time_series_results(file_name) -> TimeSeriesResults:
+    """
+    Open time series results saved in binary form.
+    The big arrays are not loaded, they are read by slices when needed.
+    :param file_name: name of the file
+    :return: TimeSeriesResults
+    """
+    store = H5ResultsStore(file_name, mode='r')
+
+    names = {name: store.read_names(name) for name in TIME_SERIES_NAMES}
+
+    keep = [name for name in TIME_SERIES_STORED_ARRAYS if name in store]
+
+    results = TimeSeriesResults(n=len(names['bus_names']),
+                                m=len(names['branch_names']),
+                                n_tr=len(names['transformer_names']),
+                                n_hvdc=len(names['hvdc_names']),
+                                time_array=store.read_time('time'),
+                                bus_types=np.array(store.get('bus_types')),
+                                store=store,
+                                keep=keep,
+                                **names)
+
+    for name in TIME_SERIES_AGGREGATES + ['error', 'converged', 'iterations', 'bus_types']:
+        setattr(results, name, np.array(store.get(name)))
+
+    return results
+
+
 def kmeans_case_sampling(X, n_points=10):
     """
     K-Means clustering
@@ -457,89 +665,6 @@ def kmeans_case_sampling(X, n_points=10):
     return closest_idx, closest_prob
 
 
-def time_series_worker(n, m, time_profile, namespace, options: PowerFlowOptions,
-                       time_indices, logger: Logger) -> (TimeSeriesResults, np.array):
-    """
-
-    :param n:
-    :param m:
-    :param time_profile:
-    :param buses:
-    :param numerical_circuit:
-    :param options:
-    :param time_indices:  array of time indices to consider
-    :param logger:
-    :return: TimeSeriesResults instance
-    """
-
-    # initialize the grid time series results we will append the island results with another function
-    time_series_results = TimeSeriesResults(n, m, time_array=time_profile[time_indices])
-
-    calc_inputs_dict = namespace.calc_inputs_dict
-    time_series_results.bus_types = namespace.bus_types
-
-    # for each partition of the profiles...
-    for t_key, calc_inputs in calc_inputs_dict.items():
-
-        # For every island, run the time series
-        for island_index, calculation_input in enumerate(calc_inputs):
-
-            # find the original indices
-            bus_original_idx = calculation_input.original_bus_idx
-            branch_original_idx = calculation_input.original_branch_idx
-
-            # if there are valid profiles...
-            if time_profile is not None:
-
-                # declare a results object for the partition
-                results = TimeSeriesResults(n=calculation_input.nbus,
-                                            m=calculation_input.nbr,
-                                            time_array=time_profile[time_indices])
-                last_voltage = calculation_input.Vbus
-
-                # default value in case of single-valued profile
-                dt = 1.0
-
-                # traverse the time profiles of the partition and simulate each time step
-                for it, t in enumerate(time_indices):
-
-                    # set the power values
-                    # if the storage dispatch option is active, the batteries power is not included
-                    # therefore, it shall be included after processing
-                    Ysh = calculation_input.Ysh_prof[:, it]
-                    I = calculation_input.Ibus_prof[:, it]
-                    S = calculation_input.Sbus_prof[:, it]
-                    branch_rates = calculation_input.branch_rates_prof[it, :]
-
-                    # add the controlled storage power if we are controlling the storage devices
-                    if options.dispatch_storage:
-
-                        if (it+1) < len(calculation_input.original_time_idx):
-                            # compute the time delta: the time values come in nanoseconds
-                            dt = (calculation_input.time_array[it + 1]
-                                  - calculation_input.time_array[it]).value * 1e-9 / 3600.0
-
-                    # run power flow at the circuit
-                    res = single_island_pf(circuit=calculation_input,
-                                           Vbus=last_voltage,
-                                           Sbus=S,
-                                           Ibus=I,
-                                           branch_rates=branch_rates,
-                                           options=options,
-                                           logger=logger)
-
-                    # store circuit results at the time index 'it'
-                    results.set_at(it, res)
-
-                # merge the circuit's results
-                time_series_results.apply_from_island(results,
-                                                      bus_original_idx,
-                                                      branch_original_idx,
-                                                      time_indices,
-                                                      'TS')
-    return time_series_results, time_indices
-
-
 class TimeSeries(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
@@ -547,11 +672,16 @@ class TimeSeries(QThread):
     name = 'Time Series'
 
     def __init__(self, grid: MultiCircuit, options: PowerFlowOptions, opf_time_series_results=None,
-                 start_=0, end_=None, use_clustering=False, cluster_number=10):
+                 start_=0, end_=None, use_clustering=False, cluster_number=10, results_file=None,
+                 keep_results=None):
         """
         TimeSeries constructor
         @param grid: MultiCircuit instance
         @param options: PowerFlowOptions instance
+        @param results_file: HDF5 file where the results are written as they are computed (None to keep them in memory)
+        @param keep_results: list of the results arrays to keep (see TIME_SERIES_STORED_ARRAYS), None to keep all;
+                             the per element statistics (max loading, overload count, voltage extremes) are always
+                             computed
         """
         QThread.__init__(self)
 
@@ -572,6 +702,12 @@ class TimeSeries(QThread):
 
         self.cluster_number = cluster_number
 
+        self.results_file = results_file
+
+        self.keep_results = keep_results
+
+        self.store = None
+
         self.elapsed = 0
 
         self.logger = Logger()
@@ -608,7 +744,7 @@ class TimeSeries(QThread):
         time_islands = split_time_circuit_into_islands(numeric_circuit=numerical_circuit,
                                                        ignore_single_node_islands=self.options.ignore_single_node_islands)
 
-        # initialize the grid time series results we will append the island results with another function
+        # initialize the grid time series results, the island results are written into it step by step
         time_series_results = TimeSeriesResults(n=numerical_circuit.nbus,
                                                 m=numerical_circuit.nbr,
                                                 n_tr=numerical_circuit.ntr,
@@ -618,7 +754,9 @@ class TimeSeries(QThread):
                                                 transformer_names=numerical_circuit.tr_names,
                                                 hvdc_names=numerical_circuit.hvdc_names,
                                                 bus_types=numerical_circuit.bus_types,
-                                                time_array=self.grid.time_profile[time_indices])
+                                                time_array=self.grid.time_profile[time_indices],
+                                                store=self.store,
+                                                keep=self.keep_results)
 
         time_series_results.bus_types = numerical_circuit.bus_types
 
@@ -642,20 +780,18 @@ class TimeSeries(QThread):
             bus_original_idx = calculation_input.original_bus_idx
             branch_original_idx = calculation_input.original_branch_idx
 
-            # declare a results object for the partition
-            results = TimeSeriesResults(n=calculation_input.nbus,
-                                        m=calculation_input.nbr,
-                                        n_tr=calculation_input.ntr,
-                                        n_hvdc=calculation_input.nhvdc,
-                                        bus_names=calculation_input.bus_names,
-                                        branch_names=calculation_input.branch_names,
-                                        transformer_names=calculation_input.tr_names,
-                                        hvdc_names=calculation_input.hvdc_names,
-                                        bus_types=numerical_circuit.bus_types,
-                                        time_array=self.grid.time_profile[time_indices])
-
             self.progress_signal.emit(0.0)
 
+            # the island topology does not change along its time steps:
+            # the Newton-Raphson Jacobian structure and factorization ordering are computed only once
+            nr_context = NRSolverContext(dishonest=self.options.dishonest_newton)
+
+            # and so is the factorization of the HELM system (used directly or as fallback)
+            helm_context = HelmSolverContext()
+
+            # last converged solutions to initialize the next time steps
+            previous_solutions = list()
+
             # default value in case of single-valued profile
             dt = 1.0
 
@@ -687,20 +823,33 @@ class TimeSeries(QThread):
 
                         S[bus_idx] += power / calculation_input.Sbase
 
+                # initial guess
+                V0 = time_series_initial_voltage(circuit=calculation_input,
+                                                 Vbus=V,
+                                                 Sbus=S,
+                                                 Ibus=I,
+                                                 previous_solutions=previous_solutions,
+                                                 initialization=self.options.ts_initialization)
+
                 # run power flow at the circuit
                 res = single_island_pf(circuit=calculation_input,
-                                       Vbus=V,
+                                       Vbus=V0,
                                        Sbus=S,
                                        Ibus=I,
                                        branch_rates=branch_rates,
                                        options=self.options,
-                                       logger=self.logger)
+                                       logger=self.logger,
+                                       nr_context=nr_context,
+                                       helm_context=helm_context)
 
                 # Recycle voltage solution
-                # last_voltage = res.voltage
+                if res.converged():
+                    previous_solutions = previous_solutions[-2:] + [res.voltage]
+                else:
+                    previous_solutions = list()
 
-                # store circuit results at the time index 'it'
-                results.set_at(it, res)
+                # store the island results at the time index 'it' of the grid results
+                time_series_results.set_at(it, res, bus_original_idx, branch_original_idx)
 
                 progress = ((t - self.start_ + 1) / (self.end_ - self.start_)) * 100
                 self.progress_signal.emit(progress)
@@ -708,21 +857,85 @@ class TimeSeries(QThread):
                                         + ' at ' + str(self.grid.time_profile[t]))
 
                 if self.__cancel__:
-                    # merge the circuit's results
-                    time_series_results.apply_from_island(results,
-                                                          bus_original_idx,
-                                                          branch_original_idx,
-                                                          time_indices,
-                                                          'TS')
                     # abort by returning at this point
                     return time_series_results
 
-            # merge the circuit's results
-            time_series_results.apply_from_island(results,
-                                                  bus_original_idx,
-                                                  branch_original_idx,
-                                                  time_indices,
-                                                  'TS')
+        return time_series_results
+
+    def run_batched(self, time_indices, batch_size=256) -> TimeSeriesResults:
+        """
+        Run the time series solving all the time steps of each island at once.
+        The results are written directly into the preallocated TimeSeriesResults arrays.
+        The time steps that do not converge with the batched Newton-Raphson are solved one by one.
+        :param time_indices: array of time indices to consider
+        :param batch_size: maximum number of time steps solved together
+        :return: TimeSeriesResults instance
+        """
+
+        # compile the multi-circuit
+        numerical_circuit = compile_time_circuit(circuit=self.grid,
+                                                 apply_temperature=False,
+                                                 branch_tolerance_mode=BranchImpedanceMode.Specified,
+                                                 opf_results=self.opf_time_series_results)
+
+        # do the topological computation
+        time_islands = split_time_circuit_into_islands(numeric_circuit=numerical_circuit,
+                                                       ignore_single_node_islands=self.options.ignore_single_node_islands)
+
+        # initialize the grid time series results
+        time_series_results = TimeSeriesResults(n=numerical_circuit.nbus,
+                                                m=numerical_circuit.nbr,
+                                                n_tr=numerical_circuit.ntr,
+                                                n_hvdc=numerical_circuit.nhvdc,
+                                                bus_names=numerical_circuit.bus_names,
+                                                branch_names=numerical_circuit.branch_names,
+                                                transformer_names=numerical_circuit.tr_names,
+                                                hvdc_names=numerical_circuit.hvdc_names,
+                                                bus_types=numerical_circuit.bus_types,
+                                                time_array=self.grid.time_profile[time_indices],
+                                                store=self.store,
+                                                keep=self.keep_results)
+
+        time_series_results.bus_types = numerical_circuit.bus_types
+
+        for island_index, calculation_input in enumerate(time_islands):
+
+            self.progress_text.emit('Batched time series at circuit ' + str(island_index) + '...')
+
+            if len(calculation_input.vd) == 0:
+                self.logger.append('There are no slack nodes in the island ' + str(island_index))
+                continue
+
+            # time steps of the island that have been requested, and their results rows
+            local_idx, rows = get_time_island_steps(calculation_input, time_indices)
+
+            nr_context = NRSolverContext()
+
+            for a in range(0, len(local_idx), batch_size):
+                t_loc = local_idx[a:a + batch_size]
+
+                values = batched_island_pf(circuit=calculation_input,
+                                           t_loc=t_loc,
+                                           options=self.options,
+                                           logger=self.logger,
+                                           nr_context=nr_context)
+
+                write_time_series_block(time_series_results,
+                                        rows[a:a + batch_size],
+                                        calculation_input.original_bus_idx,
+                                        calculation_input.original_branch_idx,
+                                        *values)
+
+                # V, Sbranch and loading of the block
+                time_series_results.update_aggregates(values[0], values[2], values[5],
+                                                      calculation_input.original_bus_idx,
+                                                      calculation_input.original_branch_idx)
+
+                progress = (a + len(t_loc)) / len(local_idx) * 100
+                self.progress_signal.emit(progress)
+
+                if self.__cancel__:
+                    return time_series_results
 
         return time_series_results
 
@@ -744,160 +957,149 @@ class TimeSeries(QThread):
 
         return time_series_results
 
-    def update_prog(self):
-        self._mt_i += 1
-        progress = (self._mt_i + 1) / self._mt_n * 100
-        self.progress_signal.emit(progress)
-
     def collect_mt_result(self, res):
         """
-
-        :param res:
-        :return:
+        Collect the result of a parallel job
+        :param res: Logger, number of time steps simulated
         """
         self.returned_results.append(res)
+        self._mt_i += res[1]
+        self.progress_signal.emit(self._mt_i / self._mt_n * 100)
 
-    def run_multi_thread_old(self, time_indices) -> TimeSeriesResults:
+    def run_multi_thread(self, time_indices, chunks_per_core=4, max_chunk_size=256) -> TimeSeriesResults:
         """
-        Run multi thread time series
+        Run the time series in parallel with a pool of processes.
+        The time circuit is compiled once and its arrays are memory-mapped, so the processes only receive
+        descriptors of the island arrays and a chunk of time steps, and write their results in place.
         :param time_indices: array of time indices to consider
+        :param chunks_per_core: number of time chunks per core and island (to balance the load)
+        :param max_chunk_size: maximum number of time steps per chunk
         :return: TimeSeriesResults instance
         """
 
-        # initialize the grid time series results, we will append the island results with another function
-        n = len(self.grid.buses)
-        m = self.grid.get_branch_number()
-        time_series_results = TimeSeriesResults(n, m, time_array=self.grid.time_profile[time_indices])
-
-        n_cores = multiprocessing.cpu_count()
-        self.pool = multiprocessing.Pool()
-
         # compile the multi-circuit
-        numerical_circuit = self.grid.compile_time_series(opf_time_series_results=self.opf_time_series_results)
-
-        # perform the topological computation
-        calc_inputs_dict = numerical_circuit.compute(branch_tolerance_mode=self.options.branch_impedance_tolerance_mode,
-                                                     ignore_single_node_islands=self.options.ignore_single_node_islands)
-
-        # for each partition of the profiles...
-        for t_key, calc_inputs in calc_inputs_dict.items():
-
-            # For every island, run the time series
-            for island_index, calculation_input in enumerate(calc_inputs):
-
-                self.progress_text.emit('Time series at circuit ' + str(island_index) + '...')
-
-                # Start jobs
-                self.returned_results = list()
-
-                # if there are valid profiles...
-                if self.grid.time_profile is not None:
-
-                    # declare a results object for the partition
-                    results = TimeSeriesResults(n=calculation_input.nbus,
-                                                m=calculation_input.nbr,
-                                                time_array=self.grid.time_profile[time_indices])
-                    Vbus = calculation_input.Vbus
-
-                    self.progress_signal.emit(0.0)
-
-                    # traverse the time profiles of the partition and simulate each time step
-                    for it, t in enumerate(time_indices):
-
-                        # set the power values
-                        # if the storage dispatch option is active, the batteries power is not included
-                        # therefore, it shall be included after processing
-                        Ysh = calculation_input.Ysh_prof[:, it]
-                        Ibus = calculation_input.Ibus_prof[:, it]
-                        Sbus = calculation_input.Sbus_prof[:, it]
-                        branch_rates = calculation_input.branch_rates_prof[t, :]
-
-                        args = (it, self.options, calculation_input, Vbus, Sbus, Ibus, branch_rates)
-                        self.pool.apply_async(power_flow_worker_args, (args,), callback=self.collect_mt_result)
+        self.progress_text.emit('Compiling time series...')
+        numerical_circuit = compile_time_circuit(circuit=self.grid,
+                                                 apply_temperature=False,
+                                                 branch_tolerance_mode=BranchImpedanceMode.Specified,
+                                                 opf_results=self.opf_time_series_results)
 
-                    # wait for all jobs to complete
-                    self.pool.close()
-                    self.pool.join()
+        # do the topological computation
+        time_islands = split_time_circuit_into_islands(numeric_circuit=numerical_circuit,
+                                                       ignore_single_node_islands=self.options.ignore_single_node_islands)
 
-                    # collect results
-                    self.progress_text.emit('Collecting results...')
-                    for it, res in self.returned_results:
-                        # store circuit results at the time index 't'
-                        results.set_at(it, res)
+        # initialize the grid time series results
+        time_series_results = TimeSeriesResults(n=numerical_circuit.nbus,
+                                                m=numerical_circuit.nbr,
+                                                n_tr=numerical_circuit.ntr,
+                                                n_hvdc=numerical_circuit.nhvdc,
+                                                bus_names=numerical_circuit.bus_names,
+                                                branch_names=numerical_circuit.branch_names,
+                                                transformer_names=numerical_circuit.tr_names,
+                                                hvdc_names=numerical_circuit.hvdc_names,
+                                                bus_types=numerical_circuit.bus_types,
+                                                time_array=self.grid.time_profile[time_indices],
+                                                store=self.store,
+                                                keep=self.keep_results)
 
-                    # merge  the circuit's results
-                    time_series_results.apply_from_island(results,
-                                                          calculation_input.original_bus_idx,
-                                                          calculation_input.original_branch_idx,
-                                                          time_indices,
-                                                          'TS multi-thread')
+        time_series_results.bus_types = numerical_circuit.bus_types
 
+        n_islands = len(time_islands)
+        store = SharedArrayStore()
+
+        try:
+            # publish the results arrays (the workers write all of them, even the ones that are not kept)
+            results_arrays = dict()
+            results_descriptors = dict()
+            specs = time_series_results.get_array_specs()
+            for name in TIME_SERIES_RESULTS_ARRAYS:
+                value = getattr(time_series_results, name)
+                if name in TIME_SERIES_ISLAND_ARRAYS:
+                    value = np.tile(value, (n_islands, 1))
+                elif value is None or isinstance(value, H5Array):
+                    value = np.zeros(*specs[name])
+                results_arrays[name], results_descriptors[name] = store.create(value.shape, value.dtype)
+                results_arrays[name][...] = value
+
+            # publish the islands and split their time steps into chunks
+            n_cores = multiprocessing.cpu_count()
+            jobs = list()
+            for island_index, calculation_input in enumerate(time_islands):
+
+                if len(calculation_input.vd) == 0:
+                    self.logger.append('There are no slack nodes in the island ' + str(island_index))
+                    continue
+
+                local_idx, rows = get_time_island_steps(calculation_input, time_indices)
+                if len(local_idx) == 0:
+                    continue
+
+                # the steps of the island are not converged until a worker says so
+                results_arrays['converged'][island_index, rows] = False
+
+                skeleton, descriptors = publish_object(calculation_input, store)
+
+                chunk_size = min(max_chunk_size, int(np.ceil(len(local_idx) / (n_cores * chunks_per_core))))
+                for a in range(0, len(local_idx), chunk_size):
+                    jobs.append((island_index, skeleton, descriptors, results_descriptors,
+                                 local_idx[a:a + chunk_size], rows[a:a + chunk_size], self.options))
+
+            # run the jobs
+            self.progress_signal.emit(0.0)
+            self.progress_text.emit('Running in parallel...')
+            self.returned_results = list()
+            self._mt_i = 0
+            self._mt_n = max(1, sum([len(job[4]) for job in jobs]))
+
+            self.pool = multiprocessing.Pool()
+            async_results = [self.pool.apply_async(func=time_series_island_worker, args=args,
+                                                   callback=self.collect_mt_result) for args in jobs]
+
+            # wait for all jobs to complete
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+            # the steps of the jobs that failed (or were cancelled) stay as not converged
+            for args, async_result in zip(jobs, async_results):
+                if not async_result.ready():
+                    continue
+                try:
+                    async_result.get()
+                except Exception as e:
+                    self.logger.add('Time series job of the island ' + str(args[0]) + ' failed: ' + str(e))
+
+            # collect results
+            self.progress_text.emit('Collecting results...')
+            for logger, n_steps in self.returned_results:
+                self.logger += logger
+
+            for name in TIME_SERIES_RESULTS_ARRAYS:
+                if name in ['error', 'iterations']:
+                    value = results_arrays[name].max(axis=0)
+                elif name == 'converged':
+                    value = results_arrays[name].all(axis=0)
                 else:
-                    print('There are no profiles')
-                    self.progress_text.emit('There are no profiles')
-
-        return time_series_results
-
-    def run_multi_thread(self, time_indices) -> TimeSeriesResults:
-
-        # initialize the grid time series results, we will append the island results with another function
-        n = len(self.grid.buses)
-        m = self.grid.get_branch_number()
-        nt = len(time_indices)
-        time_series_results = TimeSeriesResults(n, m, time_array=self.grid.time_profile[time_indices])
+                    value = results_arrays[name]
 
-        # compile the multi-circuit
-        self.progress_text.emit('Compiling time series...')
-        numerical_circuit = self.grid.compile_time_series(opf_time_series_results=self.opf_time_series_results)
+                if name in TIME_SERIES_STORED_ARRAYS and name not in time_series_results.keep:
+                    continue
+                elif isinstance(getattr(time_series_results, name), H5Array):
+                    getattr(time_series_results, name)[...] = value
+                else:
+                    setattr(time_series_results, name, np.array(value))
 
-        # compute the time indices per process
-        n_cores = multiprocessing.cpu_count()
-        nchunk = int(nt / n_cores)
-        time_chunks = list()
-        k = 0
-        while k < (nt - nchunk * 2):
-            k2 = k+nchunk
-            if k2 > nt:
-                k2 = nt
-            time_chunk = time_indices[k:k2]
-            k += nchunk
-            time_chunks.append(time_chunk)
-        time_chunks.append(time_indices[k::])  # add the last chunk
-
-        # schedule jobs
-        self.progress_signal.emit(0.0)
-        self.progress_text.emit('Running in parallel...')
-        self.pool = multiprocessing.Pool()
-        manager = multiprocessing.Manager()
-        namespace = manager.Namespace()
+            # statistics, by blocks of time steps
+            for a in range(0, time_series_results.nt, max_chunk_size):
+                time_series_results.update_aggregates(results_arrays['voltage'][a:a + max_chunk_size],
+                                                      results_arrays['Sbranch'][a:a + max_chunk_size],
+                                                      results_arrays['loading'][a:a + max_chunk_size])
 
-        stuff = list()
+            del results_arrays
 
-        calc_inputs_dict = numerical_circuit.compute(branch_tolerance_mode=self.options.branch_impedance_tolerance_mode,
-                                                     ignore_single_node_islands=self.options.ignore_single_node_islands)
+        finally:
+            store.cleanup()
 
-        namespace.calc_inputs_dict = calc_inputs_dict
-        namespace.bus_types = numerical_circuit.bus_types
-
-        for time_chunk in time_chunks:
-            # n, m, time_profile, buses, numerical_circuit, options, time_indices, logger
-            args = (n, m, self.grid.time_profile, namespace, self.options, time_chunk, self.logger)
-            p = self.pool.apply_async(func=time_series_worker, args=args, callback=self.collect_mt_result)
-            stuff.append(p)
-
-        # wait for all jobs to complete
-        self.pool.close()
-        self.pool.join()
-
-        # collect results
-        self.progress_text.emit('Collecting results...')
-        for result, time_chunk in self.returned_results:
-            # merge  the circuit's results
-            time_series_results.apply_from_island(result,
-                                                  np.arange(n),
-                                                  np.arange(m),
-                                                  time_chunk,
-                                                  'TS multi-thread')
         self.progress_signal.emit(100.0)
         return time_series_results
 
@@ -913,14 +1115,37 @@ class TimeSeries(QThread):
             self.end_ = len(self.grid.time_profile)
         time_indices = np.arange(self.start_, self.end_)
 
-        if self.options.multi_thread:
+        if self.store is not None:
+            # the results of a previous run hold the file open
+            self.store.close()
+            self.store = None
+
+        if self.results_file is not None:
+            self.store = H5ResultsStore(self.results_file, mode='w')
+
+        if self.options.multi_thread and self.options.dispatch_storage:
+            self.logger.append('The storage dispatch is sequential in time: the time series runs in a single thread')
+
+        if (self.options.batched_time_series and can_run_batched(self.options)
+                and self.options.ts_initialization not in [TimeSeriesInitialization.Profile,
+                                                           TimeSeriesInitialization.LinearPredictor]):
+            self.logger.append('The batched time series solves the time steps together: the initialization "'
+                               + self.options.ts_initialization.value + '" is not supported, the profile voltage '
+                               + 'is used instead')
+
+        if self.options.multi_thread and not self.options.dispatch_storage:
             self.results = self.run_multi_thread(time_indices)
         else:
             if self.use_clustering:
                 self.results = self.run_single_thread_clustering(time_indices)
+            elif self.options.batched_time_series and can_run_batched(self.options):
+                self.results = self.run_batched(time_indices)
             else:
                 self.results = self.run_single_thread(time_indices)
 
+        if self.store is not None:
+            self.results.write_to_store(self.store)
+
         self.elapsed = time.time() - a
 
         # send the finnish signal
@@ -997,7 +1222,7 @@ class SampledTimeSeries(QThread):
         :return: TimeSeriesResults instance
         """
 
-        # initialize the grid time series results we will append the island results with another function
+        # initialize the grid time series results, the island results are written into it step by step
         n = len(self.grid.buses)
         m = self.grid.get_branch_number()
         nt = self.number_of_steps
@@ -1,3 +1,6 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
 from numpy import zeros, diag
 
 
@@ -37,4 +40,123 @@ def short_circuit_3p(bus_idx, Zbus, Vbus, Zf, baseMVA):
     # SCC[bus_idx] = abs(Vbus[bus_idx]) * baseMVA / abs(Z[bus_idx])
     SCC = -I_k * Vbus * baseMVA
 
-    return V, SCC
\ No newline at end of file
+    return V, SCC
+
+
+class SparseZbus:
+
+    def __init__(self, Ybus):
+        """
+        Sparse LU factorization of the admittance matrix to get the columns of Zbus on demand,
+        so that the dense Zbus = Ybus^-1 (n x n) is never formed
+        :param Ybus: admittance matrix
+        """
+        self.n = Ybus.shape[0]
+
+        self.lu = splu(sp.csc_matrix(Ybus, dtype=complex), permc_spec='COLAMD')
+
+    def columns(self, idx):
+        """
+        Compute some columns of Zbus solving Ybus x Z = I[:, idx]
+        :param idx: indices of the columns (buses)
+        :return: Zbus[:, idx] (n, len(idx))
+        """
+        idx = np.array(idx, dtype=int)
+        E = np.zeros((self.n, len(idx)), dtype=complex)
+        E[idx, np.arange(len(idx))] = 1.0
+        return self.lu.solve(E)
+
+    def iter_columns(self, idx=None, block_size=500):
+        """
+        Generate the columns of Zbus by blocks, reusing the factorization
+        :param idx: indices of the columns (buses), all of them if None
+        :param block_size: number of columns per block
+        :return: generator of (indices of the block, Zbus[:, indices of the block])
+        """
+        if idx is None:
+            idx = np.arange(self.n)
+        else:
+            idx = np.array(idx, dtype=int)
+
+        for a in range(0, len(idx), block_size):
+            block = idx[a:a + block_size]
+            yield block, self.columns(block)
+
+
+def short_circuit_3p_sparse(bus_idx, zbus: SparseZbus, Vbus, Zf, baseMVA):
+    """
+    Executes a 3-phase balanced short circuit study (same as short_circuit_3p) using only the Zbus columns
+    of the faulted buses
+    :param bus_idx: Indices of the buses at which the short circuit is being studied
+    :param zbus: SparseZbus instance
+    :param Vbus: Voltages of the buses in the steady state
+    :param Zf: Fault impedance array
+    :param baseMVA: base power
+    :return: Voltages after the short circuit (p.u.), Short circuit power in MVA
+    """
+    bus_idx = np.array(bus_idx, dtype=int)
+    n = len(Vbus)
+
+    Zcols = zbus.columns(bus_idx)
+    Z = Zcols[bus_idx, np.arange(len(bus_idx))]
+
+    # Voltage Source Contribution
+    I_k = zeros(n, dtype=complex)
+    I_k[bus_idx] = -1 * Vbus[bus_idx] / (Z + Zf[bus_idx])
+
+    # voltage increment due to these currents
+    incV = Zcols.dot(I_k[bus_idx]) / len(bus_idx)
+
+    V = Vbus + incV
+
+    # Short circuit power in MVA
+    SCC = -I_k * Vbus * baseMVA
+
+    return V, SCC
+
+
+def iter_bus_faults(zbus: SparseZbus, Vbus, Zf, baseMVA, bus_idx=None, block_size=500):
+    """
+    Sweep independent 3-phase faults at every bus reusing the factorization of Ybus.
+    The results are generated bus by bus, so that they can be streamed without storing them
+    :param zbus: SparseZbus instance
+    :param Vbus: Voltages of the buses in the steady state
+    :param Zf: Fault impedance array
+    :param baseMVA: base power
+    :param bus_idx: indices of the faulted buses, all of them if None
+    :param block_size: number of Zbus columns computed at once
+    :return: generator of (faulted bus index, voltages after the short circuit, short circuit power in MVA)
+    """
+    for block, Zcols in zbus.iter_columns(idx=bus_idx, block_size=block_size):
+
+        # fault current of each bus of the block
+        Zkk = Zcols[block, np.arange(len(block))]
+        Ik = - Vbus[block] / (Zkk + Zf[block])
+
+        for j, k in enumerate(block):
+            V = Vbus + Zcols[:, j] * Ik[j]
+            yield k, V, - Ik[j] * Vbus[k] * baseMVA
+
+
+def short_circuit_sweep(zbus: SparseZbus, Vbus, Zf, baseMVA, bus_idx=None, block_size=500):
+    """
+    Short circuit power and minimum post-fault voltage of independent 3-phase faults at every bus
+    :param zbus: SparseZbus instance
+    :param Vbus: Voltages of the buses in the steady state
+    :param Zf: Fault impedance array
+    :param baseMVA: base power
+    :param bus_idx: indices of the faulted buses, all of them if None
+    :param block_size: number of Zbus columns computed at once
+    :return: short circuit power in MVA (n), minimum voltage module in the grid during each fault (n)
+    """
+    n = len(Vbus)
+    SCC = zeros(n, dtype=complex)
+    Vmin = np.abs(Vbus).copy()
+
+    for block, Zcols in zbus.iter_columns(idx=bus_idx, block_size=block_size):
+        Zkk = Zcols[block, np.arange(len(block))]
+        Ik = - Vbus[block] / (Zkk + Zf[block])
+        SCC[block] = - Ik * Vbus[block] * baseMVA
+        Vmin[block] = np.abs(Vbus[:, np.newaxis] + Zcols * Ik[np.newaxis, :]).min(axis=0)
+
+    return SCC, Vmin
@@ -14,11 +14,11 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 import numpy as np
-from scipy.sparse.linalg import inv
 from PySide2.QtCore import QRunnable
 
 from GridCal.Engine.basic_structures import Logger
-from GridCal.Engine.Simulations.ShortCircuit.short_circuit import short_circuit_3p
+from GridCal.Engine.Simulations.ShortCircuit.short_circuit import SparseZbus, short_circuit_3p_sparse, \
+    short_circuit_sweep, iter_bus_faults
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.basic_structures import BranchImpedanceMode
 from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowResults, PowerFlowOptions
@@ -37,7 +37,7 @@ class ShortCircuitOptions:
 
     def __init__(self, bus_index=[], branch_index=[], branch_fault_locations=[], branch_fault_impedance=[],
                  branch_impedance_tolerance_mode=BranchImpedanceMode.Specified,
-                 verbose=False):
+                 verbose=False, all_bus_sweep=False, block_size=500):
         """
 
         Args:
@@ -46,6 +46,8 @@ class ShortCircuitOptions:
             branch_fault_locations:
             branch_fault_impedance:
             verbose:
+            all_bus_sweep: compute independent faults at every bus instead of the simultaneous faults at bus_index
+            block_size: number of Zbus columns computed at once in the all-bus sweep
         """
 
         assert (len(branch_fault_locations) == len(branch_index))
@@ -63,6 +65,10 @@ class ShortCircuitOptions:
 
         self.verbose = verbose
 
+        self.all_bus_sweep = all_bus_sweep
+
+        self.block_size = block_size
+
 
 class ShortCircuitResults(PowerFlowResults):
 
@@ -92,6 +98,9 @@ class ShortCircuitResults(PowerFlowResults):
 
         self.short_circuit_power = None
 
+        # minimum voltage module in the grid during the fault of each bus (all-bus sweep only)
+        self.sweep_min_voltage = None
+
         self.available_results = [ResultTypes.BusVoltageModule,
                                   ResultTypes.BusVoltageAngle,
                                   ResultTypes.BranchActivePower,
@@ -109,6 +118,7 @@ class ShortCircuitResults(PowerFlowResults):
         """
         elm = super().copy()
         elm.short_circuit_power = self.short_circuit_power
+        elm.sweep_min_voltage = self.sweep_min_voltage
         return elm
 
     def initialize(self, n, m):
@@ -124,6 +134,8 @@ class ShortCircuitResults(PowerFlowResults):
 
         self.short_circuit_power = np.zeros(n, dtype=complex)
 
+        self.sweep_min_voltage = np.zeros(n, dtype=float)
+
         self.overvoltage = np.zeros(n, dtype=complex)
 
         self.undervoltage = np.zeros(n, dtype=complex)
@@ -158,6 +170,9 @@ class ShortCircuitResults(PowerFlowResults):
 
         self.short_circuit_power[b_idx] = results.short_circuit_power
 
+        if results.sweep_min_voltage is not None:
+            self.sweep_min_voltage[b_idx] = results.sweep_min_voltage
+
         self.overvoltage[b_idx] = results.overvoltage
 
         self.undervoltage[b_idx] = results.undervoltage
@@ -272,25 +287,48 @@ class ShortCircuit(QRunnable):
 
         return br1, br2, middle_bus
 
-    def single_short_circuit(self, calculation_inputs: SnapshotCircuit, Vpf, Zf):
+    def single_short_circuit(self, calculation_inputs: SnapshotCircuit, Vpf, Zf, bus_index=None):
         """
         Run a power flow simulation for a single circuit
         @param calculation_inputs:
         @param Vpf: Power flow voltage vector applicable to the island
         @param Zf: Short circuit impedance vector applicable to the island
+        @param bus_index: indices of the faulted buses in the island (options.bus_index if None)
         @return: short circuit results
         """
-        # compute Zbus
-        # is dense, so no need to store it as sparse
+        if bus_index is None:
+            bus_index = self.options.bus_index
+
         if calculation_inputs.Ybus.shape[0] > 1:
-            Zbus = inv(calculation_inputs.Ybus).toarray()
 
-            # Compute the short circuit
-            V, SCpower = short_circuit_3p(bus_idx=self.options.bus_index,
-                                          Zbus=Zbus,
-                                          Vbus=Vpf,
-                                          Zf=Zf,
-                                          baseMVA=calculation_inputs.Sbase)
+            if len(bus_index) == 0 and not self.options.all_bus_sweep:
+                # there are no faults in this island
+                V = Vpf
+                SCpower = np.zeros(calculation_inputs.nbus, dtype=complex)
+                Vmin = None
+
+            elif self.options.all_bus_sweep:
+                # one factorization for all the buses, the Zbus columns are computed by blocks
+                zbus = SparseZbus(calculation_inputs.Ybus)
+
+                # independent faults at every bus, the grid voltages remain the pre-fault ones
+                SCpower, Vmin = short_circuit_sweep(zbus=zbus,
+                                                    Vbus=Vpf,
+                                                    Zf=Zf,
+                                                    baseMVA=calculation_inputs.Sbase,
+                                                    block_size=self.options.block_size)
+                V = Vpf
+            else:
+                # only the Zbus columns of the faulted buses are computed from the sparse factorization
+                zbus = SparseZbus(calculation_inputs.Ybus)
+
+                # Compute the short circuit
+                V, SCpower = short_circuit_3p_sparse(bus_idx=bus_index,
+                                                     zbus=zbus,
+                                                     Vbus=Vpf,
+                                                     Zf=Zf,
+                                                     baseMVA=calculation_inputs.Sbase)
+                Vmin = None
 
             # Compute the branches power
             Sbranch, Ibranch, loading, losses = self.compute_branch_results(calculation_inputs=calculation_inputs, V=V)
@@ -310,7 +348,8 @@ class ShortCircuit(QRunnable):
             results.Ibranch = Ibranch
             results.losses = losses
             results.SCpower = SCpower
-
+            results.short_circuit_power = SCpower
+            results.sweep_min_voltage = Vmin
 
         else:
             nbus = calculation_inputs.Ybus.shape[0]
@@ -331,6 +370,7 @@ class ShortCircuit(QRunnable):
             results.Ibranch = np.zeros(nbr, dtype=complex)
             results.losses = np.zeros(nbr, dtype=complex)
             results.SCpower = np.zeros(nbus, dtype=complex)
+            results.short_circuit_power = results.SCpower
 
         return results
 
@@ -410,9 +450,13 @@ class ShortCircuit(QRunnable):
                 bus_original_idx = calculation_input.original_bus_idx
                 branch_original_idx = calculation_input.original_branch_idx
 
+                # faulted buses of this island in the island indexing
+                bus_index = np.where(np.isin(bus_original_idx, self.options.bus_index))[0]
+
                 res = self.single_short_circuit(calculation_inputs=calculation_input,
                                                 Vpf=self.pf_results.voltage[bus_original_idx],
-                                                Zf=Zf[bus_original_idx])
+                                                Zf=Zf[bus_original_idx],
+                                                bus_index=bus_index)
 
                 # merge results
                 results.apply_from_island(res, bus_original_idx, branch_original_idx)
@@ -426,5 +470,41 @@ class ShortCircuit(QRunnable):
         self.results = results
         self.grid.short_circuit_results = results
 
+    def stream_bus_faults(self):
+        """
+        Sweep independent faults at every bus of the grid, generating the results bus by bus so that the post-fault
+        voltages of all the faults never need to be stored at once. The factorization of each island is reused
+        for all its buses.
+        :return: generator of (faulted bus index, bus indices of its island, post-fault voltages of the island,
+                 short circuit power in MVA)
+        """
+        numerical_circuit = compile_snapshot_circuit(circuit=self.grid,
+                                                     apply_temperature=self.pf_options.apply_temperature_correction,
+                                                     branch_tolerance_mode=self.pf_options.branch_impedance_tolerance_mode,
+                                                     opf_results=self.opf_results)
+
+        calculation_inputs = split_into_islands(numeric_circuit=numerical_circuit,
+                                                ignore_single_node_islands=self.pf_options.ignore_single_node_islands)
+
+        Zf = self.compile_zf(self.grid)
+
+        for calculation_input in calculation_inputs:
+
+            if calculation_input.nbus < 2:
+                continue
+
+            bus_original_idx = calculation_input.original_bus_idx
+            zbus = SparseZbus(calculation_input.Ybus)
+
+            for k, V, SCpower in iter_bus_faults(zbus=zbus,
+                                                 Vbus=self.pf_results.voltage[bus_original_idx],
+                                                 Zf=Zf[bus_original_idx],
+                                                 baseMVA=calculation_input.Sbase,
+                                                 block_size=self.options.block_size):
+                yield bus_original_idx[k], bus_original_idx, V, SCpower
+
+                if self.__cancel__:
+                    return
+
     def cancel(self):
         self.__cancel__ = True
@@ -1,7 +1,19 @@
-from scipy.sparse import hstack as sphs, vstack as spvs, csc_matrix, csr_matrix
-from scipy.sparse.linalg import spsolve
+from enum import Enum
 import numpy as np
 from numpy import conj, arange
+import scipy.sparse as sp
+from scipy.sparse import hstack as sphs, vstack as spvs, csc_matrix, csr_matrix
+from scipy.sparse.linalg import splu
+from scipy.linalg import solve_triangular
+
+try:
+    import sparseqr
+    SPARSE_QR_AVAILABLE = True
+except ImportError:
+    SPARSE_QR_AVAILABLE = False
+
+# maximum number of unknowns of the dense QR used when sparseqr is not installed
+MAX_DENSE_QR_SIZE = 2000
 
 
 def dSbus_dV(Ybus, V):
@@ -218,6 +230,24 @@ def dIbr_dV(Yf, Yt, V):
     return dIf_dVa, dIf_dVm, dIt_dVa, dIt_dVm, If, It
 
 
+class StateEstimationMethod(Enum):
+    NormalEquations = 'Normal equations (LM)'
+    Orthogonal = 'Orthogonal (QR)'
+
+    def __str__(self):
+        return self.value
+
+    def __repr__(self):
+        return str(self)
+
+    @staticmethod
+    def argparse(s):
+        try:
+            return StateEstimationMethod[s]
+        except KeyError:
+            return s
+
+
 def Jacobian_SE(Ybus, Yf, Yt, V, f, t, inputs, pvpq):
     """
     
@@ -256,8 +286,9 @@ def Jacobian_SE(Ybus, Yf, Yt, V, f, t, inputs, pvpq):
     H51 = np.abs(dIf_dVa[np.ix_(inputs.i_flow_idx, pvpq)])
     H52 = np.abs(dIf_dVm[inputs.i_flow_idx, :])
 
-    H61 = csc_matrix(np.zeros((len(inputs.vm_m_idx), len(pvpq))))
-    H62 = csc_matrix(np.diag(np.ones(n))[inputs.vm_m_idx, :])
+    nvm = len(inputs.vm_m_idx)
+    H61 = csc_matrix((nvm, len(pvpq)))
+    H62 = csc_matrix((np.ones(nvm), (np.arange(nvm), inputs.vm_m_idx)), shape=(nvm, n))
 
     # pack the Jacobian
     H = spvs([sphs([H11, H12]),
@@ -265,7 +296,7 @@ def Jacobian_SE(Ybus, Yf, Yt, V, f, t, inputs, pvpq):
               sphs([H31, H32]),
               sphs([H41, H42]),
               sphs([H51, H52]),
-              sphs([H61, H62])])
+              sphs([H61, H62])], format='csc')
 
     # form the sub-mismatch vectors
     h1 = Sf[inputs.p_flow_idx].real
@@ -283,7 +314,96 @@ def Jacobian_SE(Ybus, Yf, Yt, V, f, t, inputs, pvpq):
     return H, h
 
 
-def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
+class GainMatrixSolver:
+
+    def __init__(self):
+        """
+        Sparse solver of the gain matrix G = H^T·W·H + lambda·I.
+        The sparsity pattern of G only depends on the topology and on the measurement set, so the fill-reducing
+        ordering is computed once and reused in every iteration and every snapshot; only the numerical
+        factorization is repeated.
+        """
+        self.key = None
+        self.col_order = None
+        self.lu = None
+
+        self.n_analysis = 0
+        self.n_factorizations = 0
+
+    def update(self, key):
+        """
+        Discard the ordering if the structure changed
+        :param key: hashable description of the structure (topology and measurement set)
+        """
+        if key != self.key:
+            self.key = key
+            self.col_order = None
+
+    def analyze(self, G):
+        """
+        Compute the fill-reducing ordering of the gain matrix
+        :param G: gain matrix (CSC)
+        """
+        lu = splu(G, permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0.0, options=dict(SymmetricMode=True))
+        self.col_order = np.argsort(lu.perm_c)
+        self.n_analysis += 1
+
+    def factorize(self, G):
+        """
+        Factorize the gain matrix with the stored ordering
+        :param G: gain matrix (CSC)
+        """
+        if self.col_order is None or len(self.col_order) != G.shape[0]:
+            self.analyze(G)
+
+        p = self.col_order
+        Gp = G[p, :][:, p].tocsc()
+        self.lu = splu(Gp, permc_spec='NATURAL', diag_pivot_thresh=0.0, options=dict(SymmetricMode=True))
+        self.n_factorizations += 1
+
+    def solve(self, rhs):
+        """
+        Solve G x = rhs with the stored factorization
+        :param rhs: right hand side
+        :return: solution
+        """
+        y = self.lu.solve(rhs[self.col_order])
+        x = np.empty_like(y)
+        x[self.col_order] = y
+        return x
+
+
+def can_use_orthogonal(nx):
+    """
+    Check if the orthogonal (QR) method can be used for a problem size
+    :param nx: number of unknowns
+    :return: True if sparseqr is available or the dense QR is affordable
+    """
+    return SPARSE_QR_AVAILABLE or nx <= MAX_DENSE_QR_SIZE
+
+
+def solve_least_squares_qr(A, b):
+    """
+    Solve min ||A·x - b|| by orthogonal factorization of A, without forming A^T·A
+    (sparse QR if SuiteSparseQR is available, dense Householder QR otherwise)
+    :param A: sparse matrix
+    :param b: right hand side
+    :return: solution
+    """
+    if SPARSE_QR_AVAILABLE:
+        return sparseqr.solve(A.tocoo(), b, tolerance=0)
+    else:
+        if not can_use_orthogonal(A.shape[1]):
+            raise ValueError('The dense QR of ' + str(A.shape[1]) + ' unknowns is too large, '
+                             + 'install sparseqr to use the orthogonal method')
+
+        Q, R = np.linalg.qr(A.toarray())
+        return solve_triangular(R, Q.T.dot(b))
+
+
+def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv, V0=None, z=None, sigma=None,
+                method=StateEstimationMethod.NormalEquations, solver: GainMatrixSolver = None,
+                tol=1e-9, max_iter=100):
     """
     Solve the state estimation problem using the Levenberg-Marquadt method
     :param Ybus: 
@@ -291,38 +411,53 @@ def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
     :param Yt: 
     :param f: array with the from bus indices of all the branches
     :param t: array with the to bus indices of all the branches
-    :param inputs: state estimation imput instance (contains the measurements)
+    :param se_input: state estimation imput instance (contains the measurements)
     :param ref: 
     :param pq: 
     :param pv: 
-    :return: 
+    :param V0: initial voltage (flat start if None)
+    :param z: array of measurement values, overrides the values of se_input
+    :param sigma: array of measurement uncertainties, overrides the values of se_input
+    :param method: StateEstimationMethod
+    :param solver: GainMatrixSolver to reuse between calls (i.e. for a sequence of snapshots)
+    :param tol: tolerance
+    :param max_iter: maximum number of iterations
+    :return: voltage, error, converged?, iterations
     """
 
     pvpq = np.r_[pv, pq]
     npvpq = len(pvpq)
-    npq = len(pq)
-    nvd = len(ref)
     n = Ybus.shape[0]
-    V = np.ones(n, dtype=complex)
+    nx = npvpq + n
+    V = np.ones(n, dtype=complex) if V0 is None else np.array(V0, dtype=complex)
 
     # pick the measurements and uncertainties
-    z, sigma = se_input.consolidate()
+    if z is None or sigma is None:
+        z_input, sigma_input = se_input.consolidate()
+        z = z_input if z is None else z
+        sigma = sigma_input if sigma is None else sigma
 
     # compute the weights matrix
-    W = csc_matrix(np.diag(1.0 / np.power(sigma, 2.0)))
+    w = 1.0 / np.power(sigma, 2.0)
+    W = sp.diags(w, format='csc')
+
+    if method == StateEstimationMethod.Orthogonal:
+        W_sqrt = sp.diags(np.sqrt(w), format='csc')
+    else:
+        W_sqrt = None
+        if solver is None:
+            solver = GainMatrixSolver()
+        solver.update(key=se_input.get_structure_key(n, pvpq))
 
     # Levenberg-Marquardt method
-    tol = 1e-9
-    max_iter = 100
     iter_ = 0
-    Idn = csc_matrix(np.identity(2 * n - nvd))  # identity matrix
+    Idn = sp.identity(nx, format='csc')  # identity matrix
     # x = np.r_[np.angle(V)[pvpq], np.abs(V)]
     Va = np.angle(V)
     Vm = np.abs(V)
     lbmda = 0  # any large number
     f_obj_prev = 1e9  # very large number
 
-    update_jacobian = False
     converged = False
     err = 1e20
     nu = 2.0
@@ -335,25 +470,36 @@ def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
         # measurements error
         dz = z - h
 
-        # System matrix
         # H1 = H^t·W
         H1 = H.transpose().dot(W)
-        # H2 = H1·H
-        H2 = H1.dot(H)
-
-        # set first value of lmbda
-        if iter_ == 0:
-            lbmda = 1e-3 * H2.diagonal().max()
-
-        # compute system matrix
-        A = H2 + lbmda * Idn
 
         # right hand side
         # H^t·W·dz
         rhs = H1.dot(dz)
 
-        # Solve the increment
-        dx = spsolve(A, rhs)
+        if method == StateEstimationMethod.Orthogonal:
+
+            # set first value of lmbda
+            if iter_ == 0:
+                lbmda = 1e-3 * H1.multiply(H.transpose()).sum(axis=1).max()
+
+            # damped least squares of the weighted Jacobian
+            A = spvs([W_sqrt.dot(H), np.sqrt(lbmda) * Idn], format='csc')
+            b = np.r_[W_sqrt.dot(dz), np.zeros(nx)]
+            dx = solve_least_squares_qr(A, b)
+
+        else:
+            # System matrix
+            # H2 = H1·H
+            H2 = H1.dot(H)
+
+            # set first value of lmbda
+            if iter_ == 0:
+                lbmda = 1e-3 * H2.diagonal().max()
+
+            # factorize the system matrix and solve the increment
+            solver.factorize(csc_matrix(H2 + lbmda * Idn))
+            dx = solver.solve(rhs)
 
         # objective function
         f_obj = 0.5 * dz.dot(W * dz)
@@ -368,7 +514,7 @@ def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
 
             # modify the solution
             dVa = dx[0:npvpq]
-            dVm = dx[npvpq:npvpq + npq + 1]
+            dVm = dx[npvpq:]
             Va[pvpq] += dVa
             Vm += dVm
             V = Vm * np.exp(1j * Va)
@@ -388,7 +534,53 @@ def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
         f_obj_prev = f_obj
         iter_ += 1
 
-    return V, err, converged
+    return V, err, converged, iter_
+
+
+def solve_se_series(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv, Z, sigma=None, V0=None,
+                    method=StateEstimationMethod.NormalEquations, tol=1e-9, max_iter=100):
+    """
+    Estimate a sequence of snapshots of the same measurement set (i.e. SCADA scans).
+    Every estimation starts from the previous one and the gain matrix ordering is kept.
+    :param Ybus:
+    :param Yf:
+    :param Yt:
+    :param f: array with the from bus indices of all the branches
+    :param t: array with the to bus indices of all the branches
+    :param se_input: state estimation imput instance (contains the measurements)
+    :param ref:
+    :param pq:
+    :param pv:
+    :param Z: array of measurement values (snapshots, measurements) in the order of se_input.consolidate()
+    :param sigma: array of measurement uncertainties (the ones of se_input if None)
+    :param V0: initial voltage of the first snapshot (flat start if None)
+    :param method: StateEstimationMethod
+    :param tol: tolerance
+    :param max_iter: maximum number of iterations
+    :return: voltages (snapshots, buses), errors, converged, iterations
+    """
+    nt = Z.shape[0]
+    n = Ybus.shape[0]
+    solver = GainMatrixSolver()
+
+    voltages = np.zeros((nt, n), dtype=complex)
+    errors = np.zeros(nt)
+    converged = np.zeros(nt, dtype=bool)
+    iterations = np.zeros(nt, dtype=int)
+
+    V = V0
+    for k in range(nt):
+        V, errors[k], converged[k], iterations[k] = solve_se_lm(Ybus=Ybus, Yf=Yf, Yt=Yt, f=f, t=t, se_input=se_input,
+                                                                ref=ref, pq=pq, pv=pv, V0=V, z=Z[k, :],
+                                                                sigma=sigma, method=method, solver=solver,
+                                                                tol=tol, max_iter=max_iter)
+        voltages[k, :] = V
+
+        # a failed estimation is not a good starting point
+        if not converged[k]:
+            V = V0
+
+    return voltages, errors, converged, iterations
 
 
 if __name__ == '__main__':
@@ -403,9 +595,9 @@ if __name__ == '__main__':
     b2 = Bus('B2')
     b3 = Bus('B3')
 
-    br1 = Branch(b1, b2, 'Br1', 0.01, 0.03)
-    br2 = Branch(b1, b3, 'Br2', 0.02, 0.05)
-    br3 = Branch(b2, b3, 'Br3', 0.03, 0.08)
+    br1 = Line(b1, b2, name='Br1', r=0.01, x=0.03)
+    br2 = Line(b1, b3, name='Br2', r=0.02, x=0.05)
+    br3 = Line(b2, b3, name='Br3', r=0.03, x=0.08)
 
     # add measurements
     br1.measurements.append(Measurement(0.888, 0.008, MeasurementType.Pflow))
@@ -425,9 +617,9 @@ if __name__ == '__main__':
     m_circuit.add_bus(b2)
     m_circuit.add_bus(b3)
 
-    m_circuit.add_branch(br1)
-    m_circuit.add_branch(br2)
-    m_circuit.add_branch(br3)
+    m_circuit.add_line(br1)
+    m_circuit.add_line(br2)
+    m_circuit.add_line(br3)
 
     br = [br1, br2, br3]
 
@@ -13,12 +13,17 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
 import numpy as np
-from PySide2.QtCore import QRunnable
+from PySide2.QtCore import QRunnable, QThread, Signal
 
-from GridCal.Engine.Simulations.StateEstimation.state_estimation import solve_se_lm
-from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowResults, power_flow_post_process
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Simulations.StateEstimation.state_estimation import solve_se_lm, solve_se_series, \
+    StateEstimationMethod, can_use_orthogonal
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowResults, power_flow_post_process, \
+    ConvergenceReport
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
 from GridCal.Engine.Devices.measurement import MeasurementType
 
 
@@ -103,6 +108,37 @@ class StateEstimationInput:
 
         return magnitudes, sigma
 
+    def get_measurements(self):
+        """
+        Get the measurement objects in the order of consolidate
+        :return: list of Measurement
+        """
+        return self.p_flow + self.p_inj + self.q_flow + self.q_inj + self.i_flow + self.vm_m
+
+    def get_structure_key(self, n, pvpq):
+        """
+        Get a description of the structure of the measurement Jacobian (to know when it changes)
+        :param n: number of buses
+        :param pvpq: array of pv and pq bus indices
+        :return: tuple
+        """
+        return (n, tuple(pvpq), tuple(self.p_flow_idx), tuple(self.p_inj_idx), tuple(self.q_flow_idx),
+                tuple(self.q_inj_idx), tuple(self.i_flow_idx), tuple(self.vm_m_idx))
+
+
+class StateEstimationOptions:
+
+    def __init__(self, method=StateEstimationMethod.NormalEquations, tolerance=1e-9, max_iter=100):
+        """
+        State estimation options
+        :param method: StateEstimationMethod
+        :param tolerance: tolerance
+        :param max_iter: maximum number of iterations
+        """
+        self.method = method
+        self.tolerance = tolerance
+        self.max_iter = max_iter
+
 
 class StateEstimationResults(PowerFlowResults):
 
@@ -129,128 +165,354 @@ class StateEstimationResults(PowerFlowResults):
                                   hvdc_names=(),
                                   bus_types=bus_types)
 
+        self.name = 'State estimation'
+
+
+class StateEstimationTimeSeriesResults:
+
+    def __init__(self, n, m, nt, bus_names, branch_names):
+        """
+        Results of the estimation of a sequence of measurement snapshots
+        :param n: number of buses
+        :param m: number of branches
+        :param nt: number of snapshots
+        :param bus_names: array of bus names
+        :param branch_names: array of branch names
+        """
+        self.name = 'State estimation time series'
+
+        self.bus_names = bus_names
+        self.branch_names = branch_names
+
+        self.voltage = np.zeros((nt, n), dtype=complex)
+        self.Sbus = np.zeros((nt, n), dtype=complex)
+        self.Sbranch = np.zeros((nt, m), dtype=complex)
+        self.loading = np.zeros((nt, m), dtype=complex)
+        self.error = np.zeros(nt)
+        self.converged = np.ones(nt, dtype=bool)
+        self.iterations = np.zeros(nt, dtype=int)
+
+    def apply_from_island(self, voltage, Sbus, Sbranch, loading, error, converged, iterations, b_idx, br_idx):
+        """
+        Apply the results of an island
+        :param voltage: array of voltages (snapshots, island buses)
+        :param Sbus: array of power injections (snapshots, island buses)
+        :param Sbranch: array of branch flows (snapshots, island branches)
+        :param loading: array of branch loading (snapshots, island branches)
+        :param error: array of errors (snapshots)
+        :param converged: array of convergence flags (snapshots)
+        :param iterations: array of iterations (snapshots)
+        :param b_idx: original bus indices
+        :param br_idx: original branch indices
+        """
+        self.voltage[:, b_idx] = voltage
+        self.Sbus[:, b_idx] = Sbus
+        self.Sbranch[:, br_idx] = Sbranch
+        self.loading[:, br_idx] = loading
+        self.error = np.maximum(self.error, error)
+        self.converged &= converged
+        self.iterations += iterations
+
+
+def get_se_branches(circuit: MultiCircuit):
+    """
+    Get the branches in the order of the compiled circuit
+    :param circuit: MultiCircuit instance
+    :return: list of branches
+    """
+    return circuit.get_branches_wo_hvdc() + circuit.dc_lines
+
+
+def get_circuit_measurements(circuit: MultiCircuit):
+    """
+    Get all the measurements of the circuit; this is the order of the columns of the measurement snapshots
+    :param circuit: MultiCircuit instance
+    :return: list of Measurement
+    """
+    lst = list()
+    for bus in circuit.buses:
+        lst += bus.measurements
+    for branch in get_se_branches(circuit):
+        lst += branch.measurements
+    return lst
+
+
+def collect_measurements(circuit: MultiCircuit, bus_idx, branch_idx):
+    """
+    Form the input of an island from the circuit measurements
+    :param circuit: MultiCircuit instance
+    :param bus_idx: original indices of the buses of the island
+    :param branch_idx: original indices of the branches of the island
+    :return: StateEstimationInput with the indices of the island
+    """
+    se_input = StateEstimationInput()
+
+    # collect the bus measurements
+    for k, i in enumerate(bus_idx):
+
+        for m in circuit.buses[i].measurements:
+
+            if m.measurement_type == MeasurementType.Pinj:
+                se_input.p_inj_idx.append(k)
+                se_input.p_inj.append(m)
+
+            elif m.measurement_type == MeasurementType.Qinj:
+                se_input.q_inj_idx.append(k)
+                se_input.q_inj.append(m)
+
+            elif m.measurement_type == MeasurementType.Vmag:
+                se_input.vm_m_idx.append(k)
+                se_input.vm_m.append(m)
+
+            else:
+                raise Exception('The bus ' + str(circuit.buses[i]) + ' contains a measurement of type '
+                                + str(m.measurement_type))
+
+    # collect the branch measurements
+    branches = get_se_branches(circuit)
+    for k, i in enumerate(branch_idx):
+
+        for m in branches[i].measurements:
+
+            if m.measurement_type == MeasurementType.Pflow:
+                se_input.p_flow_idx.append(k)
+                se_input.p_flow.append(m)
+
+            elif m.measurement_type == MeasurementType.Qflow:
+                se_input.q_flow_idx.append(k)
+                se_input.q_flow.append(m)
+
+            elif m.measurement_type == MeasurementType.Iflow:
+                se_input.i_flow_idx.append(k)
+                se_input.i_flow.append(m)
+
+            else:
+                raise Exception('The branch ' + str(branches[i]) + ' contains a measurement of type '
+                                + str(m.measurement_type))
+
+    return se_input
+
 
 class StateEstimation(QRunnable):
 
-    def __init__(self, circuit: MultiCircuit):
+    def __init__(self, circuit: MultiCircuit, options: StateEstimationOptions = None):
         """
         Constructor
         :param circuit: circuit object
+        :param options: StateEstimationOptions instance
         """
 
         QRunnable.__init__(self)
 
         self.grid = circuit
 
+        self.options = options if options is not None else StateEstimationOptions()
+
         self.se_results = None
 
+        self.logger = Logger()
+
     @staticmethod
     def collect_measurements(circuit: MultiCircuit, bus_idx, branch_idx):
         """
         Form the input from the circuit measurements
         :return: nothing, the input object is stored in this class
         """
-        se_input = StateEstimationInput()
-
-        # collect the bus measurements
-        for i in bus_idx:
-
-            for m in circuit.buses[i].measurements:
-
-                if m.measurement_type == MeasurementType.Pinj:
-                    se_input.p_inj_idx.append(i)
-                    se_input.p_inj.append(m)
-
-                elif m.measurement_type == MeasurementType.Qinj:
-                    se_input.q_inj_idx.append(i)
-                    se_input.q_inj.append(m)
-
-                elif m.measurement_type == MeasurementType.Vmag:
-                    se_input.vm_m_idx.append(i)
-                    se_input.vm_m.append(m)
-
-                else:
-                    raise Exception('The bus ' + str(circuit.buses[i]) + ' contains a measurement of type '
-                                    + str(m.measurement_type))
-
-        # collect the branch measurements
-        branches = circuit.get_branches()
-        for i in branch_idx:
-
-            # branch = circuit.branches[i]
-
-            for m in branches[i].measurements:
-
-                if m.measurement_type == MeasurementType.Pflow:
-                    se_input.p_flow_idx.append(i)
-                    se_input.p_flow.append(m)
-
-                elif m.measurement_type == MeasurementType.Qflow:
-                    se_input.q_flow_idx.append(i)
-                    se_input.q_flow.append(m)
-
-                elif m.measurement_type == MeasurementType.Iflow:
-                    se_input.i_flow_idx.append(i)
-                    se_input.i_flow.append(m)
-
-                else:
-                    raise Exception('The branch ' + str(branches[i]) + ' contains a measurement of type '
-                                    + str(m.measurement_type))
-
-        return se_input
+        return collect_measurements(circuit, bus_idx, branch_idx)
 
     def run(self):
         """
         Run state estimation
         :return:
         """
-        n = len(self.grid.buses)
-        m = self.grid.get_branch_number()
-        self.se_results = StateEstimationResults()
-        self.se_results.initialize(n, m)
+        numerical_circuit = compile_snapshot_circuit(self.grid)
+        islands = split_into_islands(numerical_circuit)
 
-        numerical_circuit = self.grid.compile_snapshot()
-        islands = numerical_circuit.compute()
+        self.se_results = StateEstimationResults(n=numerical_circuit.nbus,
+                                                 m=numerical_circuit.nbr,
+                                                 n_tr=numerical_circuit.ntr,
+                                                 bus_names=numerical_circuit.bus_names,
+                                                 branch_names=numerical_circuit.branch_names,
+                                                 transformer_names=numerical_circuit.tr_names,
+                                                 bus_types=numerical_circuit.bus_types)
 
-        self.se_results.bus_types = numerical_circuit.bus_types
+        for i, island in enumerate(islands):
 
-        for island in islands:
+            if len(island.vd) == 0:
+                self.logger.append('There are no slack nodes in the island ' + str(i))
+                continue
 
             # collect inputs of the island
             se_input = self.collect_measurements(circuit=self.grid,
                                                  bus_idx=island.original_bus_idx,
                                                  branch_idx=island.original_branch_idx)
 
+            # the dense QR fallback of the orthogonal method does not scale
+            method = self.options.method
+            if method == StateEstimationMethod.Orthogonal and \
+                    not can_use_orthogonal(len(island.pv) + len(island.pq) + island.nbus):
+                self.logger.append('The island ' + str(i) + ' is too large for the orthogonal method without '
+                                   'sparseqr, the normal equations are used instead')
+                method = StateEstimationMethod.NormalEquations
+
             # run solver
-            v_sol, err, converged = solve_se_lm(Ybus=island.Ybus,
-                                                Yf=island.Yf,
-                                                Yt=island.Yt,
-                                                f=island.F,
-                                                t=island.T,
-                                                se_input=se_input,
-                                                ref=island.ref,
-                                                pq=island.pq,
-                                                pv=island.pv)
+            start = time.time()
+            v_sol, err, converged, iterations = solve_se_lm(Ybus=island.Ybus,
+                                                            Yf=island.Yf,
+                                                            Yt=island.Yt,
+                                                            f=island.F,
+                                                            t=island.T,
+                                                            se_input=se_input,
+                                                            ref=island.vd,
+                                                            pq=island.pq,
+                                                            pv=island.pv,
+                                                            method=method,
+                                                            tol=self.options.tolerance,
+                                                            max_iter=self.options.max_iter)
+            report = ConvergenceReport()
+            report.add(method=method, converged=converged, error=err,
+                       elapsed=time.time() - start, iterations=iterations)
 
             # Compute the branches power and the slack buses power
-            Sbranch, Ibranch, Vbrnach, loading, \
-             losses, flow_direction, Sbus = power_flow_post_process(calculation_inputs=island, V=v_sol)
+            Scalc = v_sol * np.conj(island.Ybus * v_sol)
+            Sbranch, Ibranch, Vbranch, loading, \
+             losses, flow_direction, Sbus = power_flow_post_process(calculation_inputs=island,
+                                                                    Sbus=Scalc,
+                                                                    V=v_sol,
+                                                                    branch_rates=island.branch_rates)
 
             # pack results into a SE results object
-            results = StateEstimationResults(Sbus=Sbus,
-                                             voltage=v_sol,
-                                             Sbranch=Sbranch,
-                                             Ibranch=Ibranch,
-                                             loading=loading,
-                                             losses=losses,
-                                             error=[err],
-                                             converged=[converged],
-                                             Qpv=None)
+            results = StateEstimationResults(n=island.nbus,
+                                             m=island.nbr,
+                                             n_tr=island.ntr,
+                                             bus_names=island.bus_names,
+                                             branch_names=island.branch_names,
+                                             transformer_names=island.tr_names,
+                                             bus_types=island.bus_types)
+            results.Sbus = Scalc
+            results.voltage = v_sol
+            results.Sbranch = Sbranch
+            results.Ibranch = Ibranch
+            results.Vbranch = Vbranch
+            results.loading = loading
+            results.losses = losses
+            results.flow_direction = flow_direction
+            results.convergence_reports.append(report)
 
             self.se_results.apply_from_island(results,
                                               island.original_bus_idx,
-                                              island.original_branch_idx)
+                                              island.original_branch_idx,
+                                              island.original_tr_idx)
+
+
+class StateEstimationTimeSeries(QThread):
+    progress_signal = Signal(float)
+    progress_text = Signal(str)
+    done_signal = Signal()
+    name = 'State estimation time series'
+
+    def __init__(self, circuit: MultiCircuit, measurement_values, options: StateEstimationOptions = None):
+        """
+        Estimation of a sequence of measurement snapshots (i.e. SCADA scans) of the same measurement set.
+        Every island is compiled once, the gain matrix ordering is kept and every snapshot starts from the
+        previous estimation.
+        :param circuit: MultiCircuit instance
+        :param measurement_values: array of measurement values (snapshots, measurements), the columns follow
+                                   the order of get_circuit_measurements
+        :param options: StateEstimationOptions instance
+        """
+        QThread.__init__(self)
+
+        self.grid = circuit
+
+        self.measurement_values = np.atleast_2d(measurement_values)
+
+        self.options = options if options is not None else StateEstimationOptions()
+
+        self.results = None
+
+        self.logger = Logger()
+
+        self.__cancel__ = False
+
+    def run(self):
+        """
+        Run the state estimation of all the snapshots
+        """
+        self.__cancel__ = False
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Compiling...')
+
+        measurements = get_circuit_measurements(self.grid)
+        if self.measurement_values.shape[1] != len(measurements):
+            raise Exception('There are ' + str(len(measurements)) + ' measurements in the circuit but the snapshots '
+                            'have ' + str(self.measurement_values.shape[1]) + ' values')
+        column = {id(m): k for k, m in enumerate(measurements)}
+
+        numerical_circuit = compile_snapshot_circuit(self.grid)
+        islands = split_into_islands(numerical_circuit)
+
+        nt = self.measurement_values.shape[0]
+        self.results = StateEstimationTimeSeriesResults(n=numerical_circuit.nbus,
+                                                        m=numerical_circuit.nbr,
+                                                        nt=nt,
+                                                        bus_names=numerical_circuit.bus_names,
+                                                        branch_names=numerical_circuit.branch_names)
+
+        for i, island in enumerate(islands):
+
+            if self.__cancel__:
+                break
+
+            if len(island.vd) == 0:
+                self.logger.append('There are no slack nodes in the island ' + str(i))
+                continue
+
+            self.progress_text.emit('Estimating island ' + str(i + 1) + '/' + str(len(islands)) + '...')
+
+            se_input = collect_measurements(circuit=self.grid,
+                                            bus_idx=island.original_bus_idx,
+                                            branch_idx=island.original_branch_idx)
+            cols = np.array([column[id(m)] for m in se_input.get_measurements()], dtype=int)
+
+            voltage, error, converged, iterations = solve_se_series(Ybus=island.Ybus,
+                                                                    Yf=island.Yf,
+                                                                    Yt=island.Yt,
+                                                                    f=island.F,
+                                                                    t=island.T,
+                                                                    se_input=se_input,
+                                                                    ref=island.vd,
+                                                                    pq=island.pq,
+                                                                    pv=island.pv,
+                                                                    Z=self.measurement_values[:, cols],
+                                                                    method=self.options.method,
+                                                                    tol=self.options.tolerance,
+                                                                    max_iter=self.options.max_iter)
+
+            # branch flows of all the snapshots at once
+            Vf = voltage[:, island.F]
+            If = (island.Yf * voltage.T).T
+            Sbranch = Vf * np.conj(If) * island.Sbase
+            loading = Sbranch / (island.branch_rates + 1e-9)
+            Sbus = voltage * np.conj((island.Ybus * voltage.T).T)
+
+            self.results.apply_from_island(voltage, Sbus, Sbranch, loading, error, converged, iterations,
+                                           island.original_bus_idx, island.original_branch_idx)
+
+            self.progress_signal.emit((i + 1) / len(islands) * 100.0)
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Done!')
+        self.done_signal.emit()
+
+    def cancel(self):
+        """
+        Cancel the simulation
+        """
+        self.__cancel__ = True
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Cancelled')
 
 
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    pass
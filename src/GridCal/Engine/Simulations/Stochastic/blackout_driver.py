@@ -13,23 +13,486 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
-from enum import Enum
-import pandas as pd
+"""
+Cascading failures on the compiled circuit (DC model).
+
+The tripped branches are emulated by compensation on top of the last factorized topology: with the transfer factors
+H[:, c] of the branches c tripped since then, the flows are F + H[:, c] x with (I - H[:, c][c]) x = F[c], the
+multiple outage form of the LODF. Only the columns of H of the tripped branches are computed, each with a single solve.
+When the compensation becomes singular the tripped branches split an island: then the islands are detected again,
+only the islands that changed are factorized, and their injections are balanced (shedding load when there is not
+enough generation).
+"""
+
+import multiprocessing
 import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
 from PySide2.QtCore import QThread, Signal
 
-
-from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions
-from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowDriver
-from GridCal.Engine.Simulations.Stochastic.monte_carlo_results import MonteCarloResults
-from GridCal.Engine.Simulations.Stochastic.lhs_driver import LatinHypercubeSampling
+import GridCal.Engine.Core.topology as tp
+from GridCal.Engine.basic_structures import BusMode
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit
+from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit, compile_snapshot_circuit
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions
+from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowResults
+from GridCal.Engine.Simulations.PTDF.linear_analysis import get_branch_susceptances
+
+
+########################################################################################################################
+# Cascading engine
+########################################################################################################################
+
+
+class CascadeOptions:
+
+    def __init__(self, n_realisations=1000, n_initial_outages=1, overload_threshold=1.0, trip_probability=1.0,
+                 hidden_failure_probability=0.0, load_scale_range=(1.0, 1.0), max_steps=100, max_rank=50,
+                 use_multiprocessing=False, seed=None):
+        """
+        Cascading simulation options
+        :param n_realisations: number of random cascades
+        :param n_initial_outages: number of random branch outages that start every cascade
+        :param overload_threshold: loading above which the branches trip
+        :param trip_probability: probability of an overloaded branch to trip at every step
+        :param hidden_failure_probability: probability of the branches connected to a tripped branch to trip
+                                           (hidden failure of the protections)
+        :param load_scale_range: (min, max) range of the random load scaling of every cascade
+        :param max_steps: maximum number of steps of a cascade
+        :param max_rank: maximum number of tripped branches handled by compensation before factorizing again
+        :param use_multiprocessing: run the cascades in parallel processes
+        :param seed: random seed (None for a random one)
+        """
+        self.n_realisations = n_realisations
+        self.n_initial_outages = n_initial_outages
+        self.overload_threshold = overload_threshold
+        self.trip_probability = trip_probability
+        self.hidden_failure_probability = hidden_failure_probability
+        self.load_scale_range = load_scale_range
+        self.max_steps = max_steps
+        self.max_rank = max_rank
+        self.use_multiprocessing = use_multiprocessing
+        self.seed = seed
+
+
+class CascadeIsland:
+
+    def __init__(self, nc: SnapshotCircuit, bus_idx, br_idx, A, b, Pcap):
+        """
+        Factorized DC model of an island
+        :param nc: SnapshotCircuit instance
+        :param bus_idx: sorted indices of the buses of the island
+        :param br_idx: indices of the active branches of the island
+        :param A: branch-bus incidence matrix Cf - Ct (CSR)
+        :param b: array of branch susceptances (nbr)
+        :param Pcap: array of generation capacity per bus (nbus)
+        """
+        self.bus_idx = bus_idx
+        self.br_idx = br_idx
+
+        # the slack is the island's slack bus or the bus with the largest generation capacity
+        vd = np.where(nc.bus_types[bus_idx] == BusMode.Slack.value)[0]
+        slack = vd[0] if len(vd) else np.argmax(Pcap[bus_idx])
+        self.noref = np.delete(np.arange(len(bus_idx)), slack)
+
+        Ai = A[br_idx, :][:, bus_idx]
+        self.Bf = sp.csr_matrix(sp.diags(b[br_idx]) * Ai)
+        Bbus = sp.csc_matrix(Ai.T * self.Bf)
+
+        if len(self.noref) and len(br_idx):
+            self.lu = splu(Bbus[np.ix_(self.noref, self.noref)].tocsc())
+        else:
+            self.lu = None
+
+    def solve_angles(self, P):
+        """
+        Solve the DC angles of the island
+        :param P: array of injections of the buses of the island (MW)
+        :return: array of angles of the buses of the island (radians x Sbase)
+        """
+        theta = np.zeros(len(self.bus_idx))
+        if self.lu is not None:
+            theta[self.noref] = self.lu.solve(P[self.noref])
+        return theta
 
 
-class CascadeType(Enum):
-    PowerFlow = 0,
-    LatinHypercube = 1
+class CascadeContext:
+
+    def __init__(self, nc: SnapshotCircuit, options: CascadeOptions):
+        """
+        Data shared by all the cascades of a circuit, including the factorized islands of the base topology
+        :param nc: SnapshotCircuit instance
+        :param options: CascadeOptions instance
+        """
+        self.nc = nc
+        self.options = options
+
+        self.A = sp.csr_matrix(nc.C_branch_bus_f - nc.C_branch_bus_t)
+        self.b = get_branch_susceptances(nc)
+        self.rates = nc.branch_rates
+
+        # injections per bus (MW)
+        self.Pd = nc.C_bus_load * (nc.load_s.real * nc.load_active)
+        self.Pg = nc.C_bus_gen * (nc.generator_p * nc.generator_active)
+        self.Pcap = nc.C_bus_gen * (nc.generator_pmax * nc.generator_active)
+        self.Pfix = nc.C_bus_static_generator * (nc.static_generator_s.real * nc.static_generator_active)
+        self.Pfix += nc.C_bus_batt * (nc.battery_p * nc.battery_active)
+
+        self.base_branch_active = nc.branch_active.astype(bool)
+        self.base_islands, self.base_bus_island = self.get_islands(self.base_branch_active)
+
+    def get_islands(self, branch_active, reuse=None):
+        """
+        Detect and factorize the islands of a topology
+        :param branch_active: array of branch states
+        :param reuse: function returning an existing island for the buses of a new island, or None
+        :return: list of CascadeIsland, island index of every bus
+        """
+        adj = tp.get_adjacency_matrix(C_branch_bus_f=self.nc.C_branch_bus_f,
+                                      C_branch_bus_t=self.nc.C_branch_bus_t,
+                                      branch_active=branch_active.astype(int),
+                                      bus_active=self.nc.bus_active)
+        labels, n_islands = tp.get_island_labels(adj)
+
+        active_br = np.where(branch_active)[0]
+        br_labels = labels[self.nc.F[active_br]]
+
+        islands = list()
+        for k, bus_idx in enumerate(tp.labels_to_islands(labels, n_islands)):
+            island = reuse(bus_idx) if reuse is not None else None
+            if island is None:
+                island = CascadeIsland(nc=self.nc, bus_idx=bus_idx, br_idx=active_br[br_labels == k],
+                                       A=self.A, b=self.b, Pcap=self.Pcap)
+            islands.append(island)
+
+        return islands, labels
+
+
+class CascadeSimulation:
+
+    def __init__(self, context: CascadeContext, load_scale=1.0):
+        """
+        State of a cascade
+        :param context: CascadeContext instance
+        :param load_scale: scaling of the loads
+        """
+        self.context = context
+        nc = context.nc
+
+        self.branch_active = context.base_branch_active.copy()
+        self.tripped = list()
+
+        self.Pd = context.Pd * load_scale
+        self.Pg = context.Pg.copy()
+        self.Pfix = context.Pfix.copy()
+        self.total_load = self.Pd.sum()
+        self.load_lost = 0.0
+        self.energized = np.zeros(nc.nbus, dtype=bool)
+
+        # the base islands are shared by all the cascades
+        self.islands = list(context.base_islands)
+        self.bus_island = context.base_bus_island.copy()
+
+        # compensation since the last factorization
+        self.failed = list()
+        self.H = np.zeros((nc.nbr, 0))
+        self.Htheta = np.zeros((nc.nbus, 0))
+        self.flows0 = np.zeros(nc.nbr)
+        self.theta0 = np.zeros(nc.nbus)
+        self.flows = np.zeros(nc.nbr)
+        self.theta = np.zeros(nc.nbus)
+
+        self.n_factorizations = 0
+
+        for island in self.islands:
+            self.balance(island)
+        self.solve()
+
+        # load shed before the cascade
+        self.base_load_lost = self.load_lost
+
+    def balance(self, island: CascadeIsland):
+        """
+        Balance the injections of an island with its generators, shedding load if there is not enough capacity.
+        The islands without generation are de-energized.
+        :param island: CascadeIsland
+        """
+        b = island.bus_idx
+        cap = self.context.Pcap[b]
+        capacity = cap.sum()
+        demand = self.Pd[b].sum()
+        fixed = self.Pfix[b].sum()
+
+        if capacity <= 0.0:
+            self.load_lost += demand
+            self.Pd[b] = 0.0
+            self.Pg[b] = 0.0
+            self.Pfix[b] = 0.0
+            self.energized[b] = False
+            return
+
+        need = demand - fixed
+        if need > capacity:
+            # shed the load in proportion
+            shed = need - capacity
+            self.Pd[b] *= 1.0 - shed / demand
+            self.load_lost += shed
+            need = capacity
+
+        if need < 0.0:
+            # spill the excess of non dispatchable generation
+            self.Pfix[b] *= demand / fixed
+            need = 0.0
+
+        # re-dispatch the generators on their headroom, or in proportion to their output when reducing
+        Pg = self.Pg[b]
+        delta = need - Pg.sum()
+        if delta > 0.0:
+            headroom = np.maximum(cap - Pg, 0.0)
+            Pg = Pg + headroom * (delta / headroom.sum())
+        elif delta < 0.0:
+            if Pg.sum() > 0.0:
+                Pg = Pg * (need / Pg.sum())
+            else:
+                Pg = cap * (need / capacity)
+        self.Pg[b] = Pg
+
+        self.energized[b] = True
+
+    def solve(self):
+        """
+        Solve the DC flows of the current topology with the factorized islands
+        """
+        P = self.Pg + self.Pfix - self.Pd
+        self.flows0 = np.zeros(self.context.nc.nbr)
+        self.theta0 = np.zeros(self.context.nc.nbus)
+
+        for island in self.islands:
+            theta = island.solve_angles(P[island.bus_idx])
+            self.theta0[island.bus_idx] = theta
+            self.flows0[island.br_idx] = island.Bf * theta
+
+        self.failed = list()
+        self.H = np.zeros((self.context.nc.nbr, 0))
+        self.Htheta = np.zeros((self.context.nc.nbus, 0))
+        self.flows = self.flows0.copy()
+        self.theta = self.theta0.copy()
+
+    def refactorize(self):
+        """
+        Detect the islands again after a split, factorizing and balancing only the islands that changed
+        """
+        nc = self.context.nc
+        dirty = {self.bus_island[nc.F[j]] for j in self.failed}
+        old_islands = self.islands
+        old_bus_island = self.bus_island
+
+        def reuse(bus_idx):
+            k = old_bus_island[bus_idx[0]]
+            if k not in dirty and len(old_islands[k].bus_idx) == len(bus_idx):
+                return old_islands[k]
+            return None
+
+        self.islands, self.bus_island = self.context.get_islands(self.branch_active, reuse=reuse)
+
+        for island in self.islands:
+            if island not in old_islands:
+                self.balance(island)
+                self.n_factorizations += 1
+
+        self.solve()
+
+    def get_transfer_factors(self, j):
+        """
+        Get the change of the flows and angles per unit of power transferred between the ends of a branch
+        :param j: branch index
+        :return: flows change (nbr), angles change (nbus)
+        """
+        nc = self.context.nc
+        island = self.islands[self.bus_island[nc.F[j]]]
+        f, t = np.searchsorted(island.bus_idx, [nc.F[j], nc.T[j]])
+
+        rhs = np.zeros(len(island.bus_idx))
+        rhs[f] = 1.0
+        rhs[t] -= 1.0
+        theta = island.solve_angles(rhs)
+
+        dflow = np.zeros(nc.nbr)
+        dflow[island.br_idx] = island.Bf * theta
+        dtheta = np.zeros(nc.nbus)
+        dtheta[island.bus_idx] = theta
+
+        return dflow, dtheta
+
+    def trip(self, br_idx, tol=1e-9):
+        """
+        Trip branches and update the flows
+        :param br_idx: indices of the branches to trip
+        :param tol: tolerance to detect the splitting of an island
+        """
+        new = [j for j in np.unique(br_idx) if self.branch_active[j]]
+        if len(new) == 0:
+            return
+
+        self.branch_active[new] = False
+        self.tripped += new
+
+        columns = [self.get_transfer_factors(j) for j in new]
+        self.failed += new
+        self.H = np.c_[self.H, np.array([c[0] for c in columns]).T]
+        self.Htheta = np.c_[self.Htheta, np.array([c[1] for c in columns]).T]
+
+        if len(self.failed) > self.context.options.max_rank:
+            self.refactorize()
+            return
+
+        M = np.eye(len(self.failed)) - self.H[self.failed, :]
+
+        if np.linalg.cond(M) * tol > 1.0:
+            # the tripped branches split an island
+            self.refactorize()
+            return
+
+        x = np.linalg.solve(M, self.flows0[self.failed])
+        self.flows = self.flows0 + np.dot(self.H, x)
+        self.flows[self.failed] = 0.0
+        self.theta = self.theta0 + np.dot(self.Htheta, x)
+
+    def get_loading(self):
+        """
+        Get the branch loading
+        """
+        rates = self.context.rates
+        return np.where(rates > 0, np.abs(self.flows) / (rates + 1e-20), 0.0)
+
+    def get_overloaded(self):
+        """
+        Get the indices of the active branches above the overload threshold
+        """
+        loading = self.get_loading()
+        return np.where(self.branch_active & (loading > self.context.options.overload_threshold))[0]
+
+    def get_neighbours(self, br_idx):
+        """
+        Get the active branches that share a bus with the given branches
+        :param br_idx: indices of the branches
+        """
+        nc = self.context.nc
+        buses = np.r_[nc.F[br_idx], nc.T[br_idx]]
+        touches = np.isin(nc.F, buses) | np.isin(nc.T, buses)
+        return np.where(self.branch_active & touches)[0]
+
+    def run(self, initial_idx, rng=np.random):
+        """
+        Run a random cascade until there are no more trips
+        :param initial_idx: indices of the branches that start the cascade
+        :param rng: random number generator
+        :return: number of steps
+        """
+        options = self.context.options
+        trips = np.array(initial_idx, dtype=int)
+        steps = 0
+
+        while len(trips) and steps < options.max_steps:
+            self.trip(trips)
+            steps += 1
+
+            over = self.get_overloaded()
+            if options.trip_probability < 1.0:
+                over = over[rng.rand(len(over)) < options.trip_probability]
+
+            if options.hidden_failure_probability > 0.0:
+                hidden = self.get_neighbours(trips)
+                hidden = hidden[rng.rand(len(hidden)) < options.hidden_failure_probability]
+                over = np.r_[over, hidden]
+
+            trips = np.unique(over)
+
+        return steps
+
+    @property
+    def blackout_size(self):
+        """
+        Load lost during the cascade (MW)
+        """
+        return self.load_lost - self.base_load_lost
+
+    def get_pf_results(self):
+        """
+        Get the current state as power flow results (DC)
+        :return: PowerFlowResults instance
+        """
+        nc = self.context.nc
+        results = PowerFlowResults(n=nc.nbus, m=nc.nbr, n_tr=nc.ntr, n_hvdc=nc.nhvdc,
+                                   bus_names=nc.bus_names, branch_names=nc.branch_names,
+                                   transformer_names=nc.tr_names, hvdc_names=nc.hvdc_names,
+                                   bus_types=nc.bus_types)
+        results.voltage = self.energized * np.exp(1j * self.theta / nc.Sbase)
+        results.Sbus = (self.Pg + self.Pfix - self.Pd) / nc.Sbase
+        results.Sbranch = self.flows.astype(complex)
+        results.loading = self.get_loading().astype(complex)
+        results.flow_direction = np.sign(self.flows)
+        return results
+
+
+def simulate_cascades(context: CascadeContext, n, seed=None):
+    """
+    Simulate random cascades
+    :param context: CascadeContext instance
+    :param n: number of cascades
+    :param seed: random seed
+    :return: blackout sizes (MW), number of tripped branches, number of steps, number of islands,
+             number of times that every branch tripped
+    """
+    options = context.options
+    rng = np.random.RandomState(seed)
+    candidates = np.where(context.base_branch_active)[0]
+
+    blackout = np.zeros(n)
+    n_tripped = np.zeros(n, dtype=int)
+    steps = np.zeros(n, dtype=int)
+    n_islands = np.zeros(n, dtype=int)
+    trip_count = np.zeros(context.nc.nbr, dtype=int)
+
+    for r in range(n):
+        scale = rng.uniform(options.load_scale_range[0], options.load_scale_range[1])
+        sim = CascadeSimulation(context, load_scale=scale)
+
+        initial = rng.choice(candidates, size=min(options.n_initial_outages, len(candidates)), replace=False)
+        steps[r] = sim.run(initial, rng)
+
+        blackout[r] = sim.blackout_size
+        n_tripped[r] = len(sim.tripped)
+        n_islands[r] = len(sim.islands)
+        trip_count[sim.tripped] += 1
+
+    return blackout, n_tripped, steps, n_islands, trip_count
+
+
+# context of the worker processes
+__cascade_context__ = None
+
+
+def init_cascade_worker(nc: SnapshotCircuit, options: CascadeOptions):
+    """
+    Initialize the context of a worker process
+    :param nc: SnapshotCircuit instance
+    :param options: CascadeOptions instance
+    """
+    global __cascade_context__
+    __cascade_context__ = CascadeContext(nc, options)
+
+
+def cascade_worker(args):
+    """
+    Simulate cascades in a worker process
+    :param args: tuple (number of cascades, random seed)
+    :return: see simulate_cascades
+    """
+    n, seed = args
+    return simulate_cascades(__cascade_context__, n, seed)
+
 
 ########################################################################################################################
 # Cascading classes
@@ -52,13 +515,10 @@ class CascadingReportElement:
 
 class CascadingResults:
 
-    def __init__(self, cascade_type: CascadeType):
+    def __init__(self):
         """
         Cascading results constructor
-        :param cascade_type: Cascade type
         """
-        self.cascade_type = cascade_type
-
         self.events = list()
 
     def get_failed_idx(self):
@@ -67,12 +527,9 @@ class CascadingResults:
         Returns:
             array of all failed branches
         """
-        res = None
-        for i in range(len(self.events)):
-            if i == 0:
-                res = self.events[i][0]
-            else:
-                res = np.r_[res, self.events[i][0]]
+        res = np.zeros(0, dtype=int)
+        for event in self.events:
+            res = np.r_[res, event.removed_idx]
 
         return res
 
@@ -93,22 +550,78 @@ class CascadingResults:
         pass
 
 
+class CascadingMonteCarloResults:
+
+    def __init__(self, branch_names, total_load):
+        """
+        Results of the random cascades
+        :param branch_names: array of branch names
+        :param total_load: total load of the circuit (MW)
+        """
+        self.branch_names = branch_names
+        self.total_load = total_load
+
+        self.blackout = np.zeros(0)
+        self.n_tripped = np.zeros(0, dtype=int)
+        self.steps = np.zeros(0, dtype=int)
+        self.n_islands = np.zeros(0, dtype=int)
+        self.trip_count = np.zeros(len(branch_names), dtype=int)
+
+    @property
+    def n_realisations(self):
+        return len(self.blackout)
+
+    def add(self, blackout, n_tripped, steps, n_islands, trip_count):
+        """
+        Add the results of a batch of cascades
+        """
+        self.blackout = np.r_[self.blackout, blackout]
+        self.n_tripped = np.r_[self.n_tripped, n_tripped]
+        self.steps = np.r_[self.steps, steps]
+        self.n_islands = np.r_[self.n_islands, n_islands]
+        self.trip_count += trip_count
+
+    def get_blackout_size_distribution(self, relative=True):
+        """
+        Get the complementary cumulative distribution of the blackout size
+        :param relative: use the fraction of the total load instead of MW
+        :return: sorted blackout sizes, probability of a blackout of that size or larger
+        """
+        sizes = self.blackout / self.total_load if relative and self.total_load > 0 else self.blackout
+        sizes = np.sort(sizes)
+        n = len(sizes)
+        return sizes, 1.0 - np.arange(n) / n
+
+    def get_table(self):
+        """
+        Get DataFrame with the summary of every cascade
+        """
+        data = np.c_[self.blackout, self.n_tripped, self.steps, self.n_islands]
+        return pd.DataFrame(data=data, columns=['Load lost (MW)', 'Tripped branches', 'Steps', 'Islands'])
+
+    def get_branch_table(self):
+        """
+        Get DataFrame with the frequency with which every branch tripped
+        """
+        freq = self.trip_count / max(self.n_realisations, 1)
+        return pd.DataFrame(data=freq, index=self.branch_names, columns=['Trip frequency'])
+
+
 class Cascading(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
     done_signal = Signal()
 
     def __init__(self, grid: MultiCircuit, options: PowerFlowOptions, triggering_idx=None, max_additional_islands=1,
-                 cascade_type_: CascadeType = CascadeType.LatinHypercube, n_lhs_samples_=1000):
+                 cascade_options: CascadeOptions = None):
         """
-        Constructor
+        Step by step cascade: at every step the overloaded branches trip, or the most loaded one if there are none
         Args:
             grid: MultiCircuit instance to cascade
             options: Power flow Options
             triggering_idx: branch indices to trigger first
             max_additional_islands: number of islands that shall be formed to consider a blackout
-            cascade_type_: Cascade simulation kind
-            n_lhs_samples_: number of latin hypercube samples if using LHS cascade
+            cascade_options: CascadeOptions instance
         """
 
         QThread.__init__(self)
@@ -117,6 +630,8 @@ class Cascading(QThread):
 
         self.options = options
 
+        self.cascade_options = cascade_options if cascade_options is not None else CascadeOptions()
+
         self.triggering_idx = triggering_idx
 
         self.__cancel__ = False
@@ -125,79 +640,19 @@ class Cascading(QThread):
 
         self.max_additional_islands = max_additional_islands
 
-        self.cascade_type = cascade_type_
-
-        self.n_lhs_samples = n_lhs_samples_
+        self.simulation = None
 
-        self.results = CascadingResults(self.cascade_type)
+        self.results = CascadingResults()
 
-    @staticmethod
-    def remove_elements(circuit: MultiCircuit, loading_vector, idx=None):
+    def initialize(self):
         """
-        Remove branches based on loading
-        Returns:
-            Nothing
+        Compile the circuit and start the cascade state
         """
-        criteria = 'None'
-        if idx is None:
-            load = abs(loading_vector)
-            idx = np.where(load > 1.0)[0]
-
-            if len(idx) == 0:
-                criteria = 'Loading'
-                idx = np.where(load >= load.max())[0]
-
-        # disable the selected branches
-        # print('Removing:', idx, load[idx])
-        branches = circuit.get_branches()
-        for i in idx:
-            branches[i].active = False
-
-        return idx, criteria
-
-    @staticmethod
-    def remove_probability_based(numerical_circuit: SnapshotCircuit, results: MonteCarloResults, max_val, min_prob):
-        """
-        Remove branches based on their chance of overload
-        :param numerical_circuit:
-        :param results:
-        :param max_val:
-        :param min_prob:
-        :return: list of indices actually removed
-        """
-        idx, val, prob, loading = results.get_index_loading_cdf(max_val=max_val)
-
-        any_removed = False
-        indices = list()
-        criteria = 'None'
-
-        for i, idx_val in enumerate(idx):
-            if prob[i] >= min_prob:
-                any_removed = True
-                numerical_circuit.branch_active[idx_val] = False
-                indices.append(idx_val)
-                criteria = 'Overload probability > ' + str(min_prob)
-
-        if not any_removed:
-
-            if len(loading) > 0:
-                if len(idx) > 0:
-                    # pick a random value
-                    idx_val = np.random.randint(0, len(idx))
-                    criteria = 'Random with overloads'
-
-                else:
-                    # pick the most loaded
-                    idx_val = int(np.where(loading == max(loading))[0][0])
-                    criteria = 'Max loading, Overloads not seen'
-
-                numerical_circuit.branch_active[idx_val] = False
-                indices.append(idx_val)
-            else:
-                indices = []
-                criteria = 'No branches'
-
-        return indices, criteria
+        nc = compile_snapshot_circuit(self.grid, branch_tolerance_mode=self.options.branch_impedance_tolerance_mode)
+        context = CascadeContext(nc, self.cascade_options)
+        self.simulation = CascadeSimulation(context)
+        self.results = CascadingResults()
+        self.current_step = 0
 
     def perform_step_run(self):
         """
@@ -205,104 +660,55 @@ class Cascading(QThread):
         Returns:
             Nothing
         """
+        if self.simulation is None:
+            self.initialize()
 
-        # initialize the simulator
-        if self.cascade_type is CascadeType.PowerFlow:
-            model_simulator = PowerFlowDriver(self.grid, self.options)
+        sim = self.simulation
 
-        elif self.cascade_type is CascadeType.LatinHypercube:
-            model_simulator = LatinHypercubeSampling(self.grid, self.options, sampling_points=self.n_lhs_samples)
-
-        else:
-            model_simulator = PowerFlowDriver(self.grid, self.options)
-
-        # For every circuit, run a power flow
-        # for c in self.grid.circuits:
-        model_simulator.run()
-
-        if self.current_step == 0:
+        if self.current_step == 0 and self.triggering_idx is not None:
             # the first iteration try to trigger the selected indices, if any
-            idx, criteria = self.remove_elements(self.grid, idx=self.triggering_idx,
-                                                 loading_vector=model_simulator.results.loading)
+            idx = np.array(self.triggering_idx, dtype=int)
+            criteria = 'Triggering'
         else:
-            # cascade normally
-            idx, criteria = self.remove_elements(self.grid, loading_vector=model_simulator.results.loading)
+            idx = sim.get_overloaded()
+            criteria = 'Overload'
+            if len(idx) == 0:
+                loading = np.where(sim.branch_active, sim.get_loading(), -1.0)
+                idx = np.array([np.argmax(loading)])
+                criteria = 'Loading'
+
+        sim.trip(idx)
 
         # store the removed indices and the results
-        entry = CascadingReportElement(idx, model_simulator.results, criteria)
+        entry = CascadingReportElement(idx, sim.get_pf_results(), criteria)
         self.results.events.append(entry)
 
         # increase the step number
         self.current_step += 1
 
-        # print(model_simulator.results.get_convergence_report())
-
-        # send the finnish signal
-        self.progress_signal.emit(0.0)
-        self.progress_text.emit('Done!')
-        self.done_signal.emit()
-
     def run(self):
         """
-        Run the monte carlo simulation
+        Run the cascade until the grid is split in the given number of additional islands
         @return:
         """
-
         self.__cancel__ = False
 
-        # compile
-        # print('Compiling...', end='')
-        numerical_circuit = self.grid.compile_time_series()
-        calculation_inputs = numerical_circuit.compute(branch_tolerance_mode=self.options.branch_impedance_tolerance_mode)
-
-        self.results = CascadingResults(self.cascade_type)
-
-        # initialize the simulator
-        if self.cascade_type is CascadeType.PowerFlow:
-            model_simulator = PowerFlowDriver(self.grid, self.options)
-
-        elif self.cascade_type is CascadeType.LatinHypercube:
-            model_simulator = LatinHypercubeSampling(self.grid, self.options, sampling_points=self.n_lhs_samples)
-
-        else:
-            model_simulator = PowerFlowDriver(self.grid, self.options)
-
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Running cascading failure...')
 
-        n_grids = len(calculation_inputs) + self.max_additional_islands
-        if n_grids > len(self.grid.buses):  # safety check
-            n_grids = len(self.grid.buses) - 1
+        self.initialize()
 
-        # print('n grids: ', n_grids)
+        n0 = len(self.simulation.islands)
+        n_grids = min(n0 + self.max_additional_islands, self.simulation.context.nc.nbus)
 
         it = 0
-        while len(calculation_inputs) <= n_grids and it <= n_grids:
-
-            # For every circuit, run a power flow
-            # for c in self.grid.circuits:
-            model_simulator.run()
-            # print(model_simulator.results.get_convergence_report())
-
-            # remove grid elements (branches)
-            idx, criteria = self.remove_probability_based(numerical_circuit, model_simulator.results, max_val=1.0, min_prob=0.1)
-
-            # store the removed indices and the results
-            entry = CascadingReportElement(idx, model_simulator.results, criteria)
-            self.results.events.append(entry)
+        while len(self.simulation.islands) < n_grids and self.simulation.branch_active.any() and not self.__cancel__:
 
-            # recompile grid
-            calculation_inputs = numerical_circuit.compute()
+            self.perform_step_run()
 
             it += 1
-
-            prog = max(len(calculation_inputs) / (n_grids+1), it/(n_grids+1))
-            self.progress_signal.emit(prog * 100.0)
-
-            if self.__cancel__:
-                break
-
-        print('Grid split into ', len(calculation_inputs), ' islands after', it, ' steps')
+            prog = max(len(self.simulation.islands) / (n_grids + 1), it / (n_grids + 1))
+            self.progress_signal.emit(min(prog, 1.0) * 100.0)
 
         # send the finnish signal
         self.progress_signal.emit(0.0)
@@ -333,3 +739,87 @@ class Cascading(QThread):
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Cancelled')
         self.done_signal.emit()
+
+
+class CascadingMonteCarlo(QThread):
+    progress_signal = Signal(float)
+    progress_text = Signal(str)
+    done_signal = Signal()
+    name = 'Cascading Monte Carlo'
+
+    def __init__(self, grid: MultiCircuit, options: CascadeOptions, batch_size=100):
+        """
+        Random cascades to get the distribution of the blackout size
+        :param grid: MultiCircuit instance
+        :param options: CascadeOptions instance
+        :param batch_size: number of cascades between progress reports
+        """
+        QThread.__init__(self)
+
+        self.grid = grid
+
+        self.options = options
+
+        self.batch_size = batch_size
+
+        self.results = None
+
+        self.pool = None
+
+        self.__cancel__ = False
+
+    def run(self):
+        """
+        Run the random cascades
+        """
+        self.__cancel__ = False
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Compiling...')
+
+        nc = compile_snapshot_circuit(self.grid)
+
+        rng = np.random.RandomState(self.options.seed)
+
+        if self.options.use_multiprocessing:
+            n_cores = multiprocessing.cpu_count()
+            self.pool = multiprocessing.Pool(n_cores, initializer=init_cascade_worker, initargs=(nc, self.options))
+            context = None
+        else:
+            n_cores = 1
+            context = CascadeContext(nc, self.options)
+
+        self.results = CascadingMonteCarloResults(branch_names=nc.branch_names,
+                                                  total_load=(nc.load_s.real * nc.load_active).sum())
+
+        n = self.options.n_realisations
+        while self.results.n_realisations < n and not self.__cancel__:
+
+            b = min(self.batch_size * n_cores, n - self.results.n_realisations)
+
+            if self.pool is not None:
+                chunks = [len(c) for c in np.array_split(np.arange(b), n_cores) if len(c)]
+                args = [(c, rng.randint(2 ** 31 - 1)) for c in chunks]
+                for res in self.pool.map(cascade_worker, args):
+                    self.results.add(*res)
+            else:
+                self.results.add(*simulate_cascades(context, b, rng.randint(2 ** 31 - 1)))
+
+            self.progress_text.emit('Simulated ' + str(self.results.n_realisations) + ' cascades')
+            self.progress_signal.emit(self.results.n_realisations / n * 100.0)
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Done!')
+        self.done_signal.emit()
+
+    def cancel(self):
+        """
+        Cancel the simulation
+        """
+        self.__cancel__ = True
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Cancelled')
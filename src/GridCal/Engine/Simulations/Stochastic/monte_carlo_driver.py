@@ -12,21 +12,19 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
-from numpy import complex, zeros, power
-
-import multiprocessing
+import numpy as np
+from typing import List
 from PySide2.QtCore import QThread, Signal
 
 from GridCal.Engine.basic_structures import Logger
-from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowResults
 from GridCal.Engine.Simulations.Stochastic.monte_carlo_results import MonteCarloResults
 from GridCal.Engine.Simulations.Stochastic.monte_carlo_input import MonteCarloInput
 from GridCal.Engine.Core.time_series_pf_data import TimeCircuit
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.basic_structures import CDF
-from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions, single_island_pf, \
-                                                                    power_flow_worker_args, power_flow_post_process
-
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions, single_island_pf
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import NRSolverContext
+from GridCal.Engine.Simulations.PowerFlow.batched_power_flow import batched_pf, can_run_batched
 from GridCal.Engine.Core.time_series_pf_data import compile_time_circuit, split_time_circuit_into_islands, BranchImpedanceMode
 
 ########################################################################################################################
@@ -34,10 +32,11 @@ from GridCal.Engine.Core.time_series_pf_data import compile_time_circuit, split_
 ########################################################################################################################
 
 
-def make_monte_carlo_input(numerical_input_island: TimeCircuit):
+def make_monte_carlo_input(numerical_input_island: TimeCircuit, max_points=1000):
     """
     Generate a monte carlo input instance
     :param numerical_input_island:
+    :param max_points: maximum number of quantiles stored per injection CDF
     :return:
     """
     n = numerical_input_island.nbus
@@ -46,13 +45,86 @@ def make_monte_carlo_input(numerical_input_island: TimeCircuit):
     Ycdf = [None] * n
 
     for i in range(n):
-        Scdf[i] = CDF(numerical_input_island.Sbus[i, :])
-        Icdf[i] = CDF(numerical_input_island.Ibus[i, :])
-        Ycdf[i] = CDF(numerical_input_island.Yshunt_from_devices[i, :])
+        Scdf[i] = CDF(numerical_input_island.Sbus[i, :], max_points=max_points)
+        Icdf[i] = CDF(numerical_input_island.Ibus[i, :], max_points=max_points)
+        Ycdf[i] = CDF(numerical_input_island.Yshunt_from_devices[i, :], max_points=max_points)
 
     return MonteCarloInput(n, Scdf, Icdf, Ycdf)
 
 
+def group_islands_by_state(islands: List[TimeCircuit]):
+    """
+    Group the time islands by topological state (the islands of a state share their time steps)
+    :param islands: list of TimeCircuit islands
+    :return: list of (number of time steps, list of islands)
+    """
+    states = dict()
+    for island in islands:
+        key = int(island.original_time_idx[0])
+        if key not in states:
+            states[key] = (len(island.original_time_idx), list())
+        states[key][1].append(island)
+
+    return list(states.values())
+
+
+def monte_carlo_island_batch(island: TimeCircuit, mc_input: MonteCarloInput, samples, options: PowerFlowOptions,
+                             logger: Logger, nr_context: NRSolverContext = None, use_latin_hypercube=False):
+    """
+    Sample the injections of an island and run the power flow of all the samples
+    :param island: TimeCircuit island
+    :param mc_input: MonteCarloInput of the island
+    :param samples: number of samples
+    :param options: PowerFlowOptions instance
+    :param logger: Logger instance
+    :param nr_context: NRSolverContext to reuse among batches (optional)
+    :param use_latin_hypercube: use Latin Hypercube to sample
+    :return: S, V (samples, nbus), Sbranch, loading, losses (samples, nbr)
+    """
+    S, I, Y = mc_input.sample(mc_input.get_uniform_points(samples, use_latin_hypercube=use_latin_hypercube))
+
+    V0 = np.repeat(island.Vbus[0, :][:, np.newaxis], samples, axis=1)
+    branch_rates = np.repeat(island.branch_rates[0, :][np.newaxis, :], samples, axis=0)
+
+    if can_run_batched(options):
+
+        # all the samples at once
+        V, Sbus, Sbranch, Ibranch, Vbranch, loading, losses, \
+            flow_direction, error, converged, iterations = batched_pf(circuit=island,
+                                                                      V0=V0,
+                                                                      Sbus=S.T,
+                                                                      Ibus=I.T,
+                                                                      branch_rates=branch_rates,
+                                                                      options=options,
+                                                                      logger=logger,
+                                                                      nr_context=nr_context)
+    else:
+
+        # the controls need the regular power flow, sample by sample
+        V = np.zeros((samples, island.nbus), dtype=complex)
+        Sbus = np.zeros((samples, island.nbus), dtype=complex)
+        Sbranch = np.zeros((samples, island.nbr), dtype=complex)
+        loading = np.zeros((samples, island.nbr), dtype=complex)
+        losses = np.zeros((samples, island.nbr), dtype=complex)
+
+        for k in range(samples):
+            res = single_island_pf(circuit=island,
+                                   Vbus=V0[:, k],
+                                   Sbus=S[k, :],
+                                   Ibus=I[k, :],
+                                   branch_rates=branch_rates[k, :],
+                                   options=options,
+                                   logger=logger,
+                                   nr_context=nr_context)
+            V[k, :] = res.voltage
+            Sbus[k, :] = res.Sbus
+            Sbranch[k, :] = res.Sbranch
+            loading[k, :] = res.loading
+            losses[k, :] = res.losses
+
+    return Sbus, V, Sbranch, loading, losses
+
+
 class MonteCarlo(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
@@ -60,14 +132,17 @@ class MonteCarlo(QThread):
     name = 'Monte Carlo'
 
     def __init__(self, grid: MultiCircuit, options: PowerFlowOptions, mc_tol=1e-3, batch_size=100, max_mc_iter=10000,
-                 opf_time_series_results=None):
+                 opf_time_series_results=None, use_latin_hypercube=False, max_points=10000):
         """
         Monte Carlo simulation constructor
         :param grid: MultiGrid instance
         :param options: Power flow options
-        :param mc_tol: monte carlo std.dev tolerance
+        :param mc_tol: monte carlo std.dev tolerance (standard error of the bus voltage modules average)
         :param batch_size: size of the batch
         :param max_mc_iter: maximum monte carlo iterations in case of not reach the precission
+        :param opf_time_series_results: OPF time series results to take the dispatch from (optional)
+        :param use_latin_hypercube: sample every batch with Latin Hypercube instead of uniform random sampling
+        :param max_points: maximum number of sampled points to keep for the CDF results
         """
         QThread.__init__(self)
 
@@ -82,13 +157,13 @@ class MonteCarlo(QThread):
         self.batch_size = batch_size
         self.max_mc_iter = max_mc_iter
 
-        self.results = None
+        self.use_latin_hypercube = use_latin_hypercube
 
-        self.logger = Logger()
+        self.max_points = max_points
 
-        self.pool = None
+        self.results = None
 
-        self.returned_results = list()
+        self.logger = Logger()
 
         self.__cancel__ = False
 
@@ -99,173 +174,15 @@ class MonteCarlo(QThread):
         p = self.results.points_number
         return ['point:' + str(l) for l in range(p)]
 
-    def update_progress_mt(self, res):
-        """
-        """
-        t, _ = res
-        progress = (t + 1) / self.max_mc_iter * 100
-        self.progress_signal.emit(progress)
-        self.returned_results.append(res)
-
-    def run_multi_thread(self):
-        """
-        Run the monte carlo simulation
-        @return: MonteCarloResults instance
-        """
-
-        self.__cancel__ = False
-
-        # initialize the grid time series results
-        # we will append the island results with another function
-        # self.circuit.time_series_results = TimeSeriesResults(0, 0, [])
-        self.pool = multiprocessing.Pool()
-        it = 0
-        variance_sum = 0.0
-        std_dev_progress = 0
-        v_variance = 0
-
-        n = len(self.circuit.buses)
-        m = self.circuit.get_branch_number()
-
-        mc_results = MonteCarloResults(n, m, name='Monte Carlo')
-        avg_res = PowerFlowResults()
-        avg_res.initialize(n, m)
-
-        # compile circuits
-        numerical_circuit = self.circuit.compile_time_series()
-
-        # perform the topological computation
-        calc_inputs_dict = numerical_circuit.compute(branch_tolerance_mode=self.options.branch_impedance_tolerance_mode,
-                                                     ignore_single_node_islands=self.options.ignore_single_node_islands)
-
-        mc_results.bus_types = numerical_circuit.bus_types
-
-        v_sum = zeros(n, dtype=complex)
-
-        self.progress_signal.emit(0.0)
-
-        while (std_dev_progress < 100.0) and (it < self.max_mc_iter) and not self.__cancel__:
-
-            self.progress_text.emit('Running Monte Carlo: Variance: ' + str(v_variance))
-
-            mc_results = MonteCarloResults(n, m, self.batch_size, name='Monte Carlo')
-
-            # for each partition of the profiles...
-            for t_key, calc_inputs in calc_inputs_dict.items():
-
-                # For every island, run the time series
-                for island_index, numerical_island in enumerate(calc_inputs):
-
-                    # set the time series as sampled
-                    monte_carlo_input = make_monte_carlo_input(numerical_island)
-                    mc_time_series = monte_carlo_input(self.batch_size, use_latin_hypercube=False)
-                    Vbus = numerical_island.Vbus
-                    branch_rates = numerical_island.branch_rates
-
-                    # short cut the indices
-                    b_idx = numerical_island.original_bus_idx
-                    br_idx = numerical_island.original_branch_idx
-
-                    self.returned_results = list()
-
-                    t = 0
-                    while t < self.batch_size and not self.__cancel__:
-
-                        Ysh, Ibus, Sbus = mc_time_series.get_at(t)
-
-                        args = (t, self.options, numerical_island, Vbus, Sbus, Ibus, branch_rates)
-
-                        self.pool.apply_async(power_flow_worker_args, (args,), callback=self.update_progress_mt)
-
-                    # wait for all jobs to complete
-                    self.pool.close()
-                    self.pool.join()
-
-                    # collect results
-                    self.progress_text.emit('Collecting batch results...')
-                    for t, res in self.returned_results:
-                        # store circuit results at the time index 't'
-                        mc_results.S_points[t, numerical_island.original_bus_idx] = res.Sbus
-                        mc_results.V_points[t, numerical_island.original_bus_idx] = res.voltage
-                        mc_results.Sbr_points[t, numerical_island.original_branch_idx] = res.Sbranch
-                        mc_results.loading_points[t, numerical_island.original_branch_idx] = res.loading
-                        mc_results.losses_points[t, numerical_island.original_branch_idx] = res.losses
-
-                    # compile MC results
-                    self.progress_text.emit('Compiling results...')
-                    mc_results.compile()
-
-                    # compute the island branch results
-                    island_avg_res = numerical_island.compute_branch_results(mc_results.voltage[b_idx])
-
-                    # apply the island averaged results
-                    avg_res.apply_from_island(island_avg_res, b_idx=b_idx, br_idx=br_idx)
-
-            # Compute the Monte Carlo values
-            it += self.batch_size
-            mc_results.append_batch(mc_results)
-            v_sum += mc_results.get_voltage_sum()
-            v_avg = v_sum / it
-            v_variance = abs((power(mc_results.V_points - v_avg, 2.0) / (it - 1)).min())
-
-            # progress
-            variance_sum += v_variance
-            err = variance_sum / it
-            if err == 0:
-                err = 1e-200  # to avoid division by zeros
-            mc_results.error_series.append(err)
-
-            # emmit the progress signal
-            std_dev_progress = 100 * self.mc_tol / err
-            if std_dev_progress > 100:
-                std_dev_progress = 100
-            self.progress_signal.emit(max((std_dev_progress, it / self.max_mc_iter * 100)))
-
-        # compute the averaged branch magnitudes
-        mc_results.sbranch = avg_res.Sbranch
-        mc_results.losses = avg_res.losses
-
-        # print('V mc: ', mc_results.voltage)
-
-        # send the finnish signal
-        self.progress_signal.emit(0.0)
-        self.progress_text.emit('Done!')
-        self.done_signal.emit()
-
-        return mc_results
-
     def run_single_thread(self):
         """
-        Run the monte carlo simulation
-        @return:
+        Run the monte carlo simulation by batches until the standard error of the voltage averages
+        is below the tolerance. The samples of every batch are solved at once with the batched power flow.
+        @return: MonteCarloResults instance
         """
 
         self.__cancel__ = False
 
-        # initialize the grid time series results
-        # we will append the island results with another function
-        # self.circuit.time_series_results = TimeSeriesResults(0, 0, [])
-        # Sbase = self.circuit.Sbase
-
-        it = 0
-        variance_sum = 0.0
-        std_dev_progress = 0
-        v_variance = 0
-
-        # n = len(self.circuit.buses)
-        # m = self.circuit.get_branch_number()
-        #
-        # # compile circuits
-        # numerical_circuit = self.circuit.compile_time_series()
-        #
-        # # perform the topological computation
-        # calc_inputs_dict = numerical_circuit.compute(branch_tolerance_mode=self.options.branch_impedance_tolerance_mode,
-        #                                              ignore_single_node_islands=self.options.ignore_single_node_islands)
-        #
-        # mc_results = MonteCarloResults(n, m, name='Monte Carlo')
-        # avg_res = PowerFlowResults()
-        # avg_res.initialize(n, m)
-
         # compile the multi-circuit
         numerical_circuit = compile_time_circuit(circuit=self.circuit,
                                                  apply_temperature=False,
@@ -276,135 +193,97 @@ class MonteCarlo(QThread):
         calculation_inputs = split_time_circuit_into_islands(numeric_circuit=numerical_circuit,
                                                              ignore_single_node_islands=self.options.ignore_single_node_islands)
 
-        mc_results_master = MonteCarloResults(n=numerical_circuit.nbus,
-                                              m=numerical_circuit.nbr,
-                                              p=self.max_mc_iter,
-                                              bus_names=numerical_circuit.bus_names,
-                                              branch_names=numerical_circuit.branch_names,
-                                              bus_types=numerical_circuit.bus_types,
-                                              name='Monte Carlo')
-
-        avg_res = PowerFlowResults(n=numerical_circuit.nbus,
-                                   m=numerical_circuit.nbr,
-                                   n_tr=numerical_circuit.ntr,
-                                   n_hvdc=numerical_circuit.nhvdc,
-                                   bus_names=numerical_circuit.bus_names,
-                                   branch_names=numerical_circuit.branch_names,
-                                   transformer_names=numerical_circuit.tr_names,
-                                   hvdc_names=numerical_circuit.hvdc_names,
-                                   bus_types=numerical_circuit.bus_types)
+        # the topological states are sampled with their frequency in the profiles
+        states = group_islands_by_state(calculation_inputs)
+        weights = np.array([nt for nt, islands in states], dtype=float)
+        weights /= weights.sum()
+
+        # the inputs and the solver contexts are built once for all the batches
+        state_inputs = [[(island, make_monte_carlo_input(island), NRSolverContext()) for island in islands]
+                        for nt, islands in states]
 
         n = numerical_circuit.nbus
         m = numerical_circuit.nbr
-        v_sum = zeros(n, dtype=complex)
+
+        mc_results = MonteCarloResults(n=n,
+                                       m=m,
+                                       p=min(self.max_mc_iter, self.max_points),
+                                       bus_names=numerical_circuit.bus_names,
+                                       branch_names=numerical_circuit.branch_names,
+                                       bus_types=numerical_circuit.bus_types,
+                                       name='Monte Carlo')
 
         self.progress_signal.emit(0.0)
 
-        while (std_dev_progress < 100.0) and (it < self.max_mc_iter) and not self.__cancel__:
-
-            self.progress_text.emit('Running Monte Carlo: Variance: ' + str(v_variance))
-
-            batch_results = MonteCarloResults(n=numerical_circuit.nbus,
-                                              m=numerical_circuit.nbr,
-                                              p=self.max_mc_iter,
-                                              bus_names=numerical_circuit.bus_names,
-                                              branch_names=numerical_circuit.branch_names,
-                                              bus_types=numerical_circuit.bus_types,
-                                              name='Monte Carlo')
-
-            # For every island, run the time series
-            for island_index, numerical_island in enumerate(calculation_inputs):
-
-                # short cut the indices
-                bus_idx = numerical_island.original_bus_idx
-                br_idx = numerical_island.original_branch_idx
-
-                # set the time series as sampled
-                monte_carlo_input = make_monte_carlo_input(numerical_island)
-                mc_time_series = monte_carlo_input(self.batch_size, use_latin_hypercube=False)
-                Vbus = numerical_island.Vbus[0, :]
-
-                # run the time series
-                for t in range(self.batch_size):
-                    # set the power values
-                    Y, I, S = mc_time_series.get_at(t)
-
-                    res = single_island_pf(circuit=numerical_island,
-                                           Vbus=Vbus,
-                                           Sbus=S,
-                                           Ibus=I,
-                                           branch_rates=numerical_island.branch_rates[0, :],
-                                           options=self.options,
-                                           logger=self.logger)
-
-                    batch_results.S_points[t, bus_idx] = res.Sbus
-                    batch_results.V_points[t, bus_idx] = res.voltage
-                    batch_results.Sbr_points[t, br_idx] = res.Sbranch
-                    batch_results.loading_points[t, br_idx] = res.loading
-                    batch_results.losses_points[t, br_idx] = res.losses
-
-                self.progress_text.emit('Compiling results...')
-                batch_results.compile()
-
-                # compute the island branch results
-                Sbranch, Ibranch, Vbranch, loading, \
-                losses, flow_direction, Sbus = power_flow_post_process(numerical_island,
-                                                                       Sbus=batch_results.S_points.mean(axis=0)[bus_idx],
-                                                                       V=batch_results.V_points.mean(axis=0)[bus_idx],
-                                                                       branch_rates=numerical_island.branch_rates[0, :])
-
-                # apply the island averaged results
-                avg_res.Sbus[bus_idx] = Sbus
-                avg_res.voltage[bus_idx] = batch_results.voltage[bus_idx]
-                avg_res.Sbranch[br_idx] = Sbranch
-                avg_res.Ibranch[br_idx] = Ibranch
-                avg_res.Vbranch[br_idx] = Vbranch
-                avg_res.loading[br_idx] = loading
-                avg_res.losses[br_idx] = losses
-                avg_res.flow_direction[br_idx] = flow_direction
-
-            # Compute the Monte Carlo values
-            it += self.batch_size
-            mc_results_master.append_batch(batch_results)
-            v_sum += mc_results_master.get_voltage_sum()
-            v_avg = v_sum / it
-            v_variance = abs((power(mc_results_master.V_points - v_avg, 2.0) / (it - 1)).min())
-
-            # progress
-            variance_sum += v_variance
-            err = variance_sum / it
-            if err == 0:
-                err = 1e-200  # to avoid division by zeros
-            mc_results_master.error_series.append(err)
+        it = 0
+        err = np.inf
+        while err > self.mc_tol and it < self.max_mc_iter and not self.__cancel__:
+
+            self.progress_text.emit('Running Monte Carlo: Error: ' + str(err))
+
+            b = min(self.batch_size, self.max_mc_iter - it)
+
+            S = np.zeros((b, n), dtype=complex)
+            V = np.zeros((b, n), dtype=complex)
+            Sbr = np.zeros((b, m), dtype=complex)
+            loading = np.zeros((b, m), dtype=complex)
+            losses = np.zeros((b, m), dtype=complex)
+
+            # split the batch among the topological states
+            counts = np.random.multinomial(b, weights)
+            a = 0
+            for inputs, cnt in zip(state_inputs, counts):
+
+                if cnt > 0:
+                    for island, mc_input, nr_context in inputs:
+                        bus_idx = island.original_bus_idx
+                        br_idx = island.original_branch_idx
+
+                        S[a:a + cnt, bus_idx], V[a:a + cnt, bus_idx], Sbr[a:a + cnt, br_idx], \
+                            loading[a:a + cnt, br_idx], \
+                            losses[a:a + cnt, br_idx] = monte_carlo_island_batch(island=island,
+                                                                                 mc_input=mc_input,
+                                                                                 samples=cnt,
+                                                                                 options=self.options,
+                                                                                 logger=self.logger,
+                                                                                 nr_context=nr_context,
+                                                                                 use_latin_hypercube=self.use_latin_hypercube)
+                a += cnt
+
+            # update the statistics (the points are not stored beyond max_points)
+            mc_results.add_batch(S, V, Sbr, loading, losses)
+            mc_results.record_checkpoint()
+            it += b
+
+            # convergence
+            err = mc_results.get_error()
+            mc_results.error_series.append(err)
 
             # emmit the progress signal
-            std_dev_progress = 100 * self.mc_tol / err
-            if std_dev_progress > 100:
-                std_dev_progress = 100
-            self.progress_signal.emit(max((std_dev_progress, it / self.max_mc_iter * 100)))
+            std_dev_progress = 100 * self.mc_tol / err if err > 0 else 100
+            self.progress_signal.emit(min(100.0, max((std_dev_progress, it / self.max_mc_iter * 100))))
 
         # compile results
-        mc_results_master.bus_types = numerical_circuit.bus_types
+        mc_results.trim()
+        mc_results.compile_checkpoints()
+        mc_results.bus_types = numerical_circuit.bus_types
 
         # send the finnish signal
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Done!')
         self.done_signal.emit()
 
-        return mc_results_master
+        return mc_results
 
     def run(self):
         """
         Run the monte carlo simulation
         @return:
         """
-        # print('LHS run')
         self.__cancel__ = False
 
-        if self.options.multi_thread:
-            self.results = self.run_multi_thread()
-        else:
-            self.results = self.run_single_thread()
+        # the samples of each batch are already solved at once, hence there is no multi-process version
+        self.results = self.run_single_thread()
 
         # send the finnish signal
         self.progress_signal.emit(0.0)
@@ -420,4 +299,3 @@ class MonteCarlo(QThread):
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Cancelled')
         self.done_signal.emit()
-
@@ -14,6 +14,7 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 import numpy as np
+from GridCal.Engine.basic_structures import get_quantile_table, sample_quantile_table
 from GridCal.Engine.Simulations.Stochastic.latin_hypercube_sampling import lhs
 from GridCal.Engine.Simulations.PowerFlow.time_Series_input import TimeSeriesInput
 
@@ -38,6 +39,37 @@ class MonteCarloInput:
 
         self.Ycdf = Ycdf
 
+        # inverse CDF tables to sample all the nodes at once
+        self.S_prob, self.S_table = get_quantile_table(Scdf, n)
+
+        self.I_prob, self.I_table = get_quantile_table(Icdf, n)
+
+        self.Y_prob, self.Y_table = get_quantile_table(Ycdf, n)
+
+    def sample(self, x):
+        """
+        Sample the injections of all the nodes at the given probabilities.
+        The same probability is used for the power, current and admittance of a node
+        :param x: matrix of values in [0, 1] (samples, n)
+        :return: S, I, Y matrices (samples, n)
+        """
+        S = sample_quantile_table(self.S_prob, self.S_table, x)
+        I = sample_quantile_table(self.I_prob, self.I_table, x)
+        Y = sample_quantile_table(self.Y_prob, self.Y_table, x)
+        return S, I, Y
+
+    def get_uniform_points(self, samples, use_latin_hypercube=False):
+        """
+        Get the uniformly distributed points used to sample the CDFs
+        :param samples: number of samples
+        :param use_latin_hypercube: use Latin Hypercube to sample
+        :return: matrix of values in [0, 1] (samples, n)
+        """
+        if use_latin_hypercube:
+            return lhs(self.n, samples=samples, criterion='center')
+        else:
+            return np.random.uniform(0.0, 1.0, (samples, self.n))
+
     def __call__(self, samples=0, use_latin_hypercube=False):
         """
         Call this object
@@ -45,41 +77,17 @@ class MonteCarloInput:
         :param use_latin_hypercube: use Latin Hypercube to sample
         :return: Time series object
         """
-        if use_latin_hypercube:
-
-            lhs_points = lhs(self.n, samples=samples, criterion='center')
-
-            if samples > 0:
-                S = np.zeros((samples, self.n), dtype=complex)
-                I = np.zeros((samples, self.n), dtype=complex)
-                Y = np.zeros((samples, self.n), dtype=complex)
-
-                for i in range(self.n):
-                    if self.Scdf[i] is not None:
-                        S[:, i] = self.Scdf[i].get_at(lhs_points[:, i])
-
-        else:
-            if samples > 0:
-                S = np.zeros((samples, self.n), dtype=complex)
-                I = np.zeros((samples, self.n), dtype=complex)
-                Y = np.zeros((samples, self.n), dtype=complex)
-
-                for i in range(self.n):
-                    if self.Scdf[i] is not None:
-                        S[:, i] = self.Scdf[i].get_sample(samples)
-            else:
-                S = np.zeros(self.n, dtype=complex)
-                I = np.zeros(self.n, dtype=complex)
-                Y = np.zeros(self.n, dtype=complex)
-
-                for i in range(self.n):
-                    if self.Scdf[i] is not None:
-                        S[i] = complex(self.Scdf[i].get_sample()[0])
+        S, I, Y = self.sample(self.get_uniform_points(max(samples, 1), use_latin_hypercube=use_latin_hypercube))
 
         time_series_input = TimeSeriesInput()
-        time_series_input.S = S
-        time_series_input.I = I
-        time_series_input.Y = Y
+        if samples > 0:
+            time_series_input.S = S
+            time_series_input.I = I
+            time_series_input.Y = Y
+        else:
+            time_series_input.S = S[0, :]
+            time_series_input.I = I[0, :]
+            time_series_input.Y = Y[0, :]
         time_series_input.valid = True
 
         return time_series_input
@@ -92,13 +100,7 @@ class MonteCarloInput:
 
         Returns: Time series object
         """
-        S = np.zeros((1, self.n), dtype=complex)
-        I = np.zeros((1, self.n), dtype=complex)
-        Y = np.zeros((1, self.n), dtype=complex)
-
-        for i in range(self.n):
-            if self.Scdf[i] is not None:
-                S[:, i] = self.Scdf[i].get_at(x[i])
+        S, I, Y = self.sample(np.array(x, dtype=float).reshape(1, self.n))
 
         time_series_input = TimeSeriesInput()
         time_series_input.S = S
@@ -107,4 +109,3 @@ class MonteCarloInput:
         time_series_input.valid = True
 
         return time_series_input
-
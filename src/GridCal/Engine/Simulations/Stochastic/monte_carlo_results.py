@@ -23,6 +23,46 @@ from GridCal.Engine.Simulations.result_types import ResultTypes
 from GridCal.Gui.GuiFunctions import ResultsModel
 
 
+class RunningStatistics:
+
+    def __init__(self, n):
+        """
+        Running mean and standard deviation of a vector magnitude, updated by batches of samples
+        (Welford's algorithm with Chan's batch combination), so that the samples need not be stored
+        :param n: number of elements of the magnitude
+        """
+        self.count = 0
+        self.mean = np.zeros(n)
+        self.m2 = np.zeros(n)
+
+    def update(self, x):
+        """
+        Add a batch of samples
+        :param x: matrix of samples (batch size, n)
+        """
+        b = x.shape[0]
+        if b == 0:
+            return
+
+        mean_b = x.mean(axis=0)
+        m2_b = ((x - mean_b) ** 2).sum(axis=0)
+
+        total = self.count + b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * (b / total)
+        self.m2 = self.m2 + m2_b + delta * delta * (self.count * b / total)
+        self.count = total
+
+    @property
+    def std(self):
+        """
+        Standard deviation of the samples added so far
+        """
+        if self.count == 0:
+            return np.zeros_like(self.m2)
+        return np.sqrt(self.m2 / self.count)
+
+
 class MonteCarloResults:
 
     def __init__(self, n, m, p, bus_names, branch_names, bus_types, name='Monte Carlo'):
@@ -59,6 +99,19 @@ class MonteCarloResults:
 
         self.error_series = list()
 
+        # number of samples simulated (only the first points_number are kept in the points arrays)
+        self.samples_number = 0
+
+        # running statistics of the magnitudes
+        self.v_stats = RunningStatistics(n)
+        self.s_stats = RunningStatistics(m)
+        self.l_stats = RunningStatistics(m)
+        self.loss_stats = RunningStatistics(m)
+
+        # number of samples at every convergence checkpoint
+        self.checkpoints = list()
+        self.convergence_lists = [list() for _ in range(8)]
+
         self.bus_types = np.zeros(n, dtype=int)
 
         self.voltage = np.zeros(n)
@@ -111,68 +164,131 @@ class MonteCarloResults:
         """
         return self.V_points.sum(axis=0)
 
-    def compile(self):
+    def reset_statistics(self):
         """
-        Compiles the final Monte Carlo values by running an online mean and
-        @return:
+        Clear the running statistics and the convergence checkpoints
+        """
+        self.v_stats = RunningStatistics(self.n)
+        self.s_stats = RunningStatistics(self.m)
+        self.l_stats = RunningStatistics(self.m)
+        self.loss_stats = RunningStatistics(self.m)
+        self.checkpoints = list()
+        self.convergence_lists = [list() for _ in range(8)]
+
+    def update_statistics(self, V, Sbr, loading, losses):
+        """
+        Add a batch of samples to the running statistics
+        :param V: voltages (batch size, n)
+        :param Sbr: branch power (batch size, m)
+        :param loading: branch loading (batch size, m)
+        :param losses: branch losses (batch size, m)
+        """
+        self.v_stats.update(np.abs(V))
+        self.s_stats.update(Sbr.real)
+        self.l_stats.update(loading.real)
+        self.loss_stats.update(losses.real)
+
+    def add_batch(self, S, V, Sbr, loading, losses):
+        """
+        Add a batch of samples: the statistics are updated, and the points are kept with reservoir sampling,
+        so that the points arrays always hold an unbiased subset of at most points_number samples
+        :param S: power injections (batch size, n)
+        :param V: voltages (batch size, n)
+        :param Sbr: branch power (batch size, m)
+        :param loading: branch loading (batch size, m)
+        :param losses: branch losses (batch size, m)
+        """
+        self.update_statistics(V, Sbr, loading, losses)
+
+        b = S.shape[0]
+        p = self.S_points.shape[0]
+        k = self.samples_number + np.arange(b)
+
+        # slot of the points arrays for every sample (-1 to discard it)
+        slots = np.full(b, -1, dtype=int)
+        fill = k < p
+        slots[fill] = k[fill]
+        replace = np.where(~fill)[0]
+        if len(replace):
+            j = np.random.randint(0, k[replace] + 1)
+            hit = j < p
+            slots[replace[hit]] = j[hit]
+
+        sel = np.where(slots >= 0)[0]
+        self.S_points[slots[sel], :] = S[sel, :]
+        self.V_points[slots[sel], :] = V[sel, :]
+        self.Sbr_points[slots[sel], :] = Sbr[sel, :]
+        self.loading_points[slots[sel], :] = loading[sel, :]
+        self.losses_points[slots[sel], :] = losses[sel, :]
+
+        self.samples_number += b
+
+    def record_checkpoint(self):
+        """
+        Store the current averages and standard deviations for the convergence plots
+        """
+        self.checkpoints.append(self.v_stats.count)
+        for lst, val in zip(self.convergence_lists, (self.v_stats.mean, self.v_stats.std,
+                                            self.s_stats.mean, self.s_stats.std,
+                                            self.l_stats.mean, self.l_stats.std,
+                                            self.loss_stats.mean, self.loss_stats.std)):
+            lst.append(val)
+
+    def get_error(self):
+        """
+        Standard error of the voltage module averages (the largest among the buses)
+        :return: error value
+        """
+        if self.v_stats.count < 2:
+            return np.inf
+        return (self.v_stats.std / np.sqrt(self.v_stats.count)).max()
+
+    def compile_checkpoints(self):
+        """
+        Compose the convergence arrays from the checkpoints and set the final averages
+        """
+        if len(self.checkpoints) == 0:
+            self.record_checkpoint()
+
+        self.v_avg_conv, self.v_std_conv, \
+        self.s_avg_conv, self.s_std_conv, \
+        self.l_avg_conv, self.l_std_conv, \
+        self.loss_avg_conv, self.loss_std_conv = [np.array(lst) for lst in self.convergence_lists]
+
+        self.voltage = self.v_stats.mean.copy()
+        self.sbranch = self.s_stats.mean.copy()
+        self.loading = self.l_stats.mean.copy()
+        self.losses = self.loss_stats.mean.copy()
+
+    def trim(self):
+        """
+        Remove the unused rows of the points arrays
+        """
+        p = min(self.samples_number, self.S_points.shape[0])
+        self.S_points = self.S_points[:p, :]
+        self.V_points = self.V_points[:p, :]
+        self.Sbr_points = self.Sbr_points[:p, :]
+        self.loading_points = self.loading_points[:p, :]
+        self.losses_points = self.losses_points[:p, :]
+        self.points_number = p
+
+    def compile(self, max_checkpoints=100):
+        """
+        Compiles the final Monte Carlo values from the points arrays,
+        computing the averages and standard deviations at up to max_checkpoints points
+        :param max_checkpoints: maximum number of convergence checkpoints
         """
-        p, n = self.V_points.shape
-        ni, m = self.Sbr_points.shape
-        step = 1
-        nn = int(np.floor(p / step) + 1)
-        self.v_std_conv = np.zeros((nn, n))
-        self.s_std_conv = np.zeros((nn, m))
-        self.l_std_conv = np.zeros((nn, m))
-        self.loss_std_conv = np.zeros((nn, m))
-        self.v_avg_conv = np.zeros((nn, n))
-        self.s_avg_conv = np.zeros((nn, m))
-        self.l_avg_conv = np.zeros((nn, m))
-        self.loss_avg_conv = np.zeros((nn, m))
-
-        v_mean = np.zeros(n)
-        c_mean = np.zeros(m)
-        l_mean = np.zeros(m)
-        loss_mean = np.zeros(m)
-        v_std = np.zeros(n)
-        c_std = np.zeros(m)
-        l_std = np.zeros(m)
-        loss_std = np.zeros(m)
-
-        for t in range(1, p, step):
-            v_mean_prev = v_mean.copy()
-            c_mean_prev = c_mean.copy()
-            l_mean_prev = l_mean.copy()
-            loss_mean_prev = loss_mean.copy()
-
-            v = np.abs(self.V_points[t, :])
-            c = self.Sbr_points[t, :].real
-            l = self.loading_points[t, :].real
-            loss = self.losses_points[t, :].real
-
-            v_mean += (v - v_mean) / t
-            v_std += (v - v_mean) * (v - v_mean_prev)
-            self.v_avg_conv[t] = v_mean
-            self.v_std_conv[t] = v_std / t
-
-            c_mean += (c - c_mean) / t
-            c_std += (c - c_mean) * (c - c_mean_prev)
-            self.s_std_conv[t] = c_std / t
-            self.s_avg_conv[t] = c_mean
-
-            l_mean += (l - l_mean) / t
-            l_std += (l - l_mean) * (l - l_mean_prev)
-            self.l_std_conv[t] = l_std / t
-            self.l_avg_conv[t] = l_mean
-
-            loss_mean += (loss - loss_mean) / t
-            loss_std += (loss - loss_mean) * (loss - loss_mean_prev)
-            self.loss_std_conv[t] = loss_std / t
-            self.loss_avg_conv[t] = loss_mean
-
-        self.voltage = self.v_avg_conv[-2]
-        self.sbranch = self.s_avg_conv[-2]
-        self.loading = self.l_avg_conv[-2]
-        self.losses = self.loss_avg_conv[-2]
+        p = self.V_points.shape[0]
+        step = max(1, int(np.ceil(p / max_checkpoints)))
+
+        self.reset_statistics()
+        for a in range(0, p, step):
+            b = min(a + step, p)
+            self.update_statistics(self.V_points[a:b, :], self.Sbr_points[a:b, :],
+                                   self.loading_points[a:b, :], self.losses_points[a:b, :])
+            self.record_checkpoint()
+
+        self.compile_checkpoints()
 
     def get_results_dict(self):
         """
@@ -301,56 +417,56 @@ class MonteCarloResults:
 
         if result_type == ResultTypes.BusVoltageAverage:
             labels = self.bus_names
-            y = self.v_avg_conv[1:-1, :]
+            y = self.v_avg_conv
             y_label = '(p.u.)'
             x_label = 'Sampling points'
             title = 'Bus voltage \naverage convergence'
 
         elif result_type == ResultTypes.BranchPowerAverage:
             labels = self.branch_names
-            y = self.s_avg_conv[1:-1, :]
+            y = self.s_avg_conv
             y_label = '(MW)'
             x_label = 'Sampling points'
             title = 'Branch power \naverage convergence'
 
         elif result_type == ResultTypes.BranchLoadingAverage:
             labels = self.branch_names
-            y = self.l_avg_conv[1:-1, :]
+            y = self.l_avg_conv
             y_label = '(%)'
             x_label = 'Sampling points'
             title = 'Branch loading \naverage convergence'
 
         elif result_type == ResultTypes.BranchLossesAverage:
             labels = self.branch_names
-            y = self.loss_avg_conv[1:-1, :]
+            y = self.loss_avg_conv
             y_label = '(MVA)'
             x_label = 'Sampling points'
             title = 'Branch losses \naverage convergence'
 
         elif result_type == ResultTypes.BusVoltageStd:
             labels = self.bus_names
-            y = self.v_std_conv[1:-1, :]
+            y = self.v_std_conv
             y_label = '(p.u.)'
             x_label = 'Sampling points'
             title = 'Bus voltage standard \ndeviation convergence'
 
         elif result_type == ResultTypes.BranchPowerStd:
             labels = self.branch_names
-            y = self.s_std_conv[1:-1, :]
+            y = self.s_std_conv
             y_label = '(MW)'
             x_label = 'Sampling points'
             title = 'Branch power standard \ndeviation convergence'
 
         elif result_type == ResultTypes.BranchLoadingStd:
             labels = self.branch_names
-            y = self.l_std_conv[1:-1, :]
+            y = self.l_std_conv
             y_label = '(%)'
             x_label = 'Sampling points'
             title = 'Branch loading standard \ndeviation convergence'
 
         elif result_type == ResultTypes.BranchLossesStd:
             labels = self.branch_names
-            y = self.loss_std_conv[1:-1, :]
+            y = self.loss_std_conv
             y_label = '(MVA)'
             x_label = 'Sampling points'
             title = 'Branch losses standard \ndeviation convergence'
@@ -398,7 +514,7 @@ class MonteCarloResults:
         if result_type not in cdf_result_types:
 
             # assemble model
-            index = np.arange(0, y.shape[0], 1)
+            index = np.array(self.checkpoints)
             mdl = ResultsModel(data=np.abs(y), index=index, columns=labels, title=title,
                                ylabel=y_label, xlabel=x_label, units=y_label)
 
@@ -12,190 +12,676 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
-
+import copy
+import multiprocessing
 import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
 
 from PySide2.QtCore import QThread, Signal
 
-from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions
+import GridCal.Engine.Core.topology as tp
+from GridCal.Engine.basic_structures import Logger, SolverType, BusMode
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.Core.snapshot_pf_data import SnapshotData
-from GridCal.Engine.Core.time_series_pf_data import SeriesData
+from GridCal.Engine.Core.snapshot_pf_data import SnapshotCircuit, compile_snapshot_circuit
+from GridCal.Engine.Simulations.PowerFlow.linearized_power_flow import lacpf
 from GridCal.Engine.Devices import DeviceType
 
 
-def get_failure_time(mttf):
+def get_reliability_events(horizon, mttf, mttr, n_years=1, rng=np.random):
     """
-    Get an array of possible failure times
-    :param mttf: mean time to failure
+    Get random fail-repair events of all the devices for a number of years at once
+    :param horizon: length of a year in hours
+    :param mttf: array of mean times to failure in hours (the devices with mttf <= 0 never fail)
+    :param mttr: array of mean times to recovery in hours
+    :param n_years: number of years to sample
+    :param rng: random number generator (numpy.random or a RandomState instance)
+    :return: arrays of event time in hours, year, device index and device state after the event (False: failed,
+             True: repaired), sorted by year and time
     """
-    n_samples = len(mttf)
-    return -1.0 * mttf * np.log(np.random.rand(n_samples))
+    candidates = np.where(mttf > 0)[0]
+    dev = np.tile(candidates, n_years)
+    year = np.repeat(np.arange(n_years), len(candidates))
+    t = np.zeros(len(dev))
 
+    times = list()
+    years = list()
+    devices = list()
+    states = list()
 
-def get_repair_time(mttr):
-    """
-    Get an array of possible repair times
-    :param mttr: mean time to recovery
-    """
-    n_samples = len(mttr)
-    return -1.0 * mttr * np.log(np.random.rand(n_samples))
+    # every fail-repair cycle is sampled for all the devices and years that did not reach the horizon yet
+    alive = np.arange(len(dev))
+    while len(alive) > 0:
 
+        for mean_time, state in ((mttf, False), (mttr, True)):
+            t[alive] += rng.exponential(mean_time[dev[alive]])
+            alive = alive[t[alive] < horizon]
 
-def get_reliability_events(horizon, mttf, mttr, tpe: DeviceType):
-    """
-    Get random fail-repair events until a given time horizon in hours
-    :param horizon: maximum horizon in hours
-    :return: list of events,
-    Each event tuple has: (time in hours, element index, activation state (True/False))
-    """
-    n_samples = len(mttf)
-    t = np.zeros(n_samples)
-    done = np.zeros(n_samples, dtype=bool)
-    events = list()
+            times.append(t[alive])
+            years.append(year[alive])
+            devices.append(dev[alive])
+            states.append(np.full(len(alive), state, dtype=bool))
 
-    if mttf.all() == 0.0:
-        return events
+    if len(times) == 0:
+        return np.zeros(0), np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0, dtype=bool)
 
-    not_done = np.where(done == False)[0]
-    not_done_s = set(not_done)
-    while len(not_done) > 0:  # if all event get to the horizon, finnish the sampling
+    times = np.concatenate(times)
+    years = np.concatenate(years)
+    devices = np.concatenate(devices)
+    states = np.concatenate(states)
 
-        # simulate failure
-        t[not_done] += get_failure_time(mttf[not_done])
-        idx = np.where(t >= horizon)[0]
-        done[idx] = True
+    order = np.lexsort((times, years))
 
-        # store failure events
-        events += [(t[i], tpe, i, False) for i in (not_done_s - set(idx))]
+    return times[order], years[order], devices[order], states[order]
 
-        # simulate repair
-        t[not_done] += get_repair_time(mttr[not_done])
-        idx = np.where(t >= horizon)[0]
-        done[idx] = True
 
-        # store recovery events
-        events += [(t[i], tpe, i, True) for i in (not_done_s - set(idx))]
+class ReliabilityComponents:
 
-        # update not done
-        not_done = np.where(done == False)[0]
-        not_done_s = set(not_done)
+    def __init__(self, nc: SnapshotCircuit):
+        """
+        Devices that can fail, in the order: branches, generators, batteries and static generators
+        :param nc: SnapshotCircuit instance
+        """
+        self.nbr = nc.nbr
+        self.ngen = nc.ngen
+        self.nbatt = nc.nbatt
+        self.nstagen = nc.nstagen
 
-    # sort in place
-    # events.sort(key=lambda tup: tup[0])
-    return events
+        self.names = np.r_[nc.branch_names, nc.generator_names, nc.battery_names, nc.static_generator_names]
 
+        self.types = np.array([DeviceType.BranchDevice] * nc.nbr +
+                              [DeviceType.GeneratorDevice] * nc.ngen +
+                              [DeviceType.BatteryDevice] * nc.nbatt +
+                              [DeviceType.StaticGeneratorDevice] * nc.nstagen, dtype=object)
 
-def get_reliability_scenario(nc: SnapshotData, horizon=10000):
-    """
-    Get reliability events
-    Args:
-        nc: numerical circuit instance
-        horizon: time horizon in hours
+        self.mttf = np.r_[nc.branch_mttf, nc.generator_mttf, nc.battery_mttf, nc.static_generator_mttf]
+        self.mttr = np.r_[nc.branch_mttr, nc.generator_mttr, nc.battery_mttr, nc.static_generator_mttr]
 
-    Returns: dictionary of events
-    Each event tuple has: (time in hours, element index, activation state (True/False))
-    """
-    all_events = list()
+        # base states
+        self.active = np.r_[nc.branch_active, nc.generator_active,
+                            nc.battery_active, nc.static_generator_active].astype(bool)
 
-    # branches
-    all_events += get_reliability_events(horizon, nc.branch_mttf, nc.branch_mttr, DeviceType.BranchDevice)
+    def __len__(self):
+        return len(self.names)
 
-    all_events += get_reliability_events(horizon, nc.generator_mttf, nc.generator_mttr, DeviceType.GeneratorDevice)
+    def get_states(self, failed):
+        """
+        Get the states of the devices of each type
+        :param failed: collection of failed component indices
+        :return: branch, generator, battery and static generator states
+        """
+        active = self.active.copy()
+        active[list(failed)] = False
 
-    all_events += get_reliability_events(horizon, nc.battery_mttf, nc.battery_mttr, DeviceType.BatteryDevice)
+        a = self.nbr
+        b = a + self.ngen
+        c = b + self.nbatt
 
-    all_events += get_reliability_events(horizon, nc.static_gen_mttf, nc.static_gen_mttr, DeviceType.StaticGeneratorDevice)
+        return active[:a], active[a:b], active[b:c], active[c:]
 
-    all_events += get_reliability_events(horizon, nc.load_mttf, nc.load_mttr, DeviceType.LoadDevice)
 
-    all_events += get_reliability_events(horizon, nc.shunt_mttf, nc.shunt_mttr, DeviceType.ShuntDevice)
+class ReliabilityIsland:
 
-    # sort all
-    all_events.sort(key=lambda tup: tup[0])
+    def __init__(self, nc: SnapshotCircuit, bus_idx, br_idx, branch_b, solver_type: SolverType):
+        """
+        Island of a topological state, with its DC factorization ready to compute flows and sensitivities
+        :param nc: SnapshotCircuit instance (with the admittances of the topological state in case of LACPF)
+        :param bus_idx: indices of the buses of the island
+        :param br_idx: indices of the active branches of the island
+        :param branch_b: array of branch susceptances for the DC approximation (nbr)
+        :param solver_type: SolverType.DC or SolverType.LACPF
+        """
+        self.bus_idx = bus_idx
+        self.br_idx = br_idx
+        self.solver_type = solver_type
+        self.Sbase = nc.Sbase
 
-    return all_events
+        n = len(bus_idx)
+        m = len(br_idx)
 
+        self.rates = nc.branch_rates[br_idx]
 
-def run_events(nc: SnapshotData, events_list: list):
+        # the slack is the island's slack bus or the bus with the largest generation capacity
+        types = nc.bus_types[bus_idx]
+        vd = np.where(types == BusMode.Slack.value)[0]
+        if len(vd):
+            self.vd = vd[:1]
+        else:
+            capacity = nc.C_bus_gen[bus_idx, :] * nc.generator_pmax
+            self.vd = np.array([np.argmax(capacity)])
+
+        non_slack = np.ones(n, dtype=bool)
+        non_slack[self.vd] = False
+        self.pqpv = np.where(non_slack)[0]
+
+        # DC model
+        pos = np.zeros(nc.nbus, dtype=int)
+        pos[bus_idx] = np.arange(n)
+        rows = np.r_[np.arange(m), np.arange(m)]
+        cols = np.r_[pos[nc.F[br_idx]], pos[nc.T[br_idx]]]
+        vals = np.r_[np.ones(m), -np.ones(m)]
+        A = sp.csc_matrix((vals, (rows, cols)), shape=(m, n))
+        self.Bf = sp.diags(branch_b[br_idx]) * A
+        Bbus = (A.T * self.Bf).tocsc()
+
+        if len(self.pqpv) and m > 0:
+            self.lu = splu(Bbus[np.ix_(self.pqpv, self.pqpv)].tocsc())
+        else:
+            self.lu = None
+
+        # linear AC model
+        if solver_type == SolverType.LACPF:
+            self.Ybus = nc.Ybus[np.ix_(bus_idx, bus_idx)]
+            self.Yseries = nc.Yseries[np.ix_(bus_idx, bus_idx)]
+            self.Yf = nc.Yf[np.ix_(br_idx, bus_idx)]
+            self.f = pos[nc.F[br_idx]]
+            self.Vset = nc.Vbus[bus_idx]
+            self.pv = np.where((types == BusMode.PV.value) & non_slack)[0]
+            self.pq = np.where((types != BusMode.PV.value) & non_slack)[0]
+
+    def get_angles(self, P):
+        """
+        Solve the DC voltage angles
+        :param P: array of active power injections (MW)
+        :return: voltage angles (scaled by Sbase)
+        """
+        theta = np.zeros(len(self.bus_idx))
+        if self.lu is not None:
+            theta[self.pqpv] = self.lu.solve(P[self.pqpv])
+        return theta
 
-    for t, tpe, i, state in events_list:
+    def get_flows(self, P, Q):
+        """
+        Get the branch flows
+        :param P: array of active power injections (MW)
+        :param Q: array of reactive power injections (MVAr)
+        :return: array of branch flows (MW for DC, MVA with the sign of the active power for LACPF)
+        """
+        if self.solver_type == SolverType.LACPF:
+            V = lacpf(self.Ybus, self.Yseries, (P + 1j * Q) / self.Sbase, 0, self.Vset, self.pq, self.pv)[0]
+            Sf = V[self.f] * np.conj(self.Yf * V) * self.Sbase
+            return np.abs(Sf) * np.sign(Sf.real)
+        else:
+            return self.Bf * self.get_angles(P)
 
-        # Set the state of the event
-        if tpe == DeviceType.BusDevice:
-            pass
+    def get_sensitivities(self, k):
+        """
+        Get the DC sensitivities of the flow of a branch to the injections of the buses (a PTDF row),
+        with a single solve of the transposed factorization
+        :param k: index of the branch in the island
+        :return: array of sensitivities (nbus of the island)
+        """
+        ptdf = np.zeros(len(self.bus_idx))
+        if self.lu is not None:
+            row = self.Bf[k, :].toarray()[0, :]
+            ptdf[self.pqpv] = self.lu.solve(row[self.pqpv], trans='T')
+        return ptdf
 
-        elif tpe == DeviceType.BranchDevice:
-            nc.branch_active[i] = state
+    def get_load_shedding(self, Pd, Qd, Pcap, Pfix, max_iter=100, tol=1e-3):
+        """
+        Curtail the load of the island to match the available generation and to remove the branch overloads.
+        The generators are dispatched in proportion to their capacity, and the overloads are solved greedily
+        by shedding the load with the largest relief per MW on the most overloaded branch.
+        :param Pd: array of active power demand per bus (MW)
+        :param Qd: array of reactive power demand per bus (MVAr)
+        :param Pcap: array of available dispatchable generation capacity per bus (MW)
+        :param Pfix: array of fixed (non dispatchable) active power injection per bus (MW)
+        :param max_iter: maximum number of network curtailment steps
+        :param tol: power tolerance (MW)
+        :return: array of load shedding per bus (MW)
+        """
+        demand = Pd.sum()
+        capacity = Pcap.sum()
+        fixed = Pfix.sum()
+
+        if capacity <= 0.0 or demand <= tol:
+            # without dispatchable generation the island is blacked out
+            return Pd.copy()
+
+        # adequacy: shed the deficit in proportion to the demand
+        deficit = demand - fixed - capacity
+        if deficit > tol:
+            shed = Pd * (deficit / demand)
+        else:
+            shed = np.zeros(len(Pd))
 
-        elif tpe == DeviceType.GeneratorDevice:
-            nc.generator_active[i] = state
+        # dispatch
+        w = Pcap / capacity
+        net = demand - shed.sum() - fixed
+        if net < 0.0:
+            # the excess of non dispatchable generation is spilled
+            Pfix = Pfix * ((demand - shed.sum()) / fixed)
+            net = 0.0
+        Pg = w * net
 
-        elif tpe == DeviceType.StaticGeneratorDevice:
-            nc.static_gen_active[i] = state
+        if len(self.br_idx) == 0:
+            return shed
 
-        elif tpe == DeviceType.BatteryDevice:
-            nc.battery_active[i] = state
+        # security: shed load until there are no overloads
+        constrained = self.rates > 0
+        for it in range(max_iter):
 
-        elif tpe == DeviceType.ShuntDevice:
-            nc.shunt_active[i] = state
+            P = Pg + Pfix - Pd + shed
+            Q = -Qd * (1.0 - shed / (Pd + 1e-20))
+            flow = self.get_flows(P, Q)
 
-        elif tpe == DeviceType.LoadDevice:
-            nc.load_active[i] = state
+            excess = np.where(constrained, np.abs(flow) - self.rates, 0.0)
+            k = np.argmax(excess)
+            if excess[k] <= tol:
+                break
 
-        else:
-            pass
+            # shedding 1 MW at a bus and reducing the generation by the weights w changes the flow by ptdf - w.ptdf
+            ptdf = self.get_sensitivities(k)
+            relief = -np.sign(flow[k]) * (ptdf - np.dot(w, ptdf))
+            relief[(Pd - shed) <= tol] = 0.0
+
+            i = np.argmax(relief)
+            if relief[i] <= 1e-6:
+                # the overload cannot be solved by shedding load
+                break
+
+            amount = min(Pd[i] - shed[i], excess[k] / relief[i])
+            shed[i] += amount
+            Pg -= w * amount
+
+        return shed
+
+
+class ReliabilityTopology:
+
+    def __init__(self, nc: SnapshotCircuit, branch_active, branch_b, solver_type: SolverType):
+        """
+        Islands of a topological state
+        :param nc: SnapshotCircuit instance
+        :param branch_active: array of branch states
+        :param branch_b: array of branch susceptances for the DC approximation
+        :param solver_type: SolverType.DC or SolverType.LACPF
+        """
+        A = tp.get_adjacency_matrix(C_branch_bus_f=nc.C_branch_bus_f,
+                                    C_branch_bus_t=nc.C_branch_bus_t,
+                                    branch_active=branch_active.astype(int),
+                                    bus_active=nc.bus_active)
+        labels, n_islands = tp.get_island_labels(A)
+        islands = tp.labels_to_islands(labels, n_islands)
+
+        if solver_type == SolverType.LACPF:
+            # admittances of the topological state, computed on a shallow copy to keep the circuit untouched
+            nc = copy.copy(nc)
+            nc.branch_active = branch_active.astype(int)
+            nc.compute_admittance_matrices(newton_raphson=True, linear_ac=True)
+
+        active_br = np.where(branch_active)[0]
+        br_labels = labels[nc.F[active_br]]
+
+        self.islands = [ReliabilityIsland(nc=nc,
+                                          bus_idx=bus_idx,
+                                          br_idx=active_br[br_labels == k],
+                                          branch_b=branch_b,
+                                          solver_type=solver_type)
+                        for k, bus_idx in enumerate(islands)]
+
+
+class ReliabilityOptions:
+
+    def __init__(self, solver_type: SolverType = SolverType.DC, horizon=8760.0, batch_size=50, max_years=1000,
+                 tolerance=0.05, use_multiprocessing=False, seed=None, max_curtailment_iter=100,
+                 curtailment_tol=1e-3, max_cached_states=100000):
+        """
+        Reliability study options
+        :param solver_type: SolverType.DC or SolverType.LACPF, to evaluate the flows of every state
+        :param horizon: length of the simulated years in hours
+        :param batch_size: number of years simulated between convergence checks
+        :param max_years: maximum number of simulated years
+        :param tolerance: convergence tolerance of the EENS estimate (coefficient of variation)
+        :param use_multiprocessing: simulate the years of every batch in parallel processes
+        :param seed: random seed (None for a random one)
+        :param max_curtailment_iter: maximum number of network curtailment steps per island and state
+        :param curtailment_tol: power tolerance in MW to consider that there is load shedding
+        :param max_cached_states: maximum number of evaluated states kept in the cache of each process
+        """
+        self.solver_type = solver_type
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.max_years = max_years
+        self.tolerance = tolerance
+        self.use_multiprocessing = use_multiprocessing
+        self.seed = seed
+        self.max_curtailment_iter = max_curtailment_iter
+        self.curtailment_tol = curtailment_tol
+        self.max_cached_states = max_cached_states
+
+
+class ReliabilityContext:
+
+    def __init__(self, nc: SnapshotCircuit, options: ReliabilityOptions):
+        """
+        Sequential Monte Carlo simulation context.
+        The islands and factorizations of every topological state and the load shedding of every state
+        are cached, so the outage combinations that repeat along the years are evaluated once.
+        :param nc: SnapshotCircuit instance
+        :param options: ReliabilityOptions instance
+        """
+        self.nc = nc
+        self.options = options
+        self.components = ReliabilityComponents(nc)
+
+        # DC susceptances (the dc lines use their resistance)
+        x = np.r_[nc.line_X, nc.tr_X, nc.vsc_X1, nc.dc_line_R]
+        self.branch_b = 1.0 / (x + 1e-20)
+
+        self.Pd = nc.C_bus_load * (nc.load_s.real * nc.load_active)
+        self.Qd = nc.C_bus_load * (nc.load_s.imag * nc.load_active)
+
+        self.topologies = dict()
+        self.states = dict()
+
+    def get_topology(self, failed_branches, branch_active):
+        """
+        Get the (cached) islands of a topological state
+        :param failed_branches: frozenset of failed branch indices
+        :param branch_active: array of branch states
+        :return: ReliabilityTopology
+        """
+        topology = self.topologies.get(failed_branches, None)
+        if topology is None:
+            topology = ReliabilityTopology(nc=self.nc,
+                                           branch_active=branch_active,
+                                           branch_b=self.branch_b,
+                                           solver_type=self.options.solver_type)
+            if len(self.topologies) < self.options.max_cached_states:
+                self.topologies[failed_branches] = topology
+        return topology
+
+    def evaluate(self, failed):
+        """
+        Get the (cached) load shedding of a state
+        :param failed: set of failed component indices
+        :return: total load shedding (MW), indices of the buses with load shedding, load shedding at those buses (MW)
+        """
+        key = frozenset(failed)
+        res = self.states.get(key, None)
+
+        if res is None:
+            nc = self.nc
+            br_active, gen_active, batt_active, stagen_active = self.components.get_states(key)
+            failed_branches = frozenset(i for i in key if i < self.components.nbr)
+            topology = self.get_topology(failed_branches, br_active)
+
+            Pcap = nc.C_bus_gen * (nc.generator_pmax * gen_active)
+            Pfix = nc.C_bus_static_generator * (nc.static_generator_s.real * stagen_active)
+            Pfix += nc.C_bus_batt * (nc.battery_p * batt_active)
+
+            shed = np.zeros(nc.nbus)
+            for island in topology.islands:
+                b = island.bus_idx
+                shed[b] = island.get_load_shedding(Pd=self.Pd[b], Qd=self.Qd[b], Pcap=Pcap[b], Pfix=Pfix[b],
+                                                   max_iter=self.options.max_curtailment_iter,
+                                                   tol=self.options.curtailment_tol)
+
+            idx = np.where(shed > self.options.curtailment_tol)[0]
+            res = (shed[idx].sum(), idx, shed[idx])
+
+            if len(self.states) < self.options.max_cached_states:
+                self.states[key] = res
+
+        return res
+
+    def simulate_years(self, n_years, seed=None):
+        """
+        Simulate a number of years chronologically
+        :param n_years: number of years
+        :param seed: random seed
+        :return: loss of load hours per year, energy not served per year (MWh),
+                 energy not served attributed to every component (MWh), energy not served at every bus (MWh)
+        """
+        horizon = self.options.horizon
+        tol = self.options.curtailment_tol
+        rng = np.random.RandomState(seed)
+
+        times, years, devices, states = get_reliability_events(horizon=horizon,
+                                                               mttf=self.components.mttf,
+                                                               mttr=self.components.mttr,
+                                                               n_years=n_years,
+                                                               rng=rng)
+
+        lol = np.zeros(n_years)
+        ens = np.zeros(n_years)
+        component_ens = np.zeros(len(self.components))
+        bus_ens = np.zeros(self.nc.nbus)
+
+        bounds = np.searchsorted(years, np.arange(n_years + 1))
 
-        # compile the grid information
-        calculation_islands = nc.compute()
+        for y in range(n_years):
+            a, b = bounds[y], bounds[y + 1]
+            failed = set()
+            t0 = 0.0
+
+            # the last interval goes up to the horizon
+            for t, d, repaired in zip(np.r_[times[a:b], horizon], np.r_[devices[a:b], -1], np.r_[states[a:b], True]):
+
+                dt = t - t0
+                if dt > 0.0:
+                    shed, idx, bus_shed = self.evaluate(failed)
+                    if shed > tol:
+                        lol[y] += dt
+                        ens[y] += shed * dt
+                        bus_ens[idx] += bus_shed * dt
+                        if len(failed):
+                            # the energy not served is split among the failed components
+                            component_ens[list(failed)] += shed * dt / len(failed)
+
+                if d >= 0:
+                    if repaired:
+                        failed.discard(d)
+                    else:
+                        failed.add(d)
+                t0 = t
+
+        return lol, ens, component_ens, bus_ens
+
+
+# context of the worker processes
+__reliability_context__ = None
+
+
+def init_reliability_worker(nc: SnapshotCircuit, options: ReliabilityOptions):
+    """
+    Initialize the context of a worker process, that is kept for all the batches
+    :param nc: SnapshotCircuit instance
+    :param options: ReliabilityOptions instance
+    """
+    global __reliability_context__
+    __reliability_context__ = ReliabilityContext(nc, options)
+
+
+def reliability_worker(args):
+    """
+    Simulate years in a worker process
+    :param args: tuple (number of years, random seed)
+    :return: see ReliabilityContext.simulate_years
+    """
+    n_years, seed = args
+    return __reliability_context__.simulate_years(n_years, seed)
+
+
+class ReliabilityResults:
+
+    def __init__(self, bus_names, component_names, component_types, horizon=8760.0):
+        """
+        Reliability study results
+        :param bus_names: array of bus names
+        :param component_names: array of names of the devices that can fail
+        :param component_types: array of DeviceType of the devices that can fail
+        :param horizon: length of the simulated years in hours
+        """
+        self.bus_names = bus_names
+        self.component_names = component_names
+        self.component_types = component_types
+        self.horizon = horizon
+
+        self.lol_years = np.zeros(0)
+        self.ens_years = np.zeros(0)
+        self.component_ens = np.zeros(len(component_names))
+        self.bus_ens = np.zeros(len(bus_names))
+
+        # convergence: (years, LOLE, EENS, error)
+        self.convergence = list()
+
+    @property
+    def n_years(self):
+        return len(self.ens_years)
+
+    @property
+    def lole(self):
+        """
+        Loss of load expectation (h/year)
+        """
+        return self.lol_years.mean() if self.n_years else 0.0
+
+    @property
+    def eens(self):
+        """
+        Expected energy not served (MWh/year)
+        """
+        return self.ens_years.mean() if self.n_years else 0.0
+
+    def add(self, lol, ens, component_ens, bus_ens):
+        """
+        Add the results of simulated years
+        :param lol: loss of load hours per year
+        :param ens: energy not served per year (MWh)
+        :param component_ens: energy not served attributed to the components (MWh)
+        :param bus_ens: energy not served at the buses (MWh)
+        """
+        self.lol_years = np.r_[self.lol_years, lol]
+        self.ens_years = np.r_[self.ens_years, ens]
+        self.component_ens += component_ens
+        self.bus_ens += bus_ens
+
+    def get_error(self):
+        """
+        Coefficient of variation of the EENS estimate
+        """
+        if self.n_years < 2 or self.eens <= 0.0:
+            return np.inf
+        return self.ens_years.std() / np.sqrt(self.n_years) / self.eens
+
+    def record_convergence(self):
+        """
+        Store the current estimates for the convergence tracking
+        """
+        self.convergence.append((self.n_years, self.lole, self.eens, self.get_error()))
+
+    def get_convergence_df(self):
+        """
+        Get the convergence tracking as a DataFrame
+        """
+        return pd.DataFrame(data=self.convergence, columns=['Years', 'LOLE (h/year)', 'EENS (MWh/year)', 'Error'])
+
+    def get_component_indices_df(self):
+        """
+        Get the contribution of every component to the EENS
+        """
+        n = max(self.n_years, 1)
+        total = self.component_ens.sum()
+        share = self.component_ens / total if total > 0 else np.zeros(len(self.component_ens))
+        data = np.c_[self.component_ens / n, share]
+        df = pd.DataFrame(data=data, index=self.component_names, columns=['EENS (MWh/year)', 'Share'])
+        df.insert(0, 'Type', [tpe.value for tpe in self.component_types])
+        return df
+
+    def get_bus_indices_df(self):
+        """
+        Get the EENS at every bus
+        """
+        n = max(self.n_years, 1)
+        return pd.DataFrame(data=self.bus_ens / n, index=self.bus_names, columns=['EENS (MWh/year)'])
 
 
 class ReliabilityStudy(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
     done_signal = Signal()
+    name = 'Reliability'
 
-    def __init__(self, circuit: MultiCircuit, pf_options: PowerFlowOptions):
+    def __init__(self, circuit: MultiCircuit, options: ReliabilityOptions):
         """
-        VoltageCollapse constructor
-        @param circuit: NumericalCircuit instance
-        @param pf_options: power flow options instance
+        Sequential Monte Carlo reliability study constructor
+        @param circuit: MultiCircuit instance
+        @param options: ReliabilityOptions instance
         """
         QThread.__init__(self)
 
         # MultiCircuit instance
         self.circuit = circuit
 
-        # voltage stability options
-        self.pf_options = pf_options
+        self.options = options
 
-        self.results = list()
+        self.results = None
 
-        self.__cancel__ = False
+        self.logger = Logger()
 
-    def progress_callback(self, l):
-        """
-        Send progress report
-        :param l: lambda value
-        :return: None
-        """
-        self.progress_text.emit('Running voltage collapse lambda:' + "{0:.2f}".format(l) + '...')
+        self.pool = None
+
+        self.__cancel__ = False
 
     def run(self):
         """
-        run the voltage collapse simulation
-        @return:
+        Run the sequential Monte Carlo simulation by batches of years until the EENS estimate converges
         """
-        print('Running voltage collapse...')
+        self.__cancel__ = False
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Compiling...')
+
+        nc = compile_snapshot_circuit(self.circuit)
+        components = ReliabilityComponents(nc)
+
+        self.results = ReliabilityResults(bus_names=nc.bus_names,
+                                          component_names=components.names,
+                                          component_types=components.types,
+                                          horizon=self.options.horizon)
+
+        rng = np.random.RandomState(self.options.seed)
+
+        if self.options.use_multiprocessing:
+            n_cores = multiprocessing.cpu_count()
+            self.pool = multiprocessing.Pool(n_cores, initializer=init_reliability_worker, initargs=(nc, self.options))
+            context = None
+        else:
+            n_cores = 1
+            context = ReliabilityContext(nc, self.options)
+
+        err = np.inf
+        while self.results.n_years < self.options.max_years and not self.__cancel__:
+
+            b = min(self.options.batch_size, self.options.max_years - self.results.n_years)
+
+            if self.pool is not None:
+                # split the batch among the processes
+                chunks = [len(c) for c in np.array_split(np.arange(b), n_cores) if len(c)]
+                args = [(c, rng.randint(2 ** 31 - 1)) for c in chunks]
+                for res in self.pool.map(reliability_worker, args):
+                    self.results.add(*res)
+            else:
+                self.results.add(*context.simulate_years(b, rng.randint(2 ** 31 - 1)))
+
+            err = self.results.get_error()
+            self.results.record_convergence()
 
-        # compile the numerical circuit
-        numerical_circuit = self.circuit.compile_snapshot()
+            self.progress_text.emit('Simulated ' + str(self.results.n_years) + ' years, error: ' + str(err))
+            progress = max(self.options.tolerance / err, self.results.n_years / self.options.max_years) * 100
+            self.progress_signal.emit(min(100.0, progress))
 
-        evt = get_reliability_scenario(numerical_circuit)
+            if err < self.options.tolerance:
+                break
 
-        run_events(nc=numerical_circuit, events_list=evt)
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
 
-        print('done!')
+        self.progress_signal.emit(0.0)
         self.progress_text.emit('Done!')
         self.done_signal.emit()
 
@@ -204,13 +690,15 @@ class ReliabilityStudy(QThread):
 
 
 if __name__ == '__main__':
-    from GridCal.Engine.All import MultiCircuit
+    from GridCal.Engine import FileOpen
 
     fname = '/home/santi/Documentos/GitHub/GridCal/Grids_and_profiles/grids/IEEE 30 Bus with storage.xlsx'
 
-    circuit_ = MultiCircuit()
-    circuit_.load_file(fname)
+    circuit_ = FileOpen(fname).open()
 
-    study = ReliabilityStudy(circuit=circuit_, pf_options=PowerFlowOptions())
+    study = ReliabilityStudy(circuit=circuit_, options=ReliabilityOptions())
+    study.run()
 
-    study.run()
\ No newline at end of file
+    print('LOLE:', study.results.lole, 'h/year')
+    print('EENS:', study.results.eens, 'MWh/year')
+    print(study.results.get_component_indices_df())
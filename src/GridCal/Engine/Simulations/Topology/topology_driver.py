@@ -23,6 +23,7 @@ from sklearn.cluster import DBSCAN
 from sklearn.preprocessing import Normalizer
 
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.topology import get_island_labels
 from GridCal.Engine.Devices.branch import BranchType
 from GridCal.Engine.Devices.bus import Bus
 from GridCal.Engine.Simulations.PTDF.ptdf_driver import PTDF
@@ -94,7 +95,6 @@ def reduce_grid_brute(circuit: MultiCircuit, removed_br_idx):
     n = len(circuit.buses)
     buses_dict = {bus: i for i, bus in enumerate(circuit.buses)}
     C = lil_matrix((m, n), dtype=int)
-    graph = nx.DiGraph()
 
     # TODO: Fix the topology reduction with the GC example, see what is going on
     branches = circuit.get_branches()
@@ -102,7 +102,6 @@ def reduce_grid_brute(circuit: MultiCircuit, removed_br_idx):
         # get the from and to bus indices
         f = buses_dict[branches[i].bus_from]
         t = buses_dict[branches[i].bus_to]
-        graph.add_edge(f, t)
         C[i, f] = 1
         C[i, t] = -1
 
@@ -119,10 +118,15 @@ def reduce_grid_brute(circuit: MultiCircuit, removed_br_idx):
     updated_bus = None
     updated_branches = list()
 
-    # get the number of paths
-    n_paths = len(list(nx.all_simple_paths(graph, f, t)))
+    # the branch is the only path between its buses if removing it disconnects them (instead of enumerating
+    # all the simple paths, which grows exponentially with the grid meshing)
+    keep = np.ones(m, dtype=bool)
+    keep[removed_br_idx] = False
+    C_red = abs(C[keep, :])
+    labels, n_islands = get_island_labels(C_red.T * C_red)
+    is_bridge = labels[f] != labels[t]
 
-    if n_paths == 1:
+    if is_bridge:
 
         # get the branches that are connected to the bus f
         adjacent_br_idx = get_branches_of_bus(C, f)
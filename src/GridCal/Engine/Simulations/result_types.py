@@ -42,6 +42,12 @@ class ResultTypes(Enum):
     HvdcLosses = 'HVDC losses', DeviceType.HVDCLineDevice
     HvdcSentPower = 'HVDC sent power', DeviceType.HVDCLineDevice
 
+    # Time series statistics
+    BusVoltageMax = 'Bus voltage max', DeviceType.BusDevice
+    BusVoltageMin = 'Bus voltage min', DeviceType.BusDevice
+    BranchLoadingMax = 'Branch loading max', DeviceType.BranchDevice
+    BranchOverloadCount = 'Branch overload count', DeviceType.BranchDevice
+
     # MonteCarlo
     BusVoltageAverage = 'Bus voltage avg', DeviceType.BusDevice
     BusVoltageStd = 'Bus voltage std', DeviceType.BusDevice
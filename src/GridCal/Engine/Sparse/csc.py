@@ -254,8 +254,11 @@ class CscMat(csc_matrix):
         Find islands in the matrix
         :return: list of islands
         """
-        islands = find_islands(self.n, self.indptr, self.indices)
-        return [np.sort(island) for island in islands]
+        # imported here to avoid the circular import with GridCal.Engine.Core
+        from GridCal.Engine.Core.topology import find_islands_numba, labels_to_islands
+
+        labels, n_islands = find_islands_numba(self.n, self.indptr.astype(np.int64), self.indices.astype(np.int64))
+        return labels_to_islands(labels, n_islands)
 
 
 def scipy_to_mat(scipy_mat: csc_matrix):
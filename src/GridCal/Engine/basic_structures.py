@@ -202,21 +202,69 @@ class TapsControlMode(Enum):
     Iterative = "Iterative"
 
 
+class TimeSeriesInitialization(Enum):
+    """
+    Initial voltage guess of every time step of the time series power flow:
+
+    **Profile**: The voltage set in the profiles (flat start with the voltage set points).
+
+    **PreviousSolution**: The solution of the previous time step.
+
+    **LinearExtrapolation**: Linear extrapolation of the module and angle from the last two solutions.
+
+    **QuadraticExtrapolation**: Quadratic extrapolation of the module and angle from the last three solutions.
+
+    **LinearPredictor**: Solution of the linearized AC power flow of the time step.
+
+    The slack voltages and the PV voltage modules are always taken from the profile.
+    """
+
+    Profile = 'Profile'
+    PreviousSolution = 'Previous solution'
+    LinearExtrapolation = 'Linear extrapolation'
+    QuadraticExtrapolation = 'Quadratic extrapolation'
+    LinearPredictor = 'Linear AC predictor'
+
+
 class SyncIssueType(Enum):
     Added = 'Added'
     Deleted = 'Deleted'
     Conflict = 'Conflict'
 
 
+def compress_sorted(arr, npoints):
+    """
+    Compress a sorted array (along the first axis) into a table of npoints quantiles
+    equally spaced in probability, by linear interpolation
+    :param arr: sorted array (n) or (n, m)
+    :param npoints: number of quantiles
+    :return: quantile table (npoints) or (npoints, m)
+    """
+    n = arr.shape[0]
+    if n <= npoints:
+        return arr
+
+    pos = np.linspace(0.0, n - 1, npoints)
+    lo = np.minimum(pos.astype(int), n - 2)
+    w = pos - lo
+    if arr.ndim > 1:
+        w = w[:, np.newaxis]
+
+    return arr[lo] * (1.0 - w) + arr[lo + 1] * w
+
+
 class CDF:
     """
-    Inverse Cumulative density function of a given array of data
+    Inverse Cumulative density function of a given array of data.
+    The data is stored as a table of quantiles equally spaced in probability: the sorted data itself,
+    or its compression into max_points quantiles to cap the memory
     """
 
-    def __init__(self, data):
+    def __init__(self, data, max_points=None):
         """
         Constructor
         @param data: Array (list or numpy array)
+        @param max_points: maximum number of quantiles to store (None to store all the sorted data)
         """
         # Create the CDF of the data
         # sort the data:
@@ -226,10 +274,13 @@ class CDF:
         else:
             self.arr = sort(data, axis=0)
 
+        if max_points is not None:
+            self.arr = compress_sorted(self.arr, max_points)
+
         self.iscomplex = iscomplexobj(self.arr)
 
         # calculate the proportional values of samples
-        n = len(data)
+        n = len(self.arr)
         if n > 1:
             self.prob = arange(n, dtype=float) / (n - 1)
         else:
@@ -267,13 +318,27 @@ class CDF:
         self.idx += 1
         return self.arr[self.idx - 1]
 
+    def convolve(self, other, sign=1.0, max_points=512):
+        """
+        Distribution of the sum (or difference) of this variable and an independent one.
+        Both quantile tables are compressed to max_points, all the pairs are combined at once
+        and the result is compressed back to max_points quantiles.
+        @param other: CDF object
+        @param sign: 1 for the sum, -1 for the difference
+        @param max_points: size of the quantile tables used in the convolution
+        @return: A CDF object
+        """
+        a = compress_sorted(self.arr, max_points)
+        b = compress_sorted(other.arr, max_points)
+        return CDF(np.add.outer(a, sign * b).ravel(), max_points=max_points)
+
     def __add__(self, other):
         """
         Sum of two CDF
         @param other:
         @return: A CDF object with the sum of other CDF to this CDF
         """
-        return CDF(array([a + b for a in self.arr for b in other]))
+        return self.convolve(other, sign=1.0)
 
     def __sub__(self, other):
         """
@@ -281,7 +346,7 @@ class CDF:
         @param other:
         @return: A CDF object with the subtraction a a CDF to this CDF
         """
-        return CDF(array([a - b for a in self.arr for b in other]))
+        return self.convolve(other, sign=-1.0)
 
     def get_sample(self, npoints=1):
         """
@@ -291,12 +356,7 @@ class CDF:
         @return: Corresponding probabilities
         """
         pt = np.random.uniform(0, 1, npoints)
-        if self.iscomplex:
-            a = interp(pt, self.prob, self.arr.real)
-            b = interp(pt, self.prob, self.arr.imag)
-            return a + 1j * b
-        else:
-            return interp(pt, self.prob, self.arr)
+        return self.get_at(pt)
 
     def get_at(self, prob):
         """
@@ -327,6 +387,49 @@ class CDF:
         # ax.plot(self.norm_points, self.values, 'x')
 
 
+def get_quantile_table(cdfs, n, dtype=complex):
+    """
+    Tabulate the inverse CDF of many variables in a common probability grid,
+    so that all of them can be sampled at once.
+    The grid contains the probabilities of every CDF, hence sampling the table is the same as CDF.get_at
+    :param cdfs: list of CDF objects (or None for the variables that are always zero)
+    :param n: number of variables
+    :param dtype: data type of the table
+    :return: probabilities of the grid (npoints), table of values (npoints, n)
+    """
+    probs = [cdf.prob for cdf in cdfs if cdf is not None and cdf.len > 1]
+    prob = np.unique(np.concatenate(probs)) if len(probs) else np.zeros(1)
+
+    table = np.zeros((len(prob), n), dtype=dtype)
+    for i, cdf in enumerate(cdfs):
+        if cdf is not None and cdf.len > 0:
+            table[:, i] = cdf.get_at(prob)
+
+    return prob, table
+
+
+def sample_quantile_table(prob, table, x):
+    """
+    Inverse transform sampling of all the variables of a quantile table at once
+    :param prob: probabilities of the grid (npoints)
+    :param table: table of values (npoints, n)
+    :param x: matrix of values in [0, 1] (samples, n)
+    :return: matrix of samples (samples, n)
+    """
+    npoints, n = table.shape
+
+    if npoints == 1:
+        return np.repeat(table, x.shape[0], axis=0)
+
+    # linear interpolation in the probability grid
+    x = np.clip(x, 0.0, 1.0)
+    lo = np.clip(np.searchsorted(prob, x, side='right') - 1, 0, npoints - 2)
+    w = (x - prob[lo]) / (prob[lo + 1] - prob[lo])
+    col = np.arange(n)[np.newaxis, :]
+
+    return table[lo, col] * (1.0 - w) + table[lo + 1, col] * w
+
+
 class StatisticalCharacterization:
     """
     Object to store the statistical characterization
@@ -336,34 +439,24 @@ class StatisticalCharacterization:
     - grouped by hour
     """
 
-    def __init__(self, gen_P, load_P, load_Q):
+    def __init__(self, gen_P, load_P, load_Q, max_points=1000):
         """
         Constructor
         @param gen_P: 2D array with the active power generation profiles (time, generator)
         @param load_P: 2D array with the active power load profiles (time, load)
         @param load_Q: 2D array with the reactive power load profiles time, load)
+        @param max_points: maximum number of quantiles stored per profile
         @return:
         """
         # Arrays where to store the statistical laws for sampling
-        self.gen_P_laws = list()
-        self.load_P_laws = list()
-        self.load_Q_laws = list()
-
-        # Create a CDF for every profile
-        rows, cols = shape(gen_P)
-        for i in range(cols):
-            cdf = CDF(gen_P[:, i])
-            self.gen_P_laws.append(cdf)
-
-        rows, cols = shape(load_P)
-        for i in range(cols):
-            cdf = CDF(load_P[:, i])
-            self.load_P_laws.append(cdf)
-
-        rows, cols = shape(load_Q)
-        for i in range(cols):
-            cdf = CDF(load_Q[:, i])
-            self.load_Q_laws.append(cdf)
+        self.gen_P_laws = [CDF(gen_P[:, i], max_points=max_points) for i in range(shape(gen_P)[1])]
+        self.load_P_laws = [CDF(load_P[:, i], max_points=max_points) for i in range(shape(load_P)[1])]
+        self.load_Q_laws = [CDF(load_Q[:, i], max_points=max_points) for i in range(shape(load_Q)[1])]
+
+        # quantile tables to sample all the laws at once
+        self.gen_P_prob, self.gen_P_table = get_quantile_table(self.gen_P_laws, len(self.gen_P_laws), float)
+        self.load_P_prob, self.load_P_table = get_quantile_table(self.load_P_laws, len(self.load_P_laws), float)
+        self.load_Q_prob, self.load_Q_table = get_quantile_table(self.load_Q_laws, len(self.load_Q_laws), float)
 
     def get_sample(self, load_enabled_idx, gen_enabled_idx, npoints=1):
         """
@@ -375,37 +468,22 @@ class StatisticalCharacterization:
         PG: generators profile
         S: loads profile
         """
-        # nlp = len(self.load_P_laws)
-        # nlq = len(self.load_Q_laws)
-        # ngp = len(self.gen_P_laws)
-        nlp = len(load_enabled_idx)
-        ngp = len(gen_enabled_idx)
-
         if len(self.load_P_laws) != len(self.load_Q_laws):
             raise Exception('Different number of elements in the load active and reactive profiles.')
 
-        P = [None] * nlp
-        Q = [None] * nlp
-        PG = [None] * ngp
-
-        k = 0
-        for i in load_enabled_idx:
-            P[k] = self.load_P_laws[i].get_sample(npoints)
-            Q[k] = self.load_Q_laws[i].get_sample(npoints)
-            k += 1
-
-        k = 0
-        for i in gen_enabled_idx:
-            PG[k] = self.gen_P_laws[i].get_sample(npoints)
-            k += 1
-
-        P = array(P)
-        Q = array(Q)
-        S = P + 1j * Q
+        load_enabled_idx = np.array(load_enabled_idx, dtype=int)
+        gen_enabled_idx = np.array(gen_enabled_idx, dtype=int)
+        nlp = len(load_enabled_idx)
+        ngp = len(gen_enabled_idx)
 
-        PG = array(PG)
+        P = sample_quantile_table(self.load_P_prob, self.load_P_table[:, load_enabled_idx],
+                                  np.random.uniform(0, 1, (npoints, nlp)))
+        Q = sample_quantile_table(self.load_Q_prob, self.load_Q_table[:, load_enabled_idx],
+                                  np.random.uniform(0, 1, (npoints, nlp)))
+        PG = sample_quantile_table(self.gen_P_prob, self.gen_P_table[:, gen_enabled_idx],
+                                   np.random.uniform(0, 1, (npoints, ngp)))
 
-        return PG.transpose(), S.transpose()
+        return PG, P + 1j * Q
 
     def plot(self, ax):
         """
@@ -418,11 +496,11 @@ class StatisticalCharacterization:
             ax = fig.add_subplot(111)
 
         for cdf in self.gen_P_laws:
-            ax.plot(cdf.prob, cdf.data_sorted, color='r', marker='x')
+            ax.plot(cdf.prob, cdf.arr, color='r', marker='x')
         for cdf in self.load_P_laws:
-            ax.plot(cdf.prob, cdf.data_sorted, color='g', marker='x')
+            ax.plot(cdf.prob, cdf.arr, color='g', marker='x')
         for cdf in self.load_Q_laws:
-            ax.plot(cdf.prob, cdf.data_sorted, color='b', marker='x')
+            ax.plot(cdf.prob, cdf.arr, color='b', marker='x')
         ax.set_xlabel('$p(x)$')
         ax.set_ylabel('$x$')
 
@@ -1334,7 +1334,8 @@ class ResultsModel(QtCore.QAbstractTableModel):
             else:
                 names = [str(val) for val in self.cols_c]
 
-            values = self.data_c
+            # the data may be stored in a file (H5Array): read it
+            values = np.asarray(self.data_c)
 
             return self.index_c, names, values
         else:
@@ -626,7 +626,7 @@ class MainGUI(QMainWindow):
                 file_name = events[0].toLocalFile()
                 name, file_extension = os.path.splitext(file_name)
                 accepted = ['.gridcal', '.xlsx', '.xls', '.sqlite',
-                            '.dgs', '.m', '.raw', '.RAW', '.json', '.xml', '.dpx']
+                            '.dgs', '.m', '.raw', '.RAW', '.json', '.xml', '.zip', '.dpx']
                 if file_extension.lower() in accepted:
 
                     if len(self.circuit.buses) > 0:
@@ -1011,7 +1011,7 @@ class MainGUI(QMainWindow):
         Open file from a Qt thread to remain responsive
         """
 
-        files_types = "Formats (*.gridcal *.xlsx *.xls *.sqlite *.dgs *.m *.raw *.RAW *.json *.xml *.dpx)"
+        files_types = "Formats (*.gridcal *.xlsx *.xls *.sqlite *.dgs *.m *.raw *.RAW *.json *.xml *.zip *.dpx)"
         # files_types = ''
         # call dialog to select the file
 
@@ -1353,7 +1353,7 @@ class MainGUI(QMainWindow):
 
         if len(available_results) > 0:
 
-            files_types = "Zip file (*.zip)"
+            files_types = "Zip file (*.zip);;HDF5 file (*.h5)"
             fname = os.path.join(self.project_directory, 'Results of ' + self.grid_editor.name_label.text())
             options = QFileDialog.Options()
             if self.use_native_dialogues:
@@ -1363,6 +1363,12 @@ class MainGUI(QMainWindow):
                                                                   options=options)
 
             if filename != "":
+
+                # if the user did not enter the extension, add it automatically
+                name, file_extension = os.path.splitext(filename)
+                if file_extension == '':
+                    filename = name + ('.h5' if 'h5' in type_selected else '.zip')
+
                 self.LOCK()
 
                 self.stuff_running_now.append('export_all')
@@ -2680,12 +2686,12 @@ class MainGUI(QMainWindow):
             self.remove_simulation(SimulationTypes.TimeSeries_run)
 
             if self.ui.draw_schematic_checkBox.isChecked():
-                voltage = self.time_series.results.voltage.max(axis=0)
-                loading = np.abs(self.time_series.results.loading).max(axis=0)
-                Sbranch = self.time_series.results.Sbranch.max(axis=0)
-
+                # use the statistics computed along the simulation, the full arrays may not be kept
                 colour_the_schematic(circuit=self.circuit,
-                                     s_bus=None, s_branch=Sbranch, voltages=voltage, loadings=loading,
+                                     s_bus=None,
+                                     s_branch=self.time_series.results.Sbranch_max,
+                                     voltages=self.time_series.results.voltage_max,
+                                     loadings=self.time_series.results.loading_max,
                                      types=self.time_series.results.bus_types)
 
             self.update_available_results()
@@ -2869,11 +2875,9 @@ class MainGUI(QMainWindow):
                 options.solver_type = SolverType.LM
 
                 max_isl = self.ui.cascading_islands_spinBox.value()
-                n_lsh_samples = self.ui.lhs_samples_number_spinBox.value()
 
                 self.cascade = Cascading(self.circuit.copy(), options,
-                                         max_additional_islands=max_isl,
-                                         n_lhs_samples_=n_lsh_samples)
+                                         max_additional_islands=max_isl)
 
                 # connect signals
                 self.cascade.progress_signal.connect(self.ui.progressBar.setValue)
@@ -2907,7 +2911,7 @@ class MainGUI(QMainWindow):
 
             # Accumulate all the failed branches
             br_idx = zeros(0, dtype=int)
-            for i in range(idx):
+            for i in range(idx + 1):
                 br_idx = np.r_[br_idx, self.cascade.results.events[i].removed_idx]
 
             # pick the results at the designated cascade step
@@ -2919,7 +2923,7 @@ class MainGUI(QMainWindow):
                                      voltages=results.voltage,
                                      loadings=results.loading,
                                      types=results.bus_types,
-                                     s_branch=results.sbranch,
+                                     s_branch=results.Sbranch,
                                      s_bus=None,
                                      failed_br_idx=br_idx)
 
@@ -3588,9 +3592,16 @@ class MainGUI(QMainWindow):
 
             elif current_study == TimeSeries.name:
 
-                voltage = self.time_series.results.voltage[current_step, :]
-                loading = self.time_series.results.loading[current_step, :]
-                Sbranch = self.time_series.results.Sbranch[current_step, :]
+                results = self.time_series.results
+                if results.voltage is None or results.loading is None or results.Sbranch is None:
+                    # the values of the steps were not kept: use the statistics along the time steps
+                    voltage = results.voltage_max
+                    loading = results.loading_max
+                    Sbranch = results.Sbranch_max
+                else:
+                    voltage = results.voltage[current_step, :]
+                    loading = results.loading[current_step, :]
+                    Sbranch = results.Sbranch[current_step, :]
 
                 plot_function(circuit=self.circuit,
                               s_bus=None,
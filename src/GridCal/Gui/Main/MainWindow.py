@@ -3463,7 +3463,7 @@ class Ui_mainWindow(object):
         self.label_77.setText(QCoreApplication.translate("mainWindow", u"Latin Hypercube Sampling", None))
         self.label_25.setText(QCoreApplication.translate("mainWindow", u"samples", None))
 #if QT_CONFIG(tooltip)
-        self.lhs_samples_number_spinBox.setToolTip(QCoreApplication.translate("mainWindow", u"<html><head/><body><p>Number of power flows to run with Latin-Hypercube.</p></body></html>", None))
+        self.lhs_samples_number_spinBox.setToolTip(QCoreApplication.translate("mainWindow", u"<html><head/><body><p>Number of power flows to run with the Latin-Hypercube sampling simulation (the blackout cascade does not use it).</p></body></html>", None))
 #endif // QT_CONFIG(tooltip)
         self.label_78.setText("")
         self.label_79.setText(QCoreApplication.translate("mainWindow", u"Cascading", None))
@@ -213,6 +213,7 @@ setup(
     #     'dev': ['check-manifest'],
     #     'test': ['coverage'],
     # },
+    extras_require={'sparse_qr': ['sparseqr']},  # sparse QR of the orthogonal state estimation
 
     # If there are data files included in your packages that need to be
     # installed, specify them here.
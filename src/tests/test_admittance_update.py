@@ -0,0 +1,148 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Core.shared_arrays import SharedArrayStore, publish_object, attach_object
+from GridCal.Engine.Devices.bus import Bus
+from GridCal.Engine.Devices.line import Line
+from GridCal.Engine.Devices.transformer import Transformer2W
+
+
+def get_island():
+    """
+    Meshed grid of four lines and two transformers, where no single branch splits the grid
+    """
+    grid = MultiCircuit()
+    buses = [Bus(name='B{}'.format(i), is_slack=(i == 0)) for i in range(5)]
+    for bus in buses:
+        grid.add_bus(bus)
+
+    for i, (f, t) in enumerate([(0, 1), (1, 2), (2, 3), (3, 0)]):
+        grid.add_line(Line(bus_from=buses[f], bus_to=buses[t], name='L{}'.format(i),
+                           r=0.01 * (i + 1), x=0.05 * (i + 1), b=0.02))
+
+    for i, (f, t) in enumerate([(1, 4), (3, 4)]):
+        grid.add_transformer2w(Transformer2W(bus_from=buses[f], bus_to=buses[t], name='T{}'.format(i),
+                                             r=0.005, x=0.1 * (i + 1), b=0.001, tap=1.0 + 0.01 * i))
+
+    nc = compile_snapshot_circuit(grid)
+    return split_into_islands(nc)[0]
+
+
+def assert_same_matrices(island, reference):
+    assert np.allclose(island.Ybus.toarray(), reference.Ybus.toarray(), atol=1e-10)
+    assert np.allclose(island.Yf.toarray(), reference.Yf.toarray(), atol=1e-10)
+    assert np.allclose(island.Yt.toarray(), reference.Yt.toarray(), atol=1e-10)
+    assert np.allclose(island.Bpqpv.toarray(), reference.Bpqpv.toarray(), atol=1e-10)
+
+
+def test_tap_update():
+    """
+    Patching the taps in place must give the same matrices as assembling them again, keeping the structure
+    """
+    island = get_island()
+    reference = get_island()
+    assert island.ntr > 0
+
+    Ybus = island.Ybus
+    indptr = Ybus.indptr.copy()
+    indices = Ybus.indices.copy()
+
+    tap_module = island.tr_tap_mod.copy()
+    tap_module[0] = 1.05
+    tap_angle = island.tr_tap_ang.copy()
+    tap_angle[-1] = 0.1
+
+    changed = island.update_taps(tap_module=tap_module, tap_angle=tap_angle)
+    assert np.array_equal(changed, [island.nline, island.nline + island.ntr - 1])
+
+    reference.tr_tap_mod = tap_module
+    reference.tr_tap_ang = tap_angle
+    reference.compute_admittance_matrices(newton_raphson=True)
+
+    assert_same_matrices(island, reference)
+
+    # the matrix is the same object with the same structure
+    assert island.Ybus is Ybus
+    assert np.array_equal(Ybus.indptr, indptr)
+    assert np.array_equal(Ybus.indices, indices)
+
+    # nothing changes the second time
+    assert len(island.update_taps(tap_module=tap_module, tap_angle=tap_angle)) == 0
+
+
+def test_branch_active_update():
+    """
+    Switching branches in place must give the same matrices as assembling them again,
+    and the low rank increment must match the change of Ybus
+    """
+    island = get_island()
+    reference = get_island()
+
+    # a line and the first transformer
+    br_idx = np.array([2, island.nline])
+    assert br_idx.max() < island.nbr
+    Ybus0 = island.Ybus.toarray()
+    delta = island.admittance_structure.get_delta_ybus(br_idx, active=0)
+
+    island.update_branch_active(br_idx, 0)
+    reference.branch_active[br_idx] = 0
+    reference.compute_admittance_matrices(newton_raphson=True)
+
+    assert_same_matrices(island, reference)
+    assert np.allclose(island.Ybus.toarray() - Ybus0, delta.toarray(), atol=1e-10)
+    assert np.count_nonzero(delta.toarray()) <= 4 * len(br_idx)
+
+    # switch them back on
+    island.update_branch_active(br_idx, 1)
+    assert np.allclose(island.Ybus.toarray(), Ybus0, atol=1e-10)
+
+
+def test_shared_tap_update():
+    """
+    The tap updates of a circuit attached from the shared arrays patch the matrices that the solvers use
+    """
+    island = get_island()
+    reference = get_island()
+
+    store = SharedArrayStore()
+    try:
+        skeleton, descriptors = publish_object(island, store)
+        assert skeleton.admittance_structure.Ybus is None
+
+        attached = attach_object(skeleton, descriptors)
+        assert attached.admittance_structure.Ybus is attached.Ybus
+
+        tap_module = attached.tr_tap_mod.copy()
+        tap_module[0] = 1.05
+        attached.update_taps(tap_module=tap_module)
+
+        reference.tr_tap_mod = tap_module
+        reference.compute_admittance_matrices(newton_raphson=True)
+
+        assert_same_matrices(attached, reference)
+
+        # the published object is untouched
+        assert np.allclose(island.Ybus.toarray(), get_island().Ybus.toarray())
+    finally:
+        store.cleanup()
+
+
+if __name__ == '__main__':
+    test_tap_update()
+    test_branch_active_update()
+    test_shared_tap_update()
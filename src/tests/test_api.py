@@ -24,7 +24,7 @@ from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import ReactivePower
 from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowOptions, PowerFlowDriver
 from GridCal.Engine.Simulations.PowerFlow.time_series_driver import TimeSeries
 from GridCal.Engine.Simulations.ShortCircuit.short_circuit_driver import ShortCircuitOptions, ShortCircuit
-from GridCal.Engine.Simulations.Stochastic.blackout_driver import Cascading,  CascadeType
+from GridCal.Engine.Simulations.Stochastic.blackout_driver import Cascading
 from GridCal.Engine.Simulations.Stochastic.lhs_driver import LatinHypercubeSampling
 from GridCal.Engine.Simulations.Stochastic.monte_carlo_driver import MonteCarlo
 from GridCal.Engine.grid_analysis import TimeSeriesResultsAnalysis
@@ -136,9 +136,7 @@ def _test_api():
     ####################################################################################################################
     print('Running Cascading...')
     cascade = Cascading(main_circuit.copy(), pf_options,
-                        max_additional_islands=5,
-                        cascade_type_=CascadeType.LatinHypercube,
-                        n_lhs_samples_=10)
+                        max_additional_islands=5)
     cascade.run()
     cascade.perform_step_run()
     cascade.perform_step_run()
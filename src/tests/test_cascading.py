@@ -0,0 +1,124 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine import FileOpen
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit
+from GridCal.Engine.Devices.bus import Bus
+from GridCal.Engine.Devices.load import Load
+from GridCal.Engine.Devices.generator import Generator
+from GridCal.Engine.Devices.line import Line
+from GridCal.Engine.Simulations.Stochastic.blackout_driver import CascadeOptions, CascadeContext, \
+    CascadeSimulation, CascadingMonteCarlo
+
+
+def get_ieee30():
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+    return FileOpen(str(fname)).open()
+
+
+def test_low_rank_update():
+    """
+    The flows updated by compensation are the flows of the factorized topology without the tripped branches
+    """
+    nc = compile_snapshot_circuit(get_ieee30())
+    context = CascadeContext(nc, CascadeOptions())
+
+    # pick three branches that do not split the grid when tripped together
+    chosen = list()
+    for j in range(nc.nbr):
+        sim = CascadeSimulation(context)
+        sim.trip(chosen + [j])
+        if sim.n_factorizations == 0:
+            chosen.append(j)
+        if len(chosen) == 3:
+            break
+
+    sim = CascadeSimulation(context)
+    sim.trip(chosen)
+    assert len(sim.failed) == 3
+    flows = sim.flows.copy()
+    theta = sim.theta.copy()
+
+    sim.refactorize()
+
+    assert np.allclose(flows, sim.flows, atol=1e-6)
+    assert np.allclose(theta, sim.theta, atol=1e-6)
+    assert np.allclose(sim.flows[sim.tripped], 0.0)
+
+
+def test_islanding():
+    """
+    Tripping the line that feeds a bus without generation leaves its load without supply
+    """
+    grid = MultiCircuit()
+    b0 = Bus(name='B0', is_slack=True)
+    b1 = Bus(name='B1')
+    b2 = Bus(name='B2')
+    for bus in [b0, b1, b2]:
+        grid.add_bus(bus)
+
+    grid.add_generator(b0, Generator(name='G0', active_power=100.0, p_max=200.0))
+    grid.add_load(b1, Load(name='L1', P=60.0, Q=0.0))
+    grid.add_load(b2, Load(name='L2', P=40.0, Q=0.0))
+    grid.add_line(Line(bus_from=b0, bus_to=b1, name='L01', r=0.0, x=0.1, rate=150.0))
+    grid.add_line(Line(bus_from=b1, bus_to=b2, name='L12', r=0.0, x=0.1, rate=150.0))
+
+    nc = compile_snapshot_circuit(grid)
+    sim = CascadeSimulation(CascadeContext(nc, CascadeOptions()))
+
+    assert np.allclose(np.abs(sim.flows), [100.0, 40.0])
+
+    sim.trip([1])
+
+    assert len(sim.islands) == 2
+    assert np.isclose(sim.blackout_size, 40.0)
+    assert np.allclose(np.abs(sim.flows), [60.0, 0.0])
+    assert list(sim.energized) == [True, True, False]
+
+
+def test_cascading_monte_carlo():
+    """
+    Random cascades give a valid distribution of the blackout size
+    """
+    grid = get_ieee30()
+
+    for use_multiprocessing in [False, True]:
+        options = CascadeOptions(n_realisations=40, n_initial_outages=2, overload_threshold=1.0,
+                                 hidden_failure_probability=0.05, load_scale_range=(1.0, 1.5),
+                                 use_multiprocessing=use_multiprocessing, seed=0)
+        driver = CascadingMonteCarlo(grid, options, batch_size=10)
+        driver.run()
+        res = driver.results
+
+        assert res.n_realisations == 40
+        assert np.all(res.n_tripped >= 2)
+
+        sizes, prob = res.get_blackout_size_distribution()
+        assert np.all(sizes >= -1e-9)
+        assert np.all(sizes <= 1.0 + 1e-9)
+        assert np.all(np.diff(prob) <= 0)
+
+        assert len(res.get_table()) == 40
+        assert np.all(res.get_branch_table().values <= 1.0)
+
+
+if __name__ == '__main__':
+    test_low_rank_update()
+    test_islanding()
+    test_cascading_monte_carlo()
@@ -0,0 +1,85 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+
+from GridCal.Engine.basic_structures import CDF, StatisticalCharacterization, get_quantile_table, \
+    sample_quantile_table
+
+
+def test_compressed_cdf():
+    """
+    The compressed CDF keeps the quantiles of the data
+    """
+    np.random.seed(0)
+    data = np.random.randn(8760)
+
+    full = CDF(data)
+    compact = CDF(data, max_points=200)
+
+    assert full.len == 8760
+    assert compact.len == 200
+    assert compact.arr[0] == data.min() and compact.arr[-1] == data.max()
+
+    p = np.linspace(0, 1, 37)
+    assert np.allclose(compact.get_at(p), full.get_at(p), atol=0.05)
+
+
+def test_cdf_convolution():
+    """
+    The sum and difference of two independent variables, without the cartesian product of the data
+    """
+    np.random.seed(1)
+    a = CDF(np.random.uniform(0, 1, 8760))
+    b = CDF(np.random.uniform(0, 2, 8760))
+
+    c = a + b
+    d = a - b
+
+    assert c.len <= 512
+    assert np.isclose(c.get_at(0.5), 1.5, atol=0.05)
+    assert np.isclose(d.get_at(0.5), -0.5, atol=0.05)
+    assert np.isclose(c.arr[0], 0, atol=0.05) and np.isclose(c.arr[-1], 3, atol=0.05)
+
+    # the variance of the sum is the sum of the variances
+    x = c.get_at(np.linspace(0, 1, 10001))
+    assert np.isclose(x.var(), 1 / 12 + 4 / 12, rtol=0.05)
+
+
+def test_quantile_table_sampling():
+    """
+    Sampling many CDFs at once matches sampling them one by one
+    """
+    np.random.seed(2)
+    cdfs = [CDF(np.random.rand(100)), None, CDF(np.random.rand(30) + 1j * np.random.rand(30))]
+    prob, table = get_quantile_table(cdfs, 3)
+    x = np.random.rand(20, 3)
+    y = sample_quantile_table(prob, table, x)
+
+    assert np.allclose(y[:, 0], cdfs[0].get_at(x[:, 0]))
+    assert np.allclose(y[:, 1], 0)
+    assert np.allclose(y[:, 2], cdfs[2].get_at(x[:, 2]))
+
+    # statistical characterization of profiles
+    sc = StatisticalCharacterization(gen_P=np.random.rand(50, 2), load_P=np.random.rand(50, 3),
+                                     load_Q=np.random.rand(50, 3), max_points=10)
+    PG, S = sc.get_sample(load_enabled_idx=[0, 2], gen_enabled_idx=[1], npoints=5)
+    assert PG.shape == (5, 1)
+    assert S.shape == (5, 2)
+
+
+if __name__ == '__main__':
+    test_compressed_cdf()
+    test_cdf_convolution()
+    test_quantile_table_sampling()
@@ -0,0 +1,69 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import tempfile
+import zipfile
+from pathlib import Path
+
+from GridCal.Engine.IO.cim_parser import CIMCircuit, CIMImport
+
+
+def test_cim_profiles_merge(tmp_path):
+    """
+    The equipment and topology profiles are merged by id, whether they come as xml files or inside a zip file
+    """
+    folder = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+    eq_file = folder / 'IEEE14_equipment_v16.xml'
+    tp_file = folder / 'IEEE14_topology.xml'
+
+    cim = CIMCircuit()
+    cim.parse_file(str(eq_file))
+    cim.parse_file(str(tp_file))
+    cim.find_references()
+
+    # every object is indexed once, and the topology properties are merged into the equipment terminals
+    assert len(cim.elements) == len(cim.elm_dict)
+    assert len(cim.elements_by_type['TopologicalNode']) == 14
+    for terminal in cim.elements_by_type['Terminal']:
+        assert 'ConductingEquipment' in terminal.properties
+        assert 'TopologicalNode' in terminal.properties
+
+    assert sum(len(node.terminals) for node in cim.elements_by_type['TopologicalNode']) == \
+        len(cim.elements_by_type['Terminal'])
+
+    # CGMES-like set: zip with the profiles, one of them zipped again
+    eq_zip = tmp_path / 'IEEE14_EQ.zip'
+    set_zip = tmp_path / 'IEEE14_CGMES.zip'
+    with zipfile.ZipFile(eq_zip, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.write(eq_file, 'IEEE14_EQ.xml')
+    with zipfile.ZipFile(set_zip, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.write(eq_zip, 'IEEE14_EQ.zip')
+        z.write(tp_file, 'IEEE14_TP.xml')
+
+    cim2 = CIMCircuit()
+    cim2.parse_file(str(set_zip))
+    cim2.find_references()
+
+    assert len(cim2.elements) == len(cim.elements)
+    for elm in cim.elements:
+        assert cim2.elm_dict[elm.id].properties == elm.properties
+
+    circuit = CIMImport().load_cim_file([str(eq_file), str(tp_file)])
+    circuit2 = CIMImport().load_cim_file(str(set_zip))
+    assert len(circuit.buses) == len(circuit2.buses) == 14
+    assert len(circuit.get_branches()) == len(circuit2.get_branches())
+
+
+if __name__ == '__main__':
+    test_cim_profiles_merge(Path(tempfile.mkdtemp()))
@@ -0,0 +1,78 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+from pathlib import Path
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Simulations.PTDF.linear_analysis import CircuitLinearFactors, get_dc_matrices
+from GridCal.Engine.Simulations.NK.contingency_screening import screen_contingencies, post_contingency_flows
+
+
+def dc_flows(island, P):
+    """
+    DC flows solving the complete (dense) system
+    """
+    Bbus, Bf = get_dc_matrices(island)
+    noref = np.sort(np.r_[island.pq, island.pv])
+    theta = np.zeros(island.nbus)
+    theta[noref] = np.linalg.solve(Bbus[np.ix_(noref, noref)].toarray(), P[noref])
+    return Bf * theta
+
+
+def test_n2_screening():
+    """
+    The blockwise N-2 screening must match the flows of a DC power flow of the grid without the failed branches
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+    grid = FileOpen(fname).open()
+    island = split_into_islands(compile_snapshot_circuit(grid))[0]
+
+    factors = CircuitLinearFactors(nbr=island.nbr, islands=[island])
+    P = island.Sbus.real
+    flows = factors.get_flows()
+    rates = np.ones(island.nbr)
+    assert np.allclose(flows, dc_flows(island, P))
+
+    # small blocks, so that the pairs of different blocks are screened too
+    contingencies, max_loading, worst_branch, islanding = screen_contingencies(flows, factors.transfer_factors,
+                                                                               rates,
+                                                                               candidates=np.arange(island.nbr),
+                                                                               k=2, block_size=7)
+    n = island.nbr
+    assert contingencies.shape == (n + n * (n - 1) // 2, 2)
+    pairs = {tuple(sorted(c)) for c in contingencies[n:]}
+    assert len(pairs) == n * (n - 1) // 2
+
+    for i in range(n, len(contingencies), 37):
+        if islanding[i]:
+            continue
+
+        failed = list(contingencies[i])
+        post, splits = post_contingency_flows(flows, factors.transfer_factors, failed)
+
+        island.branch_active[failed] = 0
+        island.compute_admittance_matrices(newton_raphson=True)
+        expected = dc_flows(island, P)
+        island.branch_active[failed] = 1
+        island.compute_admittance_matrices(newton_raphson=True)
+
+        assert np.allclose(post, expected, atol=1e-6)
+        assert np.isclose(max_loading[i], np.abs(expected).max(), atol=1e-6)
+        assert np.isclose(np.abs(expected[worst_branch[i]]), np.abs(expected).max(), atol=1e-6)
+
+
+if __name__ == '__main__':
+    test_n2_screening()
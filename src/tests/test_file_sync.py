@@ -0,0 +1,77 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import tempfile
+from pathlib import Path
+
+from GridCal.Engine.basic_structures import Logger, SyncIssueType
+from GridCal.Engine.IO.file_handler import FileOpen, FileSave
+from GridCal.Engine.IO.synchronization_driver import ZipSyncState, SYNC_TABLES
+
+
+def test_incremental_sync(tmp_path):
+    """
+    Only the tables and devices changed by the other user are compared
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+    shared = str(tmp_path / 'IEEE 30 Bus shared.gridcal')
+
+    theirs = FileOpen(str(fname)).open()
+    FileSave(theirs, shared).save()
+
+    mine = FileOpen(shared).open()
+
+    state = ZipSyncState()
+    logger = Logger()
+    assert state.file_changed(shared)
+    state.sync(mine, shared, logger)
+    assert not state.file_changed(shared)
+    issues0 = len(state.get_issues())
+
+    # the other user modifies a load and deletes a line
+    load = theirs.get_loads()[0]
+    load.P += 10.0
+    line = theirs.lines.pop(0)
+    FileSave(theirs, shared).save()
+
+    changed = state.sync(mine, shared, logger)
+    assert set(changed) == {'load', 'line'}
+
+    issues = state.get_issues()
+    assert len(issues) == issues0 + 2
+
+    conflicts = [i for i in issues if i.issue_type == SyncIssueType.Conflict and i.property_name == 'P']
+    assert len(conflicts) == 1
+    assert conflicts[0].my_elm.idtag == load.idtag
+    assert conflicts[0].get_their_value() == load.P
+
+    deleted = [i for i in issues if i.issue_type == SyncIssueType.Deleted]
+    assert [i.my_elm.idtag for i in deleted] == [line.idtag]
+
+    # accepting the change solves the conflict at the next synchronization, without comparing the tables again
+    n_conflicts = len([i for i in issues if i.issue_type == SyncIssueType.Conflict])
+    conflicts[0].accept_change()
+    FileSave(theirs, shared).save()
+    assert state.sync(mine, shared, logger) == []
+    assert len([i for i in state.get_issues() if i.issue_type == SyncIssueType.Conflict]) == n_conflicts - 1
+
+    # saving the local model compares everything again, finding the same issues
+    n_issues = len(state.get_issues())
+    FileSave(mine, str(tmp_path / 'mine.gridcal')).save()
+    assert set(state.sync(mine, shared, logger)) == set(SYNC_TABLES)
+    assert len(state.get_issues()) == n_issues
+
+
+if __name__ == '__main__':
+    test_incremental_sync(Path(tempfile.mkdtemp()))
@@ -0,0 +1,236 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine import FileOpen
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Devices.bus import Bus
+from GridCal.Engine.Devices.generator import Generator
+from GridCal.Engine.Devices.line import Line
+from GridCal.Engine.Devices.load import Load
+from GridCal.Engine.Simulations.PowerFlow.helm_power_flow import helm_josep, helm_coefficients_josep, pade4all, \
+    HelmSolverContext
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import NR_LS
+
+
+def get_island():
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+    grid = FileOpen(str(fname)).open()
+    return split_into_islands(compile_snapshot_circuit(grid))[0]
+
+
+def get_small_island():
+    """
+    Lightly loaded meshed grid with a PV bus, where HELM converges
+    """
+    grid = MultiCircuit()
+    buses = [Bus(name='B{}'.format(i), is_slack=(i == 0)) for i in range(5)]
+    for bus in buses:
+        grid.add_bus(bus)
+
+    for i, (f, t) in enumerate([(0, 1), (1, 2), (2, 3), (3, 4), (4, 0), (1, 3)]):
+        grid.add_line(Line(bus_from=buses[f], bus_to=buses[t], name='L{}'.format(i),
+                           r=0.01, x=0.05 + 0.01 * i, b=0.02))
+
+    grid.add_generator(buses[0], Generator(name='G0'))
+    grid.add_generator(buses[2], Generator(name='G2', active_power=20.0, voltage_module=1.02))
+
+    for i in [1, 3, 4]:
+        grid.add_load(buses[i], Load(name='Ld{}'.format(i), P=10.0 * i, Q=3.0 * i))
+
+    return split_into_islands(compile_snapshot_circuit(grid))[0]
+
+
+def helm_coefficients_reference(Yseries, V0, S0, Ysh0, pq, pv, sl, pqpv, max_coeff):
+    """
+    HELM coefficients recursion written with the plain convolutions, and a dense system
+    """
+    npqpv = len(pqpv)
+    npv = len(pv)
+    pq_ = np.searchsorted(pqpv, pq)
+    pv_ = np.searchsorted(pqpv, pv)
+
+    Y = Yseries.toarray()
+    Yred = Y[np.ix_(pqpv, pqpv)]
+    Yslack = -Y[np.ix_(pqpv, sl)]
+    G = Yred.real
+    B = Yred.imag
+    vec_P = S0.real[pqpv]
+    vec_Q = S0.imag[pqpv]
+    Ysh = Ysh0[pqpv]
+    vec_W = np.abs(V0[pqpv]) ** 2
+
+    U = np.zeros((max_coeff, npqpv), dtype=complex)
+    X = np.zeros((max_coeff, npqpv), dtype=complex)
+    Q = np.zeros((max_coeff, npqpv), dtype=complex)
+
+    U[0, :] = np.linalg.solve(Yred, Yslack.sum(axis=1))
+    X[0, :] = 1 / np.conj(U[0, :])
+
+    valor = np.zeros(npqpv, dtype=complex)
+    I_inj = Yslack.dot(V0[sl]) - Yslack.sum(axis=1)
+    valor[pq_] = I_inj[pq_] + (vec_P[pq_] - vec_Q[pq_] * 1j) * X[0, pq_] - U[0, pq_] * Ysh[pq_]
+    valor[pv_] = I_inj[pv_] + vec_P[pv_] * X[0, pv_] - U[0, pv_] * Ysh[pv_]
+
+    VRE = np.zeros((npv, npqpv))
+    VIM = np.zeros((npv, npqpv))
+    XIM = np.zeros((npqpv, npv))
+    XRE = np.zeros((npqpv, npv))
+    VRE[np.arange(npv), pv_] = 2 * U[0, pv_].real
+    VIM[np.arange(npv), pv_] = 2 * U[0, pv_].imag
+    XIM[pv_, np.arange(npv)] = -X[0, pv_].imag
+    XRE[pv_, np.arange(npv)] = X[0, pv_].real
+    MAT = np.block([[G, -B, XIM],
+                    [B, G, XRE],
+                    [VRE, VIM, np.zeros((npv, npv))]])
+
+    LHS = np.linalg.solve(MAT, np.r_[valor.real, valor.imag, vec_W[pv_] - (U[0, pv_] * U[0, pv_]).real])
+    U[1, :] = LHS[:npqpv] + 1j * LHS[npqpv:2 * npqpv]
+    Q[0, pv_] = LHS[2 * npqpv:]
+    X[1, :] = -X[0, :] * np.conj(U[1, :]) / np.conj(U[0, :])
+
+    for c in range(2, max_coeff):
+        conv_xq = sum(X[k, pv_] * Q[c - 1 - k, pv_] for k in range(1, c))
+        conv_uu = sum(U[k, pv_] * np.conj(U[c - k, pv_]) for k in range(1, c))
+
+        valor[pq_] = (vec_P[pq_] - vec_Q[pq_] * 1j) * X[c - 1, pq_] - U[c - 1, pq_] * Ysh[pq_]
+        valor[pv_] = -1j * conv_xq - U[c - 1, pv_] * Ysh[pv_] + X[c - 1, pv_] * vec_P[pv_]
+
+        LHS = np.linalg.solve(MAT, np.r_[valor.real, valor.imag, -conv_uu.real])
+        U[c, :] = LHS[:npqpv] + 1j * LHS[npqpv:2 * npqpv]
+        Q[c - 1, pv_] = LHS[2 * npqpv:]
+
+        conv_ux = sum(np.conj(U[k, :]) * X[c - k, :] for k in range(1, c + 1))
+        X[c, :] = -conv_ux / np.conj(U[0, :])
+
+    return U, X, Q
+
+
+def pade_reference(order, coeff_mat, s=1.0):
+    """
+    Bus by bus Padè approximant
+    """
+    nbus = coeff_mat.shape[1]
+    L = M = int(order / 2)
+    voltages = np.zeros(nbus, dtype=complex)
+    for d in range(nbus):
+        rhs = coeff_mat[L + 1:L + M + 1, d]
+        C = np.array([coeff_mat[L - M + i + 1:L + i + 1, d] for i in range(L)])
+        b = np.r_[1.0, np.linalg.solve(C, -rhs)[::-1]]
+        a = np.array([np.sum(coeff_mat[i::-1, d] * b[:i + 1]) for i in range(L + 1)])
+        powers = s ** np.arange(L + 1)
+        voltages[d] = np.sum(a * powers) / np.sum(b * powers)
+    return voltages
+
+
+def test_pade4all():
+    """
+    The batched Padè approximants are the ones computed bus by bus
+    """
+    rng = np.random.RandomState(0)
+    coeff_mat = rng.randn(11, 6) + 1j * rng.randn(11, 6)
+
+    assert np.allclose(pade4all(10, coeff_mat, 1.0), pade_reference(10, coeff_mat, 1.0))
+    assert np.allclose(pade4all(9, coeff_mat, 0.5), pade_reference(9, coeff_mat, 0.5))
+
+    # a bus with a singular system falls back to the summation of its coefficients
+    coeff_mat[1:, 2] = 0.0
+    v = pade4all(10, coeff_mat, 1.0)
+    assert np.isclose(v[2], coeff_mat[0, 2])
+    assert np.allclose(v[[0, 1, 3, 4, 5]], pade_reference(10, coeff_mat[:, [0, 1, 3, 4, 5]], 1.0))
+
+
+def test_helm_coefficients():
+    """
+    The compiled recursion gives the coefficients of the plain convolutions
+    """
+    island = get_small_island()
+    assert len(island.pv) > 0 and len(island.pq) > 0
+
+    U, X, Q, it = helm_coefficients_josep(Yseries=island.Yseries, V0=island.Vbus, S0=island.Sbus,
+                                          Ysh0=island.Yshunt, pq=island.pq, pv=island.pv, sl=island.vd,
+                                          pqpv=island.pqpv, max_coeff=20)
+
+    U_ref, X_ref, Q_ref = helm_coefficients_reference(Yseries=island.Yseries, V0=island.Vbus, S0=island.Sbus,
+                                                      Ysh0=island.Yshunt, pq=island.pq, pv=island.pv,
+                                                      sl=island.vd, pqpv=island.pqpv, max_coeff=20)
+
+    assert np.allclose(U, U_ref, rtol=1e-8, atol=1e-12)
+    assert np.allclose(X, X_ref, rtol=1e-8, atol=1e-12)
+    assert np.allclose(Q, Q_ref, rtol=1e-8, atol=1e-12)
+
+
+def test_helm_newton_raphson():
+    """
+    HELM gives the Newton-Raphson solution where it converges
+    """
+    island = get_small_island()
+
+    V, converged, norm_f, Scalc, it, el = helm_josep(Ybus=island.Ybus, Yseries=island.Yseries,
+                                                     V0=island.Vbus, S0=island.Sbus, Ysh0=island.Yshunt,
+                                                     pq=island.pq, pv=island.pv, sl=island.vd,
+                                                     pqpv=island.pqpv, tolerance=1e-6, max_coeff=40)
+
+    V_nr, converged_nr, norm_f_nr, Scalc_nr, it_nr, el_nr = NR_LS(Ybus=island.Ybus, Sbus=island.Sbus,
+                                                                  V0=island.Vbus, Ibus=island.Ibus,
+                                                                  pv=island.pv, pq=island.pq, tol=1e-9,
+                                                                  max_it=20)
+    assert converged and converged_nr
+    assert np.allclose(V, V_nr, atol=1e-5)
+
+
+def test_helm_context_reuse():
+    """
+    HELM gives the same voltages with and without a context, and the factorization is reused
+    while only the injections change
+    """
+    island = get_island()
+    context = HelmSolverContext()
+
+    for scale in [1.0, 1.05, 0.95]:
+        Sbus = island.Sbus * scale
+
+        V_ctx, _, norm_f_ctx, _, _, _ = helm_josep(Ybus=island.Ybus, Yseries=island.Yseries,
+                                                   V0=island.Vbus, S0=Sbus, Ysh0=island.Yshunt,
+                                                   pq=island.pq, pv=island.pv, sl=island.vd,
+                                                   pqpv=island.pqpv, tolerance=1e-6, max_coeff=40,
+                                                   context=context)
+
+        V, _, norm_f, _, _, _ = helm_josep(Ybus=island.Ybus, Yseries=island.Yseries,
+                                           V0=island.Vbus, S0=Sbus, Ysh0=island.Yshunt,
+                                           pq=island.pq, pv=island.pv, sl=island.vd,
+                                           pqpv=island.pqpv, tolerance=1e-6, max_coeff=40)
+
+        assert np.allclose(V_ctx, V)
+        assert np.isclose(norm_f_ctx, norm_f)
+
+    assert context.n_analysis == 1
+
+    # a change in the series admittances invalidates the factorization
+    Yseries = island.Yseries.copy()
+    Yseries.data *= 1.01
+    helm_josep(Ybus=island.Ybus, Yseries=Yseries, V0=island.Vbus, S0=island.Sbus, Ysh0=island.Yshunt,
+               pq=island.pq, pv=island.pv, sl=island.vd, pqpv=island.pqpv, max_coeff=40, context=context)
+    assert context.n_analysis == 2
+
+
+if __name__ == '__main__':
+    test_pade4all()
+    test_helm_coefficients()
+    test_helm_newton_raphson()
+    test_helm_context_reuse()
@@ -0,0 +1,99 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import numpy as np
+from scipy.sparse import csc_matrix
+
+from GridCal.Engine.Simulations.OPF.lp_matrix import LpMatrixModel
+
+
+def test_lp_matrix_assembly():
+    """
+    A block of restrictions M x[:, t] + y[:, t] <= b is replicated for every time step
+    """
+    nt = 3
+    model = LpMatrixModel(name='test')
+    x = model.add_vars('x', shape=(2, nt), lower=0, upper=np.array([[1.0], [2.0]]))
+    y = model.add_vars('y', shape=(2, nt), lower=None, upper=None)
+
+    M = csc_matrix(np.array([[1.0, -1.0],
+                             [0.0, 2.0]]))
+    coef = np.array([[1.0, 2.0, 3.0],
+                     [1.0, 1.0, 1.0]])
+
+    rows = model.add_constraints('r', terms=[(M, x, coef), (None, y, -1.0)], sense='<=', rhs=5.0)
+    model.add_cost(x, 2.0)
+    model.set_bounds(y[:, 0], lower=0.0, upper=0.0)
+
+    c, A, senses, b, lb, ub = model.get_matrices()
+
+    assert rows.shape == (2, nt)
+    assert A.shape == (2 * nt, 4 * nt)
+    assert np.all(senses == 'L')
+    assert np.allclose(b, 5.0)
+    assert np.allclose(c[x.ravel()], 2.0)
+    assert np.allclose(c[y.ravel()], 0.0)
+    assert np.allclose(ub[x[1, :]], 2.0)
+    assert np.isinf(lb[y[:, 1:]]).all()
+    assert np.allclose(lb[y[:, 0]], 0.0)
+
+    A = A.toarray()
+    for t in range(nt):
+        assert np.allclose(A[np.ix_(rows[:, t], x[:, t])], M.toarray() * coef[:, t][:, np.newaxis])
+        assert np.allclose(A[np.ix_(rows[:, t], y[:, t])], -np.eye(2))
+
+    # the time steps are decoupled
+    assert np.count_nonzero(A) == nt * (3 + 2)
+
+
+def test_lp_matrix_mps_and_solution():
+    """
+    The MPS file declares all the rows and columns, and the CBC solution is mapped back by index
+    """
+    model = LpMatrixModel(name='test')
+    x = model.add_vars('x', shape=(2, 1), lower=0, upper=10)
+    rows = model.add_constraints('balance', terms=[(None, x, None)], sense='>=', rhs=np.array([[1.0], [2.0]]))
+    model.add_cost(x, np.array([[1.0], [3.0]]))
+
+    fname = 'test_lp_matrix.mps'
+    model.write_mps(fname)
+    with open(fname) as f:
+        text = f.read()
+    os.remove(fname)
+
+    assert ' G  R0' in text and ' G  R1' in text
+    assert 'C0  OBJ  1' in text and 'C1  R1  1' in text
+    assert 'UP BND  C1  10' in text
+
+    sol = 'test_lp_matrix.sol'
+    with open(sol, 'w') as f:
+        f.write('Optimal - objective value 7.00000000\n'
+                '      0 R0                      1                      1\n'
+                '      1 R1                      2                      3\n'
+                '      0 C0                      1                      0\n'
+                '      1 C1                      2                      0\n')
+    model.read_cbc_solution(sol)
+    os.remove(sol)
+
+    assert model.status == 1
+    assert np.allclose(model.get_values(x).ravel(), [1.0, 2.0])
+    assert np.allclose(model.get_duals(rows).ravel(), [1.0, 3.0])
+    assert np.allclose(model.get_duals(np.array([-1, 1])), [0.0, 3.0])
+    assert np.isclose(model.objective, 7.0)
+
+
+if __name__ == '__main__':
+    test_lp_matrix_assembly()
+    test_lp_matrix_mps_and_solution()
@@ -0,0 +1,101 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+
+from GridCal.Engine.basic_structures import CDF
+from GridCal.Engine.Simulations.Stochastic.monte_carlo_input import MonteCarloInput
+from GridCal.Engine.Simulations.Stochastic.monte_carlo_results import MonteCarloResults, RunningStatistics
+
+
+def test_vectorized_sampling():
+    """
+    All the nodes are sampled at once (the sampling of the CDFs is checked in test_cdf)
+    """
+    np.random.seed(0)
+    n = 4
+    data = np.random.rand(n, 50) + 1j * np.random.rand(n, 50)
+    Scdf = [CDF(data[i, :]) for i in range(n)]
+    Scdf[2] = None
+
+    mc_input = MonteCarloInput(n, Scdf, [None] * n, [None] * n)
+
+    # the extreme probabilities give the extreme values of the data
+    S, I, Y = mc_input.sample(np.vstack([np.zeros(n), np.ones(n)]))
+    for i in [0, 1, 3]:
+        assert S[0, i] == Scdf[i].arr[0] and S[1, i] == Scdf[i].arr[-1]
+
+    S, I, Y = mc_input.sample(np.random.rand(30, n))
+    assert S.shape == (30, n)
+    assert np.allclose(S[:, 2], 0)
+    assert np.allclose(I, 0)
+    assert np.allclose(Y, 0)
+
+    # latin hypercube
+    ts = mc_input(10, use_latin_hypercube=True)
+    assert ts.S.shape == (10, n)
+
+
+def test_running_statistics():
+    """
+    The statistics updated by batches must match the statistics of all the samples
+    """
+    np.random.seed(1)
+    x = np.random.randn(1000, 5) * 3 + 2
+
+    stats = RunningStatistics(5)
+    for a in range(0, 1000, 128):
+        stats.update(x[a:a + 128, :])
+
+    assert stats.count == 1000
+    assert np.allclose(stats.mean, x.mean(axis=0))
+    assert np.allclose(stats.std, x.std(axis=0))
+
+
+def test_monte_carlo_results_reservoir():
+    """
+    The results keep at most p points while the statistics account for all the samples
+    """
+    np.random.seed(2)
+    n, m, p = 3, 2, 50
+    res = MonteCarloResults(n=n, m=m, p=p, bus_names=[''] * n, branch_names=[''] * m, bus_types=np.zeros(n))
+
+    V_all = list()
+    for _ in range(8):
+        V = 1.0 + 0.1 * np.random.randn(40, n) + 0j
+        V_all.append(V)
+        res.add_batch(S=np.zeros((40, n), dtype=complex), V=V, Sbr=np.ones((40, m), dtype=complex),
+                      loading=np.zeros((40, m), dtype=complex), losses=np.zeros((40, m), dtype=complex))
+        res.record_checkpoint()
+
+    res.trim()
+    res.compile_checkpoints()
+
+    V_all = np.vstack(V_all)
+    assert res.samples_number == 320
+    assert res.V_points.shape == (p, n)
+    assert np.allclose(res.voltage, np.abs(V_all).mean(axis=0))
+    assert np.allclose(res.v_std_conv[-1], np.abs(V_all).std(axis=0))
+    assert res.v_avg_conv.shape == (8, n)
+    assert np.array_equal(res.checkpoints, np.arange(1, 9) * 40)
+
+    # every kept point is one of the samples
+    for row in res.V_points:
+        assert np.any(np.all(np.isclose(V_all, row), axis=1))
+
+
+if __name__ == '__main__':
+    test_vectorized_sampling()
+    test_running_statistics()
+    test_monte_carlo_results_reservoir()
@@ -0,0 +1,98 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import tempfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen, FileSave
+from GridCal.Engine.IO.zip_interface import MANIFEST_NAME
+
+
+def test_binary_profiles_round_trip(tmp_path):
+    """
+    The profiles are saved in binary form and memory mapped when opening, giving back the same grid
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE39_1W.gridcal'
+    fname2 = tmp_path / 'IEEE39_1W_binary.gridcal'
+
+    # the old csv format is still read
+    grid = FileOpen(str(fname)).open()
+    assert grid.time_profile is not None
+
+    FileSave(grid, str(fname2)).save()
+
+    with zipfile.ZipFile(fname2) as z:
+        names = z.namelist()
+        assert MANIFEST_NAME in names
+        assert 'load_P_prof.npy' in names
+        assert 'load_P_prof.csv' not in names
+        assert z.getinfo('load_P_prof.npy').compress_type == zipfile.ZIP_STORED
+
+    grid2 = FileOpen(str(fname2)).open()
+
+    assert np.array_equal(grid.time_profile, grid2.time_profile)
+    assert len(grid.buses) == len(grid2.buses)
+
+    for load, load2 in zip(grid.get_loads(), grid2.get_loads()):
+        assert load.name == load2.name
+        assert load.P == load2.P
+        assert isinstance(load2.P_prof, np.memmap)
+        assert np.allclose(load.P_prof, load2.P_prof)
+
+    for gen, gen2 in zip(grid.get_generators(), grid2.get_generators()):
+        assert np.allclose(gen.P_prof, gen2.P_prof)
+
+    # the memory mapped profiles can be edited without touching the file
+    load2 = grid2.get_loads()[0]
+    load2.P_prof[:] = 0
+    assert np.allclose(FileOpen(str(fname2)).open().get_loads()[0].P_prof, grid.get_loads()[0].P_prof)
+
+    # saving over the file that is memory mapped: the profiles are copied to memory before replacing the file
+    FileSave(grid2, str(fname2)).save()
+    assert not isinstance(grid2.get_loads()[0].P_prof, np.memmap)
+    assert np.allclose(grid2.get_loads()[0].P_prof, 0)
+    grid3 = FileOpen(str(fname2)).open()
+    assert np.allclose(grid3.get_loads()[0].P_prof, 0)
+    assert np.allclose(grid3.get_loads()[1].P_prof, grid.get_loads()[1].P_prof)
+
+
+def test_save_twice(tmp_path):
+    """
+    Saving again over an existing file (the usual "save") replaces it
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus.gridcal'
+    fname2 = str(tmp_path / 'IEEE 30 Bus.gridcal')
+
+    grid = FileOpen(str(fname)).open()
+    FileSave(grid, fname2).save()
+
+    grid.get_loads()[0].P += 1.0
+    FileSave(grid, fname2).save()
+
+    grid2 = FileOpen(fname2).open()
+    assert len(grid2.buses) == len(grid.buses)
+    assert len(grid2.lines) == len(grid.lines)
+    assert grid2.get_loads()[0].P == grid.get_loads()[0].P
+
+    # and once more from the grid that was opened from that file
+    FileSave(grid2, fname2).save()
+    assert FileOpen(fname2).open().get_loads()[0].P == grid.get_loads()[0].P
+
+
+if __name__ == '__main__':
+    test_binary_profiles_round_trip(Path(tempfile.mkdtemp()))
+    test_save_twice(Path(tempfile.mkdtemp()))
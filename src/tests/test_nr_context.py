@@ -0,0 +1,96 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+from pathlib import Path
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import NR_LS, NR_LS_cached, NRSolverContext
+
+
+def test_nr_context():
+    """
+    The Newton-Raphson with the cached Jacobian structure must match the regular Newton-Raphson,
+    and the structure must be analyzed only once for many load levels
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+    main_circuit = FileOpen(fname).open()
+    nc = compile_snapshot_circuit(main_circuit)
+    island = split_into_islands(nc)[0]
+
+    honest = NRSolverContext(dishonest=False)
+    dishonest = NRSolverContext(dishonest=True)
+
+    for factor in [0.8, 0.9, 1.0, 1.1, 1.2]:
+        Sbus = island.Sbus * factor
+
+        V1, ok1, err1, S1, it1, el1 = NR_LS(Ybus=island.Ybus, Sbus=Sbus, V0=island.Vbus.copy(), Ibus=island.Ibus,
+                                            pv=island.pv, pq=island.pq, tol=1e-8, max_it=25)
+
+        V2, ok2, err2, S2, it2, el2 = NR_LS_cached(context=honest, Ybus=island.Ybus, Sbus=Sbus,
+                                                   V0=island.Vbus.copy(), Ibus=island.Ibus,
+                                                   pv=island.pv, pq=island.pq, tol=1e-8, max_it=25)
+
+        V3, ok3, err3, S3, it3, el3 = NR_LS_cached(context=dishonest, Ybus=island.Ybus, Sbus=Sbus,
+                                                   V0=island.Vbus.copy(), Ibus=island.Ibus,
+                                                   pv=island.pv, pq=island.pq, tol=1e-8, max_it=25)
+
+        assert ok1 and ok2 and ok3
+        assert it1 == it2
+        assert np.allclose(V1, V2, atol=1e-10)
+        assert np.allclose(V1, V3, atol=1e-4)
+
+    assert honest.n_analysis == 1
+    assert dishonest.n_analysis == 1
+    assert dishonest.n_factorizations < honest.n_factorizations
+
+
+def test_nr_context_in_place_changes():
+    """
+    The dishonest context must discard its factorization when the admittance values are patched in place
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+    main_circuit = FileOpen(fname).open()
+    nc = compile_snapshot_circuit(main_circuit)
+    island = split_into_islands(nc)[0]
+
+    context = NRSolverContext(dishonest=True)
+    NR_LS_cached(context=context, Ybus=island.Ybus, Sbus=island.Sbus, V0=island.Vbus.copy(), Ibus=island.Ibus,
+                 pv=island.pv, pq=island.pq, tol=1e-8, max_it=25)
+    assert context.lu is not None
+
+    # the same values keep the factorization
+    context.update(island.Ybus, island.pv, island.pq)
+    assert context.lu is not None
+
+    # switch off the first line (part of a mesh) in place: same matrix object, different values
+    island.update_branch_active(np.array([0]), np.array([0]))
+    context.update(island.Ybus, island.pv, island.pq)
+    assert context.lu is None
+
+    V1, ok1, err1, S1, it1, el1 = NR_LS(Ybus=island.Ybus, Sbus=island.Sbus, V0=island.Vbus.copy(),
+                                        Ibus=island.Ibus, pv=island.pv, pq=island.pq, tol=1e-8, max_it=25)
+
+    V2, ok2, err2, S2, it2, el2 = NR_LS_cached(context=context, Ybus=island.Ybus, Sbus=island.Sbus,
+                                               V0=island.Vbus.copy(), Ibus=island.Ibus,
+                                               pv=island.pv, pq=island.pq, tol=1e-8, max_it=25)
+
+    assert ok1 and ok2
+    assert np.allclose(V1, V2, atol=1e-4)
+
+
+if __name__ == '__main__':
+    test_nr_context()
+    test_nr_context_in_place_changes()
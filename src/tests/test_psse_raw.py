@@ -0,0 +1,74 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.IO.psse_parser import PSSeParser, read_raw_sections, parse_records, RAW_RECORDS, strip_comment
+
+
+def test_bulk_records():
+    """
+    The single line records are parsed in bulk with their defaults, quotes and comments
+    """
+    logger = Logger()
+    lines = ["  101,'BUS A  ', 15.0, 3, 1, 1, 1, 1.02, -3.5",
+             "  102,'B/C', 330.0,1,   2,   1,   1,1.01, -30.75, 1.1, 0.9, 1.05, 0.95 / comment",
+             "",
+             "  103,'D'"]
+
+    rec = parse_records(lines, RAW_RECORDS['bus'][33], logger)
+
+    assert len(rec) == 3
+    assert rec['I'].dtype == np.int64
+    assert np.array_equal(rec['I'], [101, 102, 103])
+    assert list(rec['NAME']) == ['BUS A', 'B/C', 'D']
+    assert np.allclose(rec['EVLO'], [0.9, 0.95, 0.9])
+    assert np.array_equal(rec['IDE'], [3, 1, 1])
+    assert np.allclose(rec['VM'], [1.02, 1.01, 1.0])
+
+    assert strip_comment("1, 'A/B', 2 / end") == "1, 'A/B', 2 "
+
+
+def test_raw_sections():
+    """
+    The streaming reader gives the sections and the circuit has all the devices
+    """
+    fname = Path(__file__).parent / 'data' / 'IEEE 30 bus.raw'
+
+    header, sections = read_raw_sections(str(fname))
+    assert len(header) == 3
+    assert len(sections['bus']) == 30
+    assert len(sections['branch']) == 37
+
+    parser = PSSeParser(str(fname))
+    grid = parser.pss_grid
+    circuit = parser.circuit
+
+    assert len(grid.tables['bus']) == 30
+    assert len(circuit.buses) == 30
+    assert len(circuit.get_loads()) == len(grid.tables['load'])
+    assert len(circuit.get_generators()) == len(grid.tables['generator'])
+    assert len(circuit.get_shunts()) == len(grid.tables['fixed shunt'])
+    branches = grid.tables['branch']
+    assert len(circuit.lines) == len(set(zip(branches['I'], branches['J'], branches['CKT'])))
+    assert len(circuit.transformers2w) == 4
+    assert sum(bus.is_slack for bus in circuit.buses) == 1
+
+
+if __name__ == '__main__':
+    test_bulk_records()
+    test_raw_sections()
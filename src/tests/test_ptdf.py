@@ -0,0 +1,117 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+from pathlib import Path
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Simulations.PTDF.linear_analysis import make_ptdf, make_lodf, iter_ptdf_blocks, \
+    get_slack_distribution
+from GridCal.Engine.Simulations.PTDF.ptdf_ts_driver import PtdfTimeSeries
+from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
+
+
+def get_island():
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+    grid = FileOpen(fname).open()
+    nc = compile_snapshot_circuit(grid)
+    return split_into_islands(nc)[0]
+
+
+def test_ptdf_balance():
+    """
+    The PTDF flows must fulfill the nodal balance: the injection of each bus is withdrawn at the slack
+    """
+    island = get_island()
+    ptdf = make_ptdf(island)
+    A = (island.C_branch_bus_f - island.C_branch_bus_t).toarray()
+
+    # net injection at each bus per unit of injection at every bus
+    P = np.dot(A.T, ptdf)
+
+    expected = np.eye(island.nbus)
+    expected[island.vd, :] -= 1.0
+    expected[:, island.vd] = 0.0
+
+    assert np.allclose(P, expected, atol=1e-8)
+
+    # the blocked computation must match the dense one
+    blocks = np.zeros_like(ptdf)
+    for br_idx, block in iter_ptdf_blocks(island, block_size=7):
+        blocks[br_idx, :] = block
+    assert np.allclose(blocks, ptdf)
+
+    # with distributed slack, every injection is withdrawn by all the buses
+    ptdf_d = make_ptdf(island, distribute_slack=True)
+    w = get_slack_distribution(island)
+    assert np.allclose(np.dot(A.T, ptdf_d), np.eye(island.nbus) - w[:, np.newaxis], atol=1e-8)
+
+
+def test_lodf():
+    """
+    The LODF predicted flows must match the PTDF flows of the grid without the failed branch
+    """
+    island = get_island()
+    ptdf = make_ptdf(island)
+    lodf = make_lodf(island, ptdf)
+
+    P = island.Sbus.real
+    flows = np.dot(ptdf, P)
+
+    for k in range(island.nbr):
+        if np.allclose(np.delete(lodf[:, k], k), 0.0):
+            continue  # the branch splits the grid
+
+        island.branch_active[k] = 0
+        island.compute_admittance_matrices(newton_raphson=True)
+        expected = np.dot(make_ptdf(island), P)
+        island.branch_active[k] = 1
+        island.compute_admittance_matrices(newton_raphson=True)
+
+        predicted = flows + lodf[:, k] * flows[k]
+        predicted[k] = 0.0
+
+        assert np.allclose(predicted, expected, atol=1e-6)
+
+
+def test_ptdf_time_series_topology():
+    """
+    The analytic PTDF time series must use the topology of every time step
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+    grid = FileOpen(fname).open()
+    nt = len(grid.time_profile)
+
+    # the first line (1-2) is part of a mesh, so switching it off does not split the grid
+    for branch in grid.get_branches():
+        branch.active_prof = np.ones(nt, dtype=bool)
+    grid.lines[0].active_prof[::2] = False
+
+    driver = PtdfTimeSeries(grid=grid, pf_options=PowerFlowOptions(), analytic=True)
+    results = driver.run_analytic_mode(np.arange(nt))
+
+    for active in [False, True]:
+        grid.lines[0].active = active
+        ptdf = make_ptdf(split_into_islands(compile_snapshot_circuit(grid))[0])
+        t_idx = np.where(grid.lines[0].active_prof == active)[0]
+        expected = np.dot(ptdf, results.S[t_idx, :].T).T
+
+        assert np.allclose(results.Sbranch[t_idx, :], expected, atol=1e-6)
+
+
+if __name__ == '__main__':
+    test_ptdf_balance()
+    test_lodf()
+    test_ptdf_time_series_topology()
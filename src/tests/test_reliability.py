@@ -0,0 +1,142 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+
+from GridCal.Engine.basic_structures import SolverType
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit
+from GridCal.Engine.Devices.bus import Bus
+from GridCal.Engine.Devices.load import Load
+from GridCal.Engine.Devices.generator import Generator
+from GridCal.Engine.Devices.line import Line
+from GridCal.Engine.Simulations.Stochastic.reliability_driver import get_reliability_events, ReliabilityStudy, \
+    ReliabilityOptions, ReliabilityContext
+
+# unavailability of the devices with mttf=1000 h and mttr=100 h
+U = 100.0 / 1100.0
+
+
+def get_two_bus_grid(n_lines, line_rate, gen_pmax, gen_mttf):
+    """
+    Load of 100 MW at bus 1 fed from a generator at bus 0 (and another at bus 1 if there are two generators)
+    """
+    grid = MultiCircuit()
+    b0 = Bus(name='B0', is_slack=True)
+    b1 = Bus(name='B1')
+    grid.add_bus(b0)
+    grid.add_bus(b1)
+
+    grid.add_load(b1, Load(name='L1', P=100.0, Q=0.0))
+
+    for i, pmax in enumerate(gen_pmax):
+        grid.add_generator(b0 if i == 0 else b1, Generator(name='G' + str(i), active_power=50.0, p_max=pmax,
+                                                           mttf=gen_mttf, mttr=100.0))
+
+    for i in range(n_lines):
+        grid.add_line(Line(bus_from=b0, bus_to=b1, name='Line' + str(i), r=0.0, x=0.1, rate=line_rate,
+                           mttf=1000.0, mttr=100.0))
+
+    return grid
+
+
+def test_reliability_events():
+    """
+    The events of every device and year alternate between failure and repair within the horizon
+    """
+    mttf = np.array([100.0, 0.0, 500.0])
+    mttr = np.array([10.0, 10.0, 50.0])
+
+    times, years, devices, states = get_reliability_events(1000.0, mttf, mttr, n_years=20,
+                                                           rng=np.random.RandomState(0))
+
+    assert np.all(times < 1000.0)
+    assert 1 not in devices
+    assert set(years) == set(range(20))
+
+    for y in range(20):
+        sel = years == y
+        assert np.all(np.diff(times[sel]) >= 0)
+        for d in [0, 2]:
+            s = states[sel & (devices == d)]
+            assert not np.any(s[::2])
+            assert np.all(s[1::2])
+
+
+def test_generation_adequacy():
+    """
+    Two 80 MW generators supplying 100 MW: the loss of any of them curtails load
+    """
+    grid = get_two_bus_grid(n_lines=1, line_rate=1000.0, gen_pmax=[80.0, 80.0], gen_mttf=1000.0)
+
+    options = ReliabilityOptions(batch_size=50, max_years=300, tolerance=0.0, seed=0)
+    study = ReliabilityStudy(grid, options)
+    study.run()
+    res = study.results
+
+    # losing the line also curtails load, since the bus 1 generator cannot supply the load alone
+    lole = 8760.0 * (1.0 - (1.0 - U) ** 2 * (1.0 - U))
+    assert res.n_years == 300
+    assert abs(res.lole - lole) / lole < 0.1
+
+    assert len(res.convergence) == 6
+    assert res.convergence[-1][0] == 300
+
+    df = res.get_component_indices_df()
+    assert np.isclose(df['Share'].sum(), 1.0)
+    assert np.isclose(df['EENS (MWh/year)'].sum(), res.eens)
+
+    bus_df = res.get_bus_indices_df()
+    assert np.isclose(bus_df.values[0, 0], 0.0)
+    assert np.isclose(bus_df.values[1, 0], res.eens)
+
+
+def test_network_curtailment():
+    """
+    Two lines of 60 MW supplying 100 MW: the loss of one line sheds 40 MW, the loss of both sheds all
+    """
+    grid = get_two_bus_grid(n_lines=2, line_rate=60.0, gen_pmax=[200.0], gen_mttf=0.0)
+    nc = compile_snapshot_circuit(grid)
+
+    for solver_type in [SolverType.DC, SolverType.LACPF]:
+        context = ReliabilityContext(nc, ReliabilityOptions(solver_type=solver_type))
+        assert np.isclose(context.evaluate(set())[0], 0.0)
+        assert np.isclose(context.evaluate({0})[0], 40.0, atol=0.5)
+        assert np.isclose(context.evaluate({1})[0], 40.0, atol=0.5)
+        assert np.isclose(context.evaluate({0, 1})[0], 100.0)
+
+    # sequential simulation, the states and topologies are evaluated once
+    context = ReliabilityContext(nc, ReliabilityOptions())
+    lol, ens, component_ens, bus_ens = context.simulate_years(200, seed=1)
+
+    assert len(context.topologies) <= 4
+    assert len(context.states) <= 4
+
+    eens = 8760.0 * (2.0 * U * (1.0 - U) * 40.0 + U * U * 100.0)
+    assert abs(ens.mean() - eens) / eens < 0.1
+    assert np.isclose(component_ens[2], 0.0)
+    assert np.isclose(component_ens.sum(), ens.sum())
+
+    # parallel years
+    options = ReliabilityOptions(batch_size=20, max_years=40, tolerance=0.0, use_multiprocessing=True, seed=2)
+    study = ReliabilityStudy(grid, options)
+    study.run()
+    assert study.results.n_years == 40
+    assert study.results.eens > 0
+
+
+if __name__ == '__main__':
+    test_reliability_events()
+    test_generation_adequacy()
+    test_network_curtailment()
@@ -0,0 +1,55 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+from pathlib import Path
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Simulations.ShortCircuit.short_circuit import short_circuit_3p, short_circuit_3p_sparse, \
+    short_circuit_sweep, iter_bus_faults, SparseZbus
+
+
+def test_sparse_short_circuit():
+    """
+    The sparse fault engine must match the dense Zbus inverse
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+    grid = FileOpen(fname).open()
+    island = split_into_islands(compile_snapshot_circuit(grid))[0]
+
+    n = island.nbus
+    Vbus = island.Vbus
+    Zf = np.full(n, 1e-3 + 1e-2j)
+    Zbus = np.linalg.inv(island.Ybus.toarray())
+    zbus = SparseZbus(island.Ybus)
+
+    bus_idx = [3, 16]
+    V1, SCC1 = short_circuit_3p(bus_idx, Zbus, Vbus, Zf, island.Sbase)
+    V2, SCC2 = short_circuit_3p_sparse(bus_idx, zbus, Vbus, Zf, island.Sbase)
+    assert np.allclose(V1, V2)
+    assert np.allclose(SCC1, SCC2)
+
+    # the sweep must match the single bus faults
+    SCC, Vmin = short_circuit_sweep(zbus, Vbus, Zf, island.Sbase, block_size=7)
+    for k, V, SCpower in iter_bus_faults(zbus, Vbus, Zf, island.Sbase, block_size=7):
+        V3, SCC3 = short_circuit_3p([k], Zbus, Vbus, Zf, island.Sbase)
+        assert np.allclose(V, V3)
+        assert np.isclose(SCpower, SCC3[k])
+        assert np.isclose(SCC[k], SCC3[k])
+        assert np.isclose(Vmin[k], np.abs(V3).min())
+
+
+if __name__ == '__main__':
+    test_sparse_short_circuit()
@@ -0,0 +1,127 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit
+from GridCal.Engine.Devices.bus import Bus
+from GridCal.Engine.Devices.line import Line
+from GridCal.Engine.Devices.measurement import Measurement, MeasurementType
+from GridCal.Engine.Simulations.StateEstimation.state_estimation import solve_se_lm, GainMatrixSolver, \
+    StateEstimationMethod
+from GridCal.Engine.Simulations.StateEstimation.state_stimation_driver import StateEstimation, \
+    StateEstimationOptions, StateEstimationTimeSeries, collect_measurements, get_circuit_measurements
+
+# validated solution of the 3 bus example
+V_SOL = np.array([0.99962926 + 0.j, 0.97392515 - 0.02120941j, 0.94280676 - 0.04521561j])
+
+
+def get_3_bus_grid():
+    """
+    Three bus grid with 8 measurements
+    """
+    grid = MultiCircuit()
+
+    b1 = Bus('B1', is_slack=True)
+    b2 = Bus('B2')
+    b3 = Bus('B3')
+
+    br1 = Line(b1, b2, name='Br1', r=0.01, x=0.03)
+    br2 = Line(b1, b3, name='Br2', r=0.02, x=0.05)
+    br3 = Line(b2, b3, name='Br3', r=0.03, x=0.08)
+
+    br1.measurements.append(Measurement(0.888, 0.008, MeasurementType.Pflow))
+    br2.measurements.append(Measurement(1.173, 0.008, MeasurementType.Pflow))
+    b2.measurements.append(Measurement(-0.501, 0.01, MeasurementType.Pinj))
+    br1.measurements.append(Measurement(0.568, 0.008, MeasurementType.Qflow))
+    br2.measurements.append(Measurement(0.663, 0.008, MeasurementType.Qflow))
+    b2.measurements.append(Measurement(-0.286, 0.01, MeasurementType.Qinj))
+    b1.measurements.append(Measurement(1.006, 0.004, MeasurementType.Vmag))
+    b2.measurements.append(Measurement(0.968, 0.004, MeasurementType.Vmag))
+
+    for bus in [b1, b2, b3]:
+        grid.add_bus(bus)
+
+    for br in [br1, br2, br3]:
+        grid.add_line(br)
+
+    return grid
+
+
+def test_state_estimation():
+    """
+    The normal equations and the orthogonal methods give the validated solution
+    """
+    grid = get_3_bus_grid()
+
+    for method in [StateEstimationMethod.NormalEquations, StateEstimationMethod.Orthogonal]:
+        se = StateEstimation(circuit=grid, options=StateEstimationOptions(method=method))
+        se.run()
+
+        assert se.se_results.converged()
+        assert np.allclose(se.se_results.voltage, V_SOL, atol=1e-5)
+
+
+def test_gain_matrix_reuse():
+    """
+    The ordering of the gain matrix is computed once for a measurement set
+    """
+    grid = get_3_bus_grid()
+    nc = compile_snapshot_circuit(grid)
+    nc.consolidate()
+    se_input = collect_measurements(grid, np.arange(nc.nbus), np.arange(nc.nbr))
+    z, sigma = se_input.consolidate()
+
+    solver = GainMatrixSolver()
+    V = None
+    for scale in [1.0, 1.01, 0.99]:
+        V, err, converged, it = solve_se_lm(Ybus=nc.Ybus, Yf=nc.Yf, Yt=nc.Yt, f=nc.F, t=nc.T, se_input=se_input,
+                                            ref=nc.vd, pq=nc.pq, pv=nc.pv, V0=V, z=z * scale, sigma=sigma,
+                                            solver=solver)
+        assert converged
+
+    assert solver.n_analysis == 1
+    assert solver.n_factorizations > 3
+
+
+def test_state_estimation_time_series():
+    """
+    The snapshots are estimated in sequence starting from the previous estimation
+    """
+    grid = get_3_bus_grid()
+    measurements = get_circuit_measurements(grid)
+    z = np.array([m.val for m in measurements])
+
+    rng = np.random.RandomState(0)
+    nt = 10
+    Z = z * (1.0 + 0.001 * rng.randn(nt, len(z)))
+    Z[0, :] = z
+
+    driver = StateEstimationTimeSeries(grid, Z)
+    driver.run()
+    res = driver.results
+
+    assert np.all(res.converged)
+    assert np.allclose(res.voltage[0, :], V_SOL, atol=1e-5)
+    assert np.all(np.abs(res.voltage[1:, :] - V_SOL) < 0.01)
+
+    # the warm start saves iterations
+    assert res.iterations[1:].mean() < res.iterations[0]
+
+
+if __name__ == '__main__':
+    test_state_estimation()
+    test_gain_matrix_reuse()
+    test_state_estimation_time_series()
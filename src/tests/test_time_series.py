@@ -0,0 +1,181 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import tempfile
+
+import numpy as np
+from pathlib import Path
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.basic_structures import TimeSeriesInitialization
+from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import SolverType, ReactivePowerControlMode
+from GridCal.Engine.Simulations.PowerFlow.time_series_driver import TimeSeries, open_time_series_results
+from GridCal.Engine.Simulations.result_types import ResultTypes
+from GridCal.Engine.IO.h5_interface import H5Array
+
+
+def get_grid():
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 30 Bus with storage.xlsx'
+    return FileOpen(fname).open()
+
+
+def run_time_series(grid, results_file=None, keep_results=None, **kwargs):
+    options = PowerFlowOptions(SolverType.NR,
+                               control_q=ReactivePowerControlMode.NoControl,
+                               tolerance=1e-8,
+                               **kwargs)
+    ts = TimeSeries(grid=grid, options=options, results_file=results_file, keep_results=keep_results)
+    ts.run()
+    return ts.results
+
+
+def test_batched_time_series():
+    """
+    The batched time series must match the step by step time series
+    """
+    grid = get_grid()
+    reference = run_time_series(grid)
+    batched = run_time_series(grid, batched_time_series=True)
+
+    assert batched.converged.all()
+    assert np.allclose(reference.voltage, batched.voltage, atol=1e-6)
+    assert np.allclose(reference.Sbranch, batched.Sbranch, atol=1e-3)
+    assert np.allclose(reference.loading, batched.loading, atol=1e-5)
+
+    # the linear predictor is also used as initial guess of the batched time steps
+    predicted = run_time_series(grid, batched_time_series=True,
+                                ts_initialization=TimeSeriesInitialization.LinearPredictor)
+
+    assert predicted.converged.all()
+    assert np.allclose(reference.voltage, predicted.voltage, atol=1e-6)
+    assert predicted.iterations.sum() <= batched.iterations.sum()
+
+
+def test_multi_core_time_series():
+    """
+    The parallel time series must match the single thread time series
+    """
+    grid = get_grid()
+    reference = run_time_series(grid)
+    parallel = run_time_series(grid, multi_core=True)
+
+    assert parallel.converged.all()
+    assert np.allclose(reference.voltage, parallel.voltage)
+    assert np.allclose(reference.Sbranch, parallel.Sbranch)
+    assert np.allclose(reference.loading, parallel.loading)
+
+
+def test_time_series_initialization():
+    """
+    The warm start strategies must reach the same solution with fewer iterations
+    """
+    grid = get_grid()
+    reference = run_time_series(grid)
+
+    for initialization in [TimeSeriesInitialization.PreviousSolution,
+                           TimeSeriesInitialization.LinearExtrapolation,
+                           TimeSeriesInitialization.QuadraticExtrapolation,
+                           TimeSeriesInitialization.LinearPredictor]:
+        results = run_time_series(grid, ts_initialization=initialization)
+
+        assert results.converged.all()
+        assert np.allclose(reference.voltage, results.voltage, atol=1e-4)
+        assert results.iterations.sum() < reference.iterations.sum()
+
+
+def test_time_series_results_file(tmp_path):
+    """
+    The results streamed into a file and read back lazily must match the results in memory
+    """
+    grid = get_grid()
+    reference = run_time_series(grid)
+
+    for kwargs in [dict(), dict(batched_time_series=True)]:
+        fname = str(tmp_path / 'IEEE 30 Bus time series.h5')
+        streamed = run_time_series(grid, results_file=fname, **kwargs)
+        assert isinstance(streamed.voltage, H5Array)
+        assert np.allclose(reference.voltage, streamed.voltage, atol=1e-6)
+        assert np.allclose(reference.loading, streamed.loading, atol=1e-5)
+        streamed.close()
+
+    # the same driver runs again into the same file
+    options = PowerFlowOptions(SolverType.NR, control_q=ReactivePowerControlMode.NoControl, tolerance=1e-8)
+    ts = TimeSeries(grid=grid, options=options, results_file=str(tmp_path / 'IEEE 30 Bus rerun.h5'))
+    ts.run()
+    ts.run()
+    assert np.allclose(reference.voltage, ts.results.voltage, atol=1e-6)
+    ts.results.close()
+
+    # save the in-memory results in binary form and open them without loading the arrays
+    fname = str(tmp_path / 'IEEE 30 Bus time series saved.h5')
+    reference.save(fname)
+    results = open_time_series_results(fname)
+
+    assert isinstance(results.Sbranch, H5Array)
+    assert np.array_equal(results.time, reference.time)
+    assert list(results.branch_names) == list(reference.branch_names)
+    assert np.array_equal(results.Sbranch[2:5], reference.Sbranch[2:5])
+    assert results.converged.all()
+
+    mdl = results.mdl(ResultTypes.BranchLoading)
+    assert isinstance(mdl.data_c, H5Array)
+    assert np.isclose(mdl.data_c[3, 2], np.abs(reference.loading[3, 2]) * 100)
+    assert np.allclose(mdl.get_data()[2], np.abs(reference.loading) * 100)
+
+    mdl = results.mdl(ResultTypes.BusActivePower)
+    assert np.allclose(np.asarray(mdl.data_c), reference.S.real)
+    results.close()
+
+
+def test_time_series_statistics():
+    """
+    The statistics are computed along the simulation and the arrays that are not kept are not allocated
+    """
+    grid = get_grid()
+    reference = run_time_series(grid)
+
+    vm = np.abs(reference.voltage)
+    lm = np.abs(reference.loading)
+    assert np.allclose(reference.voltage_max, vm.max(axis=0))
+    assert np.allclose(reference.voltage_min, vm.min(axis=0))
+    assert np.allclose(reference.loading_max, lm.max(axis=0))
+    assert np.array_equal(reference.overload_count, (lm > 1.0).sum(axis=0))
+
+    for kwargs in [dict(), dict(batched_time_series=True), dict(multi_core=True)]:
+        results = run_time_series(grid, keep_results=['loading'], **kwargs)
+
+        assert results.voltage is None
+        assert results.Sbranch is None
+        assert np.allclose(results.loading, reference.loading, atol=1e-5)
+        assert np.allclose(results.voltage_max, reference.voltage_max, atol=1e-6)
+        assert np.allclose(results.voltage_min, reference.voltage_min, atol=1e-6)
+        assert np.allclose(results.Sbranch_max, reference.Sbranch_max, atol=1e-3)
+        assert np.array_equal(results.overload_count, reference.overload_count)
+
+        assert ResultTypes.BusVoltageModule not in results.available_results
+        assert results.mdl(ResultTypes.BusVoltageModule) is None
+        assert results.mdl(ResultTypes.BranchLoadingMax).data_c.shape == (len(results.branch_names), 1)
+
+        data = results.get_results_dict()
+        assert 'Vm' not in data
+        assert np.allclose(data['loading'], np.abs(reference.loading), atol=1e-5)
+
+
+if __name__ == '__main__':
+    test_batched_time_series()
+    test_multi_core_time_series()
+    test_time_series_initialization()
+    test_time_series_results_file(Path(tempfile.mkdtemp()))
+    test_time_series_statistics()
@@ -0,0 +1,91 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+from scipy.sparse import csc_matrix, lil_matrix
+
+from GridCal.Engine.Core.common_functions import group_states, states_to_time_groups
+from GridCal.Engine.Core.topology import find_islands, get_island_labels, get_elements_of_the_island, \
+    find_islands_by_state
+from GridCal.Engine.Sparse.csc import scipy_to_mat
+
+
+def get_branch_bus_connectivity(branches, n):
+    C = lil_matrix((len(branches), n), dtype=int)
+    for k, (f, t) in enumerate(branches):
+        C[k, f] = 1
+        C[k, t] = 1
+    return csc_matrix(C)
+
+
+def test_find_islands():
+    """
+    Three islands: a ring 0-1-2-3, a line 4-5-6 and the isolated bus 7
+    """
+    branches = [(0, 1), (1, 2), (2, 3), (3, 0), (4, 5), (6, 5)]
+    C = get_branch_bus_connectivity(branches, 8)
+    adj = csc_matrix(C.T * C)
+
+    islands = find_islands(adj)
+    assert len(islands) == 3
+    assert np.array_equal(islands[0], [0, 1, 2, 3])
+    assert np.array_equal(islands[1], [4, 5, 6])
+    assert np.array_equal(islands[2], [7])
+
+    labels, n_islands = get_island_labels(adj)
+    assert n_islands == 3
+    assert np.array_equal(labels, [0, 0, 0, 0, 1, 1, 1, 2])
+
+    # the elements of each island are those connected to any of its buses
+    assert np.array_equal(np.sort(get_elements_of_the_island(C, islands[0])), [0, 1, 2, 3])
+    assert np.array_equal(np.sort(get_elements_of_the_island(C, islands[1])), [4, 5])
+    assert len(get_elements_of_the_island(C, islands[2])) == 0
+
+    # the native sparse matrix finds the same islands
+    islands2 = scipy_to_mat(adj).islands()
+    assert len(islands2) == 3
+    for a, b in zip(islands, islands2):
+        assert np.array_equal(a, b)
+
+
+def test_group_states():
+    """
+    The time steps with the same branch states are grouped, and the islands are computed once per state
+    """
+    branches = [(0, 1), (1, 2), (2, 3)]
+    C = get_branch_bus_connectivity(branches, 4)
+
+    branch_active = np.array([[1, 1, 1],
+                              [1, 0, 1],
+                              [1, 1, 1],
+                              [1, 0, 1],
+                              [0, 0, 0]])
+    bus_active = np.ones((5, 4), dtype=int)
+
+    first, inverse = group_states(branch_active)
+    assert np.array_equal(first, [0, 1, 4])
+    assert np.array_equal(inverse, [0, 1, 0, 1, 2])
+
+    groups = states_to_time_groups(first, inverse)
+    assert [t_array.tolist() for t_array in groups] == [[0, 2], [1, 3], [4]]
+
+    state_idx, state_islands = find_islands_by_state(C, C, branch_active, bus_active)
+    assert np.array_equal(state_idx, inverse)
+    assert [len(islands) for t_array, islands in state_islands] == [1, 2, 4]
+    assert np.array_equal(state_islands[1][0], [1, 3])
+
+
+if __name__ == '__main__':
+    test_find_islands()
+    test_group_states()
@@ -0,0 +1,88 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from types import SimpleNamespace
+
+import numpy as np
+import scipy.sparse as sp
+
+from GridCal.Engine.Core.admittance_matrices import AdmittanceStructure
+from GridCal.Engine.Simulations.Dynamics.dynamic_modules import dynamic_simulation, DynamicModels, \
+    TransientStabilityEvents
+
+
+def get_grid():
+    """
+    Generator at bus 0 feeding a load at bus 1 through two parallel lines
+    """
+    n = 2
+    Cf = sp.csc_matrix(np.array([[1, 0], [1, 0]]))
+    Ct = sp.csc_matrix(np.array([[0, 1], [0, 1]]))
+    ys = 1.0 / np.array([0.01 + 0.1j, 0.01 + 0.1j])
+    structure = AdmittanceStructure(Cf, Ct)
+    Ybus, _, _ = structure.assemble(ys, -ys, -ys, ys, np.ones(2, dtype=int), np.zeros(n, dtype=complex))
+
+    # consistent operating point
+    V = np.array([1.02, 0.98 * np.exp(-0.1j)])
+    Sbus = V * np.conj(Ybus * V)
+
+    gen = SimpleNamespace(machine_model=DynamicModels.SynchronousGeneratorOrder4,
+                          H=3.0, Ra=0.0, Xd=1.68, Xa=0.0, Xdp=0.32, Xdpp=0.2, Xq=1.61, Xqp=0.32, Xqpp=0.2,
+                          Td0p=5.5, Tq0p=4.6, Snom=100.0, speed_volt=False)
+
+    return n, V, Sbus, Ybus, structure, gen
+
+
+def test_steady_state():
+    """
+    Without events, the initialised machines stay at the operating point
+    """
+    n, V, Sbus, Ybus, structure, gen = get_grid()
+
+    res = dynamic_simulation(n=n, Vbus=V, Sbus=Sbus, Ybus=Ybus, Sbase=100, fBase=50, t_sim=1.0, h=0.01,
+                             dynamic_devices=[gen], bus_indices=[0], decimation=10, max_err=1e-9)
+
+    assert res.voltage.shape == (11, n)
+    assert np.allclose(res.time, np.linspace(0, 1, 11))
+    assert np.allclose(res.voltage, V, atol=1e-6)
+    assert np.allclose(res.omega, 1.0, atol=1e-6)
+    assert res.factorizations == 1
+
+
+def test_events():
+    """
+    The network is factorized once per event time, and the fault accelerates the machine
+    """
+    n, V, Sbus, Ybus, structure, gen = get_grid()
+
+    events = TransientStabilityEvents()
+    events.add(0.1, 'Bus short circuit', 1, None)
+    events.add(0.2, 'Bus recovery', 1, None)
+    events.add(0.2, 'Line failure', 0, None)
+
+    res = dynamic_simulation(n=n, Vbus=V, Sbus=Sbus, Ybus=Ybus, Sbase=100, fBase=50, t_sim=0.5, h=0.01,
+                             dynamic_devices=[gen], bus_indices=[0], events=events, max_err=1e-8,
+                             admittance_structure=structure)
+
+    assert res.factorizations == 3
+    assert np.abs(res.voltage[15, 1]) < 1e-3
+    assert res.omega[20, 0] > 1.0
+
+    # the shared admittance matrix is not modified by the events
+    assert np.all(structure.active == 1)
+
+
+if __name__ == '__main__':
+    test_steady_state()
+    test_events()
@@ -0,0 +1,121 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine import FileOpen
+from GridCal.Engine.Core.snapshot_pf_data import compile_snapshot_circuit, split_into_islands
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowOptions, PowerFlowDriver
+from GridCal.Engine.Simulations.ContinuationPowerFlow.continuation_power_flow import predictor, corrector, \
+    predictor_cached, corrector_cached, CpfSolverContext, VCParametrization
+from GridCal.Engine.Simulations.ContinuationPowerFlow.voltage_collapse_driver import VoltageCollapseOptions, \
+    VoltageCollapseMultiDirection, get_transfer_target
+
+
+def get_base_case():
+    """
+    IEEE 9 bus grid with its solved power flow
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE 9 Bus.gridcal'
+    grid = FileOpen(str(fname)).open()
+
+    pf_options = PowerFlowOptions()
+    pf = PowerFlowDriver(grid, pf_options)
+    pf.run()
+
+    nc = compile_snapshot_circuit(grid)
+    island = split_into_islands(nc)[0]
+
+    return grid, pf_options, island, island.Sbus.copy(), pf.results.voltage.copy()
+
+
+def test_cached_predictor_corrector():
+    """
+    The predictor and corrector with the stored structure give the same steps as the original ones
+    """
+    grid, pf_options, island, Sbase, Vbase = get_base_case()
+    Sxfr = Sbase * 0.5
+    nb = len(Vbase)
+
+    for parametrization in [VCParametrization.Natural, VCParametrization.ArcLength,
+                            VCParametrization.PseudoArcLength]:
+        context = CpfSolverContext()
+        context.update(island.Ybus, island.pv, island.pq)
+
+        z = np.zeros(2 * nb + 1)
+        z[2 * nb] = 1.0
+        V0, lam0, z0 = predictor(Vbase.copy(), island.Ibus, 0.0, island.Ybus, Sxfr, island.pv, island.pq, 0.1,
+                                 z.copy(), Vbase.copy(), 0.0, parametrization)
+        V1, lam1, z1 = predictor_cached(context, Vbase.copy(), island.Ibus, 0.0, Sxfr, island.pv, island.pq, 0.1,
+                                        z.copy(), Vbase.copy(), 0.0, parametrization)
+        assert np.allclose(V0, V1)
+        assert np.isclose(lam0, lam1)
+        assert np.allclose(z0, z1)
+
+        Va, ok_a, it_a, lam_a, err_a = corrector(island.Ybus, island.Ibus, Sbase, V0, island.pv, island.pq, lam0,
+                                                 Sxfr, Vbase, 0.0, z0, 0.1, parametrization, 1e-9, 20, False)
+        Vb, ok_b, it_b, lam_b, err_b = corrector_cached(context, island.Ybus, island.Ibus, Sbase, V1, island.pv,
+                                                        island.pq, lam1, Sxfr, Vbase, 0.0, z1, 0.1,
+                                                        parametrization, 1e-9, 20)
+        assert ok_a and ok_b
+        assert np.allclose(Va, Vb, atol=1e-8)
+        assert np.isclose(lam_a, lam_b, atol=1e-8)
+
+        # a single analysis for all the steps
+        assert context.n_analysis == 1
+        assert context.n_factorizations == 1 + it_b
+
+
+def test_voltage_collapse_multi_direction():
+    """
+    Scaling the transfer direction by k divides the maximum lambda by k
+    """
+    grid, pf_options, island, Sbase, Vbase = get_base_case()
+
+    options = VoltageCollapseOptions(step=0.01, approximation_order=VCParametrization.PseudoArcLength,
+                                     adapt_step=True, step_min=1e-4, step_max=0.05, max_steps=2000)
+
+    # one scaled load increase and two transfers between bus groups
+    k = np.array([1.0, 2.0, 4.0])
+    Stargets = np.array([Sbase + ki * 0.5 * Sbase for ki in k])
+    Stargets = np.r_[Stargets, [get_transfer_target(Sbase, [1, 2], [4, 6, 8], 1.0)]]
+
+    results = list()
+    for use_multiprocessing in [False, True]:
+        driver = VoltageCollapseMultiDirection(grid, options, Vbase=Vbase, Sbase=Sbase, Stargets=Stargets,
+                                               pf_options=pf_options, use_multiprocessing=use_multiprocessing,
+                                               keep_curves=True)
+        driver.run()
+        res = driver.results
+        results.append(res)
+
+        assert np.all(res.converged)
+        assert np.all(np.isfinite(res.max_lambda))
+        assert np.allclose(res.max_lambda[:3] * k, res.max_lambda[0], rtol=0.02)
+
+        n = res.n_steps[0]
+        assert np.all(np.isnan(res.lambdas[0, n:]))
+        assert np.allclose(res.vmin[0, :n], np.nanmin(res.vm_curves[0, :n, :], axis=1), atol=1e-6)
+
+        df = res.get_margins_df()
+        assert len(df) == 4
+
+    assert np.allclose(results[0].max_lambda, results[1].max_lambda)
+
+
+if __name__ == '__main__':
+    test_cached_predictor_corrector()
+    test_voltage_collapse_multi_direction()